@@ -0,0 +1,118 @@
+"""
+Бенчмарк покупки с автоматической выдачей
+
+Параллельные покупатели создают и оплачивают заказы (OrderService.create_order
++ process_payment, отдельные сессии). Печатает время от покупки до выдачи
+и проверяет, что каждый оплаченный заказ выдан ровно одной единицей, а
+товары без содержимого остались в очереди ручной выдачи.
+
+Пример:
+    python -m benchmarks.auto_delivery --purchases 500 --concurrency 50
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+from benchmarks.load_test import DEFAULT_DATABASE_URL, ScenarioResult, format_report
+
+
+async def run(args) -> bool:
+    from sqlalchemy import select, update, func
+    from database.database import async_session
+    from database.models import Order, OrderStatus, Product
+    from services import OrderService
+    from benchmarks.seed import reset_schema, seed_database
+
+    await reset_schema()
+    seed = await seed_database(
+        users=args.users, categories=1, products_per_category=args.products, balance=1_000_000
+    )
+
+    # Каждый пятый товар без содержимого - его заказы уходят на ручную выдачу
+    manual_ids = seed.product_ids[::5]
+    async with async_session() as session:
+        await session.execute(update(Product).where(Product.id.in_(manual_ids)).values(digital_content=None))
+        await session.commit()
+
+    result = ScenarioResult(name="buy_to_delivery")
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def purchase(i: int):
+        user_id = seed.user_ids[i % len(seed.user_ids)]
+        product_id = seed.product_ids[i % len(seed.product_ids)]
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                async with async_session() as session:
+                    service = OrderService(session)
+                    order, message = await service.create_order(user_id, product_id)
+                    if not order:
+                        raise RuntimeError(message)
+                    ok, message = await service.process_payment(order.id)
+                    if not ok:
+                        raise RuntimeError(message)
+            except Exception as e:
+                print(f"purchase {i} failed: {e}")
+                result.errors += 1
+                return
+            result.latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(purchase(i) for i in range(args.purchases)))
+    result.elapsed = time.perf_counter() - started
+    print(format_report([result]))
+
+    async with async_session() as session:
+        statuses = dict((await session.execute(
+            select(Order.status, func.count(Order.id)).group_by(Order.status)
+        )).all())
+        manual_delivered = await session.scalar(
+            select(func.count(Order.id)).where(
+                Order.product_id.in_(manual_ids),
+                Order.status == OrderStatus.DELIVERED.value
+            )
+        )
+
+    expected_manual = sum(1 for i in range(args.purchases) if seed.product_ids[i % len(seed.product_ids)] in manual_ids)
+    delivered = statuses.get(OrderStatus.DELIVERED.value, 0)
+    paid = statuses.get(OrderStatus.PAID.value, 0)
+    print(f"delivered={delivered} manual_queue={paid} expected_manual={expected_manual}")
+
+    return (
+        not result.errors
+        and manual_delivered == 0
+        and paid == expected_manual
+        and delivered == args.purchases - expected_manual
+    )
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Покупка с автоматической выдачей")
+    parser.add_argument("--database-url", default=os.getenv("BENCH_DATABASE_URL", DEFAULT_DATABASE_URL))
+    parser.add_argument("--force", action="store_true", help="Разрешить БД без 'bench' в URL")
+    parser.add_argument("--purchases", type=int, default=500)
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--products", type=int, default=50, help="Товаров в категории")
+    parser.add_argument("--concurrency", type=int, default=50)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    if "bench" not in args.database_url and not args.force:
+        sys.exit("Схема БД будет пересоздана. Используйте отдельную базу с 'bench' в URL или --force")
+
+    os.environ["DATABASE_URL"] = args.database_url
+    os.environ.setdefault("BALANCE_PAYMENTS", "True")
+    os.environ.setdefault("AUTO_DELIVERY", "True")
+
+    if not asyncio.run(run(args)):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
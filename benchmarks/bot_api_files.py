@@ -0,0 +1,167 @@
+"""
+Бенчмарк чтения импортируемого файла: облачный Bot API против локального сервера
+
+Поднимает в отдельном процессе фейковый Bot API, который отвечает на getFile
+и отдает файлы по /file/bot<token>/<path>, и читает через stream_telegram_file
+один и тот же синтетический файл ключей:
+  - cloud - getFile возвращает относительный путь, файл скачивается по HTTP;
+  - local - сервер в режиме --local возвращает абсолютный путь в своем каталоге
+    (--dir), бот читает файл с диска по смонтированному пути.
+Проверяет, что оба способа дают одинаковые строки, и печатает МБ/с.
+
+Пример:
+    python -m benchmarks.bot_api_files --size-mb 200
+"""
+
+import argparse
+import asyncio
+import hashlib
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+from benchmarks.bot_session import FAKE_TOKEN
+
+# Каталог файлов фейкового сервера, как его видит сам сервер
+SERVER_FILES_DIR = "/var/lib/telegram-bot-api"
+FILE_ID = "BQACAgIAAxkBAAIBbenchmark"
+FILE_NAME = "documents/file_0.txt"
+
+
+def _serve_fake_api(files_dir: str, ports):
+    """Фейковый Bot API: getFile и скачивание файлов из files_dir"""
+    from aiohttp import web
+
+    async def get_file(request: web.Request) -> web.Response:
+        form = await request.post()
+        # Сервер в режиме --local доступен по префиксу /local
+        local_mode = request.path.startswith("/local/")
+        path = f"{SERVER_FILES_DIR}/{FAKE_TOKEN}/{FILE_NAME}" if local_mode else FILE_NAME
+        return web.json_response({"ok": True, "result": {
+            "file_id": form["file_id"],
+            "file_unique_id": form["file_id"],
+            "file_size": os.path.getsize(os.path.join(files_dir, FAKE_TOKEN, FILE_NAME)),
+            "file_path": path,
+        }})
+
+    async def download(request: web.Request) -> web.StreamResponse:
+        return web.FileResponse(os.path.join(files_dir, FAKE_TOKEN, request.match_info["path"]))
+
+    async def serve():
+        app = web.Application()
+        app.router.add_post("/bot{token}/getFile", get_file)
+        app.router.add_post("/local/bot{token}/getFile", get_file)
+        app.router.add_get("/file/bot{token}/{path:.+}", download)
+        runner = web.AppRunner(app, access_log=None)
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        ports.put(site._server.sockets[0].getsockname()[1])
+        await asyncio.Event().wait()
+
+    asyncio.run(serve())
+
+
+def start_fake_api(files_dir: str):
+    """Запустить фейковый Bot API в отдельном процессе"""
+    context = multiprocessing.get_context("spawn")
+    ports = context.Queue()
+    process = context.Process(target=_serve_fake_api, args=(files_dir, ports), daemon=True)
+    process.start()
+    return process, f"http://127.0.0.1:{ports.get(timeout=30)}"
+
+
+def write_file(files_dir: str, size_mb: int) -> int:
+    """Файл ключей по строке на товар в каталоге бота, как его раскладывает telegram-bot-api"""
+    path = os.path.join(files_dir, FAKE_TOKEN, FILE_NAME)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    lines = 0
+    with open(path, "w") as f:
+        while f.tell() < size_mb * 1024 * 1024:
+            f.write("".join(f"KEY-{n:016d}-ÄÖÜ\n" for n in range(lines, lines + 10000)))
+            lines += 10000
+    return lines
+
+
+async def read_file(mode: str, base_url: str, files_dir: str) -> dict:
+    from pathlib import Path
+    from aiogram import Bot
+    from aiogram.client.telegram import SimpleFilesPathWrapper, TelegramAPIServer
+    from services.stock_import_service import iter_text_lines, max_download_size, stream_telegram_file
+    from utils.bot_session import create_bot_session
+
+    if mode == "local":
+        api = TelegramAPIServer.from_base(
+            f"{base_url}/local", is_local=True,
+            wrap_local_file=SimpleFilesPathWrapper(Path(SERVER_FILES_DIR), Path(files_dir))
+        )
+    else:
+        api = TelegramAPIServer.from_base(base_url)
+
+    bot = Bot(FAKE_TOKEN, session=create_bot_session(api))
+    digest = hashlib.sha256()
+    lines = 0
+    started = time.perf_counter()
+    async for line in iter_text_lines(stream_telegram_file(bot, FILE_ID)):
+        digest.update(line.encode())
+        lines += 1
+    elapsed = time.perf_counter() - started
+    await bot.session.close()
+
+    return {
+        "mode": mode,
+        "lines": lines,
+        "digest": digest.hexdigest(),
+        "elapsed": elapsed,
+        "limit": max_download_size(bot),
+    }
+
+
+async def run(args) -> list:
+    with tempfile.TemporaryDirectory() as files_dir:
+        expected_lines = write_file(files_dir, args.size_mb)
+        size = os.path.getsize(os.path.join(files_dir, FAKE_TOKEN, FILE_NAME))
+        process, base_url = start_fake_api(files_dir)
+        try:
+            results = []
+            for mode in args.modes:
+                result = await read_file(mode, base_url, files_dir)
+                result["expected_lines"] = expected_lines
+                result["size"] = size
+                results.append(result)
+            return results
+        finally:
+            process.terminate()
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Чтение импортируемого файла через облачный и локальный Bot API")
+    parser.add_argument("--size-mb", type=int, default=50)
+    parser.add_argument("--modes", nargs="+", default=["cloud", "local"], choices=["cloud", "local"])
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    results = asyncio.run(run(args))
+
+    print(f"{'mode':<8}{'lines':>12}{'sec':>10}{'MB/s':>10}  download limit")
+    for result in results:
+        limit = "none" if result["limit"] is None else f"{result['limit'] // 1024 // 1024} MB"
+        print(
+            f"{result['mode']:<8}{result['lines']:>12}{result['elapsed']:>10.2f}"
+            f"{result['size'] / 1024 / 1024 / result['elapsed']:>10.1f}  {limit}"
+        )
+
+    if any(result["lines"] != result["expected_lines"] for result in results):
+        print("Line count mismatch")
+        sys.exit(1)
+    if len({result["digest"] for result in results}) > 1:
+        print("Content differs between modes")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
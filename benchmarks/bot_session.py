@@ -0,0 +1,147 @@
+"""
+Бенчмарк HTTP-сессий Bot API на локальном фейковом сервере
+
+Поднимает в отдельном процессе aiohttp-сервер, который отвечает на
+sendMessage как Bot API (с необязательной задержкой), и отправляет через него сообщения
+конкурентно разными сессиями:
+  - default       - AiohttpSession aiogram по умолчанию (stdlib json);
+  - tuned-json    - TunedAiohttpSession со stdlib json;
+  - tuned-orjson  - TunedAiohttpSession с orjson.
+Для каждой печатает p50/p95/p99 задержки и отправок в секунду (колонка upd/s).
+
+Пример:
+    python -m benchmarks.bot_session --sends 5000 --concurrency 200 --latency 20
+"""
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import sys
+import time
+from typing import List
+
+from benchmarks.load_test import ScenarioResult, format_report
+
+FAKE_TOKEN = "123456789:BENCHMARKbenchmarkBENCHMARKbenchmark"
+
+
+def _serve_fake_api(latency: float, ports):
+    """Фейковый Bot API: sendMessage возвращает сообщение с переданным текстом"""
+    from aiohttp import web
+
+    message_ids = iter(range(1, 10**9))
+
+    async def send_message(request: web.Request) -> web.Response:
+        form = await request.post()
+        if latency:
+            await asyncio.sleep(latency)
+        result = {
+            "message_id": next(message_ids),
+            "date": int(time.time()),
+            "chat": {"id": int(form["chat_id"]), "type": "private"},
+            "text": form["text"],
+        }
+        if "reply_markup" in form:
+            result["reply_markup"] = json.loads(form["reply_markup"])
+        return web.json_response({"ok": True, "result": result})
+
+    async def serve():
+        app = web.Application()
+        app.router.add_post("/bot{token}/sendMessage", send_message)
+        runner = web.AppRunner(app, access_log=None)
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        ports.put(site._server.sockets[0].getsockname()[1])
+        await asyncio.Event().wait()
+
+    asyncio.run(serve())
+
+
+def start_fake_api(latency: float):
+    """Запустить фейковый Bot API в отдельном процессе, чтобы он не делил event loop с клиентом"""
+    context = multiprocessing.get_context("spawn")
+    ports = context.Queue()
+    process = context.Process(target=_serve_fake_api, args=(latency, ports), daemon=True)
+    process.start()
+    return process, f"http://127.0.0.1:{ports.get(timeout=30)}"
+
+
+def make_session(name: str, api):
+    from aiogram.client.session.aiohttp import AiohttpSession
+    from utils.bot_session import TunedAiohttpSession, json_functions
+
+    if name == "default":
+        return AiohttpSession(api=api)
+    json_loads, json_dumps = json_functions("orjson" if name == "tuned-orjson" else "json")
+    return TunedAiohttpSession(api=api, json_loads=json_loads, json_dumps=json_dumps)
+
+
+async def run_session(name: str, base_url: str, sends: int, concurrency: int) -> ScenarioResult:
+    from aiogram import Bot
+    from aiogram.client.telegram import TelegramAPIServer
+    from keyboards import main_menu_kb
+
+    bot = Bot(FAKE_TOKEN, session=make_session(name, TelegramAPIServer.from_base(base_url)))
+    result = ScenarioResult(name=name)
+    semaphore = asyncio.Semaphore(concurrency)
+    text = "📂 <b>Каталог</b>\n" + "Синтетический текст сообщения. " * 10
+
+    async def send(i: int):
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                await bot.send_message(100 + i % 1000, text, reply_markup=main_menu_kb())
+            except Exception as e:
+                result.errors += 1
+                if result.errors == 1:
+                    print(f"{name}: {e}")
+                return
+            result.latencies.append(time.perf_counter() - started)
+
+    # Прогрев: соединения пула и импорты
+    await asyncio.gather(*(send(i) for i in range(min(concurrency, sends))))
+    result.latencies.clear()
+
+    started = time.perf_counter()
+    await asyncio.gather(*(send(i) for i in range(sends)))
+    result.elapsed = time.perf_counter() - started
+
+    await bot.session.close()
+    return result
+
+
+async def run(args) -> List[ScenarioResult]:
+    process, base_url = start_fake_api(args.latency / 1000)
+    try:
+        return [
+            await run_session(name, base_url, args.sends, args.concurrency)
+            for name in args.sessions
+        ]
+    finally:
+        process.terminate()
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Отправка сообщений через разные HTTP-сессии Bot API")
+    parser.add_argument("--sends", type=int, default=3000)
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--latency", type=float, default=0, help="Задержка ответа фейкового Bot API, мс")
+    parser.add_argument(
+        "--sessions", nargs="+", default=["default", "tuned-json", "tuned-orjson"],
+        choices=["default", "tuned-json", "tuned-orjson"]
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    results = asyncio.run(run(args))
+    print(format_report(results))
+    if any(result.errors for result in results):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""
+Микробенчмарк маршрутизации callback-запросов
+
+Для каждого зарегистрированного CallbackPattern строит пример callback_data
+и сравнивает поиск обработчика:
+  - linear - как aiogram: по роутерам и обработчикам подряд, проверяя фильтры;
+  - table  - через префиксное дерево install_callback_table.
+Обработчики не вызываются, БД не нужна. Печатает время поиска на апдейт,
+число проверок фильтров и callback_data, которые линейный обход отдавал
+не тому обработчику (более короткий префикс раньше более длинного).
+
+Пример:
+    python -m benchmarks.callback_routing --rounds 200
+"""
+
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+
+
+def sample_data(pattern) -> str:
+    """Пример callback_data для шаблона"""
+    if not pattern.is_prefix:
+        return pattern.text
+    if not pattern.params:
+        return pattern.text + "x"
+    values = {int: "17", str: "name"}
+    return pattern.text + "_".join(values.get(kind, "1") for _, kind, _ in pattern.params)
+
+
+async def linear_lookup(routers, callback, kwargs):
+    """Первый подходящий обработчик при последовательной проверке фильтров"""
+    checks = 0
+    for router in routers:
+        for handler in router.callback_query.handlers:
+            checks += 1
+            result, _ = await handler.check(callback, **kwargs)
+            if result:
+                return handler, checks
+    return None, checks
+
+
+async def table_lookup(table, callback, kwargs):
+    """Первый подходящий обработчик из таблицы"""
+    checks = 0
+    for route in table.lookup(callback.data):
+        checks += 1
+        result, _ = await route.handler.check(callback, **kwargs)
+        if result:
+            return route.handler, checks
+    return None, checks
+
+
+async def measure(lookup, target, events, kwargs, rounds: int):
+    """Среднее время поиска на апдейт (мкс) и проверок фильтров на апдейт"""
+    timings = []
+    checks = 0
+    for _ in range(rounds):
+        started = time.perf_counter()
+        for callback in events:
+            _, count = await lookup(target, callback, kwargs)
+            checks += count
+        timings.append((time.perf_counter() - started) / len(events))
+    return statistics.median(timings) * 1_000_000, checks / (rounds * len(events))
+
+
+async def run(args) -> bool:
+    from aiogram import Dispatcher
+    from handlers import user_router, admin_router, callback_router, warehouse_router
+    from utils.callbacks import CallbackTable, install_callback_table
+    from benchmarks.load_test import UpdateFactory
+
+    dp = Dispatcher()
+    for router in (user_router, admin_router, callback_router, warehouse_router):
+        dp.include_router(router)
+    routers = list(dp.chain_tail)
+
+    factory = UpdateFactory()
+    patterns = [
+        pattern
+        for router in routers
+        for handler in router.callback_query.handlers
+        if (pattern := CallbackTable._pattern_of(handler)) is not None
+    ]
+    events = [factory.callback(1, sample_data(pattern)).callback_query for pattern in patterns]
+    kwargs = {"raw_state": None}
+
+    linear_handlers = [(await linear_lookup(routers, callback, kwargs))[0] for callback in events]
+    linear_us, linear_checks = await measure(linear_lookup, routers, events, kwargs, args.rounds)
+
+    table = install_callback_table(dp)
+    table_handlers = [(await table_lookup(table, callback, kwargs))[0] for callback in events]
+    table_us, table_checks = await measure(table_lookup, table, events, kwargs, args.rounds)
+
+    print(f"patterns={len(patterns)} table_size={table.trie.size}")
+    print(f"{'router':<8} {'us/update':>10} {'checks/update':>14}")
+    print(f"{'linear':<8} {linear_us:>10.2f} {linear_checks:>14.1f}")
+    print(f"{'table':<8} {table_us:>10.2f} {table_checks:>14.1f}")
+
+    # Где линейный обход выбирал другой обработчик (перехват коротким префиксом).
+    # Это исправления маршрутизации: например, кнопка «Обновить» экрана товаров
+    # с остатками раньше попадала в warehouse_category_products_redirect и сбрасывала меню
+    shadowed = 0
+    for callback, before, after in zip(events, linear_handlers, table_handlers):
+        if before is not after and after is not None:
+            shadowed += 1
+            before_name = before.callback.__name__ if before else "-"
+            print(f"  {callback.data}: {before_name} -> {after.callback.__name__}")
+    print(f"shadowed_before={shadowed}")
+
+    unresolved = [callback.data for callback, handler in zip(events, table_handlers) if handler is None]
+    # Обработчики с фильтром состояния не подходят без состояния - это ожидаемо
+    print(f"state_only={len(unresolved)}")
+    return table_us < linear_us
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Маршрутизация callback-запросов: перебор против таблицы")
+    parser.add_argument("--rounds", type=int, default=200, help="Повторов прогона всех callback_data")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if not asyncio.run(run(args)):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""
+Бенчмарк потоковой выгрузки (ExportService)
+
+Заполняет базу товарами с контентом и выданными заказами, затем выгружает
+все виды данных в оба формата. Печатает размер файла, скорость и пик памяти
+Python (tracemalloc) - он не должен расти вместе с размером таблиц.
+
+Пример:
+    python -m benchmarks.export --rows 200000
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+import tracemalloc
+
+from benchmarks.load_test import DEFAULT_DATABASE_URL
+
+
+async def fill(rows: int, category_id: int, user_id: int, batch_size: int = 5000):
+    """Вставить rows товаров с контентом и по выданному заказу на каждый"""
+    from sqlalchemy import insert
+    from database.database import async_session
+    from database.models import Product, Order, OrderStatus
+    from database.money import Money
+
+    price = Money.from_rubles(199)
+
+    async with async_session() as session:
+        for start in range(0, rows, batch_size):
+            ids = range(start, min(start + batch_size, rows))
+            product_ids = (await session.scalars(
+                insert(Product.__table__).returning(Product.id),
+                [{
+                    "name": f"Bench export #{i}",
+                    "price": price,
+                    "category_id": category_id,
+                    "product_type": "key",
+                    "duration": "1 месяц",
+                    "stock_quantity": 1,
+                    "digital_content": f"EXPORT-{i:012d}",
+                    "is_active": True,
+                    "is_unlimited": False,
+                    "total_sold": 0,
+                } for i in ids]
+            )).all()
+            await session.execute(insert(Order.__table__), [{
+                "user_id": user_id,
+                "product_id": product_id,
+                "quantity": 1,
+                "unit_price": price,
+                "total_price": price,
+                "status": OrderStatus.DELIVERED.value,
+                "delivered_content": f"DELIVERED-{product_id:012d}",
+            } for product_id in product_ids])
+            await session.commit()
+
+
+async def run(args) -> bool:
+    from database.database import async_session
+    from benchmarks.seed import reset_schema, seed_database
+    from services.export_service import ExportService, EXPORT_KINDS, EXPORT_FORMATS
+
+    await reset_schema()
+    seed = await seed_database(users=1, categories=1, products_per_category=0)
+    await fill(args.rows, seed.category_ids[0], seed.user_ids[0])
+
+    ok = True
+    for kind in EXPORT_KINDS:
+        for fmt in EXPORT_FORMATS:
+            tracemalloc.start()
+            started = time.perf_counter()
+
+            async with async_session() as session:
+                path, rows_total = await ExportService(session, chunk_size=args.chunk_size).export_to_temp_file(kind, fmt)
+
+            elapsed = time.perf_counter() - started
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+            size = os.path.getsize(path)
+            os.unlink(path)
+            ok = ok and rows_total == args.rows
+
+            print(f"{kind:8} {fmt:5} rows={rows_total} size={size / 1024:.0f} KB elapsed={elapsed:.1f}s "
+                  f"rate={rows_total / elapsed:.0f} rows/s peak_memory={peak / 1024 / 1024:.1f} MB")
+
+    return ok
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Бенчмарк потоковой выгрузки")
+    parser.add_argument("--database-url", default=os.getenv("BENCH_DATABASE_URL", DEFAULT_DATABASE_URL))
+    parser.add_argument("--force", action="store_true", help="Разрешить БД без 'bench' в URL")
+    parser.add_argument("--rows", type=int, default=100_000, help="Товаров и выданных заказов")
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    if "bench" not in args.database_url and not args.force:
+        sys.exit("Схема БД будет пересоздана. Используйте отдельную базу с 'bench' в URL или --force")
+
+    os.environ["DATABASE_URL"] = args.database_url
+
+    if not asyncio.run(run(args)):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""Фейковая сессия Bot API для нагрузочных тестов без обращения к Telegram"""
+
+import asyncio
+import itertools
+from collections import Counter
+from datetime import datetime
+from typing import Any, AsyncGenerator, Dict, Optional, get_args
+
+from aiogram import Bot
+from aiogram.client.default import DefaultBotProperties
+from aiogram.client.session.base import BaseSession
+from aiogram.enums import ParseMode
+from aiogram.methods import TelegramMethod
+from aiogram.types import Chat, File, Message, User
+
+
+FAKE_BOT_TOKEN = "123456789:BENCHMARKbenchmarkBENCHMARKbenchmark"
+FAKE_BOT_ID = 123456789
+
+
+class FakeSession(BaseSession):
+    """
+    Сессия, которая отвечает на любые методы Bot API локально.
+
+    Сетевую задержку можно эмулировать через latency (в секундах).
+    Количество вызовов по методам копится в calls.
+    Содержимое файлов для getFile/скачивания задается в files (file_id -> bytes).
+    """
+
+    def __init__(self, latency: float = 0.0, **kwargs):
+        super().__init__(**kwargs)
+        self.latency = latency
+        self.calls: Counter = Counter()
+        self.files: Dict[str, bytes] = {}
+        self._message_ids = itertools.count(1_000_000)
+
+    async def close(self) -> None:
+        pass
+
+    async def make_request(
+        self,
+        bot: Bot,
+        method: TelegramMethod[Any],
+        timeout: Optional[int] = None
+    ) -> Any:
+        self.calls[type(method).__name__] += 1
+
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        returning = method.__returning__
+        candidates = get_args(returning) or (returning,)
+
+        if Message in candidates:
+            return self._fake_message(method).as_(bot)
+        if File in candidates:
+            file_id = getattr(method, "file_id", "")
+            return File(
+                file_id=file_id,
+                file_unique_id=file_id,
+                file_size=len(self.files.get(file_id, b"")),
+                file_path=f"documents/{file_id}"
+            )
+        if User in candidates:
+            return User(id=FAKE_BOT_ID, is_bot=True, first_name="Bench", username="bench_bot")
+        if bool in candidates:
+            return True
+        return None
+
+    async def stream_content(
+        self,
+        url: str,
+        headers: Optional[Dict[str, Any]] = None,
+        timeout: int = 30,
+        chunk_size: int = 65536,
+        raise_for_status: bool = True
+    ) -> AsyncGenerator[bytes, None]:
+        content = self.files.get(url.rsplit("/", 1)[-1], b"")
+        for start in range(0, len(content), chunk_size):
+            yield content[start:start + chunk_size]
+
+    def _fake_message(self, method: TelegramMethod[Any]) -> Message:
+        """Собрать ответное сообщение для send/edit методов"""
+        chat_id = getattr(method, "chat_id", None)
+        if not isinstance(chat_id, int):
+            chat_id = FAKE_BOT_ID
+
+        message_id = getattr(method, "message_id", None) or next(self._message_ids)
+
+        return Message(
+            message_id=message_id,
+            date=datetime.now(),
+            chat=Chat(id=chat_id, type="private"),
+            text=getattr(method, "text", None)
+        )
+
+
+def create_fake_bot(latency: float = 0.0) -> Bot:
+    """Создать бота с фейковой сессией"""
+    return Bot(
+        token=FAKE_BOT_TOKEN,
+        session=FakeSession(latency=latency),
+        default=DefaultBotProperties(parse_mode=ParseMode.HTML)
+    )
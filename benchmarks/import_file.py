@@ -0,0 +1,112 @@
+"""
+Бенчмарк потокового импорта склада (StockImportService)
+
+Строки генерируются на лету и подаются чанками так же, как при скачивании
+файла из Telegram. Печатает скорость импорта и пик памяти Python (tracemalloc).
+
+Пример:
+    python -m benchmarks.import_file --lines 1000000
+    python -m benchmarks.import_file --lines 100000 --csv --product-type account
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+import tracemalloc
+
+from benchmarks.load_test import DEFAULT_DATABASE_URL
+
+
+async def generate_chunks(lines: int, product_type: str, csv_format: bool, duplicate_every: int, chunk_size: int):
+    """Синтетический файл: каждая duplicate_every-я строка повторяет предыдущую"""
+    buffer = []
+    size = 0
+
+    if csv_format:
+        buffer.append("login;password\n" if product_type == "account" else "key\n")
+
+    for i in range(lines):
+        n = i - 1 if duplicate_every and i and i % duplicate_every == 0 else i
+        if product_type == "account":
+            line = f"user{n}@example.com;pass{n}\n" if csv_format else f"user{n}@example.com:pass{n}\n"
+        else:
+            line = f"BENCH-{n:012d}\n"
+
+        buffer.append(line)
+        size += len(line)
+        if size >= chunk_size:
+            yield "".join(buffer).encode()
+            buffer = []
+            size = 0
+            await asyncio.sleep(0)
+
+    if buffer:
+        yield "".join(buffer).encode()
+
+
+async def run(args):
+    from database.database import async_session
+    from benchmarks.seed import reset_schema, seed_database
+    from services.stock_import_service import StockImportService, iter_text_lines, DOWNLOAD_CHUNK_SIZE
+
+    await reset_schema()
+    seed = await seed_database(users=0, categories=1, products_per_category=0)
+
+    progress_calls = 0
+
+    async def on_progress(report):
+        nonlocal progress_calls
+        progress_calls += 1
+
+    tracemalloc.start()
+    started = time.perf_counter()
+
+    async with async_session() as session:
+        report = await StockImportService(session, batch_size=args.batch_size).import_lines(
+            iter_text_lines(generate_chunks(args.lines, args.product_type, args.csv, args.duplicate_every, DOWNLOAD_CHUNK_SIZE)),
+            base_name="Bench import",
+            category_id=seed.category_ids[0],
+            product_type=args.product_type,
+            duration="1 месяц",
+            price=199.0,
+            admin_id=1,
+            csv_format=args.csv,
+            on_progress=on_progress
+        )
+
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print(f"lines={report['total_lines']} added={report['successful']} duplicates={report['duplicates']} "
+          f"invalid={report['invalid_format']} batches={report['batches']} progress_calls={progress_calls}")
+    print(f"elapsed={elapsed:.1f}s rate={report['total_lines'] / elapsed:.0f} lines/s peak_memory={peak / 1024 / 1024:.1f} MB")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Бенчмарк потокового импорта из файла")
+    parser.add_argument("--database-url", default=os.getenv("BENCH_DATABASE_URL", DEFAULT_DATABASE_URL))
+    parser.add_argument("--force", action="store_true", help="Разрешить БД без 'bench' в URL")
+    parser.add_argument("--lines", type=int, default=100_000)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--product-type", choices=["key", "promo", "account"], default="key")
+    parser.add_argument("--csv", action="store_true")
+    parser.add_argument("--duplicate-every", type=int, default=100, help="Каждая N-я строка - дубликат (0 - без дублей)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    if "bench" not in args.database_url and not args.force:
+        sys.exit("Схема БД будет пересоздана. Используйте отдельную базу с 'bench' в URL или --force")
+
+    os.environ["DATABASE_URL"] = args.database_url
+
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+Проверка журнала балансов под конкурентными начислениями
+
+Параллельно проводит начисления одному пользователю из отдельных сессий,
+часть событий отправляется повторно с тем же idempotency_key. В конце
+сверяет баланс с ожидаемым и запускает LedgerService.reconcile().
+
+Пример:
+    python -m benchmarks.ledger_concurrency --credits 500 --duplicates 100
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+
+from benchmarks.load_test import DEFAULT_DATABASE_URL, ScenarioResult, format_report
+
+
+async def run(args) -> bool:
+    from database.database import async_session
+    from database.models import User, LedgerReason
+    from database.money import Money
+    from repositories import LedgerRepository, UserRepository
+    from services import LedgerService
+    from benchmarks.seed import reset_schema, seed_database
+
+    await reset_schema()
+    seed = await seed_database(users=1, categories=0, products_per_category=0)
+    user_id = seed.user_ids[0]
+
+    amount = Money.from_rubles(args.amount)
+    keys = [f"bench_credit:{i}" for i in range(args.credits)]
+    plan = keys + random.Random(42).choices(keys, k=args.duplicates)
+    random.Random(7).shuffle(plan)
+
+    result = ScenarioResult(name="ledger_credit")
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def credit(key: str):
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                async with async_session() as session:
+                    await LedgerRepository(session).post(user_id, amount, key, LedgerReason.ADJUSTMENT)
+            except Exception as e:
+                print(f"credit {key} failed: {e}")
+                result.errors += 1
+                return
+            result.latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(credit(key) for key in plan))
+    result.elapsed = time.perf_counter() - started
+    print(format_report([result]))
+
+    async with async_session() as session:
+        user = await UserRepository(session).get_by_telegram_id(user_id)
+        reconciliation = await LedgerService(session).reconcile()
+
+    expected = amount * args.credits
+    print(f"balance={user.balance} expected={expected} reconcile_ok={reconciliation['ok']}")
+    return user.balance == expected and reconciliation["ok"] and not result.errors
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Конкурентные начисления через журнал балансов")
+    parser.add_argument("--database-url", default=os.getenv("BENCH_DATABASE_URL", DEFAULT_DATABASE_URL))
+    parser.add_argument("--force", action="store_true", help="Разрешить БД без 'bench' в URL")
+    parser.add_argument("--credits", type=int, default=500, help="Уникальных начислений")
+    parser.add_argument("--duplicates", type=int, default=100, help="Повторов уже отправленных событий")
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--amount", type=float, default=1.11, help="Сумма одного начисления, руб.")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    if "bench" not in args.database_url and not args.force:
+        sys.exit("Схема БД будет пересоздана. Используйте отдельную базу с 'bench' в URL или --force")
+
+    os.environ["DATABASE_URL"] = args.database_url
+
+    if not asyncio.run(run(args)):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+"""
+Проверка переходов статусов заказа под конкурентными запросами
+
+Создает заказы и для каждого параллельно (из отдельных сессий) посылает
+повторные оплаты, выдачи и отмены - как двойные нажатия и два админа.
+В конце проверяет, что побочные действия применены ровно один раз:
+  - каждый заказ в одном конечном статусе, версия равна числу переходов;
+  - остаток товара вернулся только за отмененные заказы;
+  - счетчик продаж вырос только за выданные;
+  - возврат денег проведен по разу на отмененный заказ, журнал сходится.
+
+Пример:
+    python -m benchmarks.order_transitions --orders 200 --repeats 3
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+
+from benchmarks.load_test import DEFAULT_DATABASE_URL, ScenarioResult, format_report
+
+
+async def run(args) -> bool:
+    from sqlalchemy import select
+    from database.database import async_session
+    from database.models import Order, OrderStatus, Product, BalanceTransaction, LedgerReason
+    from repositories.ledger_repository import user_account
+    from services import OrderService, LedgerService
+    from benchmarks.seed import reset_schema, seed_database
+
+    await reset_schema()
+    seed = await seed_database(users=1, categories=1, products_per_category=1, balance=1_000_000)
+    user_id = seed.user_ids[0]
+
+    async with async_session() as session:
+        product = await session.get(Product, seed.product_ids[0])
+        initial_stock, initial_sold = product.stock_quantity, product.total_sold
+
+        order_ids = []
+        for _ in range(args.orders):
+            order, message = await OrderService(session).create_order(user_id, product.id)
+            if not order:
+                print(f"create_order failed: {message}")
+                return False
+            order_ids.append(order.id)
+
+    actions = []
+    for order_id in order_ids:
+        actions += [("pay", order_id)] * args.repeats
+        actions += [("deliver", order_id)] * args.repeats
+        actions += [("cancel", order_id)] * args.repeats
+    random.Random(42).shuffle(actions)
+
+    results = {name: ScenarioResult(name=f"order_{name}") for name in ("pay", "deliver", "cancel")}
+    succeeded = {name: 0 for name in results}
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def fire(action: str, order_id: int):
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                async with async_session() as session:
+                    service = OrderService(session)
+                    if action == "pay":
+                        ok, _ = await service.process_payment(order_id)
+                    elif action == "deliver":
+                        ok, _ = await service.deliver_order(order_id, f"CONTENT-{order_id}", admin_id=0)
+                    else:
+                        ok, _ = await service.cancel_order(order_id, "bench")
+            except Exception as e:
+                print(f"{action} {order_id} failed: {e}")
+                results[action].errors += 1
+                return
+            succeeded[action] += ok
+            results[action].latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(fire(action, order_id) for action, order_id in actions))
+    elapsed = time.perf_counter() - started
+    for result in results.values():
+        result.elapsed = elapsed
+    print(format_report(list(results.values())))
+
+    async with async_session() as session:
+        rows = (await session.execute(
+            select(Order.id, Order.status, Order.version).where(Order.id.in_(order_ids))
+        )).all()
+        product = await session.get(Product, seed.product_ids[0])
+        # Заказы, за которые списаны и возвращены деньги (ключи purchase:<id> и order_refund:<id>)
+        postings = (await session.execute(
+            select(BalanceTransaction.reason, BalanceTransaction.idempotency_key).where(
+                BalanceTransaction.account == user_account(user_id),
+                BalanceTransaction.reason.in_([LedgerReason.PURCHASE.value, LedgerReason.ORDER_REFUND.value])
+            )
+        )).all()
+        reconciliation = await LedgerService(session).reconcile()
+
+    charged = {int(key.rsplit(":", 1)[1]) for reason, key in postings if reason == LedgerReason.PURCHASE.value}
+    refunded = {int(key.rsplit(":", 1)[1]) for reason, key in postings if reason == LedgerReason.ORDER_REFUND.value}
+    refunds = len(refunded)
+
+    statuses = {status.value: 0 for status in OrderStatus}
+    cancelled_ids = set()
+    bad_versions = 0
+    for order_id, status, version in rows:
+        statuses[status] += 1
+        if status == OrderStatus.CANCELLED.value:
+            cancelled_ids.add(order_id)
+        # PENDING -> CANCELLED/DELIVERED - один переход, через PAID - два
+        if version not in (1, 2):
+            bad_versions += 1
+
+    cancelled = statuses[OrderStatus.CANCELLED.value]
+    delivered = statuses[OrderStatus.DELIVERED.value]
+    checks = {
+        "terminal": cancelled + delivered == args.orders,
+        "versions": bad_versions == 0,
+        "stock": product.stock_quantity == initial_stock - args.orders + cancelled,
+        "sold": product.total_sold == initial_sold + delivered,
+        # Возврат - ровно за отмененные оплаченные заказы
+        "refunds": refunded == charged & cancelled_ids,
+        "successes": succeeded["deliver"] == delivered and succeeded["cancel"] == cancelled,
+        "ledger": reconciliation["ok"],
+    }
+
+    print(f"statuses={statuses} refunds={refunds} successes={succeeded}")
+    print(" ".join(f"{name}={'ok' if passed else 'FAIL'}" for name, passed in checks.items()))
+    return all(checks.values()) and not any(result.errors for result in results.values())
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Конкурентные переходы статусов заказа")
+    parser.add_argument("--database-url", default=os.getenv("BENCH_DATABASE_URL", DEFAULT_DATABASE_URL))
+    parser.add_argument("--force", action="store_true", help="Разрешить БД без 'bench' в URL")
+    parser.add_argument("--orders", type=int, default=200)
+    parser.add_argument("--repeats", type=int, default=3, help="Повторов каждого действия на заказ")
+    parser.add_argument("--concurrency", type=int, default=50)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    if "bench" not in args.database_url and not args.force:
+        sys.exit("Схема БД будет пересоздана. Используйте отдельную базу с 'bench' в URL или --force")
+
+    os.environ["DATABASE_URL"] = args.database_url
+    # Оплата списывает с баланса - проверяется, что возвраты совпадают со списаниями.
+    # Выдача - только ручная: автовыдача при оплате смешала бы успехи pay и deliver
+    os.environ.setdefault("BALANCE_PAYMENTS", "True")
+    os.environ.setdefault("AUTO_DELIVERY", "False")
+
+    if not asyncio.run(run(args)):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
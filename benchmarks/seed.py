@@ -0,0 +1,91 @@
+"""Наполнение базы синтетическими данными для бенчмарков"""
+
+from dataclasses import dataclass, field
+from typing import List
+
+from sqlalchemy import insert
+
+from database.database import Base, engine, async_session
+from database.models import User, Category, Product, ProductType, LedgerReason
+from database.money import Money
+from repositories.ledger_repository import LedgerRepository
+
+
+@dataclass
+class SeedResult:
+    """Идентификаторы созданных записей"""
+    user_ids: List[int] = field(default_factory=list)
+    category_ids: List[int] = field(default_factory=list)
+    product_ids: List[int] = field(default_factory=list)
+
+
+async def reset_schema():
+    """Пересоздать схему БД (только для бенчмарковой базы!)"""
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+
+
+async def seed_database(
+    users: int = 1000,
+    categories: int = 10,
+    products_per_category: int = 50,
+    stock_per_product: int = 1_000_000,
+    first_user_id: int = 10_000_000,
+    balance: float = 0
+) -> SeedResult:
+    """Создать пользователей (с начальным балансом через журнал), категории и товары пачками"""
+    result = SeedResult()
+
+    async with async_session() as session:
+        user_rows = [
+            {
+                "id": first_user_id + i,
+                "username": f"bench_user_{i}",
+                "first_name": f"Bench {i}",
+                "language_code": "ru",
+                "referral_code": f"BREF{i:08d}",
+                "promo_code": f"BPROMO{i:08d}",
+            }
+            for i in range(users)
+        ]
+        if user_rows:
+            await session.execute(insert(User), user_rows)
+        result.user_ids = [row["id"] for row in user_rows]
+
+        if balance and result.user_ids:
+            await LedgerRepository(session).post_many(
+                [(user_id, Money.from_rubles(balance), f"opening:{user_id}", None) for user_id in result.user_ids],
+                LedgerReason.OPENING_BALANCE
+            )
+
+        for c in range(categories):
+            category = Category(name=f"Bench category {c}", description="Синтетическая категория", sort_order=c)
+            session.add(category)
+            await session.flush()
+            result.category_ids.append(category.id)
+
+            product_rows = [
+                {
+                    "name": f"Bench product {c}-{p}",
+                    "description": "Синтетический товар",
+                    "price": 100.0 + p,
+                    "category_id": category.id,
+                    "product_type": ProductType.KEY.value,
+                    "duration": "1 месяц",
+                    "stock_quantity": stock_per_product,
+                    "digital_content": f"KEY-{c:04d}-{p:06d}",
+                    "is_active": True,
+                    "is_unlimited": False,
+                    "total_sold": 0,
+                    "sort_order": p,
+                }
+                for p in range(products_per_category)
+            ]
+            if product_rows:
+                ids = await session.scalars(insert(Product).returning(Product.id), product_rows)
+                result.product_ids.extend(ids.all())
+
+        await session.commit()
+
+    return result
@@ -0,0 +1,135 @@
+"""
+Проверка планировщика апдейтов на перемешанных синтетических апдейтах
+
+Через диспетчер с UpdateScheduler одновременно подаются сообщения
+нескольких чатов вперемешку (как задачи polling). Обработчик спит
+случайное время и записывает интервал работы. Проверяется:
+  - апдейты каждого чата обработаны в порядке поступления;
+  - внутри чата обработки не пересекаются;
+  - одновременно работает не больше --concurrency обработчиков;
+  - разные чаты действительно обрабатываются параллельно.
+Часть апдейтов отменяется в очереди - порядок остальных не должен
+нарушиться. БД не нужна.
+
+Пример:
+    python -m benchmarks.update_ordering --chats 50 --updates 20 --concurrency 16
+"""
+
+import argparse
+import asyncio
+import random
+import sys
+import time
+from collections import defaultdict
+
+
+async def run(args) -> bool:
+    from aiogram import Dispatcher, Router
+    from aiogram.types import Message
+
+    from benchmarks.fake_bot import create_fake_bot
+    from benchmarks.load_test import UpdateFactory
+    from utils.update_scheduler import install_update_scheduler
+
+    rng = random.Random(args.seed)
+    dp = Dispatcher()
+    router = Router()
+    scheduler = install_update_scheduler(dp, args.concurrency)
+
+    intervals = defaultdict(list)
+    running = {"now": 0, "max": 0}
+
+    @router.message()
+    async def record(message: Message):
+        running["now"] += 1
+        running["max"] = max(running["max"], running["now"])
+        started = time.monotonic()
+        await asyncio.sleep(rng.uniform(0, args.max_delay / 1000))
+        intervals[message.chat.id].append((int(message.text), started, time.monotonic()))
+        running["now"] -= 1
+
+    dp.include_router(router)
+    bot = create_fake_bot()
+    factory = UpdateFactory()
+
+    # Перемешанный поток: у каждого чата свои номера сообщений по возрастанию
+    plan = [(10_000 + chat, seq) for chat in range(args.chats) for seq in range(args.updates)]
+    rng.shuffle(plan)
+    next_seq = defaultdict(int)
+    updates = []
+    for chat_id, _ in plan:
+        updates.append((chat_id, next_seq[chat_id], factory.message(chat_id, str(next_seq[chat_id]))))
+        next_seq[chat_id] += 1
+
+    started = time.perf_counter()
+    tasks = []
+    for _, _, update in updates:
+        tasks.append(asyncio.create_task(dp.feed_update(bot, update)))
+        # Задачи polling создаются по мере получения апдейтов
+        await asyncio.sleep(0)
+
+    cancelled = set()
+    for (chat_id, seq, _), task in zip(updates, tasks):
+        if rng.random() < args.cancel_ratio and not task.done():
+            task.cancel()
+            cancelled.add((chat_id, seq))
+    await asyncio.gather(*tasks, return_exceptions=True)
+    elapsed = time.perf_counter() - started
+
+    ok = True
+    serial_time = 0.0
+    for chat_id, items in intervals.items():
+        sequence = [seq for seq, _, _ in items]
+        if sequence != sorted(sequence):
+            print(f"chat {chat_id}: out of order {sequence}")
+            ok = False
+        for (_, _, end), (_, start, _) in zip(items, items[1:]):
+            if start < end:
+                print(f"chat {chat_id}: overlapping handlers")
+                ok = False
+                break
+        serial_time += sum(end - start for _, start, end in items)
+
+    handled = sum(len(items) for items in intervals.values())
+    metrics = scheduler.metrics
+    print(
+        f"updates={len(updates)} handled={handled} cancelled={len(cancelled)} "
+        f"elapsed={elapsed:.2f}s serial={serial_time:.2f}s max_running={running['max']}"
+    )
+    print(
+        f"max_queue_depth={metrics['max_queue_depth']} queued_left={metrics['queued']} "
+        f"avg_wait={metrics['wait_total'] / max(metrics['completed'], 1) * 1000:.1f}ms "
+        f"max_wait={metrics['wait_max'] * 1000:.1f}ms"
+    )
+
+    if running["max"] > args.concurrency:
+        print(f"concurrency limit exceeded: {running['max']} > {args.concurrency}")
+        ok = False
+    if metrics["queued"] or scheduler._queues:
+        print("queues not drained")
+        ok = False
+    if args.concurrency > 1 and elapsed >= serial_time:
+        print("chats were not processed in parallel")
+        ok = False
+    return ok
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Порядок апдейтов внутри чата и параллельность между чатами")
+    parser.add_argument("--chats", type=int, default=50)
+    parser.add_argument("--updates", type=int, default=20, help="Апдейтов на чат")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--max-delay", type=float, default=5, help="Максимальное время обработчика, мс")
+    parser.add_argument("--cancel-ratio", type=float, default=0.05, help="Доля апдейтов, отменяемых в очереди")
+    parser.add_argument("--seed", type=int, default=1)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if not asyncio.run(run(args)):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -6,27 +6,155 @@ from dotenv import load_dotenv
 load_dotenv()
 
 
+def _optional_int(name: str) -> Optional[int]:
+    """Целое из окружения или None, если переменная не задана"""
+    value = os.getenv(name)
+    return int(value) if value not in (None, "") else None
+
+
+def _optional_bool(name: str) -> Optional[bool]:
+    """Булево значение из окружения или None, если переменная не задана"""
+    value = os.getenv(name)
+    return value.lower() == "true" if value not in (None, "") else None
+
+
 class Settings(BaseSettings):
     # Bot settings
     BOT_TOKEN: str = os.getenv("BOT_TOKEN", "8284240552:AAGLlARMHz6tYT5vaQcy7p1LjepjPTFfxb0")
     ADMIN_IDS: list[int] = [int(x) for x in os.getenv("ADMIN_IDS", "7936351930").split(",") if x.strip()]
     
+    # HTTP-сессия Bot API: tuned (пул keep-alive, кэш DNS, orjson) или default (aiogram по умолчанию)
+    BOT_SESSION: str = os.getenv("BOT_SESSION", "tuned")
+    BOT_JSON: str = os.getenv("BOT_JSON", "orjson")  # orjson или json
+    BOT_API_CONNECTION_LIMIT: int = int(os.getenv("BOT_API_CONNECTION_LIMIT", "100"))
+    BOT_API_DNS_CACHE_TTL: int = int(os.getenv("BOT_API_DNS_CACHE_TTL", "300"))
+    BOT_API_KEEPALIVE_TIMEOUT: float = float(os.getenv("BOT_API_KEEPALIVE_TIMEOUT", "60"))
+    # Таймауты запроса к Bot API и отдельно установки соединения, секунд
+    BOT_API_TIMEOUT: float = float(os.getenv("BOT_API_TIMEOUT", "60"))
+    BOT_API_CONNECT_TIMEOUT: float = float(os.getenv("BOT_API_CONNECT_TIMEOUT", "5"))
+    # Локальный сервер Bot API (telegram-bot-api --local), например http://localhost:8081.
+    # Не задан - облачный api.telegram.org с лимитом скачивания файлов ботом 20 МБ
+    BOT_API_SERVER_URL: Optional[str] = os.getenv("BOT_API_SERVER_URL") or None
+    # Каталог файлов сервера (--dir) и путь, по которому он смонтирован у бота.
+    # Не заданы - бот видит файлы по тем же путям, что и сервер
+    BOT_API_SERVER_FILES_DIR: Optional[str] = os.getenv("BOT_API_SERVER_FILES_DIR") or None
+    BOT_API_LOCAL_FILES_DIR: Optional[str] = os.getenv("BOT_API_LOCAL_FILES_DIR") or None
+    
     # Database settings
     DATABASE_URL: str = os.getenv("DATABASE_URL", "sqlite+aiosqlite:///./bot.db")
     
+    # Реплика только для чтения (каталог, отчеты, поиск). Не задана - все запросы идут в основную БД
+    DATABASE_REPLICA_URL: Optional[str] = os.getenv("DATABASE_REPLICA_URL") or None
+    # Сколько секунд после записи читать данные пользователя из основной БД (read-your-writes)
+    DATABASE_REPLICA_STICKY_SECONDS: float = float(os.getenv("DATABASE_REPLICA_STICKY_SECONDS", "5"))
+    
+    # Пресет пула соединений: production (тюнинг под бэкенд) или default (настройки SQLAlchemy)
+    DB_PRESET: str = os.getenv("DB_PRESET", "production")
+    
+    # Переопределения пресета (не заданы - берутся из пресета)
+    DB_POOL_SIZE: Optional[int] = _optional_int("DB_POOL_SIZE")
+    DB_MAX_OVERFLOW: Optional[int] = _optional_int("DB_MAX_OVERFLOW")
+    DB_POOL_TIMEOUT: Optional[int] = _optional_int("DB_POOL_TIMEOUT")
+    DB_POOL_RECYCLE: Optional[int] = _optional_int("DB_POOL_RECYCLE")
+    DB_POOL_PRE_PING: Optional[bool] = _optional_bool("DB_POOL_PRE_PING")
+    
+    # asyncpg: кэш подготовленных выражений (0 - отключить, нужно для pgbouncer)
+    DB_STATEMENT_CACHE_SIZE: Optional[int] = _optional_int("DB_STATEMENT_CACHE_SIZE")
+    DB_PREPARED_STATEMENT_CACHE_SIZE: Optional[int] = _optional_int("DB_PREPARED_STATEMENT_CACHE_SIZE")
+    
+    # Предупреждать, если обработчик держит соединение с БД дольше, мс (0 - не проверять)
+    DB_SESSION_HOLD_WARN_MS: int = int(os.getenv("DB_SESSION_HOLD_WARN_MS", "500"))
+    
+    # SQLite PRAGMA
+    SQLITE_JOURNAL_MODE: Optional[str] = os.getenv("SQLITE_JOURNAL_MODE") or None
+    SQLITE_SYNCHRONOUS: Optional[str] = os.getenv("SQLITE_SYNCHRONOUS") or None
+    SQLITE_MMAP_SIZE: Optional[int] = _optional_int("SQLITE_MMAP_SIZE")
+    SQLITE_BUSY_TIMEOUT: Optional[int] = _optional_int("SQLITE_BUSY_TIMEOUT")  # мс
+    
     # Webhook settings (optional)
     WEBHOOK_HOST: Optional[str] = os.getenv("WEBHOOK_HOST")
     WEBHOOK_PORT: int = int(os.getenv("WEBHOOK_PORT", "8000"))
     WEBHOOK_PATH: str = os.getenv("WEBHOOK_PATH", "/webhook")
     
+    # Сколько апдейтов разных чатов обрабатывать одновременно; апдейты одного чата
+    # всегда идут по очереди (0 - без планировщика, как в aiogram по умолчанию)
+    UPDATE_CONCURRENCY: int = int(os.getenv("UPDATE_CONCURRENCY", "64"))
+    
+    # Ограничение частоты апдейтов пользователей (администраторы не ограничиваются)
+    THROTTLE_ENABLED: bool = os.getenv("THROTTLE_ENABLED", "True").lower() == "true"
+    # Лимиты групп обработчиков (buy, pagination, default) через запятую:
+    # "группа=апдейтов_в_секунду/запас/debounce_мс", например "buy=0.5/3/1000,pagination=3/8/300"
+    THROTTLE_LIMITS: str = os.getenv("THROTTLE_LIMITS", "")
+    
+    # Сколько последних показанных сообщений помнить, чтобы не отправлять правки
+    # без изменений (0 - отправлять все правки)
+    VIEW_CACHE_SIZE: int = int(os.getenv("VIEW_CACHE_SIZE", "50000"))
+    
+    # Сколько секунд хранить готовые экраны каталога (сбрасываются и раньше - при изменении каталога)
+    CATALOG_VIEW_TTL: int = int(os.getenv("CATALOG_VIEW_TTL", "60"))
+    
     # Other settings
     DEBUG: bool = os.getenv("DEBUG", "False").lower() == "true"
     REFERRAL_REWARD_PERCENT: float = float(os.getenv("REFERRAL_REWARD_PERCENT", "10.0"))
+    # Проценты реферальных наград по уровням через запятую: "10,3,1" - 10% пригласившему
+    # покупателя, 3% пригласившему его и т.д. Не заданы - один уровень REFERRAL_REWARD_PERCENT
+    REFERRAL_LEVEL_PERCENTS: str = os.getenv("REFERRAL_LEVEL_PERCENTS", "")
+    # Период начисления реферальных наград за оплаченные заказы, секунд, и размер пачки
+    REFERRAL_PROCESS_INTERVAL: int = int(os.getenv("REFERRAL_PROCESS_INTERVAL", "10"))
+    REFERRAL_BATCH_SIZE: int = int(os.getenv("REFERRAL_BATCH_SIZE", "500"))
+    # Сколько секунд кэшировать статистику команды по уровням
+    REFERRAL_TEAM_STATS_TTL: int = int(os.getenv("REFERRAL_TEAM_STATS_TTL", "300"))
+    
+    # Период сверки журнала балансов, секунд (0 - не запускать)
+    LEDGER_RECONCILE_INTERVAL: int = int(os.getenv("LEDGER_RECONCILE_INTERVAL", "3600"))
+    
+    # Период сверки счетчиков категорий с товарами, секунд (0 - не запускать)
+    CATEGORY_COUNTERS_VERIFY_INTERVAL: int = int(os.getenv("CATEGORY_COUNTERS_VERIFY_INTERVAL", "3600"))
+    
+    # Списывать стоимость заказа с баланса при оплате (по умолчанию - оплата без списания, выдача вручную)
+    BALANCE_PAYMENTS: bool = os.getenv("BALANCE_PAYMENTS", "False").lower() == "true"
+    # Выдавать оплаченный заказ сразу, если у товара есть содержимое (не задано - как BALANCE_PAYMENTS)
+    AUTO_DELIVERY: Optional[bool] = _optional_bool("AUTO_DELIVERY")
+    
+    # Неоплаченный заказ держит резерв товара столько минут, затем отменяется (0 - не отменять)
+    ORDER_RESERVATION_TTL_MINUTES: int = int(os.getenv("ORDER_RESERVATION_TTL_MINUTES", "30"))
+    # Период проверки просроченных заказов, секунд, и размер пачки отмены
+    ORDER_EXPIRY_INTERVAL: int = int(os.getenv("ORDER_EXPIRY_INTERVAL", "60"))
+    ORDER_EXPIRY_BATCH_SIZE: int = int(os.getenv("ORDER_EXPIRY_BATCH_SIZE", "500"))
+    
+    # Как часто, секунд, сверять кэш системных настроек с версией в БД (изменения из других воркеров)
+    SETTINGS_CACHE_POLL_INTERVAL: float = float(os.getenv("SETTINGS_CACHE_POLL_INTERVAL", "5"))
+    
+    # Скорость рассылки уведомлений, сообщений в секунду (лимит Telegram ~30)
+    NOTIFY_RATE_LIMIT: float = float(os.getenv("NOTIFY_RATE_LIMIT", "25"))
     
     # Support and channels
     SUPPORT_USERNAME: str = os.getenv("SUPPORT_USERNAME", "your_support_username")
     EARNING_CHANNEL: str = os.getenv("EARNING_CHANNEL", "https://t.me/your_earning_channel")
     
+    @property
+    def auto_delivery(self) -> bool:
+        """Автовыдача: явная настройка или, если не задана, только вместе со списанием с баланса"""
+        return self.BALANCE_PAYMENTS if self.AUTO_DELIVERY is None else self.AUTO_DELIVERY
+    
+    @property
+    def referral_level_percents(self) -> list[float]:
+        """Проценты наград по уровням, начиная с первого"""
+        percents = [float(x) for x in self.REFERRAL_LEVEL_PERCENTS.split(",") if x.strip()]
+        return percents or [self.REFERRAL_REWARD_PERCENT]
+    
+    @property
+    def throttle_limits(self) -> dict[str, tuple[float, int, float]]:
+        """Переопределенные лимиты групп: группа -> (апдейтов/с, запас, debounce в секундах)"""
+        limits = {}
+        for item in self.THROTTLE_LIMITS.split(","):
+            if not item.strip():
+                continue
+            name, _, spec = item.partition("=")
+            rate, burst, debounce_ms = spec.split("/")
+            limits[name.strip()] = (float(rate), int(burst), float(debounce_ms) / 1000)
+        return limits
+    
     class Config:
         env_file = ".env"
         case_sensitive = True
@@ -1,5 +1,6 @@
 from .models import User, Product, Order, Referral, Category
 from .database import get_session, init_db
+from .money import Money, MoneyType
 
 __all__ = [
     "User",
@@ -7,6 +8,8 @@ __all__ = [
     "Order",
     "Referral",
     "Category",
+    "Money",
+    "MoneyType",
     "get_session",
     "init_db"
 ]
\ No newline at end of file
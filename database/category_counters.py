@@ -0,0 +1,138 @@
+"""
+Счетчики остатков в categories, поддерживаемые триггерами на products
+
+Каждая вставка, удаление и изменение товара (category_id, stock_quantity,
+is_unlimited, is_active) в той же транзакции меняет счетчики его категории.
+Триггеры срабатывают для любых путей записи - ORM, массовых UPDATE
+при покупке и выдаче, импорта, - поэтому экраны склада читают одну строку
+категории вместо пересчета по товарам.
+
+Изменение товара блокирует строку его категории до конца транзакции.
+"""
+
+from typing import List
+
+from sqlalchemy import Table, event
+
+
+# Вклад одной строки products в счетчики категории ({row} - NEW, OLD или products)
+CATEGORY_COUNTERS = {
+    "total_products": "CASE WHEN {row}.is_active THEN 1 ELSE 0 END",
+    "available_products": (
+        "CASE WHEN {row}.is_active AND ({row}.is_unlimited OR {row}.stock_quantity > 0) THEN 1 ELSE 0 END"
+    ),
+    "unlimited_products": "CASE WHEN {row}.is_active AND {row}.is_unlimited THEN 1 ELSE 0 END",
+    "total_stock": (
+        "CASE WHEN {row}.is_active AND NOT {row}.is_unlimited THEN COALESCE({row}.stock_quantity, 0) ELSE 0 END"
+    ),
+}
+
+# Колонки products, от которых зависят счетчики
+_TRACKED_COLUMNS = "category_id, stock_quantity, is_unlimited, is_active"
+
+_PG_FUNCTION = "products_category_counters"
+_PG_TRIGGER = "trg_products_category_counters"
+_SQLITE_TRIGGERS = (
+    "trg_products_category_counters_insert",
+    "trg_products_category_counters_delete",
+    "trg_products_category_counters_update",
+)
+
+
+def _add(row: str, sign: str) -> str:
+    return ", ".join(
+        f"{column} = {column} {sign} {expression.format(row=row)}"
+        for column, expression in CATEGORY_COUNTERS.items()
+    )
+
+
+def _move() -> str:
+    """Одним UPDATE снять вклад OLD и добавить вклад NEW (категория могла смениться)"""
+    return ", ".join(
+        f"{column} = {column}"
+        f" + CASE WHEN id = NEW.category_id THEN {expression.format(row='NEW')} ELSE 0 END"
+        f" - CASE WHEN id = OLD.category_id THEN {expression.format(row='OLD')} ELSE 0 END"
+        for column, expression in CATEGORY_COUNTERS.items()
+    )
+
+
+def _insert_sql() -> str:
+    return f"UPDATE categories SET {_add('NEW', '+')} WHERE id = NEW.category_id"
+
+
+def _delete_sql() -> str:
+    return f"UPDATE categories SET {_add('OLD', '-')} WHERE id = OLD.category_id"
+
+
+def _update_sql() -> str:
+    return f"UPDATE categories SET {_move()} WHERE id IN (NEW.category_id, OLD.category_id)"
+
+
+def create_trigger_statements(dialect_name: str) -> List[str]:
+    """DDL триггеров для диалекта (по одному выражению на элемент)"""
+    if dialect_name == "postgresql":
+        return [
+            f"""CREATE OR REPLACE FUNCTION {_PG_FUNCTION}() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        {_insert_sql()};
+    ELSIF TG_OP = 'DELETE' THEN
+        {_delete_sql()};
+    ELSE
+        {_update_sql()};
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql""",
+            f"""CREATE TRIGGER {_PG_TRIGGER}
+AFTER INSERT OR DELETE OR UPDATE OF {_TRACKED_COLUMNS} ON products
+FOR EACH ROW EXECUTE FUNCTION {_PG_FUNCTION}()""",
+        ]
+
+    if dialect_name == "sqlite":
+        insert_trigger, delete_trigger, update_trigger = _SQLITE_TRIGGERS
+        return [
+            f"""CREATE TRIGGER IF NOT EXISTS {insert_trigger} AFTER INSERT ON products
+BEGIN
+    {_insert_sql()};
+END""",
+            f"""CREATE TRIGGER IF NOT EXISTS {delete_trigger} AFTER DELETE ON products
+BEGIN
+    {_delete_sql()};
+END""",
+            f"""CREATE TRIGGER IF NOT EXISTS {update_trigger} AFTER UPDATE OF {_TRACKED_COLUMNS} ON products
+BEGIN
+    {_update_sql()};
+END""",
+        ]
+
+    raise NotImplementedError(f"Category counter triggers are not implemented for {dialect_name}")
+
+
+def drop_trigger_statements(dialect_name: str) -> List[str]:
+    """DDL удаления триггеров"""
+    if dialect_name == "postgresql":
+        return [
+            f"DROP TRIGGER IF EXISTS {_PG_TRIGGER} ON products",
+            f"DROP FUNCTION IF EXISTS {_PG_FUNCTION}()",
+        ]
+    return [f"DROP TRIGGER IF EXISTS {name}" for name in _SQLITE_TRIGGERS]
+
+
+def recount_sql() -> str:
+    """UPDATE, пересчитывающий счетчики всех категорий по товарам"""
+    assignments = ", ".join(
+        f"{column} = (SELECT COALESCE(SUM({expression.format(row='products')}), 0) "
+        f"FROM products WHERE products.category_id = categories.id)"
+        for column, expression in CATEGORY_COUNTERS.items()
+    )
+    return f"UPDATE categories SET {assignments}"
+
+
+def register_triggers(products: Table):
+    """Создавать триггеры вместе с таблицей products (create_all)"""
+
+    @event.listens_for(products, "after_create")
+    def _create_triggers(target, connection, **kw):
+        for statement in create_trigger_statements(connection.dialect.name):
+            connection.exec_driver_sql(statement)
@@ -1,5 +1,10 @@
-from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
-from sqlalchemy.orm import DeclarativeBase
+import time
+from typing import Optional, Tuple
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, create_async_engine, async_sessionmaker
+from sqlalchemy.orm import DeclarativeBase, Session
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 from config import settings
 import logging
 
@@ -10,17 +15,369 @@ class Base(DeclarativeBase):
     pass
 
 
-engine = create_async_engine(
-    settings.DATABASE_URL,
-    echo=settings.DEBUG,
-    future=True
-)
+# Пресеты настроек движка по бэкендам. "default" - поведение SQLAlchemy по умолчанию
+ENGINE_PRESETS = {
+    "default": {},
+    "production": {
+        "postgresql": {
+            "pool_size": 20,
+            "max_overflow": 10,
+            "pool_timeout": 30,
+            "pool_recycle": 1800,
+            "pool_pre_ping": True,
+            "statement_cache_size": 100,
+            "prepared_statement_cache_size": 500,
+        },
+        "sqlite": {
+            # aiosqlite по умолчанию использует NullPool и открывает поток на каждую сессию
+            "pool_size": 5,
+            "max_overflow": 10,
+            "pool_timeout": 30,
+            "journal_mode": "WAL",
+            "synchronous": "NORMAL",
+            "mmap_size": 256 * 1024 * 1024,
+            "busy_timeout": 5000,
+        },
+    },
+}
 
-async_session = async_sessionmaker(
-    engine,
-    class_=AsyncSession,
-    expire_on_commit=False
-)
+SQLITE_PRAGMA_KEYS = ("journal_mode", "synchronous", "mmap_size", "busy_timeout")
+
+
+def _settings_overrides() -> dict:
+    """Явные переопределения пресета из config.Settings"""
+    overrides = {
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_timeout": settings.DB_POOL_TIMEOUT,
+        "pool_recycle": settings.DB_POOL_RECYCLE,
+        "pool_pre_ping": settings.DB_POOL_PRE_PING,
+        "statement_cache_size": settings.DB_STATEMENT_CACHE_SIZE,
+        "prepared_statement_cache_size": settings.DB_PREPARED_STATEMENT_CACHE_SIZE,
+        "journal_mode": settings.SQLITE_JOURNAL_MODE,
+        "synchronous": settings.SQLITE_SYNCHRONOUS,
+        "mmap_size": settings.SQLITE_MMAP_SIZE,
+        "busy_timeout": settings.SQLITE_BUSY_TIMEOUT,
+    }
+    return {key: value for key, value in overrides.items() if value is not None}
+
+
+def build_engine_options(database_url: str, preset: Optional[str] = None) -> Tuple[dict, dict]:
+    """
+    Собрать параметры движка для URL и пресета
+
+    Returns:
+        (kwargs для create_async_engine, PRAGMA для SQLite)
+    """
+    url = make_url(database_url)
+    backend = url.get_backend_name()
+    preset_name = preset or settings.DB_PRESET
+
+    if preset_name not in ENGINE_PRESETS:
+        raise ValueError(f"Unknown DB preset: {preset_name}")
+
+    options = dict(ENGINE_PRESETS[preset_name].get(backend, {}))
+    options.update(_settings_overrides())
+
+    engine_kwargs = {}
+    connect_args = {}
+    pragmas = {}
+
+    if backend == "sqlite":
+        pragmas = {key: options.pop(key) for key in SQLITE_PRAGMA_KEYS if key in options}
+        options.pop("statement_cache_size", None)
+        options.pop("prepared_statement_cache_size", None)
+
+        is_memory = url.database in (None, "", ":memory:")
+        if is_memory:
+            # In-memory база живет в единственном соединении StaticPool
+            options = {}
+            pragmas.pop("journal_mode", None)
+            pragmas.pop("mmap_size", None)
+        elif options:
+            engine_kwargs["poolclass"] = AsyncAdaptedQueuePool
+    else:
+        for key in ("statement_cache_size", "prepared_statement_cache_size"):
+            if key in options:
+                connect_args[key] = options.pop(key)
+
+    engine_kwargs.update(options)
+    if connect_args:
+        engine_kwargs["connect_args"] = connect_args
+
+    return engine_kwargs, pragmas
+
+
+def _install_sqlite_pragmas(engine: AsyncEngine, pragmas: dict):
+    """Выставлять PRAGMA на каждом новом соединении SQLite"""
+
+    @event.listens_for(engine.sync_engine, "connect")
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for key, value in pragmas.items():
+            cursor.execute(f"PRAGMA {key}={value}")
+        cursor.close()
+
+
+def _unicode_lower(value):
+    return value.lower() if isinstance(value, str) else value
+
+
+def _install_sqlite_functions(engine: AsyncEngine):
+    """
+    Заменить lower() в SQLite на юникодный
+
+    Встроенный lower() (и ILIKE, который SQLAlchemy строит через него)
+    меняет регистр только у ASCII, поэтому поиск по кириллице был бы
+    чувствителен к регистру.
+    """
+
+    @event.listens_for(engine.sync_engine, "connect")
+    def set_sqlite_functions(dbapi_connection, connection_record):
+        dbapi_connection.create_function("lower", 1, _unicode_lower, deterministic=True)
+
+
+def make_engine(database_url: str, preset: Optional[str] = None, **kwargs) -> AsyncEngine:
+    """Создать движок с учетом пресета и настроек пула"""
+    engine_kwargs, pragmas = build_engine_options(database_url, preset)
+    engine_kwargs.setdefault("echo", settings.DEBUG)
+    engine_kwargs.update(kwargs)
+
+    new_engine = create_async_engine(
+        database_url,
+        future=True,
+        **engine_kwargs
+    )
+
+    if pragmas:
+        _install_sqlite_pragmas(new_engine, pragmas)
+
+    if new_engine.dialect.name == "sqlite":
+        _install_sqlite_functions(new_engine)
+
+    return new_engine
+
+
+# Ключи в session.info для маршрутизации чтений
+REPLICA_READS_KEY = "replica_reads"
+READ_YOUR_WRITES_KEY = "read_your_writes"
+# Ключ в session.info: транзакция меняла товары или категории
+CATALOG_CHANGED_KEY = "catalog_changed"
+CATALOG_TABLES = frozenset({"products", "categories"})
+# Опция выполнения UPDATE, меняющего только остатки и продажи товаров
+STOCK_ONLY_OPTION = "stock_only"
+# Ключи в session.info для учета удержания соединения
+CONNECTED_AT_KEY = "connected_at"
+CONNECTION_HOLD_KEY = "connection_hold"
+
+
+class RoutingSession(Session):
+    """
+    Сессия, отправляющая SELECT из read-only методов репозиториев в реплику
+
+    Чтение идет в реплику, только если метод помечен @replica_read и в этой
+    сессии еще не было записи. После первой записи (flush или DML) сессия
+    читает только из основной БД, чтобы видеть собственные изменения.
+    """
+    primary_bind = None
+    replica_bind = None
+    
+    def get_bind(self, mapper=None, clause=None, **kw):
+        if self.primary_bind is None:
+            return super().get_bind(mapper, clause=clause, **kw)
+        
+        if getattr(clause, "is_dml", False):
+            self.info[READ_YOUR_WRITES_KEY] = True
+        
+        if self.replica_bind is not None and self._reads_from_replica(clause):
+            return self.replica_bind
+        
+        return self.primary_bind
+    
+    def _reads_from_replica(self, clause) -> bool:
+        return (
+            self.info.get(REPLICA_READS_KEY, 0) > 0
+            and not self.info.get(READ_YOUR_WRITES_KEY)
+            and not self._flushing
+            and getattr(clause, "is_select", False)
+        )
+
+
+@event.listens_for(RoutingSession, "after_flush")
+def _mark_session_written(session, flush_context):
+    session.info[READ_YOUR_WRITES_KEY] = True
+
+
+@event.listens_for(RoutingSession, "after_begin")
+def _mark_connection_taken(session, transaction, connection):
+    session.info.setdefault(CONNECTED_AT_KEY, time.monotonic())
+
+
+@event.listens_for(RoutingSession, "after_transaction_end")
+def _mark_connection_released(session, transaction):
+    if transaction.parent is None:
+        connected_at = session.info.pop(CONNECTED_AT_KEY, None)
+        if connected_at is not None:
+            session.info[CONNECTION_HOLD_KEY] = (
+                session.info.get(CONNECTION_HOLD_KEY, 0.0) + time.monotonic() - connected_at
+            )
+
+
+@event.listens_for(RoutingSession, "after_flush")
+def _mark_catalog_flush(session, flush_context):
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if getattr(obj, "__tablename__", None) in CATALOG_TABLES:
+            session.info[CATALOG_CHANGED_KEY] = True
+            return
+
+
+@event.listens_for(RoutingSession, "do_orm_execute")
+def _mark_catalog_statement(orm_execute_state):
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        # Покупатели видят только наличие товара, а не количество: списание и возврат
+        # остатков меняют каталог, лишь когда товар закончился или появился снова -
+        # такие случаи репозиторий отмечает сам через mark_catalog_changed
+        if orm_execute_state.execution_options.get(STOCK_ONLY_OPTION):
+            return
+        table = getattr(orm_execute_state.statement, "table", None)
+        if getattr(table, "name", None) in CATALOG_TABLES:
+            mark_catalog_changed(orm_execute_state.session)
+
+
+def mark_catalog_changed(session):
+    """Сбросить кэши каталога после коммита текущей транзакции (Session или AsyncSession)"""
+    session.info[CATALOG_CHANGED_KEY] = True
+
+
+@event.listens_for(RoutingSession, "after_commit")
+def _bump_catalog_after_commit(session):
+    if session.info.pop(CATALOG_CHANGED_KEY, False):
+        bump_catalog_version()
+
+
+@event.listens_for(RoutingSession, "after_rollback")
+def _forget_catalog_changes(session):
+    session.info.pop(CATALOG_CHANGED_KEY, None)
+
+
+# Версия каталога в процессе: растет после коммита, менявшего товары, категории или наличие товара
+_catalog_version = 0
+
+
+def catalog_version() -> int:
+    """Текущая версия каталога (ключ кэшей отрисовки каталога)"""
+    return _catalog_version
+
+
+def bump_catalog_version():
+    """Отметить изменение каталога"""
+    global _catalog_version
+    _catalog_version += 1
+
+
+def make_session_factory(primary: AsyncEngine, replica: Optional[AsyncEngine] = None) -> async_sessionmaker:
+    """Создать фабрику сессий с маршрутизацией чтений в реплику"""
+    session_class = type(
+        "BoundRoutingSession",
+        (RoutingSession,),
+        {
+            "primary_bind": primary.sync_engine,
+            "replica_bind": replica.sync_engine if replica is not None else None,
+        }
+    )
+    
+    return async_sessionmaker(
+        primary,
+        class_=AsyncSession,
+        sync_session_class=session_class,
+        expire_on_commit=False
+    )
+
+
+def force_primary(session: AsyncSession):
+    """Читать все данные этой сессии из основной БД"""
+    session.info[READ_YOUR_WRITES_KEY] = True
+
+
+def session_has_writes(session: AsyncSession) -> bool:
+    """Была ли запись в этой сессии"""
+    return bool(session.info.get(READ_YOUR_WRITES_KEY))
+
+
+def connection_hold_time(session: AsyncSession) -> float:
+    """Сколько секунд сессия держала соединения (по завершенным транзакциям)"""
+    return session.info.get(CONNECTION_HOLD_KEY, 0.0)
+
+
+class LazySession:
+    """
+    Сессия, создаваемая при первом обращении
+
+    Передается в обработчики вместо AsyncSession: обработчик, не
+    работающий с БД, не создает сессию и не берет соединение из пула.
+    Все атрибуты и методы проксируются в настоящую сессию.
+    """
+
+    def __init__(self, factory: async_sessionmaker, on_create=None):
+        self._factory = factory
+        self._on_create = on_create
+        self._session: Optional[AsyncSession] = None
+
+    @property
+    def created(self) -> bool:
+        """Была ли создана настоящая сессия"""
+        return self._session is not None
+
+    @property
+    def session(self) -> AsyncSession:
+        """Настоящая сессия (создается при первом обращении)"""
+        if self._session is None:
+            self._session = self._factory()
+            if self._on_create is not None:
+                self._on_create(self._session)
+        return self._session
+
+    def __getattr__(self, name):
+        return getattr(self.session, name)
+
+    async def close(self):
+        """Закрыть сессию и вернуть соединение в пул, если она создавалась"""
+        if self._session is not None:
+            await self._session.close()
+
+    async def __aenter__(self) -> "LazySession":
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+
+# Время последней записи по пользователям - для read-your-writes между апдейтами
+_recent_writers: dict[int, float] = {}
+
+
+def remember_writer(user_id: int):
+    """Запомнить, что пользователь только что изменил данные"""
+    now = time.monotonic()
+    _recent_writers[user_id] = now
+    
+    if len(_recent_writers) > 10000:
+        expired = now - settings.DATABASE_REPLICA_STICKY_SECONDS
+        for key in [key for key, value in _recent_writers.items() if value < expired]:
+            del _recent_writers[key]
+
+
+def wrote_recently(user_id: int) -> bool:
+    """Писал ли пользователь в БД в пределах окна read-your-writes"""
+    written_at = _recent_writers.get(user_id)
+    return written_at is not None and time.monotonic() - written_at < settings.DATABASE_REPLICA_STICKY_SECONDS
+
+
+engine = make_engine(settings.DATABASE_URL)
+
+replica_engine = make_engine(settings.DATABASE_REPLICA_URL) if settings.DATABASE_REPLICA_URL else None
+
+async_session = make_session_factory(engine, replica_engine)
 
 
 async def get_session() -> AsyncSession:
@@ -37,4 +394,4 @@ async def init_db():
         logger.info("Database initialized successfully")
     except Exception as e:
         logger.error(f"Error initializing database: {e}")
-        raise
\ No newline at end of file
+        raise
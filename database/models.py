@@ -1,9 +1,11 @@
-from sqlalchemy import BigInteger, String, Text, Integer, Float, Boolean, DateTime, ForeignKey
+from sqlalchemy import BigInteger, String, Text, Integer, Float, Boolean, DateTime, ForeignKey, Index, UniqueConstraint
 from sqlalchemy.orm import Mapped, mapped_column, relationship
-from sqlalchemy.sql import func
+from sqlalchemy.sql import func, text
 from datetime import datetime
 from enum import Enum
 from .database import Base
+from .money import Money, MoneyType
+from .category_counters import register_triggers
 
 
 class OrderStatus(Enum):
@@ -13,6 +15,23 @@ class OrderStatus(Enum):
     CANCELLED = "cancelled"
 
 
+# Допустимые переходы статусов заказа (выданный и отмененный заказ - конечные)
+ORDER_TRANSITIONS = {
+    OrderStatus.PENDING: {OrderStatus.PAID, OrderStatus.DELIVERED, OrderStatus.CANCELLED},
+    OrderStatus.PAID: {OrderStatus.DELIVERED, OrderStatus.CANCELLED},
+    OrderStatus.DELIVERED: set(),
+    OrderStatus.CANCELLED: set(),
+}
+
+
+class LedgerReason(Enum):
+    REFERRAL_REWARD = "referral_reward"    # Реферальная награда
+    ORDER_REFUND = "order_refund"          # Возврат за отмененный заказ
+    PURCHASE = "purchase"                  # Оплата с баланса
+    ADJUSTMENT = "adjustment"              # Ручная корректировка
+    OPENING_BALANCE = "opening_balance"    # Начальный остаток при вводе журнала
+
+
 class ProductType(Enum):
     ACCOUNT = "account"  # Логин/пароль
     KEY = "key"          # Ключ активации
@@ -21,6 +40,10 @@ class ProductType(Enum):
 
 class User(Base):
     __tablename__ = "users"
+    __table_args__ = (
+        # Приглашенные пользователя и дерево команды (рекурсивный запрос по уровням)
+        Index("ix_users_referrer_id", "referrer_id"),
+    )
     
     id: Mapped[int] = mapped_column(BigInteger, primary_key=True)
     username: Mapped[str] = mapped_column(String(255), nullable=True)
@@ -29,19 +52,22 @@ class User(Base):
     language_code: Mapped[str] = mapped_column(String(10), default="ru")
     
     # Баланс пользователя
-    balance: Mapped[float] = mapped_column(Float, default=0.0)
+    balance: Mapped[Money] = mapped_column(MoneyType, default=Money(0))
     
     # Реферальная система
     referrer_id: Mapped[int] = mapped_column(BigInteger, ForeignKey("users.id"), nullable=True)
     referral_code: Mapped[str] = mapped_column(String(50), unique=True, nullable=True)
-    referral_earnings: Mapped[float] = mapped_column(Float, default=0.0)
+    referral_earnings: Mapped[Money] = mapped_column(MoneyType, default=Money(0))
+    # Приглашенные: всего и сделавшие хотя бы один заказ (ведутся при привязке и первом заказе)
+    referrals_count: Mapped[int] = mapped_column(Integer, default=0, server_default="0", nullable=False)
+    active_referrals_count: Mapped[int] = mapped_column(Integer, default=0, server_default="0", nullable=False)
     
     # Промокод пользователя
     promo_code: Mapped[str] = mapped_column(String(50), unique=True, nullable=True)
     
     # Статистика
     total_orders: Mapped[int] = mapped_column(Integer, default=0)
-    total_spent: Mapped[float] = mapped_column(Float, default=0.0)
+    total_spent: Mapped[Money] = mapped_column(MoneyType, default=Money(0))
     
     # Даты
     created_at: Mapped[datetime] = mapped_column(DateTime, server_default=func.now())
@@ -64,6 +90,12 @@ class Category(Base):
     is_active: Mapped[bool] = mapped_column(Boolean, default=True)
     sort_order: Mapped[int] = mapped_column(Integer, default=0)
     
+    # Счетчики по активным товарам - ведутся триггерами на products (database/category_counters.py)
+    total_products: Mapped[int] = mapped_column(Integer, default=0, server_default="0", nullable=False)
+    available_products: Mapped[int] = mapped_column(Integer, default=0, server_default="0", nullable=False)
+    unlimited_products: Mapped[int] = mapped_column(Integer, default=0, server_default="0", nullable=False)
+    total_stock: Mapped[int] = mapped_column(BigInteger, default=0, server_default="0", nullable=False)
+    
     created_at: Mapped[datetime] = mapped_column(DateTime, server_default=func.now())
     updated_at: Mapped[datetime] = mapped_column(DateTime, server_default=func.now(), onupdate=func.now())
     
@@ -73,11 +105,15 @@ class Category(Base):
 
 class Product(Base):
     __tablename__ = "products"
+    __table_args__ = (
+        # Проверка дублей при массовом добавлении и импорте (hash - без ограничения длины в PostgreSQL)
+        Index("ix_products_digital_content", "digital_content", postgresql_using="hash"),
+    )
     
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
     name: Mapped[str] = mapped_column(String(255), nullable=False)
     description: Mapped[str] = mapped_column(Text, nullable=True)
-    price: Mapped[float] = mapped_column(Float, nullable=False)
+    price: Mapped[Money] = mapped_column(MoneyType, nullable=False)
     
     # Категория
     category_id: Mapped[int] = mapped_column(Integer, ForeignKey("categories.id"), nullable=False)
@@ -109,6 +145,16 @@ class Product(Base):
 
 class Order(Base):
     __tablename__ = "orders"
+    __table_args__ = (
+        # Поиск просроченных неоплаченных заказов (снятие резервов)
+        Index("ix_orders_status_created_at", "status", "created_at"),
+        # Очередь начисления реферальных наград - только необработанные заказы
+        Index(
+            "ix_orders_referral_pending", "id",
+            sqlite_where=text("referral_processed_at IS NULL"),
+            postgresql_where=text("referral_processed_at IS NULL")
+        ),
+    )
     
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
     
@@ -120,11 +166,13 @@ class Order(Base):
     quantity: Mapped[int] = mapped_column(Integer, default=1)
     
     # Цены
-    unit_price: Mapped[float] = mapped_column(Float, nullable=False)
-    total_price: Mapped[float] = mapped_column(Float, nullable=False)
+    unit_price: Mapped[Money] = mapped_column(MoneyType, nullable=False)
+    total_price: Mapped[Money] = mapped_column(MoneyType, nullable=False)
     
     # Статус
     status: Mapped[str] = mapped_column(String(50), default=OrderStatus.PENDING.value)
+    # Номер версии: растет при каждом переходе статуса (см. OrderRepository.transition)
+    version: Mapped[int] = mapped_column(Integer, default=0, server_default="0", nullable=False)
     
     # Выдача товара
     delivered_content: Mapped[str] = mapped_column(Text, nullable=True)
@@ -133,6 +181,9 @@ class Order(Base):
     # Комментарии
     notes: Mapped[str] = mapped_column(Text, nullable=True)
     
+    # Когда начислены реферальные награды (NULL - ждет фоновой обработки)
+    referral_processed_at: Mapped[datetime] = mapped_column(DateTime, nullable=True)
+    
     created_at: Mapped[datetime] = mapped_column(DateTime, server_default=func.now())
     updated_at: Mapped[datetime] = mapped_column(DateTime, server_default=func.now(), onupdate=func.now())
     
@@ -143,6 +194,10 @@ class Order(Base):
 
 class Referral(Base):
     __tablename__ = "referrals"
+    __table_args__ = (
+        # Награда каждого уровня за заказ начисляется один раз
+        UniqueConstraint("order_id", "level", name="uq_referrals_order_level"),
+    )
     
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
     
@@ -152,8 +207,11 @@ class Referral(Base):
     # Заказ, за который получена награда
     order_id: Mapped[int] = mapped_column(Integer, ForeignKey("orders.id"), nullable=False)
     
+    # Уровень реферала: 1 - покупатель приглашен получателем, 2 - приглашенным им и т.д.
+    level: Mapped[int] = mapped_column(Integer, default=1, server_default="1", nullable=False)
+    
     # Сумма награды
-    reward_amount: Mapped[float] = mapped_column(Float, nullable=False)
+    reward_amount: Mapped[Money] = mapped_column(MoneyType, nullable=False)
     reward_percent: Mapped[float] = mapped_column(Float, nullable=False)
     
     created_at: Mapped[datetime] = mapped_column(DateTime, server_default=func.now())
@@ -163,6 +221,39 @@ class Referral(Base):
     order: Mapped["Order"] = relationship("Order")
 
 
+class BalanceTransaction(Base):
+    """
+    Проводка журнала балансов (двойная запись)
+
+    Каждое событие записывается двумя строками с одним idempotency_key:
+    счет пользователя "user:<id>" и системный счет "system:<name>",
+    суммы равны по модулю и противоположны по знаку.
+    """
+    __tablename__ = "balance_transactions"
+    __table_args__ = (
+        UniqueConstraint("idempotency_key", "account", name="uq_balance_transactions_key_account"),
+        Index("ix_balance_transactions_user_id", "user_id"),
+    )
+    
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    
+    # Счет: user:<id> или system:<name>
+    account: Mapped[str] = mapped_column(String(64), nullable=False)
+    
+    # Пользователь (только у проводки по счету пользователя)
+    user_id: Mapped[int] = mapped_column(BigInteger, ForeignKey("users.id"), nullable=True)
+    
+    # Сумма проводки: > 0 - приход, < 0 - расход
+    amount: Mapped[Money] = mapped_column(MoneyType, nullable=False)
+    
+    # Ключ бизнес-события, например referral_reward:<order_id>
+    idempotency_key: Mapped[str] = mapped_column(String(128), nullable=False)
+    reason: Mapped[str] = mapped_column(String(50), nullable=False)
+    description: Mapped[str] = mapped_column(Text, nullable=True)
+    
+    created_at: Mapped[datetime] = mapped_column(DateTime, server_default=func.now())
+
+
 class WarehouseLog(Base):
     __tablename__ = "warehouse_logs"
     
@@ -219,4 +310,17 @@ class SystemSetting(Base):
     is_editable: Mapped[bool] = mapped_column(Boolean, default=True)
     
     created_at: Mapped[datetime] = mapped_column(DateTime, server_default=func.now())
-    updated_at: Mapped[datetime] = mapped_column(DateTime, server_default=func.now(), onupdate=func.now())
\ No newline at end of file
+    updated_at: Mapped[datetime] = mapped_column(DateTime, server_default=func.now(), onupdate=func.now())
+
+
+register_triggers(Product.__table__)
+
+
+class SettingsVersion(Base):
+    __tablename__ = "settings_version"
+    
+    # Единственная строка с id = 1
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    
+    # Растет при каждом изменении system_settings - по ней воркеры обновляют кэш настроек
+    version: Mapped[int] = mapped_column(BigInteger, default=0, server_default="0", nullable=False)
@@ -0,0 +1,176 @@
+"""
+Денежные суммы в копейках
+
+Все денежные колонки хранятся как BIGINT в минимальных единицах (копейках),
+в коде суммы представлены неизменяемым типом Money. Это убирает накопление
+ошибок float при суммировании и делает агрегаты в БД точными.
+"""
+
+from decimal import Decimal, ROUND_HALF_UP
+from numbers import Number
+from typing import Union
+
+from sqlalchemy import BigInteger
+from sqlalchemy.types import TypeDecorator
+
+
+KOPECKS_IN_RUBLE = 100
+
+MoneyLike = Union["Money", int, float, Decimal, str]
+
+
+class Money:
+    """Сумма в рублях, хранимая как целое число копеек"""
+
+    __slots__ = ("minor",)
+
+    def __init__(self, minor: int = 0):
+        object.__setattr__(self, "minor", int(minor))
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Money is immutable")
+
+    @classmethod
+    def from_rubles(cls, value: Union[int, float, Decimal, str]) -> "Money":
+        """Создать сумму из рублей с округлением до копейки"""
+        if isinstance(value, Money):
+            return value
+        rubles = Decimal(str(value))
+        return cls(int((rubles * KOPECKS_IN_RUBLE).to_integral_value(rounding=ROUND_HALF_UP)))
+
+    @classmethod
+    def coerce(cls, value: MoneyLike) -> "Money":
+        """Привести Money или число в рублях к Money"""
+        if isinstance(value, Money):
+            return value
+        if value is None:
+            return cls(0)
+        return cls.from_rubles(value)
+
+    @property
+    def rubles(self) -> Decimal:
+        """Сумма в рублях"""
+        return Decimal(self.minor) / KOPECKS_IN_RUBLE
+
+    def percent(self, percent: Union[int, float, Decimal]) -> "Money":
+        """Процент от суммы с округлением до копейки"""
+        return self * (Decimal(str(percent)) / 100)
+
+    # Арифметика
+
+    def __add__(self, other):
+        if isinstance(other, Money):
+            return Money(self.minor + other.minor)
+        if isinstance(other, Number):
+            return self + Money.from_rubles(other)
+        return NotImplemented
+
+    def __radd__(self, other):
+        # sum() начинает с 0
+        if other == 0:
+            return self
+        return self.__add__(other)
+
+    def __sub__(self, other):
+        if isinstance(other, Money):
+            return Money(self.minor - other.minor)
+        if isinstance(other, Number):
+            return self - Money.from_rubles(other)
+        return NotImplemented
+
+    def __rsub__(self, other):
+        if isinstance(other, Number):
+            return Money.from_rubles(other) - self
+        return NotImplemented
+
+    def __neg__(self):
+        return Money(-self.minor)
+
+    def __abs__(self):
+        return Money(abs(self.minor))
+
+    def __mul__(self, other):
+        if isinstance(other, Money) or not isinstance(other, Number):
+            return NotImplemented
+        if isinstance(other, int):
+            return Money(self.minor * other)
+        minor = (Decimal(self.minor) * Decimal(str(other))).to_integral_value(rounding=ROUND_HALF_UP)
+        return Money(int(minor))
+
+    __rmul__ = __mul__
+
+    # Сравнения на больше/меньше (числа трактуются как рубли). Равенство - только
+    # между Money: иначе Money(100) == 1 при разных хэшах ломало бы словари и множества
+
+    def _minor_of(self, other):
+        if isinstance(other, Money):
+            return other.minor
+        if isinstance(other, Number):
+            return Money.from_rubles(other).minor
+        return None
+
+    def __eq__(self, other):
+        if not isinstance(other, Money):
+            return NotImplemented
+        return self.minor == other.minor
+
+    def __lt__(self, other):
+        minor = self._minor_of(other)
+        return NotImplemented if minor is None else self.minor < minor
+
+    def __le__(self, other):
+        minor = self._minor_of(other)
+        return NotImplemented if minor is None else self.minor <= minor
+
+    def __gt__(self, other):
+        minor = self._minor_of(other)
+        return NotImplemented if minor is None else self.minor > minor
+
+    def __ge__(self, other):
+        minor = self._minor_of(other)
+        return NotImplemented if minor is None else self.minor >= minor
+
+    def __hash__(self):
+        return hash(self.minor)
+
+    def __bool__(self):
+        return self.minor != 0
+
+    # Представление
+
+    def __float__(self):
+        return self.minor / KOPECKS_IN_RUBLE
+
+    def __str__(self):
+        return f"{self.rubles:.2f}"
+
+    def __repr__(self):
+        return f"Money('{self}')"
+
+    def __format__(self, format_spec: str) -> str:
+        # Совместимо с существующими f"{price:.2f}"
+        return format(self.rubles, format_spec) if format_spec else str(self)
+
+
+class MoneyType(TypeDecorator):
+    """Колонка с суммой в копейках (BIGINT), в Python - Money"""
+
+    impl = BigInteger
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        return Money.coerce(value).minor
+
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        # SUM/AVG могут вернуть Decimal или float - округляем до копейки
+        if isinstance(value, int):
+            return Money(value)
+        return Money(int(Decimal(str(value)).to_integral_value(rounding=ROUND_HALF_UP)))
+
+    def coerce_compared_value(self, op, value):
+        # Сравнение с числом (User.balance >= 100) трактует число как рубли
+        return self
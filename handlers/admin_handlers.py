@@ -1,11 +1,14 @@
-from aiogram import Router, F
+from aiogram import Router
 from aiogram.types import CallbackQuery, Message, InlineKeyboardButton
-from aiogram.filters import Command
+from aiogram.filters import Command, CommandObject
 from aiogram.fsm.context import FSMContext
 from sqlalchemy.ext.asyncio import AsyncSession
 
 
 from services import OrderService, ProductService, UserService
+from services.order_service import reservation_metrics
+from utils.view_cache import view_metrics
+from database.money import Money
 from keyboards import (
     admin_menu_kb, admin_orders_kb, order_management_kb, back_button,
     warehouse_menu_kb, warehouse_products_kb, warehouse_product_actions_kb,
@@ -13,6 +16,7 @@ from keyboards import (
 )
 from utils import format_order_info, format_stats, AdminStates
 from utils.states import AdminSettingsStates
+from utils.callbacks import CallbackPattern
 from repositories import CategoryRepository
 from config import settings
 
@@ -40,7 +44,7 @@ async def admin_menu_command(message: Message):
     )
 
 
-@admin_router.callback_query(F.data == "admin_menu")
+@admin_router.callback_query(CallbackPattern.exact("admin_menu"))
 async def admin_menu_callback(callback: CallbackQuery):
     """Показать админ меню"""
     if not is_admin(callback.from_user.id):
@@ -54,7 +58,7 @@ async def admin_menu_callback(callback: CallbackQuery):
     await callback.answer()
 
 
-@admin_router.callback_query(F.data == "admin_orders")
+@admin_router.callback_query(CallbackPattern.exact("admin_orders"))
 async def admin_orders_callback(callback: CallbackQuery, session: AsyncSession ):
     """Показать заказы для админа"""
     if not is_admin(callback.from_user.id):
@@ -79,15 +83,13 @@ async def admin_orders_callback(callback: CallbackQuery, session: AsyncSession )
     await callback.answer()
 
 
-@admin_router.callback_query(F.data.startswith("admin_order_"))
-async def admin_order_details(callback: CallbackQuery, session: AsyncSession ):
+@admin_router.callback_query(CallbackPattern.prefix("admin_order_", order_id=int))
+async def admin_order_details(callback: CallbackQuery, session: AsyncSession, order_id: int):
     """Детали заказа для админа"""
     if not is_admin(callback.from_user.id):
         await callback.answer("❌ У вас нет прав доступа", show_alert=True)
         return
     
-    order_id = int(callback.data.split("_")[2])
-    
     order_service = OrderService(session)
     order = await order_service.get_order_details(order_id)
     
@@ -108,15 +110,13 @@ async def admin_order_details(callback: CallbackQuery, session: AsyncSession ):
     await callback.answer()
 
 
-@admin_router.callback_query(F.data.startswith("deliver_order_"))
-async def deliver_order_callback(callback: CallbackQuery, state: FSMContext):
+@admin_router.callback_query(CallbackPattern.prefix("deliver_order_", order_id=int))
+async def deliver_order_callback(callback: CallbackQuery, state: FSMContext, order_id: int):
     """Начать процесс выдачи заказа"""
     if not is_admin(callback.from_user.id):
         await callback.answer("❌ У вас нет прав доступа", show_alert=True)
         return
     
-    order_id = int(callback.data.split("_")[2])
-    
     await state.update_data(order_id=order_id)
     await state.set_state(AdminStates.waiting_for_order_content)
     
@@ -168,15 +168,13 @@ async def process_order_delivery(message: Message, state: FSMContext, session: A
     await state.clear()
 
 
-@admin_router.callback_query(F.data.startswith("admin_cancel_order_"))
-async def admin_cancel_order_callback(callback: CallbackQuery, state: FSMContext):
+@admin_router.callback_query(CallbackPattern.prefix("admin_cancel_order_", order_id=int))
+async def admin_cancel_order_callback(callback: CallbackQuery, state: FSMContext, order_id: int):
     """Начать отмену заказа админом"""
     if not is_admin(callback.from_user.id):
         await callback.answer("❌ У вас нет прав доступа", show_alert=True)
         return
     
-    order_id = int(callback.data.split("_")[3])
-    
     await state.update_data(order_id=order_id)
     await state.set_state(AdminStates.waiting_for_cancel_reason)
     
@@ -206,7 +204,8 @@ async def process_order_cancellation(message: Message, state: FSMContext, sessio
         order = await order_service.get_order_details(order_id)
         user_text = f"❌ <b>Ваш заказ #{order_id} отменен</b>\n\n"
         user_text += f"📝 Причина: {reason}\n"
-        user_text += f"💰 Средства возвращены на баланс: {order.total_price:.2f}₽"
+        if await order_service.is_refunded(order_id):
+            user_text += f"💰 Средства возвращены на баланс: {order.total_price:.2f}₽"
         
         try:
             await message.bot.send_message(
@@ -226,7 +225,7 @@ async def process_order_cancellation(message: Message, state: FSMContext, sessio
     await state.clear()
 
 
-@admin_router.callback_query(F.data == "admin_stats")
+@admin_router.callback_query(CallbackPattern.exact("admin_stats"))
 async def admin_stats_callback(callback: CallbackQuery, session: AsyncSession ):
     """Показать расширенную статистику администратора"""
     if not is_admin(callback.from_user.id):
@@ -262,11 +261,11 @@ async def admin_stats_callback(callback: CallbackQuery, session: AsyncSession ):
     # Доходы
     total_revenue = await session.scalar(
         select(func.sum(Order.total_price)).where(Order.status == OrderStatus.DELIVERED.value)
-    ) or 0
+    ) or Money(0)
     
     pending_revenue = await session.scalar(
         select(func.sum(Order.total_price)).where(Order.status == OrderStatus.PENDING.value)
-    ) or 0
+    ) or Money(0)
     
     # Статистика товаров
     warehouse_stats = await warehouse_service.get_smart_warehouse_stats()
@@ -289,7 +288,13 @@ async def admin_stats_callback(callback: CallbackQuery, session: AsyncSession ):
     text += f"• ⏳ Ожидающих: {pending_orders or 0}\n"
     text += f"• 💳 Оплаченных: {paid_orders or 0}\n"
     text += f"• ✅ Выданных: {delivered_orders or 0}\n"
-    text += f"• ❌ Отмененных: {cancelled_orders or 0}\n\n"
+    text += f"• ❌ Отмененных: {cancelled_orders or 0}\n"
+    if reservation_metrics["expired_orders"]:
+        text += (
+            f"• ♻️ Снято просроченных резервов: {reservation_metrics['expired_orders']} "
+            f"({reservation_metrics['released_units']} шт. возвращено)\n"
+        )
+    text += "\n"
     
     # Статистика выдач со склада
     text += f"🏪 <b>Склад:</b>\n"
@@ -324,6 +329,10 @@ async def admin_stats_callback(callback: CallbackQuery, session: AsyncSession ):
         text += f"• Новых заказов: {order_stats.get('recent_orders', 0)}\n"
         text += f"• Доход: {order_stats.get('recent_revenue', 0):.2f}₽\n"
     
+    # Сэкономленные запросы к Bot API
+    if view_metrics["skipped"]:
+        text += f"\n🤖 <b>Bot API:</b> пропущено правок без изменений - {view_metrics['skipped']} из {view_metrics['edits']}\n"
+    
     # Предупреждения
     warnings = []
     if pending_orders and pending_orders > 5:
@@ -353,7 +362,7 @@ async def admin_stats_callback(callback: CallbackQuery, session: AsyncSession ):
 # admin_categories удален - упрощена админ-панель
 
 
-@admin_router.callback_query(F.data == "admin_settings")
+@admin_router.callback_query(CallbackPattern.exact("admin_settings"))
 async def admin_settings_callback(callback: CallbackQuery, session: AsyncSession):
     """Главное меню настроек системы"""
     if not is_admin(callback.from_user.id):
@@ -388,15 +397,13 @@ async def admin_settings_callback(callback: CallbackQuery, session: AsyncSession
     await callback.answer()
 
 
-@admin_router.callback_query(F.data.startswith("admin_settings_category_"))
-async def admin_settings_category_callback(callback: CallbackQuery, session: AsyncSession):
+@admin_router.callback_query(CallbackPattern.prefix("admin_settings_category_", category=str))
+async def admin_settings_category_callback(callback: CallbackQuery, session: AsyncSession, category: str):
     """Показать настройки категории"""
     if not is_admin(callback.from_user.id):
         await callback.answer("❌ У вас нет прав доступа", show_alert=True)
         return
     
-    category = callback.data.split("_")[-1]
-    
     from services.settings_service import SettingsService
     from keyboards.inline_keyboards import admin_settings_category_kb, admin_settings_back_kb
     
@@ -427,7 +434,7 @@ async def admin_settings_category_callback(callback: CallbackQuery, session: Asy
     await callback.answer()
 
 
-# @admin_router.callback_query(F.data == "admin_settings_all")
+# @admin_router.callback_query(CallbackPattern.exact("admin_settings_all"))
 # async def admin_settings_all_callback(callback: CallbackQuery, session: AsyncSession):
 #     """Показать все настройки"""
 #     if not is_admin(callback.from_user.id):
@@ -454,15 +461,13 @@ async def admin_settings_category_callback(callback: CallbackQuery, session: Asy
 #     await callback.answer()
 
 
-@admin_router.callback_query(F.data.startswith("admin_setting_edit_"))
-async def admin_setting_edit_callback(callback: CallbackQuery, session: AsyncSession):
+@admin_router.callback_query(CallbackPattern.prefix("admin_setting_edit_", setting_id=int))
+async def admin_setting_edit_callback(callback: CallbackQuery, session: AsyncSession, setting_id: int):
     """Показать интерфейс редактирования настройки"""
     if not is_admin(callback.from_user.id):
         await callback.answer("❌ У вас нет прав доступа", show_alert=True)
         return
     
-    setting_id = int(callback.data.split("_")[-1])
-    
     from services.settings_service import SettingsService
     from keyboards.inline_keyboards import admin_setting_edit_kb, admin_settings_back_kb
     
@@ -499,15 +504,13 @@ async def admin_setting_edit_callback(callback: CallbackQuery, session: AsyncSes
     await callback.answer()
 
 
-@admin_router.callback_query(F.data.startswith("admin_setting_change_"))
-async def admin_setting_change_callback(callback: CallbackQuery, state: FSMContext, session: AsyncSession):
+@admin_router.callback_query(CallbackPattern.prefix("admin_setting_change_", setting_id=int))
+async def admin_setting_change_callback(callback: CallbackQuery, state: FSMContext, session: AsyncSession, setting_id: int):
     """Начать изменение значения настройки"""
     if not is_admin(callback.from_user.id):
         await callback.answer("❌ У вас нет прав доступа", show_alert=True)
         return
     
-    setting_id = int(callback.data.split("_")[-1])
-    
     from services.settings_service import SettingsService
     from keyboards.inline_keyboards import admin_settings_back_kb
     
@@ -555,15 +558,13 @@ async def admin_setting_change_callback(callback: CallbackQuery, state: FSMConte
     await callback.answer()
 
 
-@admin_router.callback_query(F.data.startswith("admin_setting_toggle_"))
-async def admin_setting_toggle_callback(callback: CallbackQuery, session: AsyncSession):
+@admin_router.callback_query(CallbackPattern.prefix("admin_setting_toggle_", setting_id=int))
+async def admin_setting_toggle_callback(callback: CallbackQuery, session: AsyncSession, setting_id: int):
     """Переключить boolean настройку"""
     if not is_admin(callback.from_user.id):
         await callback.answer("❌ У вас нет прав доступа", show_alert=True)
         return
     
-    setting_id = int(callback.data.split("_")[-1])
-    
     from services.settings_service import SettingsService
     settings_service = SettingsService(session)
     
@@ -581,7 +582,7 @@ async def admin_setting_toggle_callback(callback: CallbackQuery, session: AsyncS
     if success:
         await callback.answer(f"✅ Настройка обновлена: {new_value}")
         # Обновляем отображение
-        await admin_setting_edit_callback(callback, session)
+        await admin_setting_edit_callback(callback, session, setting_id)
     else:
         await callback.answer("❌ Ошибка при обновлении настройки", show_alert=True)
 
@@ -654,14 +655,13 @@ async def admin_setting_value_handler(message: Message, state: FSMContext, sessi
     )
 
 
-@admin_router.callback_query(F.data.startswith("admin_setting_confirm_"))
-async def admin_setting_confirm_callback(callback: CallbackQuery, state: FSMContext, session: AsyncSession):
+@admin_router.callback_query(CallbackPattern.prefix("admin_setting_confirm_", setting_id=int))
+async def admin_setting_confirm_callback(callback: CallbackQuery, state: FSMContext, session: AsyncSession, setting_id: int):
     """Подтвердить изменение настройки"""
     if not is_admin(callback.from_user.id):
         await callback.answer("❌ У вас нет прав доступа", show_alert=True)
         return
     
-    setting_id = int(callback.data.split("_")[-1])
     data = await state.get_data()
     new_value = data.get("new_value")
     
@@ -713,7 +713,7 @@ async def admin_setting_confirm_callback(callback: CallbackQuery, state: FSMCont
     await state.clear()
 
 
-@admin_router.callback_query(F.data == "admin_users")
+@admin_router.callback_query(CallbackPattern.exact("admin_users"))
 async def admin_users_callback(callback: CallbackQuery, session: AsyncSession):
     """Главное меню управления пользователями"""
     if not is_admin(callback.from_user.id):
@@ -744,7 +744,7 @@ async def admin_users_callback(callback: CallbackQuery, session: AsyncSession):
     await callback.answer()
 
 
-@admin_router.callback_query(F.data == "admin_users_top_buyers")
+@admin_router.callback_query(CallbackPattern.exact("admin_users_top_buyers"))
 async def admin_users_top_buyers_callback(callback: CallbackQuery, session: AsyncSession):
     """Показать топ покупателей"""
     if not is_admin(callback.from_user.id):
@@ -776,7 +776,7 @@ async def admin_users_top_buyers_callback(callback: CallbackQuery, session: Asyn
     await callback.answer()
 
 
-@admin_router.callback_query(F.data == "admin_users_active")
+@admin_router.callback_query(CallbackPattern.exact("admin_users_active"))
 async def admin_users_active_callback(callback: CallbackQuery, session: AsyncSession):
     """Показать активных пользователей"""
     if not is_admin(callback.from_user.id):
@@ -808,7 +808,7 @@ async def admin_users_active_callback(callback: CallbackQuery, session: AsyncSes
     await callback.answer()
 
 
-@admin_router.callback_query(F.data == "admin_users_recent")
+@admin_router.callback_query(CallbackPattern.exact("admin_users_recent"))
 async def admin_users_recent_callback(callback: CallbackQuery, session: AsyncSession):
     """Показать новых пользователей"""
     if not is_admin(callback.from_user.id):
@@ -841,7 +841,7 @@ async def admin_users_recent_callback(callback: CallbackQuery, session: AsyncSes
     await callback.answer()
 
 
-@admin_router.callback_query(F.data == "admin_users_balance")
+@admin_router.callback_query(CallbackPattern.exact("admin_users_balance"))
 async def admin_users_balance_callback(callback: CallbackQuery, session: AsyncSession):
     """Показать пользователей с балансом"""
     if not is_admin(callback.from_user.id):
@@ -855,7 +855,7 @@ async def admin_users_balance_callback(callback: CallbackQuery, session: AsyncSe
     text = "💰 <b>Пользователи с балансом</b>\n\n"
     
     if users_with_balance:
-        total_balance = sum(user.balance for user in users_with_balance)
+        total_balance = sum((user.balance for user in users_with_balance), Money(0))
         text += f"💳 <b>Общий баланс топ-{len(users_with_balance)}: {total_balance:.2f}₽</b>\n\n"
         
         for i, user in enumerate(users_with_balance, 1):
@@ -876,7 +876,36 @@ async def admin_users_balance_callback(callback: CallbackQuery, session: AsyncSe
     await callback.answer()
 
 
-@admin_router.callback_query(F.data == "admin_users_stats")
+@admin_router.message(Command("topup"))
+async def topup_command(message: Message, command: CommandObject, session: AsyncSession):
+    """Команда /topup <telegram_id> <сумма> - пополнить баланс пользователя через журнал балансов"""
+    if not is_admin(message.from_user.id):
+        await message.answer("❌ У вас нет прав доступа")
+        return
+    
+    args = (command.args or "").split()
+    try:
+        user_id, amount = int(args[0]), float(args[1].replace(",", "."))
+    except (IndexError, ValueError):
+        await message.answer("❌ Использование: <code>/topup telegram_id сумма</code>")
+        return
+    
+    if amount <= 0:
+        await message.answer("❌ Сумма пополнения должна быть больше нуля")
+        return
+    
+    user = await UserService(session).add_balance(user_id, amount)
+    if not user:
+        await message.answer("❌ Пользователь не найден")
+        return
+    
+    await message.answer(
+        f"✅ Баланс пользователя <code>{user_id}</code> пополнен на {amount:.2f}₽\n"
+        f"💰 Текущий баланс: {user.balance:.2f}₽"
+    )
+
+
+@admin_router.callback_query(CallbackPattern.exact("admin_users_stats"))
 async def admin_users_stats_callback(callback: CallbackQuery, session: AsyncSession):
     """Показать детальную статистику пользователей"""
     if not is_admin(callback.from_user.id):
@@ -886,6 +915,7 @@ async def admin_users_stats_callback(callback: CallbackQuery, session: AsyncSess
     from repositories import UserRepository
     from sqlalchemy import select, func
     from database.models import User
+    from database.money import MoneyType
     
     user_repo = UserRepository(session)
     stats = await user_repo.get_stats()
@@ -894,7 +924,10 @@ async def admin_users_stats_callback(callback: CallbackQuery, session: AsyncSess
     users_with_orders = await session.scalar(select(func.count(User.id)).where(User.total_orders > 0))
     users_with_balance = await session.scalar(select(func.count(User.id)).where(User.balance > 0))
     avg_orders = await session.scalar(select(func.avg(User.total_orders)).where(User.total_orders > 0)) or 0
-    avg_spent = await session.scalar(select(func.avg(User.total_spent)).where(User.total_spent > 0)) or 0
+    avg_spent = await session.scalar(
+        select(func.avg(User.total_spent, type_=MoneyType)).where(User.total_spent > 0)
+    ) or Money(0)
+    total_turnover = await session.scalar(select(func.sum(User.total_spent))) or Money(0)
     
     # Получаем пользователей за последние дни
     from datetime import datetime, timedelta
@@ -912,7 +945,7 @@ async def admin_users_stats_callback(callback: CallbackQuery, session: AsyncSess
         f"• С балансом: {users_with_balance or 0}\n"
         f"• Новых за неделю: {recent_users_count or 0}\n\n"
         f"💰 <b>Финансовые показатели:</b>\n"
-        f"• Общий оборот: {sum(u.total_spent for u in await user_repo.get_top_buyers(1000)):.2f}₽\n"
+        f"• Общий оборот: {total_turnover:.2f}₽\n"
         f"• Общий баланс: {stats['total_balance']:.2f}₽\n"
         f"• Средняя сумма заказа: {avg_spent:.2f}₽\n\n"
         f"📈 <b>Активность:</b>\n"
@@ -931,7 +964,7 @@ async def admin_users_stats_callback(callback: CallbackQuery, session: AsyncSess
 
 # ================== СКЛАД ТОВАРОВ ==================
 
-@admin_router.callback_query(F.data == "warehouse_menu")
+@admin_router.callback_query(CallbackPattern.exact("warehouse_menu"))
 async def warehouse_menu_callback(callback: CallbackQuery, session: AsyncSession):
     """Показать классическое главное меню склада"""
     if not is_admin(callback.from_user.id):
@@ -988,15 +1021,13 @@ async def warehouse_menu_callback(callback: CallbackQuery, session: AsyncSession
 # warehouse_give_ обработчики перемещены в warehouse.py
 
 
-@admin_router.callback_query(F.data.startswith("warehouse_add_stock_"))
-async def warehouse_add_stock_callback(callback: CallbackQuery, state: FSMContext):
+@admin_router.callback_query(CallbackPattern.prefix("warehouse_add_stock_", product_id=int))
+async def warehouse_add_stock_callback(callback: CallbackQuery, state: FSMContext, product_id: int):
     """Добавить остаток товара"""
     if not is_admin(callback.from_user.id):
         await callback.answer("❌ У вас нет прав доступа", show_alert=True)
         return
     
-    product_id = int(callback.data.split("_")[-1])
-    
     await state.update_data(product_id=product_id, action="add")
     await state.set_state(AdminStates.waiting_for_stock_quantity)
     
@@ -1008,15 +1039,13 @@ async def warehouse_add_stock_callback(callback: CallbackQuery, state: FSMContex
     await callback.answer()
 
 
-@admin_router.callback_query(F.data.startswith("warehouse_remove_stock_"))
-async def warehouse_remove_stock_callback(callback: CallbackQuery, state: FSMContext):
+@admin_router.callback_query(CallbackPattern.prefix("warehouse_remove_stock_", product_id=int))
+async def warehouse_remove_stock_callback(callback: CallbackQuery, state: FSMContext, product_id: int):
     """Списать остаток товара"""
     if not is_admin(callback.from_user.id):
         await callback.answer("❌ У вас нет прав доступа", show_alert=True)
         return
     
-    product_id = int(callback.data.split("_")[-1])
-    
     await state.update_data(product_id=product_id, action="remove")
     await state.set_state(AdminStates.waiting_for_stock_quantity)
     
@@ -1101,7 +1130,7 @@ async def process_stock_quantity(message: Message, state: FSMContext, session: A
     await state.clear()
 
 
-@admin_router.callback_query(F.data == "warehouse_history")
+@admin_router.callback_query(CallbackPattern.exact("warehouse_history"))
 async def warehouse_history_callback(callback: CallbackQuery):
     """История выдач товаров"""
     if not is_admin(callback.from_user.id):
@@ -1118,7 +1147,7 @@ async def warehouse_history_callback(callback: CallbackQuery):
     await callback.answer()
 
 
-@admin_router.callback_query(F.data == "warehouse_stats")
+@admin_router.callback_query(CallbackPattern.exact("warehouse_stats"))
 async def warehouse_stats_callback(callback: CallbackQuery, session: AsyncSession):
     """Умная статистика остатков товаров с анализом переполненных товаров"""
     if not is_admin(callback.from_user.id):
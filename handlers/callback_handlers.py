@@ -1,15 +1,16 @@
-from aiogram import Router, F
+from aiogram import Router
 from aiogram.types import CallbackQuery, Message
 from aiogram.fsm.context import FSMContext
 from sqlalchemy.ext.asyncio import AsyncSession
+from database.models import OrderStatus
 
 
-from services import UserService, ProductService, OrderService
+from services import UserService, OrderService, CatalogViewService
 from keyboards import (
-    main_menu_kb, categories_kb, products_kb, product_detail_kb,
-    profile_kb, referrals_kb, order_confirmation_kb, user_orders_kb, back_button
+    main_menu_kb, profile_kb, referrals_kb, order_confirmation_kb, user_orders_kb, back_button
 )
-from utils import format_user_info, format_product_info, format_order_info, OrderForm, log_user_action
+from utils import format_user_info, format_order_info, OrderForm, log_user_action
+from utils.callbacks import CallbackPattern
 from config import settings
 
 callback_router = Router()
@@ -18,7 +19,7 @@ callback_router = Router()
 
 
 
-@callback_router.callback_query(F.data == "back_to_menu")
+@callback_router.callback_query(CallbackPattern.exact("back_to_menu"))
 async def back_to_menu(callback: CallbackQuery):
     """Возврат в главное меню"""
     await callback.message.edit_text(
@@ -28,7 +29,7 @@ async def back_to_menu(callback: CallbackQuery):
     await callback.answer()
 
 
-@callback_router.callback_query(F.data == "profile")
+@callback_router.callback_query(CallbackPattern.exact("profile"))
 async def profile_callback(callback: CallbackQuery, session: AsyncSession):
     """Показать профиль пользователя"""
     log_user_action(callback.from_user.id, "profile_view", "Открыл профиль")
@@ -49,99 +50,57 @@ async def profile_callback(callback: CallbackQuery, session: AsyncSession):
     await callback.answer()
 
 
-@callback_router.callback_query(F.data == "catalog")
+@callback_router.callback_query(CallbackPattern.exact("catalog"))
 async def catalog_callback(callback: CallbackQuery, session: AsyncSession):
     """Показать каталог категорий"""
     log_user_action(callback.from_user.id, "catalog_view", "Открыл каталог")
     
-    product_service = ProductService(session)
+    text, markup = await CatalogViewService(session).categories_view()
     
-    categories = await product_service.get_categories_menu()
-    
-    if not categories:
-        await callback.message.edit_text(
-            "❌ Категории не найдены",
-            reply_markup=back_button()
-        )
-        await callback.answer()
-        return
-    
-    await callback.message.edit_text(
-        "📂 Выберите категорию:",
-        reply_markup=categories_kb(categories)
-    )
+    await callback.message.edit_text(text, reply_markup=markup)
     await callback.answer()
 
 
-@callback_router.callback_query(F.data.startswith("category_"))
-async def category_callback(callback: CallbackQuery, session: AsyncSession):
+@callback_router.callback_query(CallbackPattern.prefix("category_", category_id=int))
+async def category_callback(callback: CallbackQuery, session: AsyncSession, category_id: int):
     """Показать товары категории"""
-    category_id = int(callback.data.split("_")[1])
     log_user_action(callback.from_user.id, "category_select", f"Выбрал категорию {category_id}")
     
-    page = 0
-    
-    product_service = ProductService(session)
-    products = await product_service.get_products_by_category(category_id)
-    
-    if not products:
-        await callback.message.edit_text(
-            "❌ В этой категории пока нет товаров",
-            reply_markup=back_button("catalog")
-        )
-        await callback.answer()
-        return
+    text, markup = await CatalogViewService(session).products_view(category_id)
     
-    await callback.message.edit_text(
-        "🛍 Выберите товар:",
-        reply_markup=products_kb(products, category_id, page)
-    )
+    await callback.message.edit_text(text, reply_markup=markup)
     await callback.answer()
 
 
-@callback_router.callback_query(F.data.startswith("products_"))
-async def products_pagination(callback: CallbackQuery, session: AsyncSession ):
+@callback_router.callback_query(CallbackPattern.prefix("products_", category_id=int, page=int))
+async def products_pagination(callback: CallbackQuery, session: AsyncSession, category_id: int, page: int):
     """Пагинация товаров"""
-    parts = callback.data.split("_")
-    category_id = int(parts[1])
-    page = int(parts[2])
+    _, markup = await CatalogViewService(session).products_view(category_id, page)
     
-    product_service = ProductService(session)
-    products = await product_service.get_products_by_category(category_id)
-    
-    await callback.message.edit_reply_markup(
-        reply_markup=products_kb(products, category_id, page)
-    )
+    await callback.message.edit_reply_markup(reply_markup=markup)
     await callback.answer()
 
 
-@callback_router.callback_query(F.data.startswith("product_"))
-async def product_detail_callback(callback: CallbackQuery, session: AsyncSession):
+@callback_router.callback_query(CallbackPattern.prefix("product_", product_id=int))
+async def product_detail_callback(callback: CallbackQuery, session: AsyncSession, product_id: int):
     """Показать детали товара"""
-    product_id = int(callback.data.split("_")[1])
     log_user_action(callback.from_user.id, "product_view", f"Просмотрел товар {product_id}")
     
-    product_service = ProductService(session)
-    product = await product_service.get_product_details(product_id)
+    view = await CatalogViewService(session).product_view(product_id)
     
-    if not product:
+    if not view:
         await callback.answer("❌ Товар не найден или недоступен", show_alert=True)
         return
     
-    text = format_product_info(product)
-    
-    await callback.message.edit_text(
-        text,
-        reply_markup=product_detail_kb(product, user_can_buy=True)
-    )
+    text, markup = view
+    await callback.message.edit_text(text, reply_markup=markup)
     await callback.answer()
 
 
-@callback_router.callback_query(F.data.startswith("buy_"))
-async def buy_product_callback(callback: CallbackQuery, state: FSMContext, session: AsyncSession):
+@callback_router.callback_query(CallbackPattern.prefix("buy_", product_id=int))
+async def buy_product_callback(callback: CallbackQuery, state: FSMContext, session: AsyncSession, product_id: int):
     """Начать покупку товара"""
     try:
-        product_id = int(callback.data.split("_")[1])
         print(f"🛒 DEBUG: Пользователь {callback.from_user.id} пытается купить товар {product_id}")
         log_user_action(callback.from_user.id, "buy_attempt", f"Попытка покупки товара {product_id}")
         
@@ -196,10 +155,9 @@ async def buy_product_callback(callback: CallbackQuery, state: FSMContext, sessi
         await state.clear()
 
 
-@callback_router.callback_query(F.data.startswith("confirm_order_"))
-async def confirm_order_callback(callback: CallbackQuery, state: FSMContext, session: AsyncSession ):
+@callback_router.callback_query(CallbackPattern.prefix("confirm_order_", order_id=int))
+async def confirm_order_callback(callback: CallbackQuery, state: FSMContext, session: AsyncSession, order_id: int):
     """Подтвердить заказ"""
-    order_id = int(callback.data.split("_")[2])
     
     order_service = OrderService(session)
     
@@ -208,9 +166,13 @@ async def confirm_order_callback(callback: CallbackQuery, state: FSMContext, ses
     
     if success:
         order = await order_service.get_order_details(order_id)
-        text = "✅ <b>Заказ успешно оплачен!</b>\n\n"
-        text += format_order_info(order)
-        text += "\n📋 Ваш заказ передан на обработку администратору."
+        if order.status == OrderStatus.DELIVERED.value:
+            text = "✅ <b>Заказ оплачен и выдан!</b>\n\n"
+            text += format_order_info(order, show_content=True)
+        else:
+            text = "✅ <b>Заказ успешно оплачен!</b>\n\n"
+            text += format_order_info(order)
+            text += "\n📋 Ваш заказ передан на обработку администратору."
         
         await callback.message.edit_text(text, reply_markup=back_button())
     else:
@@ -220,17 +182,16 @@ async def confirm_order_callback(callback: CallbackQuery, state: FSMContext, ses
     await callback.answer()
 
 
-@callback_router.callback_query(F.data.startswith("cancel_order_"))
-async def cancel_order_callback(callback: CallbackQuery, state: FSMContext, session: AsyncSession ):
+@callback_router.callback_query(CallbackPattern.prefix("cancel_order_", order_id=int))
+async def cancel_order_callback(callback: CallbackQuery, state: FSMContext, session: AsyncSession, order_id: int):
     """Отменить заказ"""
-    order_id = int(callback.data.split("_")[2])
     
     order_service = OrderService(session)
     success, message = await order_service.cancel_order(order_id, "Отменен пользователем")
     
     if success:
         await callback.message.edit_text(
-            "❌ Заказ отменен. Средства возвращены на баланс.",
+            f"❌ {message}",
             reply_markup=back_button()
         )
     else:
@@ -240,7 +201,7 @@ async def cancel_order_callback(callback: CallbackQuery, state: FSMContext, sess
     await callback.answer()
 
 
-@callback_router.callback_query(F.data == "cart")
+@callback_router.callback_query(CallbackPattern.exact("cart"))
 async def cart_callback(callback: CallbackQuery, session: AsyncSession):
     """Показать корзину (заказы пользователя)"""
     log_user_action(callback.from_user.id, "cart_view", "Открыл корзину")
@@ -263,10 +224,9 @@ async def cart_callback(callback: CallbackQuery, session: AsyncSession):
     await callback.answer()
 
 
-@callback_router.callback_query(F.data.startswith("cart_"))
-async def cart_pagination(callback: CallbackQuery, session: AsyncSession):
+@callback_router.callback_query(CallbackPattern.prefix("cart_", page=int))
+async def cart_pagination(callback: CallbackQuery, session: AsyncSession, page: int):
     """Пагинация корзины"""
-    page = int(callback.data.split("_")[1])
     log_user_action(callback.from_user.id, "cart_pagination", f"Страница {page}")
     
     order_service = OrderService(session)
@@ -278,10 +238,9 @@ async def cart_pagination(callback: CallbackQuery, session: AsyncSession):
     await callback.answer()
 
 
-@callback_router.callback_query(F.data.startswith("order_details_"))
-async def order_details_callback(callback: CallbackQuery, session: AsyncSession ):
+@callback_router.callback_query(CallbackPattern.prefix("order_details_", order_id=int))
+async def order_details_callback(callback: CallbackQuery, session: AsyncSession, order_id: int):
     """Показать детали заказа"""
-    order_id = int(callback.data.split("_")[2])
     
     order_service = OrderService(session)
     order = await order_service.get_order_details(order_id)
@@ -299,7 +258,7 @@ async def order_details_callback(callback: CallbackQuery, session: AsyncSession
     await callback.answer()
 
 
-@callback_router.callback_query(F.data == "referrals")
+@callback_router.callback_query(CallbackPattern.exact("referrals"))
 async def referrals_callback(callback: CallbackQuery, session: AsyncSession):
     """Показать реферальную информацию"""
     log_user_action(callback.from_user.id, "referrals_view", "Открыл рефералы")
@@ -321,17 +280,31 @@ async def referrals_callback(callback: CallbackQuery, session: AsyncSession):
     text += f"🛒 Активных: <b>{stats['active_referrals']}</b>\n"
     text += f"💰 Заработано: <b>{stats['total_earnings']:.2f}₽</b>\n\n"
     
+    # Команда по уровням - только при многоуровневых наградах
+    if len(settings.referral_level_percents) > 1 and stats["total_referrals"]:
+        text += "🌳 <b>Команда по уровням:</b>\n"
+        for level in await referral_service.get_team_stats(callback.from_user.id):
+            text += (
+                f"{level['level']} ур.: {level['members']} чел., активных {level['active']}, "
+                f"заработано {level['earned']:.2f}₽\n"
+            )
+        text += "\n"
+    
     bot_username = (await callback.bot.me()).username
     referral_link = f"https://t.me/{bot_username}?start={stats['referral_code']}"
     
     text += f"🔗 Ваша ссылка:\n<code>{referral_link}</code>\n\n"
-    text += f"💡 Получайте {settings.REFERRAL_REWARD_PERCENT}% с покупок рефералов!"
+    percents = settings.referral_level_percents
+    text += f"💡 Получайте {percents[0]:g}% с покупок рефералов!"
+    if len(percents) > 1:
+        levels = ", ".join(f"{level} ур. - {percent:g}%" for level, percent in enumerate(percents, start=1))
+        text += f"\n📊 Награды по уровням приглашений: {levels}"
     
     await callback.message.edit_text(text, reply_markup=referrals_kb())
     await callback.answer()
 
 
-@callback_router.callback_query(F.data == "withdraw_funds")
+@callback_router.callback_query(CallbackPattern.exact("withdraw_funds"))
 async def withdraw_funds_callback(callback: CallbackQuery, session: AsyncSession):
     """Обработчик вывода средств"""
     log_user_action(callback.from_user.id, "withdraw_request", "Запросил вывод средств")
@@ -99,13 +99,13 @@ async def help_handler(message: Message):
 5️⃣ Подтвердите заказ
 
 <b>Пополнение баланса:</b>
-Используйте кнопку "💰 Пополнить баланс" в главном меню
+Для пополнения обратитесь к администратору и сообщите свой UID из /profile
 
 <b>Реферальная программа:</b>
 Приглашайте друзей и получайте {:.1f}% с их покупок!
 
 ❓ Если у вас есть вопросы, обратитесь к администратору.
-    """.format(settings.REFERRAL_REWARD_PERCENT)
+    """.format(settings.referral_level_percents[0])
     
     await message.answer(help_text)
 
@@ -130,7 +130,7 @@ async def search_handler(message: Message, session: AsyncSession):
         return
     
     product_service = ProductService(session)
-    products = await product_service.search_products(query)
+    products, total = await product_service.search_products(query, limit=10)
     
     if not products:
         await message.answer(f"❌ По запросу '{query}' ничего не найдено.")
@@ -138,13 +138,13 @@ async def search_handler(message: Message, session: AsyncSession):
     
     text = f"🔍 Результаты поиска по запросу '{query}':\n\n"
     
-    for product in products[:10]:  # Показываем первые 10 результатов
+    for product in products:  # Показываем первые 10 результатов
         availability = "✅" if (product.is_unlimited or product.stock_quantity > 0) else "❌"
         text += f"{availability} <b>{product.name}</b> - {product.price:.2f}₽\n"
         text += f"📂 {product.category.name}\n\n"
     
-    if len(products) > 10:
-        text += f"... и еще {len(products) - 10} товаров\n\n"
+    if total > len(products):
+        text += f"... и еще {total - len(products)} товаров\n\n"
     
     text += "Используйте каталог для покупки товаров."
     
@@ -1,16 +1,23 @@
 """Обработчики для управления складом товаров"""
 
+import asyncio
+import html
 import logging
-from aiogram import Router, F
-from aiogram.types import CallbackQuery, Message, InlineKeyboardButton
+import os
+from typing import Optional
+from aiogram import Bot, Router, F
+from aiogram.filters import Command, CommandObject
+from aiogram.types import CallbackQuery, Message, InlineKeyboardButton, FSInputFile
 from aiogram.utils.keyboard import InlineKeyboardBuilder
 from aiogram.fsm.context import FSMContext
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from config import settings
+from database.database import async_session
 from database.models import ProductType
-from utils.states import WarehouseAddProductStates, WarehouseGiveProductStates, WarehouseCreateCategoryStates, WarehouseMassAddStates, WarehouseQuickAddStates, WarehouseEditProductStates, WarehouseQuickGiveStates
+from utils.states import WarehouseAddProductStates, WarehouseGiveProductStates, WarehouseCreateCategoryStates, WarehouseMassAddStates, WarehouseQuickAddStates, WarehouseEditProductStates, WarehouseQuickGiveStates, WarehouseMassGiveStates
 from utils.warehouse_templates import WarehouseMessages
+from utils.callbacks import CallbackPattern
 from keyboards.warehouse_keyboards import (
     product_type_kb, warehouse_categories_select_kb, warehouse_products_select_kb,
     add_product_confirmation_kb, give_product_confirmation_kb, cancel_kb,
@@ -24,14 +31,31 @@ from keyboards.warehouse_keyboards import (
     warehouse_category_management_kb, warehouse_category_unified_management_kb,
     warehouse_category_action_complete_kb, warehouse_products_with_stock_kb,
     warehouse_out_of_stock_products_kb, warehouse_stock_summary_kb,
-    warehouse_category_products_with_stock_kb, warehouse_quick_stock_select_kb
+    warehouse_category_products_with_stock_kb, warehouse_quick_stock_select_kb,
+    file_import_confirmation_kb, warehouse_export_kb, mass_give_source_kb, mass_give_confirmation_kb
 )
 from services.warehouse_service import WarehouseService
+from services.stock_import_service import (
+    StockImportService, stream_telegram_file, iter_text_lines, is_csv_file, is_spreadsheet_file, max_download_size
+)
+from services.mass_give_service import (
+    MassGiveService, parse_recipients, MASS_GIVE_MAX_RECIPIENTS, MASS_GIVE_MAX_UNITS_PER_USER
+)
+from services.export_service import (
+    ExportService, EXPORT_KINDS, EXPORT_FORMATS, export_file_name, export_upload_limit
+)
+from services.category_counter_service import CategoryCounterService
+from utils.notifier import RateLimitedSender
+from utils.progress import ProgressMessage
+from utils.background import start_background
 
 
 logger = logging.getLogger(__name__)
 warehouse_router = Router()
 
+# Сколько товаров категории показывать кнопками при выборе источника массовой выдачи
+MASS_GIVE_SOURCE_BUTTONS = 20
+
 
 def is_admin(user_id: int) -> bool:
     """Проверить, является ли пользователь администратором"""
@@ -57,7 +81,7 @@ async def check_categories_exist(callback: CallbackQuery, session: AsyncSession)
 
 # ========== ДОБАВЛЕНИЕ ТОВАРА ==========
 
-@warehouse_router.callback_query(F.data == "warehouse_add_product")
+@warehouse_router.callback_query(CallbackPattern.exact("warehouse_add_product"))
 async def start_add_product(callback: CallbackQuery, state: FSMContext, session: AsyncSession):
     """Начать процесс добавления товара"""
     if not is_admin(callback.from_user.id):
@@ -80,10 +104,9 @@ async def start_add_product(callback: CallbackQuery, state: FSMContext, session:
     await callback.answer()
 
 
-@warehouse_router.callback_query(F.data.startswith("warehouse_select_category_"), WarehouseAddProductStates.waiting_for_category)
-async def select_category(callback: CallbackQuery, state: FSMContext):
+@warehouse_router.callback_query(CallbackPattern.prefix("warehouse_select_category_", category_id=int), WarehouseAddProductStates.waiting_for_category)
+async def select_category(callback: CallbackQuery, state: FSMContext, category_id: int):
     """Выбрать категорию для товара"""
-    category_id = int(callback.data.split("_")[-1])
     await state.update_data(category_id=category_id)
     await state.set_state(WarehouseAddProductStates.waiting_for_name)
     
@@ -115,10 +138,9 @@ async def enter_product_name(message: Message, state: FSMContext):
     )
 
 
-@warehouse_router.callback_query(F.data.startswith("warehouse_type_"), WarehouseAddProductStates.waiting_for_type)
-async def select_product_type(callback: CallbackQuery, state: FSMContext):
+@warehouse_router.callback_query(CallbackPattern.prefix("warehouse_type_", product_type=str), WarehouseAddProductStates.waiting_for_type)
+async def select_product_type(callback: CallbackQuery, state: FSMContext, product_type: str):
     """Выбрать тип товара"""
-    product_type = callback.data.split("_")[-1]
     await state.update_data(product_type=product_type)
     await state.set_state(WarehouseAddProductStates.waiting_for_duration)
     
@@ -251,7 +273,7 @@ async def enter_price(message: Message, state: FSMContext, session: AsyncSession
     )
 
 
-@warehouse_router.callback_query(F.data == "warehouse_confirm_add_product", WarehouseAddProductStates.waiting_for_confirmation)
+@warehouse_router.callback_query(CallbackPattern.exact("warehouse_confirm_add_product"), WarehouseAddProductStates.waiting_for_confirmation)
 async def confirm_add_product(callback: CallbackQuery, state: FSMContext, session: AsyncSession):
     """Подтвердить добавление товара"""
     data = await state.get_data()
@@ -316,7 +338,7 @@ async def confirm_add_product(callback: CallbackQuery, state: FSMContext, sessio
 
 # ========== ВЫДАЧА ТОВАРА ==========
 
-@warehouse_router.callback_query(F.data == "warehouse_give_product")
+@warehouse_router.callback_query(CallbackPattern.exact("warehouse_give_product"))
 async def start_give_product(callback: CallbackQuery, state: FSMContext, session: AsyncSession):
     """Начать процесс выдачи товара"""
     if not is_admin(callback.from_user.id):
@@ -346,10 +368,9 @@ async def start_give_product(callback: CallbackQuery, state: FSMContext, session
     await callback.answer()
 
 
-@warehouse_router.callback_query(F.data.startswith("warehouse_select_product_"), WarehouseGiveProductStates.waiting_for_product)
-async def select_product_to_give(callback: CallbackQuery, state: FSMContext, session: AsyncSession):
+@warehouse_router.callback_query(CallbackPattern.prefix("warehouse_select_product_", product_id=int), WarehouseGiveProductStates.waiting_for_product)
+async def select_product_to_give(callback: CallbackQuery, state: FSMContext, session: AsyncSession, product_id: int):
     """Выбрать товар для выдачи"""
-    product_id = int(callback.data.split("_")[-1])
     warehouse_service = WarehouseService(session)
     
     product = await warehouse_service.get_product_with_category(product_id)
@@ -433,7 +454,7 @@ async def enter_user_to_give(message: Message, state: FSMContext, session: Async
     )
 
 
-@warehouse_router.callback_query(F.data == "warehouse_confirm_give_product", WarehouseGiveProductStates.waiting_for_confirmation)
+@warehouse_router.callback_query(CallbackPattern.exact("warehouse_confirm_give_product"), WarehouseGiveProductStates.waiting_for_confirmation)
 async def confirm_give_product(callback: CallbackQuery, state: FSMContext, session: AsyncSession):
     """Подтвердить выдачу товара"""
     
@@ -515,9 +536,289 @@ async def confirm_give_product(callback: CallbackQuery, state: FSMContext, sessi
     await callback.answer()
 
 
+# ========== МАССОВАЯ ВЫДАЧА ==========
+
+def _mass_give_source_name(data: dict) -> str:
+    """Название источника массовой выдачи для сообщений"""
+    if data.get("product_id"):
+        return html.escape(data["product_name"])
+    return f"любые товары категории «{html.escape(data['category_name'])}»"
+
+
+def _mass_give_notification(units: list, manual_url: Optional[str]) -> str:
+    """Уведомление получателю со всеми выданными ему единицами"""
+    names = list(dict.fromkeys(name for _, name, _ in units))
+    contents = "\n".join(f"<code>{html.escape(content)}</code>" for _, _, content in units)
+    
+    text = WarehouseMessages.MASS_GIVE_USER_NOTIFICATION.format(
+        product_name=html.escape(", ".join(names)),
+        contents=contents
+    )
+    if manual_url:
+        text += f"\n\n📚 <b>Инструкция:</b> {manual_url}"
+    return text
+
+
+@warehouse_router.callback_query(CallbackPattern.exact("warehouse_mass_give"))
+async def warehouse_mass_give_callback(callback: CallbackQuery, state: FSMContext, session: AsyncSession):
+    """Начать массовую выдачу"""
+    if not is_admin(callback.from_user.id):
+        await callback.answer("❌ У вас нет прав доступа", show_alert=True)
+        return
+    
+    if not await check_categories_exist(callback, session):
+        return
+    
+    warehouse_service = WarehouseService(session)
+    categories = await warehouse_service.get_categories()
+    
+    await state.clear()
+    await state.set_state(WarehouseMassGiveStates.waiting_for_category)
+    
+    await callback.message.edit_text(
+        WarehouseMessages.MASS_GIVE_START,
+        reply_markup=warehouse_categories_select_kb(categories)
+    )
+    await callback.answer()
+
+
+@warehouse_router.callback_query(CallbackPattern.prefix("warehouse_select_category_", category_id=int), WarehouseMassGiveStates.waiting_for_category)
+async def mass_give_select_category(callback: CallbackQuery, state: FSMContext, session: AsyncSession, category_id: int):
+    """Выбрать категорию для массовой выдачи"""
+    warehouse_service = WarehouseService(session)
+    
+    category = await warehouse_service.get_category_by_id(category_id)
+    if not category:
+        await callback.answer(WarehouseMessages.ERROR_CATEGORY_NOT_FOUND, show_alert=True)
+        return
+    
+    products = await warehouse_service.get_products_by_category(category_id)
+    
+    await state.update_data(category_id=category_id, category_name=category.name)
+    await state.set_state(WarehouseMassGiveStates.waiting_for_source)
+    
+    await callback.message.edit_text(
+        WarehouseMessages.MASS_GIVE_SOURCE.format(category=html.escape(category.name)),
+        reply_markup=mass_give_source_kb(products[:MASS_GIVE_SOURCE_BUTTONS])
+    )
+    await callback.answer()
+
+
+async def _mass_give_ask_quantity(callback: CallbackQuery, state: FSMContext, available: str):
+    await state.update_data(available=available)
+    await state.set_state(WarehouseMassGiveStates.waiting_for_quantity)
+    
+    await callback.message.edit_text(
+        WarehouseMessages.MASS_GIVE_QUANTITY.format(
+            source=_mass_give_source_name(await state.get_data()),
+            available=available,
+            max_units=MASS_GIVE_MAX_UNITS_PER_USER
+        ),
+        reply_markup=cancel_kb()
+    )
+    await callback.answer()
+
+
+@warehouse_router.callback_query(CallbackPattern.exact("warehouse_mass_give_any"), WarehouseMassGiveStates.waiting_for_source)
+async def mass_give_select_any(callback: CallbackQuery, state: FSMContext, session: AsyncSession):
+    """Выдавать любые товары категории"""
+    data = await state.get_data()
+    available = await MassGiveService(session).count_category_units(data["category_id"])
+    
+    if not available:
+        await callback.answer(WarehouseMessages.ERROR_NO_STOCK, show_alert=True)
+        return
+    
+    await state.update_data(product_id=None)
+    await _mass_give_ask_quantity(callback, state, str(available))
+
+
+@warehouse_router.callback_query(CallbackPattern.prefix("warehouse_select_product_", product_id=int), WarehouseMassGiveStates.waiting_for_source)
+async def mass_give_select_product(callback: CallbackQuery, state: FSMContext, session: AsyncSession, product_id: int):
+    """Выдавать конкретный товар"""
+    warehouse_service = WarehouseService(session)
+    
+    product = await warehouse_service.get_product_with_category(product_id)
+    if not product or not product.digital_content:
+        await callback.answer(WarehouseMessages.ERROR_PRODUCT_NOT_FOUND, show_alert=True)
+        return
+    
+    if not product.is_unlimited and product.stock_quantity <= 0:
+        await callback.answer(WarehouseMessages.ERROR_NO_STOCK, show_alert=True)
+        return
+    
+    await state.update_data(product_id=product_id, product_name=product.name)
+    await _mass_give_ask_quantity(callback, state, "∞" if product.is_unlimited else str(product.stock_quantity))
+
+
+@warehouse_router.message(WarehouseMassGiveStates.waiting_for_quantity)
+async def mass_give_enter_quantity(message: Message, state: FSMContext):
+    """Ввод количества единиц на получателя"""
+    try:
+        units = int((message.text or "").strip())
+    except ValueError:
+        units = 0
+    
+    if not 1 <= units <= MASS_GIVE_MAX_UNITS_PER_USER:
+        await message.answer(
+            f"❌ Введите число от 1 до {MASS_GIVE_MAX_UNITS_PER_USER}",
+            reply_markup=cancel_kb()
+        )
+        return
+    
+    await state.update_data(units=units)
+    await state.set_state(WarehouseMassGiveStates.waiting_for_recipients)
+    
+    await message.answer(
+        WarehouseMessages.MASS_GIVE_RECIPIENTS.format(max_recipients=MASS_GIVE_MAX_RECIPIENTS),
+        reply_markup=cancel_kb()
+    )
+
+
+@warehouse_router.message(WarehouseMassGiveStates.waiting_for_recipients, F.text)
+async def mass_give_enter_recipients(message: Message, state: FSMContext, session: AsyncSession):
+    """Разобрать список получателей и найти их одним запросом"""
+    ids, usernames, invalid = parse_recipients(message.text)
+    
+    if len(ids) + len(usernames) > MASS_GIVE_MAX_RECIPIENTS:
+        await message.answer(
+            f"❌ Слишком много получателей. Максимум: {MASS_GIVE_MAX_RECIPIENTS}",
+            reply_markup=cancel_kb()
+        )
+        return
+    
+    recipients, missing = await MassGiveService(session).resolve_recipients(ids, usernames)
+    
+    if not recipients:
+        await message.answer(
+            "❌ Ни один получатель не найден. Пользователи должны хотя бы раз запустить бота.\n\n"
+            "Отправьте список еще раз:",
+            reply_markup=cancel_kb()
+        )
+        return
+    
+    data = await state.get_data()
+    needed = len(recipients) * data["units"]
+    
+    warnings = ""
+    if missing:
+        shown = ", ".join(html.escape(value) for value in missing[:10])
+        more = f" и еще {len(missing) - 10}" if len(missing) > 10 else ""
+        warnings += f"⚠️ Не найдены ({len(missing)}): {shown}{more}\n"
+    if invalid:
+        shown = ", ".join(html.escape(value) for value in invalid[:10])
+        warnings += f"⚠️ Нераспознанные значения ({len(invalid)}): {shown}\n"
+    if data["available"] != "∞" and needed > int(data["available"]):
+        warnings += "⚠️ Товара хватит не всем: получатели из конца списка останутся без товара\n"
+    
+    await state.update_data(recipient_ids=[user.id for user in recipients])
+    await state.set_state(WarehouseMassGiveStates.waiting_for_confirmation)
+    
+    await message.answer(
+        WarehouseMessages.MASS_GIVE_CONFIRMATION.format(
+            source=_mass_give_source_name(data),
+            units=data["units"],
+            found=len(recipients),
+            needed=needed,
+            available=data["available"],
+            warnings=warnings
+        ),
+        reply_markup=mass_give_confirmation_kb()
+    )
+
+
+@warehouse_router.callback_query(CallbackPattern.exact("warehouse_confirm_mass_give"), WarehouseMassGiveStates.waiting_for_confirmation)
+async def confirm_mass_give(callback: CallbackQuery, state: FSMContext, session: AsyncSession, bot: Bot):
+    """Выдать товар и разослать уведомления с ограничением скорости"""
+    data = await state.get_data()
+    await state.clear()
+    await callback.answer("⏳ Выдаю товар...")
+    
+    progress = ProgressMessage(callback.message)
+    await progress.update("⏳ <b>Массовая выдача: списываю товар...</b>", force=True)
+    
+    mass_give_service = MassGiveService(session)
+    recipients, _ = await mass_give_service.resolve_recipients(data["recipient_ids"], [])
+    
+    try:
+        report = await mass_give_service.give(
+            recipients,
+            units_per_user=data["units"],
+            admin_id=callback.from_user.id,
+            admin_username=callback.from_user.username,
+            product_id=data.get("product_id"),
+            category_id=data["category_id"]
+        )
+    except Exception as e:
+        await progress.update(
+            f"❌ Ошибка массовой выдачи: {html.escape(str(e))}",
+            reply_markup=back_to_warehouse_kb(),
+            force=True
+        )
+        return
+    
+    warehouse_service = WarehouseService(session)
+    category = await warehouse_service.get_category_by_id(data["category_id"])
+    manual_url = category.manual_url if category else None
+    category_stats = await warehouse_service.get_single_category_stats(data["category_id"])
+    
+    # Товар уже выдан и зафиксирован. Рассылка идет в фоне: обработчик не держит
+    # соединение с БД и не задерживает следующие апдейты чата администратора
+    await session.close()
+    
+    summary = {
+        "source": _mass_give_source_name(data),
+        "delivered": len(report['deliveries']),
+        "units": report['units'],
+        "not_delivered": len(report['not_delivered']),
+    }
+    reply_markup = warehouse_category_action_complete_kb(data["category_id"], action_type="give", category_stats=category_stats)
+    
+    task = start_background(
+        _send_mass_give_notifications(bot, progress, report, manual_url),
+        name=f"mass_give_notify_{callback.from_user.id}"
+    )
+    task.add_done_callback(lambda done: _report_mass_give(done, progress, summary, reply_markup))
+
+
+async def _send_mass_give_notifications(bot: Bot, progress: ProgressMessage, report: dict, manual_url: Optional[str]) -> dict:
+    """Разослать уведомления о выдаче с прогрессом в сообщении администратора"""
+    async with RateLimitedSender(bot, rate=settings.NOTIFY_RATE_LIMIT) as sender:
+        for user, units in report['deliveries']:
+            sender.enqueue(user.id, _mass_give_notification(units, manual_url))
+        
+        sending = asyncio.ensure_future(sender.join())
+        while not sending.done():
+            await asyncio.wait({sending}, timeout=progress.interval)
+            await progress.update(WarehouseMessages.MASS_GIVE_PROGRESS.format(
+                delivered=len(report['deliveries']), units=report['units'], **sender.stats()
+            ))
+    
+    logger.info(f"WAREHOUSE: Mass give notifications: {sender.stats()}")
+    return sender.stats()
+
+
+def _report_mass_give(task: asyncio.Task, progress: ProgressMessage, summary: dict, reply_markup):
+    """Показать администратору итог рассылки после ее завершения"""
+    if task.cancelled():
+        return
+    
+    error = task.exception()
+    if error is not None:
+        logger.error(f"Mass give notifications failed: {error}")
+        text = (
+            f"⚠️ <b>Товар выдан ({summary['delivered']} пользователей), "
+            f"но рассылка уведомлений прервана:</b> {html.escape(str(error))}"
+        )
+    else:
+        text = WarehouseMessages.MASS_GIVE_SUMMARY.format(**summary, **task.result())
+    
+    start_background(progress.update(text, reply_markup=reply_markup, force=True), name="mass_give_report")
+
+
 # ========== СОЗДАНИЕ КАТЕГОРИИ ==========
 
-@warehouse_router.callback_query(F.data == "warehouse_create_category")
+@warehouse_router.callback_query(CallbackPattern.exact("warehouse_create_category"))
 async def start_create_category(callback: CallbackQuery, state: FSMContext):
     """Начать процесс создания категории"""
     if not is_admin(callback.from_user.id):
@@ -600,7 +901,7 @@ async def enter_category_manual_url(message: Message, state: FSMContext):
     )
 
 
-@warehouse_router.callback_query(F.data == "warehouse_confirm_create_category", WarehouseCreateCategoryStates.waiting_for_confirmation)
+@warehouse_router.callback_query(CallbackPattern.exact("warehouse_confirm_create_category"), WarehouseCreateCategoryStates.waiting_for_confirmation)
 async def confirm_create_category(callback: CallbackQuery, state: FSMContext, session: AsyncSession):
     """Подтвердить создание категории"""
     data = await state.get_data()
@@ -643,7 +944,7 @@ async def confirm_create_category(callback: CallbackQuery, state: FSMContext, se
 
 # ========== МАССОВОЕ ДОБАВЛЕНИЕ ТОВАРОВ ==========
 
-@warehouse_router.callback_query(F.data == "warehouse_mass_add")
+@warehouse_router.callback_query(CallbackPattern.exact("warehouse_mass_add"))
 async def start_mass_add(callback: CallbackQuery, state: FSMContext, session: AsyncSession):
     """Начать процесс массового добавления товаров"""
     if not is_admin(callback.from_user.id):
@@ -666,10 +967,9 @@ async def start_mass_add(callback: CallbackQuery, state: FSMContext, session: As
     await callback.answer()
 
 
-@warehouse_router.callback_query(F.data.startswith("warehouse_select_category_"), WarehouseMassAddStates.waiting_for_category)
-async def mass_add_select_category(callback: CallbackQuery, state: FSMContext):
+@warehouse_router.callback_query(CallbackPattern.prefix("warehouse_select_category_", category_id=int), WarehouseMassAddStates.waiting_for_category)
+async def mass_add_select_category(callback: CallbackQuery, state: FSMContext, category_id: int):
     """Выбрать категорию для массового добавления"""
-    category_id = int(callback.data.split("_")[-1])
     
     await state.update_data(category_id=category_id)
     await state.set_state(WarehouseMassAddStates.waiting_for_name)
@@ -702,10 +1002,9 @@ async def mass_add_enter_name(message: Message, state: FSMContext):
     )
 
 
-@warehouse_router.callback_query(F.data.startswith("warehouse_type_"), WarehouseMassAddStates.waiting_for_type)
-async def mass_add_select_type(callback: CallbackQuery, state: FSMContext):
+@warehouse_router.callback_query(CallbackPattern.prefix("warehouse_type_", product_type=str), WarehouseMassAddStates.waiting_for_type)
+async def mass_add_select_type(callback: CallbackQuery, state: FSMContext, product_type: str):
     """Выбрать тип товара для массового добавления"""
-    product_type = callback.data.split("_")[-1]
     
     await state.update_data(product_type=product_type)
     await state.set_state(WarehouseMassAddStates.waiting_for_duration)
@@ -821,12 +1120,13 @@ async def mass_add_enter_price(message: Message, state: FSMContext):
     await state.set_state(WarehouseMassAddStates.waiting_for_content)
     
     await message.answer(
-        WarehouseMessages.MASS_ADD_CONTENT.format(content_format=content_format),
+        WarehouseMessages.MASS_ADD_CONTENT.format(content_format=content_format)
+        + "\n\n" + WarehouseMessages.MASS_ADD_FILE_HINT,
         reply_markup=cancel_kb()
     )
 
 
-@warehouse_router.message(WarehouseMassAddStates.waiting_for_content)
+@warehouse_router.message(WarehouseMassAddStates.waiting_for_content, F.text)
 async def mass_add_enter_content(message: Message, state: FSMContext, session: AsyncSession):
     """Ввод контента для массового добавления"""
     content_text = message.text.strip()
@@ -883,7 +1183,7 @@ async def mass_add_enter_content(message: Message, state: FSMContext, session: A
     )
 
 
-@warehouse_router.callback_query(F.data == "warehouse_confirm_mass_add", WarehouseMassAddStates.waiting_for_confirmation)
+@warehouse_router.callback_query(CallbackPattern.exact("warehouse_confirm_mass_add"), WarehouseMassAddStates.waiting_for_confirmation)
 async def confirm_mass_add(callback: CallbackQuery, state: FSMContext, session: AsyncSession):
     """Подтвердить массовое добавление товаров"""
     data = await state.get_data()
@@ -1011,9 +1311,314 @@ async def confirm_mass_add(callback: CallbackQuery, state: FSMContext, session:
     await callback.answer()
 
 
+# ========== ИМПОРТ ИЗ ФАЙЛА ==========
+
+def _format_file_size(size: int) -> str:
+    """Размер файла для сообщений"""
+    if size >= 1024 * 1024:
+        return f"{size / 1024 / 1024:.1f} МБ"
+    return f"{max(size, 1) / 1024:.1f} КБ"
+
+
+@warehouse_router.message(WarehouseMassAddStates.waiting_for_content, F.document)
+async def mass_add_receive_file(message: Message, state: FSMContext, session: AsyncSession, bot: Bot):
+    """Получить файл с содержимым товаров для потокового импорта"""
+    document = message.document
+    
+    if is_spreadsheet_file(document.file_name):
+        await message.answer(
+            "❌ Таблицы Excel не поддерживаются напрямую.\n\n"
+            "Сохраните лист как <b>CSV</b> («Файл → Сохранить как → CSV UTF-8») и отправьте еще раз:",
+            reply_markup=cancel_kb()
+        )
+        return
+    
+    limit = max_download_size(bot)
+    if limit is not None and (document.file_size or 0) > limit:
+        await message.answer(
+            WarehouseMessages.IMPORT_FILE_TOO_LARGE.format(
+                size=_format_file_size(document.file_size), limit=_format_file_size(limit)
+            ),
+            reply_markup=cancel_kb()
+        )
+        return
+    
+    data = await state.get_data()
+    warehouse_service = WarehouseService(session)
+    
+    category = await warehouse_service.get_category_by_id(data["category_id"])
+    category_name = category.name if category else "Неизвестная"
+    
+    type_names = {
+        ProductType.ACCOUNT.value: "Аккаунт (логин/пароль)",
+        ProductType.KEY.value: "Ключ активации",
+        ProductType.PROMO.value: "Промокод"
+    }
+    
+    # В FSM храним только ссылку на файл - строки читаются потоком при импорте
+    await state.update_data(
+        file_id=document.file_id,
+        file_name=document.file_name or "file.txt",
+        file_csv=is_csv_file(document.file_name, document.mime_type),
+        category_name=category_name
+    )
+    await state.set_state(WarehouseMassAddStates.waiting_for_confirmation)
+    
+    await message.answer(
+        WarehouseMessages.IMPORT_FILE_CONFIRMATION.format(
+            name=data["name"],
+            category=category_name,
+            product_type=type_names.get(data["product_type"], data["product_type"]),
+            duration=data["duration"],
+            price=data["price"],
+            file_name=document.file_name or "без имени",
+            file_size=_format_file_size(document.file_size or 0)
+        ),
+        reply_markup=file_import_confirmation_kb()
+    )
+
+
+@warehouse_router.callback_query(CallbackPattern.exact("warehouse_confirm_file_import"), WarehouseMassAddStates.waiting_for_confirmation)
+async def confirm_file_import(callback: CallbackQuery, state: FSMContext, bot: Bot):
+    """Запустить импорт товаров из файла в фоне с прогрессом в одном сообщении"""
+    data = await state.get_data()
+    await state.clear()
+    await callback.answer("⏳ Импорт запущен")
+    
+    progress = ProgressMessage(callback.message)
+    await progress.update(
+        WarehouseMessages.IMPORT_FILE_PROGRESS.format(total_lines=0, successful=0, duplicates=0, invalid_format=0),
+        force=True
+    )
+    
+    # Файл читается и импортируется в фоне в своей сессии БД: обработчик не держит
+    # соединение и не задерживает следующие апдейты чата администратора
+    task = start_background(
+        _import_file(bot, progress, data, callback.from_user.id, callback.from_user.username),
+        name=f"file_import_{callback.from_user.id}"
+    )
+    task.add_done_callback(lambda done: _report_file_import(done, progress, data))
+
+
+async def _import_file(bot: Bot, progress: ProgressMessage, data: dict, admin_id: int, admin_username: Optional[str]) -> tuple:
+    """Импортировать файл пачками и вернуть отчет и обновленную статистику категории"""
+    async def on_progress(report: dict):
+        await progress.update(WarehouseMessages.IMPORT_FILE_PROGRESS.format(**report))
+    
+    async with async_session() as session:
+        report = await StockImportService(session).import_lines(
+            iter_text_lines(stream_telegram_file(bot, data["file_id"])),
+            base_name=data["name"],
+            category_id=data["category_id"],
+            product_type=data["product_type"],
+            duration=data["duration"],
+            price=data["price"],
+            admin_id=admin_id,
+            admin_username=admin_username,
+            csv_format=data.get("file_csv", False),
+            on_progress=on_progress
+        )
+        category_stats = await WarehouseService(session).get_single_category_stats(data["category_id"])
+    
+    return report, category_stats
+
+
+def _report_file_import(task: asyncio.Task, progress: ProgressMessage, data: dict):
+    """Показать администратору итог импорта после его завершения"""
+    if task.cancelled():
+        return
+    
+    category_id = data["category_id"]
+    error = task.exception()
+    if error is not None:
+        logger.error(f"Error importing file {data.get('file_name')}: {error}")
+        start_background(progress.update(
+            f"❌ <b>Ошибка импорта</b>\n\n{html.escape(str(error))}\n\n"
+            f"Товары из уже обработанных частей файла сохранены.",
+            reply_markup=warehouse_error_recovery_kb(category_id, action_type="mass_add"),
+            force=True
+        ), name="file_import_report")
+        return
+    
+    report, category_stats = task.result()
+    
+    text = "✅ <b>Импорт из файла завершен!</b>\n\n" if report['successful'] else "❌ <b>Товары не добавлены</b>\n\n"
+    text += f"📎 Файл: {data.get('file_name')}\n"
+    text += f"📋 Обработано строк: {report['total_lines']}\n"
+    text += f"✅ Добавлено товаров: <b>{report['successful']}</b>\n"
+    if report['empty_lines'] > 0:
+        text += f"📄 Пустых строк: {report['empty_lines']}\n"
+    if report['duplicates'] > 0:
+        text += f"🔄 Дубликатов: {report['duplicates']}\n"
+    if report['invalid_format'] > 0:
+        text += f"❌ Неверный формат: {report['invalid_format']}\n"
+    
+    if report['errors']:
+        text += f"\n⚠️ <b>Подробности ошибок ({report['errors_total']}):</b>\n"
+        for error in report['errors'][:5]:
+            text += f"• {error}\n"
+        if report['errors_total'] > 5:
+            text += f"• ... и еще {report['errors_total'] - 5} ошибок\n"
+    
+    start_background(progress.update(
+        text,
+        reply_markup=warehouse_category_action_complete_kb(category_id, action_type="add", category_stats=category_stats),
+        force=True
+    ), name="file_import_report")
+
+
+# ========== ЭКСПОРТ ==========
+
+async def _send_export(message: Message, bot: Bot, kind: str, fmt: str):
+    """Запустить выгрузку в фоне: файл формируется и отправляется без участия обработчика"""
+    status = await message.answer(
+        WarehouseMessages.EXPORT_STARTED.format(kind=EXPORT_KINDS[kind], fmt=fmt.upper())
+    )
+    
+    # Выгрузка и отправка большого файла идут в фоне в своей сессии БД: обработчик
+    # не держит соединение и не задерживает следующие апдейты чата администратора
+    task = start_background(
+        _export_file(bot, message.chat.id, kind, fmt),
+        name=f"export_{kind}_{message.chat.id}"
+    )
+    task.add_done_callback(lambda done: _report_export(done, status, kind))
+
+
+async def _export_file(bot: Bot, chat_id: int, kind: str, fmt: str) -> Optional[str]:
+    """
+    Сформировать выгрузку во временном файле и отправить ее документом
+    
+    Returns:
+        Текст для статусного сообщения, если файл не отправлен, иначе None
+    """
+    async with async_session() as session:
+        path, rows_total = await ExportService(session).export_to_temp_file(kind, fmt)
+    
+    try:
+        size = os.path.getsize(path)
+        limit = export_upload_limit(bot)
+        if size > limit:
+            return WarehouseMessages.EXPORT_TOO_LARGE.format(
+                size=_format_file_size(size), limit=_format_file_size(limit)
+            )
+        
+        await bot.send_document(
+            chat_id,
+            FSInputFile(path, filename=export_file_name(kind, fmt)),
+            caption=WarehouseMessages.EXPORT_DONE.format(
+                kind=EXPORT_KINDS[kind], rows=rows_total, size=_format_file_size(size)
+            )
+        )
+        return None
+    finally:
+        os.unlink(path)
+
+
+def _report_export(task: asyncio.Task, status: Message, kind: str):
+    """Убрать статусное сообщение после отправки файла или показать в нем причину неудачи"""
+    if task.cancelled():
+        return
+    
+    error = task.exception()
+    if error is not None:
+        logger.error(f"Error exporting {kind}: {error}")
+        text = f"❌ Ошибка выгрузки: {html.escape(str(error))}"
+    else:
+        text = task.result()
+    
+    start_background(_finish_export_status(status, text), name="export_report")
+
+
+async def _finish_export_status(status: Message, text: Optional[str]):
+    """Удалить статус выгрузки или заменить его текстом итога"""
+    if text is None:
+        await status.delete()
+    else:
+        await status.edit_text(text, reply_markup=back_to_warehouse_kb())
+
+
+@warehouse_router.callback_query(CallbackPattern.exact("warehouse_export"))
+async def warehouse_export_menu_callback(callback: CallbackQuery):
+    """Меню экспорта склада и продаж"""
+    if not is_admin(callback.from_user.id):
+        await callback.answer("❌ У вас нет прав доступа", show_alert=True)
+        return
+    
+    await callback.message.edit_text(
+        WarehouseMessages.EXPORT_MENU,
+        reply_markup=warehouse_export_kb()
+    )
+    await callback.answer()
+
+
+@warehouse_router.callback_query(CallbackPattern.prefix("warehouse_export_"))
+async def warehouse_export_callback(callback: CallbackQuery, bot: Bot):
+    """Выгрузить выбранные данные"""
+    if not is_admin(callback.from_user.id):
+        await callback.answer("❌ У вас нет прав доступа", show_alert=True)
+        return
+    
+    kind, _, fmt = callback.data.removeprefix("warehouse_export_").rpartition("_")
+    if kind not in EXPORT_KINDS or fmt not in EXPORT_FORMATS:
+        await callback.answer("❌ Неизвестный формат выгрузки", show_alert=True)
+        return
+    
+    await callback.answer("⏳ Формирую файл...")
+    await _send_export(callback.message, bot, kind, fmt)
+
+
+@warehouse_router.message(Command("export"))
+async def export_command(message: Message, command: CommandObject, bot: Bot):
+    """Команда /export [products|stock|orders] [csv|jsonl]"""
+    if not is_admin(message.from_user.id):
+        await message.answer("❌ У вас нет прав доступа")
+        return
+    
+    args = (command.args or "").lower().split()
+    if not args:
+        await message.answer(WarehouseMessages.EXPORT_MENU, reply_markup=warehouse_export_kb())
+        return
+    
+    kind = args[0]
+    fmt = args[1] if len(args) > 1 else "csv"
+    if kind not in EXPORT_KINDS or fmt not in EXPORT_FORMATS:
+        await message.answer(
+            "❌ Использование: <code>/export products|stock|orders [csv|jsonl]</code>"
+        )
+        return
+    
+    await _send_export(message, bot, kind, fmt)
+
+
+# ========== СЧЕТЧИКИ КАТЕГОРИЙ ==========
+
+@warehouse_router.message(Command("counters"))
+async def counters_command(message: Message, command: CommandObject, session: AsyncSession):
+    """Команда /counters [repair] - сверка счетчиков остатков категорий с товарами"""
+    if not is_admin(message.from_user.id):
+        await message.answer("❌ У вас нет прав доступа")
+        return
+    
+    repair = (command.args or "").strip().lower() == "repair"
+    report = await CategoryCounterService(session).verify(repair=repair)
+    
+    if report["ok"]:
+        await message.answer(WarehouseMessages.COUNTERS_OK)
+        return
+    
+    categories = "\n".join(
+        f"📂 {item['name']} (#{item['id']}): "
+        f"доступно {item['stored']['available_products']} → {item['actual']['available_products']}, "
+        f"остаток {item['stored']['total_stock']} → {item['actual']['total_stock']}"
+        for item in report["drift"][:20]
+    )
+    template = WarehouseMessages.COUNTERS_REPAIRED if report["repaired"] else WarehouseMessages.COUNTERS_DRIFT
+    await message.answer(template.format(categories=categories))
+
+
 # ========== БЫСТРОЕ ДОБАВЛЕНИЕ ТОВАРА ==========
 
-@warehouse_router.callback_query(F.data == "warehouse_quick_add")
+@warehouse_router.callback_query(CallbackPattern.exact("warehouse_quick_add"))
 async def start_quick_add(callback: CallbackQuery, state: FSMContext, session: AsyncSession):
     """Начать быстрое добавление товара"""
     if not is_admin(callback.from_user.id):
@@ -1036,10 +1641,9 @@ async def start_quick_add(callback: CallbackQuery, state: FSMContext, session: A
     await callback.answer()
 
 
-@warehouse_router.callback_query(F.data.startswith("warehouse_select_category_"), WarehouseQuickAddStates.waiting_for_category)
-async def quick_add_select_category(callback: CallbackQuery, state: FSMContext):
+@warehouse_router.callback_query(CallbackPattern.prefix("warehouse_select_category_", category_id=int), WarehouseQuickAddStates.waiting_for_category)
+async def quick_add_select_category(callback: CallbackQuery, state: FSMContext, category_id: int):
     """Выбрать категорию для быстрого добавления"""
-    category_id = int(callback.data.split("_")[-1])
     
     await state.update_data(category_id=category_id)
     await state.set_state(WarehouseQuickAddStates.waiting_for_all_data)
@@ -1121,7 +1725,7 @@ async def quick_add_enter_data(message: Message, state: FSMContext, session: Asy
 
 # ========== БЫСТРАЯ ВЫДАЧА ТОВАРА (ОБЪЕДИНЕННАЯ) ==========
 
-@warehouse_router.callback_query(F.data == "warehouse_quick_give")
+@warehouse_router.callback_query(CallbackPattern.exact("warehouse_quick_give"))
 async def start_quick_give(callback: CallbackQuery, state: FSMContext, session: AsyncSession):
     """Начать быструю выдачу товара - объединенный интерфейс"""
     if not is_admin(callback.from_user.id):
@@ -1142,11 +1746,52 @@ async def start_quick_give(callback: CallbackQuery, state: FSMContext, session:
     await callback.answer()
 
 
+# Сколько найденных товаров показывать в быстрой выдаче
+QUICK_GIVE_SEARCH_LIMIT = 10
+
+
+async def _quick_give_choose_product(message: Message, state: FSMContext, product, title: str):
+    """Запомнить выбранный товар и перейти к вводу получателя"""
+    state_data = await state.get_data()
+    state_data.pop("found_products", None)
+    state_data["product_id"] = product.id
+    await state.set_data(state_data)
+    await state.set_state(WarehouseQuickGiveStates.waiting_for_user)
+    
+    stock_display = "∞" if product.is_unlimited else str(product.stock_quantity)
+    
+    await message.answer(
+        f"✅ <b>{title}:</b>\n\n"
+        f"📦 <b>Название:</b> {product.name}\n"
+        f"💰 <b>Цена:</b> {product.price:.2f}₽\n"
+        f"📊 <b>Остаток:</b> {stock_display} шт.\n\n"
+        f"👤 Введите username пользователя (без @) или его Telegram ID:",
+        reply_markup=cancel_kb()
+    )
+
+
 @warehouse_router.message(WarehouseQuickGiveStates.waiting_for_search)
 async def quick_give_search_product(message: Message, state: FSMContext, session: AsyncSession):
     """Поиск товара для быстрой выдачи"""
     search_text = message.text.strip()
     warehouse_service = WarehouseService(session)
+    data = await state.get_data()
+    found_products = data.get("found_products") or []
+    
+    # Номер товара из показанного списка
+    if found_products and search_text.isdigit():
+        product_index = int(search_text) - 1
+        if not 0 <= product_index < len(found_products):
+            await message.answer("❌ Неверный номер товара. Попробуйте еще раз:", reply_markup=cancel_kb())
+            return
+        
+        product = await warehouse_service.get_product_with_category(found_products[product_index])
+        if not product or not product.is_active or (not product.is_unlimited and product.stock_quantity <= 0):
+            await message.answer("❌ Товар не найден или закончился. Попробуйте еще раз:", reply_markup=cancel_kb())
+            return
+        
+        await _quick_give_choose_product(message, state, product, "Выбран товар")
+        return
     
     # Поиск товаров
     if search_text.startswith("#"):
@@ -1160,10 +1805,12 @@ async def quick_give_search_product(message: Message, state: FSMContext, session
                 products = []
         except ValueError:
             products = []
+        total = len(products)
     else:
-        # Поиск по названию
-        all_products = await warehouse_service.get_available_products()
-        products = [p for p in all_products if search_text.lower() in p.name.lower()]
+        # Поиск по названию: фильтр, сортировка и LIMIT выполняются в БД
+        products, total = await warehouse_service.search_available_products(
+            search_text, limit=QUICK_GIVE_SEARCH_LIMIT
+        )
     
     if not products:
         await message.answer(
@@ -1174,38 +1821,23 @@ async def quick_give_search_product(message: Message, state: FSMContext, session
         return
     
     # Если найден только один товар - переходим к выбору пользователя
-    if len(products) == 1:
-        product = products[0]
-        await state.update_data(product_id=product.id)
-        await state.set_state(WarehouseQuickGiveStates.waiting_for_user)
-        
-        stock_display = "∞" if product.is_unlimited else str(product.stock_quantity)
-        
-        await message.answer(
-            f"✅ <b>Найден товар:</b>\n\n"
-            f"📦 <b>Название:</b> {product.name}\n"
-            f"💰 <b>Цена:</b> {product.price:.2f}₽\n"
-            f"📊 <b>Остаток:</b> {stock_display} шт.\n\n"
-            f"👤 Введите username пользователя (без @) или его Telegram ID:",
-            reply_markup=cancel_kb()
-        )
+    if total == 1:
+        await _quick_give_choose_product(message, state, products[0], "Найден товар")
         return
     
     # Если найдено несколько товаров - показываем список
-    await state.set_state(WarehouseQuickGiveStates.waiting_for_search)
-    
-    text = f"🔍 <b>Найдено товаров: {len(products)}</b>\n\n"
-    for i, product in enumerate(products[:10], 1):  # Показываем максимум 10
+    text = f"🔍 <b>Найдено товаров: {total}</b>\n\n"
+    for i, product in enumerate(products, 1):
         stock_display = "∞" if product.is_unlimited else str(product.stock_quantity)
         text += f"{i}. <b>{product.name}</b> (#{product.id})\n"
         text += f"   💰 {product.price:.2f}₽ • 📊 {stock_display} шт.\n\n"
     
-    if len(products) > 10:
-        text += f"... и еще {len(products) - 10} товаров\n\n"
+    if total > len(products):
+        text += f"... и еще {total - len(products)} товаров, уточните запрос\n\n"
     
     text += "Введите <b>номер товара</b> или <b>ID</b> для выдачи:"
     
-    # Сохраняем список найденных товаров
+    # Сохраняем только показанные товары - номер из списка выбирает один из них
     await state.update_data(found_products=[p.id for p in products])
     
     await message.answer(text, reply_markup=cancel_kb())
@@ -1216,59 +1848,6 @@ async def quick_give_select_user(message: Message, state: FSMContext, session: A
     """Выбор пользователя для быстрой выдачи"""
     data = await state.get_data()
     
-    # Если это номер товара из списка или повторный поиск
-    if "found_products" in data:
-        try:
-            # Пробуем распарсить как номер товара из списка
-            if message.text.strip().isdigit():
-                product_index = int(message.text.strip()) - 1
-                if 0 <= product_index < len(data["found_products"]):
-                    product_id = data["found_products"][product_index]
-                    await state.update_data(product_id=product_id)
-                    # Удаляем список найденных товаров
-                    state_data = await state.get_data()
-                    state_data.pop("found_products", None)
-                    await state.set_data(state_data)
-                else:
-                    await message.answer("❌ Неверный номер товара. Попробуйте еще раз:", reply_markup=cancel_kb())
-                    return
-            elif message.text.strip().startswith("#"):
-                # Поиск по ID
-                product_id = int(message.text.strip()[1:])
-                await state.update_data(product_id=product_id)
-                # Удаляем список найденных товаров
-                state_data = await state.get_data()
-                state_data.pop("found_products", None)
-                await state.set_data(state_data)
-            else:
-                await message.answer("❌ Введите номер товара из списка или ID товара (например: #123):", reply_markup=cancel_kb())
-                return
-                
-            # Получаем выбранный товар
-            warehouse_service = WarehouseService(session)
-            product = await warehouse_service.get_product_with_category(product_id)
-            
-            if not product or (not product.is_unlimited and product.stock_quantity <= 0):
-                await message.answer("❌ Товар не найден или закончился. Попробуйте еще раз:", reply_markup=cancel_kb())
-                await state.set_state(WarehouseQuickGiveStates.waiting_for_search)
-                return
-            
-            stock_display = "∞" if product.is_unlimited else str(product.stock_quantity)
-            
-            await message.answer(
-                f"✅ <b>Выбран товар:</b>\n\n"
-                f"📦 <b>Название:</b> {product.name}\n"
-                f"💰 <b>Цена:</b> {product.price:.2f}₽\n"
-                f"📊 <b>Остаток:</b> {stock_display} шт.\n\n"
-                f"👤 Введите username пользователя (без @) или его Telegram ID:",
-                reply_markup=cancel_kb()
-            )
-            return
-            
-        except (ValueError, IndexError):
-            await message.answer("❌ Неверный формат. Введите номер товара из списка:", reply_markup=cancel_kb())
-            return
-    
     # Поиск пользователя
     identifier = message.text.strip()
     warehouse_service = WarehouseService(session)
@@ -1314,7 +1893,7 @@ async def quick_give_select_user(message: Message, state: FSMContext, session: A
     )
 
 
-@warehouse_router.callback_query(F.data == "warehouse_confirm_give_product", WarehouseQuickGiveStates.waiting_for_confirmation)
+@warehouse_router.callback_query(CallbackPattern.exact("warehouse_confirm_give_product"), WarehouseQuickGiveStates.waiting_for_confirmation)
 async def confirm_quick_give_product(callback: CallbackQuery, state: FSMContext, session: AsyncSession):
     """Подтвердить быструю выдачу товара"""
     
@@ -1402,17 +1981,14 @@ async def confirm_quick_give_product(callback: CallbackQuery, state: FSMContext,
 # Используется warehouse_all_products_callback на строке 2537
 
 
-@warehouse_router.callback_query(F.data.startswith("warehouse_all_products_page_"))
-async def warehouse_all_products_page_handler(callback: CallbackQuery, session: AsyncSession):
+@warehouse_router.callback_query(CallbackPattern.prefix("warehouse_all_products_page_", page=int))
+async def warehouse_all_products_page_handler(callback: CallbackQuery, session: AsyncSession, page: int):
     """Обработчик пагинации для страницы всех товаров"""
     if not is_admin(callback.from_user.id):
         await callback.answer("❌ У вас нет прав доступа", show_alert=True)
         return
     
     try:
-        # Получаем номер страницы из callback_data
-        page = int(callback.data.split("_")[-1])
-        
         warehouse_service = WarehouseService(session)
         products = await warehouse_service.get_available_products()
         
@@ -1439,7 +2015,7 @@ async def warehouse_all_products_page_handler(callback: CallbackQuery, session:
 
 # ========== КОМПАКТНОЕ ОТОБРАЖЕНИЕ ТОВАРОВ ПО КАТЕГОРИЯМ ==========
 
-@warehouse_router.callback_query(F.data == "warehouse_all_products_compact")
+@warehouse_router.callback_query(CallbackPattern.exact("warehouse_all_products_compact"))
 async def warehouse_all_products_compact(callback: CallbackQuery, session: AsyncSession):
     """Показать компактное отображение всех товаров по категориям"""
     if not is_admin(callback.from_user.id):
@@ -1491,22 +2067,27 @@ async def warehouse_all_products_compact(callback: CallbackQuery, session: Async
 
 # ========== ОБРАБОТКА НЕДЕЙСТВИТЕЛЬНЫХ CALLBACK'ОВ ==========
 
-@warehouse_router.callback_query(F.data.startswith("warehouse_category_products_"))
+@warehouse_router.callback_query(CallbackPattern.prefix("warehouse_category_products_"))
 async def warehouse_category_products_redirect(callback: CallbackQuery, session: AsyncSession):
-    """Перенаправление со старого callback на новый для избежания зависших меню"""
+    """
+    Перенаправление со старого callback на новый для избежания зависших меню
+    
+    Более длинные префиксы (warehouse_category_products_with_stock_) таблица
+    callback'ов проверяет раньше, сюда они попадают, только если не разобрались.
+    """
     if not is_admin(callback.from_user.id):
         await callback.answer("❌ У вас нет прав доступа", show_alert=True)
         return
         
     try:
-        # Парсим старый callback и перенаправляем на новый
-        parts = callback.data.split("_")
-        category_id = int(parts[3])
-        page = int(parts[4]) if len(parts) > 4 else 0
+        # Старый формат: warehouse_category_products_{category_id}[_{page}].
+        # Остальное (неизвестные и испорченные кнопки) - обновление меню ниже
+        params = CallbackPattern.prefix("warehouse_category_products_", category_id=int, page=0).parse(callback.data)
+        if not params:
+            raise ValueError(f"Invalid callback format: {callback.data}")
         
         # Перенаправляем на новый обработчик
-        callback.data = f"warehouse_show_category_{category_id}_{page}"
-        await warehouse_show_category_handler(callback, session)
+        await warehouse_show_category_handler(callback, session, **params)
         
     except (ValueError, IndexError) as e:
         logger.error(f"Error redirecting old callback: {e}")
@@ -1524,14 +2105,13 @@ async def warehouse_category_products_redirect(callback: CallbackQuery, session:
 
 # ========== БЫСТРАЯ ВЫДАЧА ОТДЕЛЬНОГО ТОВАРА ==========
 
-@warehouse_router.callback_query(F.data.startswith("warehouse_give_single_"))
-async def give_single_product(callback: CallbackQuery, state: FSMContext, session: AsyncSession):
+@warehouse_router.callback_query(CallbackPattern.prefix("warehouse_give_single_", product_id=int))
+async def give_single_product(callback: CallbackQuery, state: FSMContext, session: AsyncSession, product_id: int):
     """Быстрая выдача конкретного товара"""
     if not is_admin(callback.from_user.id):
         await callback.answer("❌ У вас нет прав доступа", show_alert=True)
         return
     
-    product_id = int(callback.data.split("_")[-1])
     warehouse_service = WarehouseService(session)
     
     product = await warehouse_service.get_product_with_category(product_id)
@@ -1568,14 +2148,13 @@ async def give_single_product(callback: CallbackQuery, state: FSMContext, sessio
 
 # ========== РЕДАКТИРОВАНИЕ ТОВАРА ==========
 
-@warehouse_router.callback_query(F.data.startswith("warehouse_edit_"))
-async def start_edit_product(callback: CallbackQuery, state: FSMContext, session: AsyncSession):
+@warehouse_router.callback_query(CallbackPattern.prefix("warehouse_edit_", product_id=int))
+async def start_edit_product(callback: CallbackQuery, state: FSMContext, session: AsyncSession, product_id: int):
     """Начать редактирование товара"""
     if not is_admin(callback.from_user.id):
         await callback.answer("❌ У вас нет прав доступа", show_alert=True)
         return
     
-    product_id = int(callback.data.split("_")[-1])
     warehouse_service = WarehouseService(session)
     
     product = await warehouse_service.get_product_with_category(product_id)
@@ -1612,10 +2191,9 @@ async def start_edit_product(callback: CallbackQuery, state: FSMContext, session
     await callback.answer()
 
 
-@warehouse_router.callback_query(F.data.startswith("edit_field_"), WarehouseEditProductStates.waiting_for_field_selection)
-async def select_edit_field(callback: CallbackQuery, state: FSMContext, session: AsyncSession):
+@warehouse_router.callback_query(CallbackPattern.prefix("edit_field_", field=str), WarehouseEditProductStates.waiting_for_field_selection)
+async def select_edit_field(callback: CallbackQuery, state: FSMContext, session: AsyncSession, field: str):
     """Выбрать поле для редактирования"""
-    field = callback.data.split("_")[-1]
     data = await state.get_data()
     product_id = data.get("product_id")
     
@@ -1707,10 +2285,9 @@ async def edit_product_name(message: Message, state: FSMContext, session: AsyncS
     await confirm_product_edit(message, state, session)
 
 
-@warehouse_router.callback_query(F.data.startswith("edit_type_"), WarehouseEditProductStates.waiting_for_type)
-async def edit_product_type(callback: CallbackQuery, state: FSMContext, session: AsyncSession):
+@warehouse_router.callback_query(CallbackPattern.prefix("edit_type_", new_type=str), WarehouseEditProductStates.waiting_for_type)
+async def edit_product_type(callback: CallbackQuery, state: FSMContext, session: AsyncSession, new_type: str):
     """Редактировать тип товара"""
-    new_type = callback.data.split("_")[-1]
     
     await state.update_data(new_type=new_type)
     await confirm_product_edit(callback.message, state, session)
@@ -1879,7 +2456,7 @@ async def confirm_product_edit(message: Message, state: FSMContext, session: Asy
     )
 
 
-@warehouse_router.callback_query(F.data == "warehouse_confirm_edit_product", WarehouseEditProductStates.waiting_for_confirmation)
+@warehouse_router.callback_query(CallbackPattern.exact("warehouse_confirm_edit_product"), WarehouseEditProductStates.waiting_for_confirmation)
 async def confirm_edit_product(callback: CallbackQuery, state: FSMContext, session: AsyncSession):
     """Подтвердить редактирование товара"""
     data = await state.get_data()
@@ -1942,16 +2519,14 @@ async def confirm_edit_product(callback: CallbackQuery, state: FSMContext, sessi
 
 # ========== УДАЛЕНИЕ ТОВАРА ==========
 
-@warehouse_router.callback_query(F.data.startswith("warehouse_delete_"))
-async def delete_product_confirm(callback: CallbackQuery, session: AsyncSession):
+@warehouse_router.callback_query(CallbackPattern.prefix("warehouse_delete_", product_id=int))
+async def delete_product_confirm(callback: CallbackQuery, session: AsyncSession, product_id: int):
     """Подтверждение удаления товара"""
     if not is_admin(callback.from_user.id):
         await callback.answer("❌ У вас нет прав доступа", show_alert=True)
         return
     
     try:
-        # Парсим product_id
-        product_id = int(callback.data.split("_")[-1])
         logger.info(f"Admin {callback.from_user.id} requested deletion of product {product_id}")
         
         warehouse_service = WarehouseService(session)
@@ -2006,19 +2581,14 @@ async def delete_product_confirm(callback: CallbackQuery, session: AsyncSession)
         await callback.answer("❌ Произошла ошибка при подготовке к удалению", show_alert=True)
 
 
-@warehouse_router.callback_query(F.data.startswith("warehouse_confirm_delete_"))
-async def confirm_delete_product(callback: CallbackQuery, session: AsyncSession):
+@warehouse_router.callback_query(CallbackPattern.prefix("warehouse_confirm_delete_", product_id=int, category_id=int))
+async def confirm_delete_product(callback: CallbackQuery, session: AsyncSession, product_id: int, category_id: int):
     """Окончательное удаление товара"""
     if not is_admin(callback.from_user.id):
         await callback.answer("❌ У вас нет прав доступа", show_alert=True)
         return
     
     try:
-        # Парсим callback_data: warehouse_confirm_delete_{product_id}_{category_id}
-        parts = callback.data.split("_")
-        product_id = int(parts[-2])  # предпоследний элемент - product_id
-        category_id = int(parts[-1])  # последний элемент - category_id
-        
         logger.info(f"Admin {callback.from_user.id} confirmed deletion of product {product_id}")
         
         warehouse_service = WarehouseService(session)
@@ -2031,8 +2601,7 @@ async def confirm_delete_product(callback: CallbackQuery, session: AsyncSession)
             
             # Пытаемся вернуться к категории, если знаем category_id
             if category_id:
-                callback.data = f"warehouse_show_category_{category_id}_0"
-                await warehouse_show_category_handler(callback, session)
+                await warehouse_show_category_handler(callback, session, category_id)
             else:
                 # Возвращаемся к списку всех категорий
                 category_stats = await warehouse_service.get_category_stats()
@@ -2110,7 +2679,7 @@ async def confirm_delete_product(callback: CallbackQuery, session: AsyncSession)
 
 # ========== ОБЩИЕ ОБРАБОТЧИКИ ==========
 
-@warehouse_router.callback_query(F.data == "warehouse_cancel")
+@warehouse_router.callback_query(CallbackPattern.exact("warehouse_cancel"))
 async def cancel_warehouse_action(callback: CallbackQuery, state: FSMContext):
     """Отменить текущее действие на складе"""
     await state.clear()
@@ -2128,7 +2697,7 @@ async def cancel_warehouse_action(callback: CallbackQuery, state: FSMContext):
 
 # ========== НОВЫЕ МЕНЮ И МАСТЕРЫ ==========
 
-@warehouse_router.callback_query(F.data == "warehouse_add_menu")
+@warehouse_router.callback_query(CallbackPattern.exact("warehouse_add_menu"))
 async def warehouse_add_menu_callback(callback: CallbackQuery):
     """Показать улучшенное меню способов добавления товаров"""
     if not is_admin(callback.from_user.id):
@@ -2148,7 +2717,7 @@ async def warehouse_add_menu_callback(callback: CallbackQuery):
     await callback.answer()
 
 
-@warehouse_router.callback_query(F.data == "warehouse_give_menu")
+@warehouse_router.callback_query(CallbackPattern.exact("warehouse_give_menu"))
 async def warehouse_give_menu_callback(callback: CallbackQuery):
     """Показать объединенное меню выдачи товаров"""
     if not is_admin(callback.from_user.id):
@@ -2168,7 +2737,7 @@ async def warehouse_give_menu_callback(callback: CallbackQuery):
     await callback.answer()
 
 
-@warehouse_router.callback_query(F.data == "warehouse_quick_master")
+@warehouse_router.callback_query(CallbackPattern.exact("warehouse_quick_master"))
 async def warehouse_quick_master_callback(callback: CallbackQuery):
     """Показать быстрый мастер"""
     if not is_admin(callback.from_user.id):
@@ -2188,15 +2757,13 @@ async def warehouse_quick_master_callback(callback: CallbackQuery):
 
 # ========== БЫСТРЫЕ ДЕЙСТВИЯ ДЛЯ КАТЕГОРИЙ ==========
 
-@warehouse_router.callback_query(F.data.startswith("warehouse_add_to_category_"))
-async def add_to_category_callback(callback: CallbackQuery, state: FSMContext, session: AsyncSession):
+@warehouse_router.callback_query(CallbackPattern.prefix("warehouse_add_to_category_", category_id=int))
+async def add_to_category_callback(callback: CallbackQuery, state: FSMContext, session: AsyncSession, category_id: int):
     """Добавить товар в конкретную категорию (быстрый путь)"""
     if not is_admin(callback.from_user.id):
         await callback.answer("❌ У вас нет прав доступа", show_alert=True)
         return
         
-    category_id = int(callback.data.split("_")[-1])
-    
     # Проверяем, что категория существует
     warehouse_service = WarehouseService(session)
     category = await warehouse_service.get_category_by_id(category_id)
@@ -2222,15 +2789,13 @@ async def add_to_category_callback(callback: CallbackQuery, state: FSMContext, s
     await callback.answer()
 
 
-@warehouse_router.callback_query(F.data.startswith("warehouse_mass_add_to_category_"))
-async def mass_add_to_category_callback(callback: CallbackQuery, state: FSMContext, session: AsyncSession):
+@warehouse_router.callback_query(CallbackPattern.prefix("warehouse_mass_add_to_category_", category_id=int))
+async def mass_add_to_category_callback(callback: CallbackQuery, state: FSMContext, session: AsyncSession, category_id: int):
     """Массовое добавление в конкретную категорию (быстрый путь)"""
     if not is_admin(callback.from_user.id):
         await callback.answer("❌ У вас нет прав доступа", show_alert=True)
         return
         
-    category_id = int(callback.data.split("_")[-1])
-    
     # Проверяем, что категория существует
     warehouse_service = WarehouseService(session)
     category = await warehouse_service.get_category_by_id(category_id)
@@ -2256,15 +2821,13 @@ async def mass_add_to_category_callback(callback: CallbackQuery, state: FSMConte
     await callback.answer()
 
 
-@warehouse_router.callback_query(F.data.startswith("warehouse_quick_add_to_category_"))
-async def quick_add_to_category_callback(callback: CallbackQuery, state: FSMContext, session: AsyncSession):
+@warehouse_router.callback_query(CallbackPattern.prefix("warehouse_quick_add_to_category_", category_id=int))
+async def quick_add_to_category_callback(callback: CallbackQuery, state: FSMContext, session: AsyncSession, category_id: int):
     """Быстрое добавление в конкретную категорию"""
     if not is_admin(callback.from_user.id):
         await callback.answer("❌ У вас нет прав доступа", show_alert=True)
         return
         
-    category_id = int(callback.data.split("_")[-1])
-    
     # Проверяем, что категория существует
     warehouse_service = WarehouseService(session)
     category = await warehouse_service.get_category_by_id(category_id)
@@ -2303,39 +2866,49 @@ async def quick_add_to_category_callback(callback: CallbackQuery, state: FSMCont
 
 # ========== ЗАГЛУШКИ ДЛЯ НОВЫХ ФУНКЦИЙ ==========
 
-@warehouse_router.callback_query(F.data == "warehouse_import_file")
-async def warehouse_import_file_callback(callback: CallbackQuery):
-    """Заглушка для импорта из файла"""
-    await callback.answer("🚧 Функция в разработке. Скоро будет доступна!", show_alert=True)
+@warehouse_router.callback_query(CallbackPattern.exact("warehouse_import_file"))
+async def warehouse_import_file_callback(callback: CallbackQuery, state: FSMContext, session: AsyncSession):
+    """Импорт товаров из файла: мастер массового добавления с загрузкой документа"""
+    if not is_admin(callback.from_user.id):
+        await callback.answer("❌ У вас нет прав доступа", show_alert=True)
+        return
+    
+    if not await check_categories_exist(callback, session):
+        return
+    
+    warehouse_service = WarehouseService(session)
+    categories = await warehouse_service.get_categories()
+    
+    await state.set_state(WarehouseMassAddStates.waiting_for_category)
+    
+    await callback.message.edit_text(
+        WarehouseMessages.IMPORT_FILE_START,
+        reply_markup=warehouse_categories_select_kb(categories)
+    )
+    await callback.answer()
 
 
 
-@warehouse_router.callback_query(F.data == "warehouse_search_product")
+@warehouse_router.callback_query(CallbackPattern.exact("warehouse_search_product"))
 async def warehouse_search_product_callback(callback: CallbackQuery):
     """Заглушка для поиска товара"""
     await callback.answer("🚧 Используйте 'Быстрая выдача' для поиска товаров", show_alert=True)
 
 
-@warehouse_router.callback_query(F.data == "warehouse_find_user")
+@warehouse_router.callback_query(CallbackPattern.exact("warehouse_find_user"))
 async def warehouse_find_user_callback(callback: CallbackQuery):
     """Заглушка для поиска пользователя"""
     await callback.answer("🚧 Используйте 'Быстрая выдача' для поиска пользователей", show_alert=True)
 
 
-@warehouse_router.callback_query(F.data == "warehouse_mass_give")
-async def warehouse_mass_give_callback(callback: CallbackQuery):
-    """Заглушка для массовой выдачи"""
-    await callback.answer("🚧 Функция в разработке. Скоро будет доступна!", show_alert=True)
-
-
-@warehouse_router.callback_query(F.data == "warehouse_management")
+@warehouse_router.callback_query(CallbackPattern.exact("warehouse_management"))
 async def warehouse_management_callback(callback: CallbackQuery):
     """Заглушка для управления складом"""
     await callback.answer("🚧 Дополнительные функции управления в разработке!", show_alert=True)
 
 
 # Обработчики кнопок "нет товаров" и других служебных
-@warehouse_router.callback_query(F.data == "warehouse_no_products")
+@warehouse_router.callback_query(CallbackPattern.exact("warehouse_no_products"))
 async def no_products_handler(callback: CallbackQuery):
     """Обработчик для случая отсутствия товаров"""
     await callback.answer("❌ Нет доступных товаров", show_alert=True)
@@ -2343,24 +2916,20 @@ async def no_products_handler(callback: CallbackQuery):
 
 # ========== НОВАЯ НАВИГАЦИЯ ПО КАТЕГОРИЯМ ==========
 
-@warehouse_router.callback_query(F.data.startswith("warehouse_show_category_"))
-async def warehouse_show_category_handler(callback: CallbackQuery, session: AsyncSession):
+@warehouse_router.callback_query(CallbackPattern.prefix("warehouse_show_category_", category_id=int, page=0))
+async def warehouse_show_category_handler(callback: CallbackQuery, session: AsyncSession, category_id: int, page: int = 0):
     """Показать товары в выбранной категории - компактное отображение"""
     if not is_admin(callback.from_user.id):
         await callback.answer("❌ У вас нет прав доступа", show_alert=True)
         return
     
     try:
-        # Парсим callback data: warehouse_show_category_{category_id} или warehouse_show_category_{category_id}_{page}
-        parts = callback.data.split("_")
-        category_id = int(parts[3])
-        page = int(parts[4]) if len(parts) > 4 else 0
         
         warehouse_service = WarehouseService(session)
         
-        # Получаем категорию
-        category = await warehouse_service.get_category_by_id(category_id)
-        if not category:
+        # Получаем категорию вместе со счетчиками остатков
+        summary = await warehouse_service.get_category_stock_summary(category_id)
+        if not summary:
             await callback.message.edit_text(
                 "❌ <b>Категория не найдена</b>\n\nВозможно, категория была удалена.",
                 reply_markup=back_to_warehouse_kb()
@@ -2368,13 +2937,18 @@ async def warehouse_show_category_handler(callback: CallbackQuery, session: Asyn
             await callback.answer("❌ Категория не найдена", show_alert=True)
             return
         
-        # Получаем товары в категории
-        products = await warehouse_service.get_products_by_category(category_id)
+        # В списке категории показываются только товары в наличии
+        available_count = summary['available_products']
+        total_stock = summary['total_stock']
+        unlimited_count = summary['unlimited_products']
         
-        # Подсчитываем статистику для категории
-        available_count = sum(1 for p in products if p.is_unlimited or p.stock_quantity > 0)
-        total_stock = sum(p.stock_quantity for p in products if not p.is_unlimited)
-        unlimited_count = sum(1 for p in products if p.is_unlimited)
+        per_page = 10  # Стандартная пагинация - 10 товаров на страницу
+        total_pages = max((available_count + per_page - 1) // per_page, 1)
+        page = min(page, total_pages - 1)
+        
+        # Загружаем только текущую страницу
+        products = await warehouse_service.get_category_products_page(category_id, page, per_page)
+        current_page_count = len(products)
         
         stock_display = ""
         if unlimited_count > 0:
@@ -2388,18 +2962,10 @@ async def warehouse_show_category_handler(callback: CallbackQuery, session: Asyn
         if not stock_display:
             stock_display = "0"
         
-        per_page = 10  # Стандартная пагинация - 10 товаров на страницу
-        total_pages = (len(products) + per_page - 1) // per_page if products else 1
-        
-        # Вычисляем границы для текущей страницы
-        start = page * per_page
-        end = min(start + per_page, len(products))
-        current_page_count = end - start if products else 0
-        
         text = (
-            f"📂 <b>Категория: {category.name}</b>\n\n"
+            f"📂 <b>Категория: {summary['name']}</b>\n\n"
             f"📊 <b>Статистика:</b>\n"
-            f"• Всего товаров: {len(products)}\n"
+            f"• Всего товаров: {summary['total_products']}\n"
             f"• Доступно: {available_count}\n"
             f"• Остаток: {stock_display} шт.\n\n"
         )
@@ -2412,17 +2978,19 @@ async def warehouse_show_category_handler(callback: CallbackQuery, session: Asyn
         else:
             if total_pages > 1:
                 text += f"📄 <b>Страница {page + 1} из {total_pages}</b>\n"
-                text += f"📋 Показано товаров: {current_page_count} из {len(products)}\n\n"
+                text += f"📋 Показано товаров: {current_page_count} из {available_count}\n\n"
             else:
-                text += f"📋 <b>Показано все товары:</b> {len(products)}\n\n"
+                text += f"📋 <b>Показано все товары:</b> {available_count}\n\n"
             
             text += "🛍 <b>Выберите товар для управления:</b>\n"
-            if len(products) > 10:
+            if available_count > per_page:
                 text += "💡 <i>Используйте кнопки ⬅️➡️ для навигации по страницам</i>"
         
         await callback.message.edit_text(
             text,
-            reply_markup=warehouse_category_products_kb(products, category_id, category.name, page, per_page)
+            reply_markup=warehouse_category_products_kb(
+                products, category_id, summary['name'], page, per_page, total_count=available_count
+            )
         )
         await callback.answer()
         
@@ -2434,30 +3002,16 @@ async def warehouse_show_category_handler(callback: CallbackQuery, session: Asyn
         await callback.answer("❌ Произошла ошибка при загрузке категории", show_alert=True)
 
 
-@warehouse_router.callback_query(F.data.startswith("warehouse_product_detail_"))
-async def warehouse_product_detail_handler(callback: CallbackQuery, session: AsyncSession):
+@warehouse_router.callback_query(CallbackPattern.prefix("warehouse_product_detail_", product_id=int, category_id=int, page=0))
+async def warehouse_product_detail_handler(
+    callback: CallbackQuery, session: AsyncSession, product_id: int, category_id: int, page: int = 0
+):
     """Показать детальную информацию о товаре с действиями"""
     if not is_admin(callback.from_user.id):
         await callback.answer("❌ У вас нет прав доступа", show_alert=True)
         return
     
     try:
-        # Парсим callback data: warehouse_product_detail_{product_id}_{category_id}_{page}
-        logger.info(f"Processing callback data: {callback.data}")
-        parts = callback.data.split("_")
-        logger.info(f"Callback parts: {parts}")
-        
-        if len(parts) < 5:
-            raise ValueError(f"Invalid callback format: expected at least 5 parts, got {len(parts)}")
-        
-        # Проверяем, что это действительно числа
-        try:
-            product_id = int(parts[3])
-            category_id = int(parts[4])
-            page = int(parts[5]) if len(parts) > 5 else 0
-        except (ValueError, IndexError) as e:
-            raise ValueError(f"Invalid numeric values in callback: {parts[3:]}, error: {e}")
-        
         # Проверяем валидность значений
         if product_id <= 0:
             raise ValueError(f"Invalid product_id: {product_id}")
@@ -2577,7 +3131,7 @@ async def warehouse_product_detail_handler(callback: CallbackQuery, session: Asy
 
 # ========== НОВАЯ ИЕРАРХИЧЕСКАЯ СТРУКТУРА ==========
 
-@warehouse_router.callback_query(F.data == "warehouse_all_products")
+@warehouse_router.callback_query(CallbackPattern.exact("warehouse_all_products"))
 async def warehouse_all_products_callback(callback: CallbackQuery, session: AsyncSession):
     """Показать все товары по категориям - классическая иерархия"""
     if not is_admin(callback.from_user.id):
@@ -2627,7 +3181,7 @@ async def warehouse_all_products_callback(callback: CallbackQuery, session: Asyn
     await callback.answer()
 
 
-@warehouse_router.callback_query(F.data == "warehouse_display_settings")
+@warehouse_router.callback_query(CallbackPattern.exact("warehouse_display_settings"))
 async def warehouse_display_settings_callback(callback: CallbackQuery):
     """Показать настройки отображения товаров"""
     if not is_admin(callback.from_user.id):
@@ -2653,37 +3207,37 @@ async def warehouse_display_settings_callback(callback: CallbackQuery):
 
 # ========== ЗАГЛУШКИ ДЛЯ НАСТРОЕК ОТОБРАЖЕНИЯ ==========
 
-@warehouse_router.callback_query(F.data == "warehouse_set_display_flat")
+@warehouse_router.callback_query(CallbackPattern.exact("warehouse_set_display_flat"))
 async def set_display_flat_callback(callback: CallbackQuery):
     """Установить плоское отображение"""
     await callback.answer("🚧 Плоское отображение будет добавлено в следующих версиях!", show_alert=True)
 
 
-@warehouse_router.callback_query(F.data == "warehouse_set_display_hierarchy")
+@warehouse_router.callback_query(CallbackPattern.exact("warehouse_set_display_hierarchy"))
 async def set_display_hierarchy_callback(callback: CallbackQuery):
     """Установить иерархическое отображение"""
     await callback.answer("✅ Иерархическое отображение уже активно!", show_alert=True)
 
 
-@warehouse_router.callback_query(F.data == "warehouse_set_per_page_5")
+@warehouse_router.callback_query(CallbackPattern.exact("warehouse_set_per_page_5"))
 async def set_per_page_5_callback(callback: CallbackQuery):
     """Установить 5 товаров на странице"""
     await callback.answer("🚧 Настройки пагинации в разработке!", show_alert=True)
 
 
-@warehouse_router.callback_query(F.data == "warehouse_set_per_page_10")
+@warehouse_router.callback_query(CallbackPattern.exact("warehouse_set_per_page_10"))
 async def set_per_page_10_callback(callback: CallbackQuery):
     """Установить 10 товаров на странице"""
     await callback.answer("🚧 Настройки пагинации в разработке!", show_alert=True)
 
 
-@warehouse_router.callback_query(F.data == "warehouse_set_sort_name")
+@warehouse_router.callback_query(CallbackPattern.exact("warehouse_set_sort_name"))
 async def set_sort_name_callback(callback: CallbackQuery):
     """Сортировать по алфавиту"""
     await callback.answer("🚧 Настройки сортировки в разработке!", show_alert=True)
 
 
-@warehouse_router.callback_query(F.data == "warehouse_set_sort_stock")
+@warehouse_router.callback_query(CallbackPattern.exact("warehouse_set_sort_stock"))
 async def set_sort_stock_callback(callback: CallbackQuery):
     """Сортировать по остатку"""
     await callback.answer("🚧 Настройки сортировки в разработке!", show_alert=True)
@@ -2691,22 +3245,21 @@ async def set_sort_stock_callback(callback: CallbackQuery):
 
 # ========== ЗАГЛУШКИ ДЛЯ НОВЫХ ФУНКЦИЙ ==========
 
-@warehouse_router.callback_query(F.data.startswith("warehouse_edit_category_"))
+@warehouse_router.callback_query(CallbackPattern.prefix("warehouse_edit_category_"))
 async def edit_category_callback(callback: CallbackQuery):
     """Заглушка для редактирования категории"""
     await callback.answer("🚧 Функция редактирования категорий в разработке!", show_alert=True)
 
 
-@warehouse_router.callback_query(F.data.startswith("warehouse_mass_delete_category_"))
+@warehouse_router.callback_query(CallbackPattern.prefix("warehouse_mass_delete_category_"))
 async def mass_delete_category_callback(callback: CallbackQuery):
     """Заглушка для массового удаления товаров категории"""
-    category_id = callback.data.split("_")[-1]
     await callback.answer("🚧 Функция массового удаления товаров в разработке!", show_alert=True)
 
 
 # ========== МЕНЮ УПРАВЛЕНИЯ КАТЕГОРИЯМИ ==========
 
-@warehouse_router.callback_query(F.data == "warehouse_categories_menu")
+@warehouse_router.callback_query(CallbackPattern.exact("warehouse_categories_menu"))
 async def warehouse_categories_menu_callback(callback: CallbackQuery, session: AsyncSession):
     """Показать меню управления категориями"""
     if not is_admin(callback.from_user.id):
@@ -2754,15 +3307,14 @@ async def warehouse_categories_menu_callback(callback: CallbackQuery, session: A
     await callback.answer()
 
 
-@warehouse_router.callback_query(F.data.startswith("warehouse_manage_category_"))
-async def warehouse_manage_category_callback(callback: CallbackQuery, session: AsyncSession):
+@warehouse_router.callback_query(CallbackPattern.prefix("warehouse_manage_category_", category_id=int))
+async def warehouse_manage_category_callback(callback: CallbackQuery, session: AsyncSession, category_id: int):
     """Показать меню управления конкретной категорией"""
     if not is_admin(callback.from_user.id):
         await callback.answer("❌ У вас нет прав доступа", show_alert=True)
         return
     
     try:
-        category_id = int(callback.data.split("_")[-1])
         warehouse_service = WarehouseService(session)
         
         # Получаем категорию
@@ -2819,18 +3371,14 @@ async def warehouse_manage_category_callback(callback: CallbackQuery, session: A
 
 # ========== ЕДИНОЕ УПРАВЛЕНИЕ КАТЕГОРИЕЙ ==========
 
-@warehouse_router.callback_query(F.data.startswith("warehouse_category_management_"))
-async def warehouse_category_management_handler(callback: CallbackQuery, session: AsyncSession):
+@warehouse_router.callback_query(CallbackPattern.prefix("warehouse_category_management_", category_id=int, page=0))
+async def warehouse_category_management_handler(callback: CallbackQuery, session: AsyncSession, category_id: int):
     """Простое меню управления категорией - ТОЛЬКО действия"""
     if not is_admin(callback.from_user.id):
         await callback.answer("❌ У вас нет прав доступа", show_alert=True)
         return
     
     try:
-        # Парсим callback: warehouse_category_management_{category_id} или warehouse_category_management_{category_id}_{page}
-        parts = callback.data.split("_")
-        category_id = int(parts[3])
-        
         warehouse_service = WarehouseService(session)
         
         # Получаем категорию
@@ -2873,19 +3421,16 @@ async def warehouse_category_management_handler(callback: CallbackQuery, session
         await callback.answer("❌ Произошла ошибка", show_alert=True)
 
 
-@warehouse_router.callback_query(F.data.startswith("warehouse_category_unified_"))
-async def warehouse_category_unified_management_handler(callback: CallbackQuery, session: AsyncSession):
+@warehouse_router.callback_query(CallbackPattern.prefix("warehouse_category_unified_", category_id=int, page=0))
+async def warehouse_category_unified_management_handler(
+    callback: CallbackQuery, session: AsyncSession, category_id: int, page: int = 0
+):
     """Расширенное меню управления категорией - товары + действия + статистика"""
     if not is_admin(callback.from_user.id):
         await callback.answer("❌ У вас нет прав доступа", show_alert=True)
         return
     
     try:
-        # Парсим callback: warehouse_category_unified_{category_id}_{page}
-        parts = callback.data.split("_")
-        category_id = int(parts[3])
-        page = int(parts[4]) if len(parts) > 4 else 0
-        
         warehouse_service = WarehouseService(session)
         
         # Получаем категорию
@@ -2962,25 +3507,25 @@ async def warehouse_category_unified_management_handler(callback: CallbackQuery,
 
 # ========== ЗАГЛУШКИ ДЛЯ СТАТИСТИКИ И МАССОВЫХ ОПЕРАЦИЙ ==========
 
-@warehouse_router.callback_query(F.data == "warehouse_categories_stats")
+@warehouse_router.callback_query(CallbackPattern.exact("warehouse_categories_stats"))
 async def warehouse_categories_stats_callback(callback: CallbackQuery):
     """Заглушка для статистики категорий"""
     await callback.answer("🚧 Детальная статистика категорий в разработке!", show_alert=True)
 
 
-@warehouse_router.callback_query(F.data == "warehouse_categories_bulk")
+@warehouse_router.callback_query(CallbackPattern.exact("warehouse_categories_bulk"))
 async def warehouse_categories_bulk_callback(callback: CallbackQuery):
     """Заглушка для массовых операций с категориями"""
     await callback.answer("🚧 Массовые операции с категориями в разработке!", show_alert=True)
 
 
-@warehouse_router.callback_query(F.data.startswith("warehouse_category_stats_"))
+@warehouse_router.callback_query(CallbackPattern.prefix("warehouse_category_stats_"))
 async def warehouse_category_stats_callback(callback: CallbackQuery):
     """Заглушка для статистики конкретной категории"""
     await callback.answer("🚧 Статистика категории в разработке!", show_alert=True)
 
 
-@warehouse_router.callback_query(F.data.startswith("warehouse_delete_category_"))
+@warehouse_router.callback_query(CallbackPattern.prefix("warehouse_delete_category_"))
 async def warehouse_delete_category_callback(callback: CallbackQuery):
     """Заглушка для удаления категории"""
     await callback.answer("🚧 Удаление категорий в разработке!", show_alert=True)
@@ -2988,7 +3533,7 @@ async def warehouse_delete_category_callback(callback: CallbackQuery):
 
 # ========== ЗАГЛУШКА ДЛЯ НЕАКТИВНЫХ КНОПОК ==========
 
-@warehouse_router.callback_query(F.data == "noop")
+@warehouse_router.callback_query(CallbackPattern.exact("noop"))
 async def noop_callback(callback: CallbackQuery):
     """Заглушка для неактивных кнопок (разделители)"""
     await callback.answer()
@@ -2999,7 +3544,7 @@ async def noop_callback(callback: CallbackQuery):
 
 # ========== ОБРАБОТЧИКИ ДЛЯ РАБОТЫ С ОСТАТКАМИ ==========
 
-@warehouse_router.callback_query(F.data == "warehouse_products_with_stock")
+@warehouse_router.callback_query(CallbackPattern.exact("warehouse_products_with_stock"))
 async def warehouse_products_with_stock_callback(callback: CallbackQuery, session: AsyncSession):
     """Показать товары с остатками"""
     if not is_admin(callback.from_user.id):
@@ -3035,15 +3580,14 @@ async def warehouse_products_with_stock_callback(callback: CallbackQuery, sessio
         await callback.answer("❌ Произошла ошибка", show_alert=True)
 
 
-@warehouse_router.callback_query(F.data.startswith("warehouse_products_stock_page_"))
-async def warehouse_products_stock_page_callback(callback: CallbackQuery, session: AsyncSession):
+@warehouse_router.callback_query(CallbackPattern.prefix("warehouse_products_stock_page_", page=int))
+async def warehouse_products_stock_page_callback(callback: CallbackQuery, session: AsyncSession, page: int):
     """Пагинация для товаров с остатками"""
     if not is_admin(callback.from_user.id):
         await callback.answer("❌ У вас нет прав доступа", show_alert=True)
         return
     
     try:
-        page = int(callback.data.split("_")[-1])
         warehouse_service = WarehouseService(session)
         products = await warehouse_service.get_products_with_stock()
         
@@ -3062,7 +3606,7 @@ async def warehouse_products_stock_page_callback(callback: CallbackQuery, sessio
         await callback.answer("❌ Произошла ошибка", show_alert=True)
 
 
-@warehouse_router.callback_query(F.data == "warehouse_show_out_of_stock")
+@warehouse_router.callback_query(CallbackPattern.exact("warehouse_show_out_of_stock"))
 async def warehouse_show_out_of_stock_callback(callback: CallbackQuery, session: AsyncSession):
     """Показать товары без остатков"""
     if not is_admin(callback.from_user.id):
@@ -3099,15 +3643,14 @@ async def warehouse_show_out_of_stock_callback(callback: CallbackQuery, session:
         await callback.answer("❌ Произошла ошибка", show_alert=True)
 
 
-@warehouse_router.callback_query(F.data.startswith("warehouse_out_of_stock_page_"))
-async def warehouse_out_of_stock_page_callback(callback: CallbackQuery, session: AsyncSession):
+@warehouse_router.callback_query(CallbackPattern.prefix("warehouse_out_of_stock_page_", page=int))
+async def warehouse_out_of_stock_page_callback(callback: CallbackQuery, session: AsyncSession, page: int):
     """Пагинация для товаров без остатков"""
     if not is_admin(callback.from_user.id):
         await callback.answer("❌ У вас нет прав доступа", show_alert=True)
         return
     
     try:
-        page = int(callback.data.split("_")[-1])
         warehouse_service = WarehouseService(session)
         products = await warehouse_service.get_all_products()
         
@@ -3125,19 +3668,14 @@ async def warehouse_out_of_stock_page_callback(callback: CallbackQuery, session:
         await callback.answer("❌ Произошла ошибка", show_alert=True)
 
 
-@warehouse_router.callback_query(F.data.startswith("warehouse_category_products_with_stock_"))
-async def warehouse_category_products_with_stock_callback(callback: CallbackQuery, session: AsyncSession):
+@warehouse_router.callback_query(CallbackPattern.prefix("warehouse_category_products_with_stock_", category_id=int, page=int))
+async def warehouse_category_products_with_stock_callback(callback: CallbackQuery, session: AsyncSession, category_id: int, page: int):
     """Показать товары категории с остатками"""
     if not is_admin(callback.from_user.id):
         await callback.answer("❌ У вас нет прав доступа", show_alert=True)
         return
     
     try:
-        # Парсим category_id и page из callback_data
-        parts = callback.data.split("_")
-        category_id = int(parts[-2])
-        page = int(parts[-1])
-        
         warehouse_service = WarehouseService(session)
         category = await warehouse_service.get_category_by_id(category_id)
         products = await warehouse_service.get_products_by_category(category_id)
@@ -3162,19 +3700,14 @@ async def warehouse_category_products_with_stock_callback(callback: CallbackQuer
         await callback.answer("❌ Произошла ошибка", show_alert=True)
 
 
-@warehouse_router.callback_query(F.data.startswith("warehouse_category_stock_page_"))
-async def warehouse_category_stock_page_callback(callback: CallbackQuery, session: AsyncSession):
+@warehouse_router.callback_query(CallbackPattern.prefix("warehouse_category_stock_page_", category_id=int, page=int))
+async def warehouse_category_stock_page_callback(callback: CallbackQuery, session: AsyncSession, category_id: int, page: int):
     """Пагинация для товаров категории с остатками"""
     if not is_admin(callback.from_user.id):
         await callback.answer("❌ У вас нет прав доступа", show_alert=True)
         return
     
     try:
-        # Парсим category_id и page из callback_data
-        parts = callback.data.split("_")
-        category_id = int(parts[-2])
-        page = int(parts[-1])
-        
         warehouse_service = WarehouseService(session)
         category = await warehouse_service.get_category_by_id(category_id)
         products = await warehouse_service.get_products_by_category(category_id)
@@ -3199,15 +3732,14 @@ async def warehouse_category_stock_page_callback(callback: CallbackQuery, sessio
         await callback.answer("❌ Произошла ошибка", show_alert=True)
 
 
-@warehouse_router.callback_query(F.data.startswith("warehouse_product_out_of_stock_"))
-async def warehouse_product_out_of_stock_callback(callback: CallbackQuery, session: AsyncSession):
+@warehouse_router.callback_query(CallbackPattern.prefix("warehouse_product_out_of_stock_", product_id=int))
+async def warehouse_product_out_of_stock_callback(callback: CallbackQuery, session: AsyncSession, product_id: int):
     """Обработчик для товаров без остатков"""
     if not is_admin(callback.from_user.id):
         await callback.answer("❌ У вас нет прав доступа", show_alert=True)
         return
     
     try:
-        product_id = int(callback.data.split("_")[-1])
         warehouse_service = WarehouseService(session)
         product = await warehouse_service.get_product_by_id(product_id)
         
@@ -3239,7 +3771,7 @@ async def warehouse_product_out_of_stock_callback(callback: CallbackQuery, sessi
         await callback.answer("❌ Произошла ошибка", show_alert=True)
 
 
-@warehouse_router.callback_query(F.data == "warehouse_stock_summary")
+@warehouse_router.callback_query(CallbackPattern.exact("warehouse_stock_summary"))
 async def warehouse_stock_summary_callback(callback: CallbackQuery, session: AsyncSession):
     """Показать сводку по остаткам"""
     if not is_admin(callback.from_user.id):
@@ -3248,26 +3780,7 @@ async def warehouse_stock_summary_callback(callback: CallbackQuery, session: Asy
     
     try:
         warehouse_service = WarehouseService(session)
-        categories = await warehouse_service.get_categories()
-        
-        # Подготавливаем статистику по категориям
-        category_stats = []
-        for category in categories:
-            products = await warehouse_service.get_products_by_category(category.id)
-            
-            available_products = sum(1 for p in products if p.is_unlimited or p.stock_quantity > 0)
-            out_of_stock_products = sum(1 for p in products if not p.is_unlimited and p.stock_quantity <= 0)
-            total_stock = sum(p.stock_quantity for p in products if not p.is_unlimited)
-            
-            category_stats.append({
-                'id': category.id,
-                'name': category.name,
-                'available_products': available_products,
-                'out_of_stock_products': out_of_stock_products,
-                'total_stock': total_stock
-            })
-        
-        from keyboards.warehouse_keyboards import warehouse_stock_summary_kb
+        category_stats = await warehouse_service.get_stock_summary()
         
         await callback.message.edit_text(
             "📊 <b>Сводка по остаткам</b>\n\n"
@@ -3281,50 +3794,49 @@ async def warehouse_stock_summary_callback(callback: CallbackQuery, session: Asy
         await callback.answer("❌ Произошла ошибка", show_alert=True)
 
 
-@warehouse_router.callback_query(F.data.startswith("warehouse_category_stock_summary_"))
-async def warehouse_category_stock_summary_callback(callback: CallbackQuery, session: AsyncSession):
+@warehouse_router.callback_query(CallbackPattern.prefix("warehouse_category_stock_summary_", category_id=int))
+async def warehouse_category_stock_summary_callback(callback: CallbackQuery, session: AsyncSession, category_id: int):
     """Показать сводку по остаткам конкретной категории"""
     if not is_admin(callback.from_user.id):
         await callback.answer("❌ У вас нет прав доступа", show_alert=True)
         return
     
     try:
-        category_id = int(callback.data.split("_")[-1])
         warehouse_service = WarehouseService(session)
-        category = await warehouse_service.get_category_by_id(category_id)
-        products = await warehouse_service.get_products_by_category(category_id)
+        summary = await warehouse_service.get_category_stock_summary(category_id)
         
-        if not category:
+        if not summary:
             await callback.answer("❌ Категория не найдена", show_alert=True)
             return
         
-        # Подготавливаем статистику
-        available_products = [p for p in products if p.is_unlimited or p.stock_quantity > 0]
-        out_of_stock_products = [p for p in products if not p.is_unlimited and p.stock_quantity <= 0]
-        total_stock = sum(p.stock_quantity for p in products if not p.is_unlimited)
+        # Счетчики считаются в SQL, товары загружаются только для коротких списков
+        available_count = summary['available_products']
+        out_of_stock_count = summary['out_of_stock_products']
         
-        text = f"📊 <b>Сводка по остаткам: {category.name}</b>\n\n"
-        text += f"📦 Всего товаров: <b>{len(products)}</b>\n"
-        text += f"🟢 Доступно: <b>{len(available_products)}</b>\n"
-        text += f"🔴 Закончилось: <b>{len(out_of_stock_products)}</b>\n"
-        text += f"📊 Общий остаток: <b>{total_stock}</b> шт.\n\n"
+        text = f"📊 <b>Сводка по остаткам: {summary['name']}</b>\n\n"
+        text += f"📦 Всего товаров: <b>{summary['total_products']}</b>\n"
+        text += f"🟢 Доступно: <b>{available_count}</b>\n"
+        text += f"🔴 Закончилось: <b>{out_of_stock_count}</b>\n"
+        text += f"📊 Общий остаток: <b>{summary['total_stock']}</b> шт.\n\n"
         
-        if available_products:
+        if available_count:
+            available_products = await warehouse_service.get_category_products_page(category_id, per_page=5, in_stock=True)
             text += "🟢 <b>Доступные товары:</b>\n"
-            for product in available_products[:5]:  # Показываем первые 5
+            for product in available_products:  # Показываем первые 5
                 stock_info = "∞" if product.is_unlimited else str(product.stock_quantity)
                 text += f"• {product.name} ({stock_info} шт.)\n"
             
-            if len(available_products) > 5:
-                text += f"• ... и еще {len(available_products) - 5} товаров\n"
+            if available_count > 5:
+                text += f"• ... и еще {available_count - 5} товаров\n"
         
-        if out_of_stock_products:
+        if out_of_stock_count:
+            out_of_stock_products = await warehouse_service.get_category_products_page(category_id, per_page=3, in_stock=False)
             text += "\n🔴 <b>Закончившиеся товары:</b>\n"
-            for product in out_of_stock_products[:3]:  # Показываем первые 3
+            for product in out_of_stock_products:  # Показываем первые 3
                 text += f"• {product.name}\n"
             
-            if len(out_of_stock_products) > 3:
-                text += f"• ... и еще {len(out_of_stock_products) - 3} товаров\n"
+            if out_of_stock_count > 3:
+                text += f"• ... и еще {out_of_stock_count - 3} товаров\n"
         
         from keyboards.warehouse_keyboards import warehouse_error_recovery_kb
         
@@ -3342,31 +3854,31 @@ async def warehouse_category_stock_summary_callback(callback: CallbackQuery, ses
         await callback.answer("❌ Произошла ошибка", show_alert=True)
 
 
-@warehouse_router.callback_query(F.data == "warehouse_add_stock")
+@warehouse_router.callback_query(CallbackPattern.exact("warehouse_add_stock"))
 async def warehouse_add_stock_callback(callback: CallbackQuery):
     """Заглушка для добавления остатков"""
     await callback.answer("🚧 Функция добавления остатков в разработке!", show_alert=True)
 
 
-@warehouse_router.callback_query(F.data == "warehouse_import_stock")
+@warehouse_router.callback_query(CallbackPattern.exact("warehouse_import_stock"))
 async def warehouse_import_stock_callback(callback: CallbackQuery):
     """Заглушка для импорта остатков"""
     await callback.answer("🚧 Функция импорта остатков в разработке!", show_alert=True)
 
 
-@warehouse_router.callback_query(F.data == "warehouse_stock_notifications")
+@warehouse_router.callback_query(CallbackPattern.exact("warehouse_stock_notifications"))
 async def warehouse_stock_notifications_callback(callback: CallbackQuery):
     """Заглушка для настроек уведомлений об остатках"""
     await callback.answer("🚧 Настройки уведомлений об остатках в разработке!", show_alert=True)
 
 
-@warehouse_router.callback_query(F.data == "warehouse_sales_stats")
+@warehouse_router.callback_query(CallbackPattern.exact("warehouse_sales_stats"))
 async def warehouse_sales_stats_callback(callback: CallbackQuery):
     """Заглушка для статистики продаж"""
     await callback.answer("🚧 Статистика продаж в разработке!", show_alert=True)
 
 
-@warehouse_router.callback_query(F.data == "warehouse_show_more_products")
+@warehouse_router.callback_query(CallbackPattern.exact("warehouse_show_more_products"))
 async def warehouse_show_more_products_callback(callback: CallbackQuery, session: AsyncSession):
     """Показать больше товаров в быстром выборе"""
     if not is_admin(callback.from_user.id):
@@ -3391,15 +3903,14 @@ async def warehouse_show_more_products_callback(callback: CallbackQuery, session
         await callback.answer("❌ Произошла ошибка", show_alert=True)
 
 
-@warehouse_router.callback_query(F.data.startswith("warehouse_show_category_out_of_stock_"))
-async def warehouse_show_category_out_of_stock_callback(callback: CallbackQuery, session: AsyncSession):
+@warehouse_router.callback_query(CallbackPattern.prefix("warehouse_show_category_out_of_stock_", category_id=int))
+async def warehouse_show_category_out_of_stock_callback(callback: CallbackQuery, session: AsyncSession, category_id: int):
     """Показать товары без остатков в конкретной категории"""
     if not is_admin(callback.from_user.id):
         await callback.answer("❌ У вас нет прав доступа", show_alert=True)
         return
     
     try:
-        category_id = int(callback.data.split("_")[-1])
         warehouse_service = WarehouseService(session)
         category = await warehouse_service.get_category_by_id(category_id)
         products = await warehouse_service.get_products_by_category(category_id)
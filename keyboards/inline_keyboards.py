@@ -5,7 +5,7 @@ from database.models import Category, Product, Order
 from config import settings
 
 
-def main_menu_kb() -> InlineKeyboardMarkup:
+def _build_main_menu_kb() -> InlineKeyboardMarkup:
     """Главное меню"""
     builder = InlineKeyboardBuilder()
     
@@ -24,6 +24,15 @@ def main_menu_kb() -> InlineKeyboardMarkup:
     return builder.as_markup()
 
 
+# Клавиатура не зависит от данных - собирается один раз при импорте
+_MAIN_MENU_KB = _build_main_menu_kb()
+
+
+def main_menu_kb() -> InlineKeyboardMarkup:
+    """Главное меню"""
+    return _MAIN_MENU_KB
+
+
 def categories_kb(categories: List[Category]) -> InlineKeyboardMarkup:
     """Клавиатура категорий"""
     builder = InlineKeyboardBuilder()
@@ -162,7 +171,7 @@ def user_orders_kb(orders: List[Order], page: int = 0, per_page: int = 5) -> Inl
     return builder.as_markup()
 
 
-def admin_menu_kb() -> InlineKeyboardMarkup:
+def _build_admin_menu_kb() -> InlineKeyboardMarkup:
     """Упрощенное админ меню"""
     builder = InlineKeyboardBuilder()
     
@@ -188,6 +197,14 @@ def admin_menu_kb() -> InlineKeyboardMarkup:
     return builder.as_markup()
 
 
+_ADMIN_MENU_KB = _build_admin_menu_kb()
+
+
+def admin_menu_kb() -> InlineKeyboardMarkup:
+    """Упрощенное админ меню"""
+    return _ADMIN_MENU_KB
+
+
 def admin_orders_kb(orders: List[Order], page: int = 0, per_page: int = 5) -> InlineKeyboardMarkup:
     """Клавиатура заказов для админа"""
     builder = InlineKeyboardBuilder()
@@ -330,6 +347,9 @@ def warehouse_menu_kb() -> InlineKeyboardMarkup:
         InlineKeyboardButton(text="📂 Создать категорию", callback_data="warehouse_create_category"),
         InlineKeyboardButton(text="📈 Статистика", callback_data="warehouse_stats")
     )
+    builder.row(
+        InlineKeyboardButton(text="📤 Экспорт", callback_data="warehouse_export")
+    )
     builder.row(
         InlineKeyboardButton(text="🔙 Админ меню", callback_data="admin_menu")
     )
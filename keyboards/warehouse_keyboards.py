@@ -185,7 +185,7 @@ def warehouse_product_action_complete_kb(category_id: int, page: int = 0, action
     return builder.as_markup()
 
 
-def warehouse_main_menu_kb() -> InlineKeyboardMarkup:
+def _build_warehouse_main_menu_kb() -> InlineKeyboardMarkup:
     """Классическое главное меню склада с иерархической структурой"""
     builder = InlineKeyboardBuilder()
     
@@ -218,6 +218,10 @@ def warehouse_main_menu_kb() -> InlineKeyboardMarkup:
         InlineKeyboardButton(text="⚙️ Настройки отображения", callback_data="warehouse_display_settings")
     )
     
+    builder.row(
+        InlineKeyboardButton(text="📤 Экспорт", callback_data="warehouse_export")
+    )
+    
     builder.row(
         InlineKeyboardButton(text="🔙 Админ меню", callback_data="admin_menu")
     )
@@ -225,6 +229,15 @@ def warehouse_main_menu_kb() -> InlineKeyboardMarkup:
     return builder.as_markup()
 
 
+# Клавиатура не зависит от данных - собирается один раз при импорте
+_WAREHOUSE_MAIN_MENU_KB = _build_warehouse_main_menu_kb()
+
+
+def warehouse_main_menu_kb() -> InlineKeyboardMarkup:
+    """Классическое главное меню склада с иерархической структурой"""
+    return _WAREHOUSE_MAIN_MENU_KB
+
+
 def warehouse_categories_main_kb() -> InlineKeyboardMarkup:
     """Главный экран склада с категориями и быстрыми действиями"""
     builder = InlineKeyboardBuilder()
@@ -505,6 +518,58 @@ def mass_add_confirmation_kb() -> InlineKeyboardMarkup:
     return confirmation_kb("warehouse_confirm_mass_add")
 
 
+def file_import_confirmation_kb() -> InlineKeyboardMarkup:
+    """Клавиатура подтверждения импорта из файла"""
+    return confirmation_kb("warehouse_confirm_file_import")
+
+
+def mass_give_source_kb(products: List[Product]) -> InlineKeyboardMarkup:
+    """Клавиатура выбора источника массовой выдачи: товар или вся категория"""
+    builder = InlineKeyboardBuilder()
+    
+    builder.row(
+        InlineKeyboardButton(text="🎲 Любые товары категории", callback_data="warehouse_mass_give_any")
+    )
+    
+    for product in products:
+        stock_info = "∞" if product.is_unlimited else str(product.stock_quantity)
+        display_name = product.name[:25] + "..." if len(product.name) > 25 else product.name
+        builder.row(
+            InlineKeyboardButton(
+                text=f"📦 {display_name} ({stock_info} шт.)",
+                callback_data=f"warehouse_select_product_{product.id}"
+            )
+        )
+    
+    builder.row(
+        InlineKeyboardButton(text="❌ Отмена", callback_data="warehouse_cancel")
+    )
+    
+    return builder.as_markup()
+
+
+def mass_give_confirmation_kb() -> InlineKeyboardMarkup:
+    """Клавиатура подтверждения массовой выдачи"""
+    return confirmation_kb("warehouse_confirm_mass_give")
+
+
+def warehouse_export_kb() -> InlineKeyboardMarkup:
+    """Клавиатура выбора данных и формата выгрузки"""
+    builder = InlineKeyboardBuilder()
+    
+    for kind, title in (("products", "📦 Товары"), ("stock", "🟢 Остатки"), ("orders", "🧾 Заказы")):
+        builder.row(
+            InlineKeyboardButton(text=f"{title} · CSV", callback_data=f"warehouse_export_{kind}_csv"),
+            InlineKeyboardButton(text=f"{title} · JSONL", callback_data=f"warehouse_export_{kind}_jsonl")
+        )
+    
+    builder.row(
+        InlineKeyboardButton(text="🔙 К складу", callback_data="warehouse_menu")
+    )
+    
+    return builder.as_markup()
+
+
 def edit_product_fields_kb() -> InlineKeyboardMarkup:
     """Клавиатура выбора поля для редактирования товара"""
     builder = InlineKeyboardBuilder()
@@ -658,14 +723,30 @@ def warehouse_display_settings_kb() -> InlineKeyboardMarkup:
     return builder.as_markup()
 
 
-def warehouse_category_products_kb(products: List[Product], category_id: int, category_name: str, page: int = 0, per_page: int = 10) -> InlineKeyboardMarkup:
-    """Компактная клавиатура товаров в категории"""
+def warehouse_category_products_kb(
+    products: List[Product],
+    category_id: int,
+    category_name: str,
+    page: int = 0,
+    per_page: int = 10,
+    total_count: Optional[int] = None
+) -> InlineKeyboardMarkup:
+    """
+    Компактная клавиатура товаров в категории
+
+    Если передан total_count, products - уже загруженная текущая страница,
+    иначе - все товары категории, и страница вырезается здесь.
+    """
     builder = InlineKeyboardBuilder()
     
     # Пагинация
     start = page * per_page
     end = start + per_page
-    page_products = products[start:end]
+    if total_count is None:
+        page_products = products[start:end]
+        total_count = len(products)
+    else:
+        page_products = products
     
     # Отображаем товары компактно - только по 1 кнопке на товар
     for product in page_products:
@@ -703,7 +784,7 @@ def warehouse_category_products_kb(products: List[Product], category_id: int, ca
             InlineKeyboardButton(text="⬅️", callback_data=f"warehouse_show_category_{category_id}_{page-1}")
         )
     
-    if end < len(products):
+    if end < total_count:
         nav_buttons.append(
             InlineKeyboardButton(text="➡️", callback_data=f"warehouse_show_category_{category_id}_{page+1}")
         )
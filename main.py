@@ -6,18 +6,119 @@ from aiogram.enums import ParseMode
 from aiogram.types import ErrorEvent
 
 from config import settings
-from database import init_db, get_session
+from database import init_db
+from database.database import (
+    async_session, LazySession, connection_hold_time,
+    force_primary, session_has_writes, remember_writer, wrote_recently
+)
 from handlers import user_router, admin_router, callback_router, warehouse_router
 from utils import setup_logging
+from utils.background import start_periodic
+from utils.callbacks import install_callback_table
+from utils.update_scheduler import install_update_scheduler
+from utils.throttling import install_throttling
+from utils.view_cache import install_view_cache
+from utils.bot_session import create_bot_session
 
 # Настройка логирования
 logger = setup_logging()
 
 
+# Сессии БД обработчиков с запуска бота (см. db_session_middleware)
+session_metrics = {
+    "updates": 0,
+    "sessions": 0,
+    "hold_total": 0.0,
+    "hold_max": 0.0,
+    "long_holds": 0,
+}
+
+
+def _describe_event(event) -> str:
+    """Короткое описание апдейта для логов"""
+    if getattr(event, "data", None) is not None:
+        return f"callback {event.data!r}"
+    return f"message {(getattr(event, 'text', None) or '')[:32]!r}"
+
+
+def _record_session_hold(event, hold: float):
+    """Учесть время удержания соединения обработчиком"""
+    session_metrics["sessions"] += 1
+    session_metrics["hold_total"] += hold
+    session_metrics["hold_max"] = max(session_metrics["hold_max"], hold)
+    
+    # Долгое удержание - обычно запросы Telegram API внутри открытой транзакции
+    if settings.DB_SESSION_HOLD_WARN_MS and hold * 1000 > settings.DB_SESSION_HOLD_WARN_MS:
+        session_metrics["long_holds"] += 1
+        logger.warning(f"DB connection held {hold * 1000:.0f} ms while handling {_describe_event(event)}")
+
+
+async def db_session_middleware(handler, event, data):
+    """
+    Middleware для внедрения сессии БД
+    
+    Сессия создается при первом обращении обработчика к ней и закрывается
+    сразу после обработчика, так что обработчики без запросов к БД
+    не берут соединение из пула.
+    """
+    user = data.get("event_from_user")
+    
+    # Недавно писавший пользователь читает из основной БД, а не из отстающей реплики
+    on_create = force_primary if user and wrote_recently(user.id) else None
+    session = LazySession(async_session, on_create)
+    
+    data['session'] = session
+    session_metrics["updates"] += 1
+    try:
+        return await handler(event, data)
+    finally:
+        await session.close()
+        if session.created:
+            if user and session_has_writes(session.session):
+                remember_writer(user.id)
+            _record_session_hold(event, connection_hold_time(session.session))
+
+
+async def error_handler(event: ErrorEvent):
+    """Обработчик ошибок"""
+    # твоя логика логирования
+    print(f"Ошибка: {event.exception}")
+    return True
+
+
 async def setup_dependencies(dp: Dispatcher):
     """Настройка зависимостей для handlers"""
-    # Здесь можно добавить middleware для автоматического внедрения зависимостей
-    pass
+    dp.message.middleware(db_session_middleware)
+    dp.callback_query.middleware(db_session_middleware)
+
+
+async def create_dispatcher() -> Dispatcher:
+    """Создать диспетчер со всеми роутерами и middleware"""
+    dp = Dispatcher(storage=MemoryStorage())
+    
+    # Лишние апдейты отбрасываются до очереди чата и обработчиков
+    if settings.THROTTLE_ENABLED:
+        install_throttling(dp, settings.throttle_limits, exempt_ids=settings.ADMIN_IDS)
+    
+    # Апдейты одного чата - строго по очереди, разных чатов - параллельно
+    if settings.UPDATE_CONCURRENCY > 0:
+        install_update_scheduler(dp, settings.UPDATE_CONCURRENCY)
+    
+    # Настраиваем зависимости
+    await setup_dependencies(dp)
+    
+    # Регистрируем роутеры (специфичные команды должны быть первыми)
+    dp.include_router(user_router)
+    dp.include_router(admin_router)
+    dp.include_router(callback_router)
+    dp.include_router(warehouse_router)
+    
+    # Callback-обработчики всех роутеров - одной таблицей с поиском по префиксу
+    install_callback_table(dp)
+    
+    dp.errors.register(error_handler)
+    
+    return dp
 
 
 async def main():
@@ -40,34 +141,43 @@ async def main():
     # Создаем бота и диспетчер
     bot = Bot(
         token=settings.BOT_TOKEN,
+        session=create_bot_session(),
         default=DefaultBotProperties(parse_mode=ParseMode.HTML)
     )
+    if bot.session.api.is_local:
+        logger.info(f"Using local Bot API server {settings.BOT_API_SERVER_URL}")
     
-    dp = Dispatcher(storage=MemoryStorage())
+    # Правки сообщений без изменений не отправляются в Bot API
+    if settings.VIEW_CACHE_SIZE > 0:
+        install_view_cache(bot, settings.VIEW_CACHE_SIZE)
     
-    # Настраиваем зависимости
-    await setup_dependencies(dp)
-    
-    # Регистрируем роутеры (специфичные команды должны быть первыми)
-    dp.include_router(user_router)
-    dp.include_router(admin_router)
-    dp.include_router(callback_router)
-    dp.include_router(warehouse_router)
+    dp = await create_dispatcher()
     
-    # Middleware для автоматического внедрения сессии БД
-    @dp.message.middleware()
-    @dp.callback_query.middleware()
-    async def db_session_middleware(handler, event, data):
-        async for session in get_session():
-            data['session'] = session
-            return await handler(event, data)
-    
-    # Обработчик ошибок
-    @dp.error()
-    async def error_handler(event: ErrorEvent):
-        # твоя логика логирования
-        print(f"Ошибка: {event.exception}")
-        return True
+    # Фоновые задачи
+    background_tasks = []
+    if settings.LEDGER_RECONCILE_INTERVAL > 0:
+        from services.ledger_service import reconcile_ledger
+        background_tasks.append(
+            start_periodic(reconcile_ledger, settings.LEDGER_RECONCILE_INTERVAL, "ledger_reconcile", initial_delay=60)
+        )
+    if settings.ORDER_RESERVATION_TTL_MINUTES > 0 and settings.ORDER_EXPIRY_INTERVAL > 0:
+        from services.order_service import expire_pending_orders
+        background_tasks.append(
+            start_periodic(expire_pending_orders, settings.ORDER_EXPIRY_INTERVAL, "order_expiry", initial_delay=30)
+        )
+    if settings.REFERRAL_PROCESS_INTERVAL > 0:
+        from services.referral_service import process_referral_rewards
+        background_tasks.append(
+            start_periodic(process_referral_rewards, settings.REFERRAL_PROCESS_INTERVAL, "referral_rewards", initial_delay=15)
+        )
+    if settings.CATEGORY_COUNTERS_VERIFY_INTERVAL > 0:
+        from services.category_counter_service import verify_category_counters
+        background_tasks.append(
+            start_periodic(
+                verify_category_counters, settings.CATEGORY_COUNTERS_VERIFY_INTERVAL,
+                "category_counters_verify", initial_delay=90
+            )
+        )
     
     # Уведомляем админов о запуске с админ-меню
     from keyboards.inline_keyboards import admin_menu_kb
@@ -89,6 +199,8 @@ async def main():
     except Exception as e:
         logger.error(f"Error during polling: {e}")
     finally:
+        for task in background_tasks:
+            task.cancel()
         await bot.session.close()
         logger.info("Bot stopped")
 
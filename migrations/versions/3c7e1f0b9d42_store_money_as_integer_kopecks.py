@@ -0,0 +1,64 @@
+"""store money as integer kopecks
+
+Revision ID: 3c7e1f0b9d42
+Revises: a92554233d96
+Create Date: 2026-10-19 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3c7e1f0b9d42'
+down_revision: Union[str, None] = 'a92554233d96'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# (таблица, колонка, nullable)
+MONEY_COLUMNS = [
+    ('users', 'balance', True),
+    ('users', 'referral_earnings', True),
+    ('users', 'total_spent', True),
+    ('products', 'price', False),
+    ('orders', 'unit_price', False),
+    ('orders', 'total_price', False),
+    ('referrals', 'reward_amount', False),
+]
+
+
+def _convert(to_type, expression: str) -> None:
+    bind = op.get_bind()
+
+    if bind.dialect.name == 'postgresql':
+        for table, column, nullable in MONEY_COLUMNS:
+            op.alter_column(
+                table, column,
+                type_=to_type,
+                existing_nullable=nullable,
+                postgresql_using=expression.format(column=column)
+            )
+        return
+
+    # SQLite не умеет ALTER COLUMN TYPE: пересчитываем значения и пересоздаем таблицу
+    for table, column, nullable in MONEY_COLUMNS:
+        op.execute(f"UPDATE {table} SET {column} = {expression.format(column=column)}")
+
+    for table in dict.fromkeys(table for table, _, _ in MONEY_COLUMNS):
+        with op.batch_alter_table(table) as batch_op:
+            for column_table, column, nullable in MONEY_COLUMNS:
+                if column_table == table:
+                    batch_op.alter_column(column, type_=to_type, existing_nullable=nullable)
+
+
+def upgrade() -> None:
+    # рубли (float) -> копейки (bigint)
+    _convert(sa.BigInteger(), "CAST(ROUND({column} * 100) AS BIGINT)")
+
+
+def downgrade() -> None:
+    # копейки (bigint) -> рубли (float)
+    _convert(sa.Float(), "CAST({column} AS FLOAT) / 100")
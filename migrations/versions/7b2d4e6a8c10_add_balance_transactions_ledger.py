@@ -0,0 +1,53 @@
+"""add balance_transactions ledger
+
+Revision ID: 7b2d4e6a8c10
+Revises: 3c7e1f0b9d42
+Create Date: 2026-10-19 13:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7b2d4e6a8c10'
+down_revision: Union[str, None] = '3c7e1f0b9d42'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'balance_transactions',
+        sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column('account', sa.String(length=64), nullable=False),
+        sa.Column('user_id', sa.BigInteger(), nullable=True),
+        sa.Column('amount', sa.BigInteger(), nullable=False),
+        sa.Column('idempotency_key', sa.String(length=128), nullable=False),
+        sa.Column('reason', sa.String(length=50), nullable=False),
+        sa.Column('description', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=False),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('idempotency_key', 'account', name='uq_balance_transactions_key_account')
+    )
+    op.create_index('ix_balance_transactions_user_id', 'balance_transactions', ['user_id'], unique=False)
+
+    # Начальные остатки: текущие балансы становятся первой проводкой журнала
+    op.execute(
+        "INSERT INTO balance_transactions (account, user_id, amount, idempotency_key, reason, description) "
+        "SELECT 'user:' || id, id, balance, 'opening_balance:' || id, 'opening_balance', 'Начальный остаток' "
+        "FROM users WHERE balance IS NOT NULL AND balance <> 0"
+    )
+    op.execute(
+        "INSERT INTO balance_transactions (account, user_id, amount, idempotency_key, reason, description) "
+        "SELECT 'system:opening_balance', NULL, -balance, 'opening_balance:' || id, 'opening_balance', 'Начальный остаток' "
+        "FROM users WHERE balance IS NOT NULL AND balance <> 0"
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_balance_transactions_user_id', table_name='balance_transactions')
+    op.drop_table('balance_transactions')
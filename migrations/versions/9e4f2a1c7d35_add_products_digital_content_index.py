@@ -0,0 +1,27 @@
+"""add products digital_content index
+
+Revision ID: 9e4f2a1c7d35
+Revises: 7b2d4e6a8c10
+Create Date: 2026-10-19 14:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9e4f2a1c7d35'
+down_revision: Union[str, None] = '7b2d4e6a8c10'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # hash-индекс в PostgreSQL не ограничивает длину значения (btree - ~2.7 КБ)
+    op.create_index('ix_products_digital_content', 'products', ['digital_content'], unique=False, postgresql_using='hash')
+
+
+def downgrade() -> None:
+    op.drop_index('ix_products_digital_content', table_name='products')
@@ -0,0 +1,39 @@
+"""add user referral counters
+
+Revision ID: a7d2f4b8c3e1
+Revises: f3c6d8e1a2b9
+Create Date: 2026-10-19 19:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a7d2f4b8c3e1'
+down_revision: Union[str, None] = 'f3c6d8e1a2b9'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('users', sa.Column('referrals_count', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('users', sa.Column('active_referrals_count', sa.Integer(), server_default='0', nullable=False))
+    op.create_index('ix_users_referrer_id', 'users', ['referrer_id'], unique=False)
+
+    # Начальные значения по текущим приглашенным, дальше счетчики ведет приложение
+    op.execute(
+        "UPDATE users SET "
+        "referrals_count = (SELECT COUNT(*) FROM users AS r WHERE r.referrer_id = users.id), "
+        "active_referrals_count = (SELECT COUNT(*) FROM users AS r "
+        "WHERE r.referrer_id = users.id AND r.total_orders > 0)"
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_users_referrer_id', table_name='users')
+    with op.batch_alter_table('users') as batch_op:
+        batch_op.drop_column('active_referrals_count')
+        batch_op.drop_column('referrals_count')
@@ -0,0 +1,32 @@
+"""add settings version
+
+Revision ID: b8e3a5c9d2f4
+Revises: a7d2f4b8c3e1
+Create Date: 2026-10-19 20:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b8e3a5c9d2f4'
+down_revision: Union[str, None] = 'a7d2f4b8c3e1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'settings_version',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('version', sa.BigInteger(), server_default='0', nullable=False),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.execute("INSERT INTO settings_version (id, version) VALUES (1, 0)")
+
+
+def downgrade() -> None:
+    op.drop_table('settings_version')
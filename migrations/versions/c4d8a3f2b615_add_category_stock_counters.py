@@ -0,0 +1,48 @@
+"""add category stock counters
+
+Revision ID: c4d8a3f2b615
+Revises: 9e4f2a1c7d35
+Create Date: 2026-10-19 15:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from database.category_counters import create_trigger_statements, drop_trigger_statements, recount_sql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c4d8a3f2b615'
+down_revision: Union[str, None] = '9e4f2a1c7d35'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+COUNTER_COLUMNS = {
+    'total_products': sa.Integer(),
+    'available_products': sa.Integer(),
+    'unlimited_products': sa.Integer(),
+    'total_stock': sa.BigInteger(),
+}
+
+
+def upgrade() -> None:
+    for column, column_type in COUNTER_COLUMNS.items():
+        op.add_column('categories', sa.Column(column, column_type, server_default='0', nullable=False))
+
+    # Начальные значения по текущим товарам, дальше счетчики ведут триггеры
+    op.execute(recount_sql())
+
+    for statement in create_trigger_statements(op.get_bind().dialect.name):
+        op.execute(statement)
+
+
+def downgrade() -> None:
+    for statement in drop_trigger_statements(op.get_bind().dialect.name):
+        op.execute(statement)
+
+    with op.batch_alter_table('categories') as batch_op:
+        for column in reversed(list(COUNTER_COLUMNS)):
+            batch_op.drop_column(column)
@@ -0,0 +1,26 @@
+"""add orders status created_at index
+
+Revision ID: e5b2c9d4a716
+Revises: d1a7e5c3b9f4
+Create Date: 2026-10-19 17:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e5b2c9d4a716'
+down_revision: Union[str, None] = 'd1a7e5c3b9f4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_orders_status_created_at', 'orders', ['status', 'created_at'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_orders_status_created_at', table_name='orders')
@@ -0,0 +1,46 @@
+"""add batched referral rewards
+
+Revision ID: f3c6d8e1a2b9
+Revises: e5b2c9d4a716
+Create Date: 2026-10-19 18:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f3c6d8e1a2b9'
+down_revision: Union[str, None] = 'e5b2c9d4a716'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('orders', sa.Column('referral_processed_at', sa.DateTime(), nullable=True))
+
+    # Оплаченные ранее заказы уже получили награду при оплате
+    op.execute("UPDATE orders SET referral_processed_at = CURRENT_TIMESTAMP WHERE status <> 'pending'")
+
+    op.create_index(
+        'ix_orders_referral_pending', 'orders', ['id'], unique=False,
+        sqlite_where=sa.text('referral_processed_at IS NULL'),
+        postgresql_where=sa.text('referral_processed_at IS NULL')
+    )
+
+    with op.batch_alter_table('referrals') as batch_op:
+        batch_op.add_column(sa.Column('level', sa.Integer(), server_default='1', nullable=False))
+        batch_op.create_unique_constraint('uq_referrals_order_level', ['order_id', 'level'])
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('referrals') as batch_op:
+        batch_op.drop_constraint('uq_referrals_order_level', type_='unique')
+        batch_op.drop_column('level')
+
+    op.drop_index('ix_orders_referral_pending', table_name='orders')
+
+    with op.batch_alter_table('orders') as batch_op:
+        batch_op.drop_column('referral_processed_at')
@@ -2,10 +2,14 @@ from .user_repository import UserRepository
 from .product_repository import ProductRepository
 from .order_repository import OrderRepository
 from .category_repository import CategoryRepository
+from .ledger_repository import LedgerRepository
+from .stock_summary_repository import StockSummaryRepository
 
 __all__ = [
     "UserRepository",
     "ProductRepository", 
     "OrderRepository",
-    "CategoryRepository"
+    "CategoryRepository",
+    "LedgerRepository",
+    "StockSummaryRepository"
 ]
\ No newline at end of file
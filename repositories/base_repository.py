@@ -1,17 +1,40 @@
+import functools
 from abc import ABC, abstractmethod
 from typing import TypeVar, Generic, Optional, List
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, update, delete, func
-from database.database import Base
+from sqlalchemy.orm.attributes import set_committed_value
+from database.database import Base, REPLICA_READS_KEY
 
 T = TypeVar('T', bound=Base)
 
 
+def replica_read(method):
+    """Выполнять SELECT метода на реплике, если она настроена (см. RoutingSession)"""
+    @functools.wraps(method)
+    async def wrapper(self, *args, **kwargs):
+        info = self.session.info
+        info[REPLICA_READS_KEY] = info.get(REPLICA_READS_KEY, 0) + 1
+        try:
+            return await method(self, *args, **kwargs)
+        finally:
+            info[REPLICA_READS_KEY] -= 1
+    return wrapper
+
+
 class BaseRepository(ABC, Generic[T]):
     def __init__(self, session: AsyncSession, model: type[T]):
         self.session = session
         self.model = model
     
+    def _sync_loaded(self, model: type, id: int, values: dict):
+        """Обновить загруженный в сессию объект значениями из RETURNING (UPDATE без synchronize_session)"""
+        sync_session = self.session.sync_session
+        instance = sync_session.identity_map.get(sync_session.identity_key(model, id))
+        if instance is not None:
+            for key, value in values.items():
+                set_committed_value(instance, key, value)
+    
     async def create(self, **kwargs) -> T:
         """Создать новую запись"""
         instance = self.model(**kwargs)
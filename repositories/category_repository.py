@@ -3,13 +3,14 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, func
 from sqlalchemy.orm import selectinload
 from database.models import Category, Product
-from .base_repository import BaseRepository
+from .base_repository import BaseRepository, replica_read
 
 
 class CategoryRepository(BaseRepository[Category]):
     def __init__(self, session: AsyncSession):
         super().__init__(session, Category)
     
+    @replica_read
     async def get_active_categories(self) -> List[Category]:
         """Получить активные категории"""
         stmt = (
@@ -21,6 +22,7 @@ class CategoryRepository(BaseRepository[Category]):
         result = await self.session.execute(stmt)
         return list(result.scalars().all())
     
+    @replica_read
     async def get_categories_with_products(self) -> List[Category]:
         """Получить категории с товарами"""
         stmt = (
@@ -39,6 +41,7 @@ class CategoryRepository(BaseRepository[Category]):
         result = await self.session.execute(stmt)
         return result.scalar_one_or_none()
     
+    @replica_read
     async def get_categories_stats(self) -> List[dict]:
         """Получить статистику по категориям"""
         stmt = (
@@ -0,0 +1,277 @@
+from typing import Optional, List, Tuple
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, update, delete, func, and_, case, literal
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from database.models import User, BalanceTransaction, LedgerReason
+from database.money import Money, MoneyType
+from .base_repository import BaseRepository
+
+
+def user_account(user_id: int) -> str:
+    """Счет пользователя в журнале"""
+    return f"user:{user_id}"
+
+
+def system_account(name: str) -> str:
+    """Системный счет в журнале"""
+    return f"system:{name}"
+
+
+class LedgerRepository(BaseRepository[BalanceTransaction]):
+    def __init__(self, session: AsyncSession):
+        super().__init__(session, BalanceTransaction)
+
+    async def post(
+        self,
+        user_id: int,
+        amount: Money,
+        idempotency_key: str,
+        reason: LedgerReason,
+        counter_account: Optional[str] = None,
+        description: Optional[str] = None,
+        counters: Optional[dict] = None,
+        allow_overdraft: bool = True,
+        commit: bool = True
+    ) -> bool:
+        """
+        Провести изменение баланса пользователя через журнал
+
+        Баланс меняется атомарным UPDATE users SET balance = balance + :amount,
+        в той же транзакции пишутся две проводки события. Повтор с тем же
+        idempotency_key ничего не меняет.
+
+        Args:
+            counters: дополнительные денежные счетчики пользователя,
+                увеличиваемые на ту же сумму (например, referral_earnings)
+            allow_overdraft: False - списание только при достаточном балансе
+            commit: False - не фиксировать транзакцию (фиксирует вызывающий).
+                При отказе отменяются только проводки этого вызова,
+                остальные изменения вызывающего остаются в транзакции -
+                откатывать ли их, решает вызывающий
+
+        Returns:
+            True, если проводка выполнена; False - событие уже проведено,
+            пользователь не найден или не хватает средств
+        """
+        amount = Money.coerce(amount)
+
+        values = {"balance": User.balance + amount}
+        for column in counters or ():
+            values[column] = getattr(User, column) + amount
+
+        conditions = [User.id == user_id]
+        if not allow_overdraft and amount < 0:
+            conditions.append(User.balance >= -amount)
+
+        legs = [
+            {
+                "account": user_account(user_id),
+                "user_id": user_id,
+                "amount": amount,
+                "idempotency_key": idempotency_key,
+                "reason": reason.value,
+                "description": description,
+            },
+            {
+                "account": counter_account or system_account(reason.value),
+                "user_id": None,
+                "amount": -amount,
+                "idempotency_key": idempotency_key,
+                "reason": reason.value,
+                "description": description,
+            },
+        ]
+
+        # Сначала проводки: повтор события упирается в уникальный ключ и ничего не пишет.
+        # ON CONFLICT DO NOTHING вместо IntegrityError - после ошибки SQLite держит блокировку записи
+        inserted = (await self.session.scalars(
+            self._insert_ignore().returning(BalanceTransaction.id),
+            legs
+        )).all()
+        if len(inserted) != len(legs):
+            await self._discard(inserted, commit)
+            return False
+
+        stmt = (
+            update(User)
+            .where(and_(*conditions))
+            .values(**values)
+            .returning(*(getattr(User, column) for column in values))
+            .execution_options(synchronize_session=False)
+        )
+        row = (await self.session.execute(stmt)).first()
+
+        if row is None:
+            # Нет пользователя или не хватает средств - отменяем проводки
+            await self._discard(inserted, commit)
+            return False
+
+        if commit:
+            await self.session.commit()
+
+        self._sync_loaded(User, user_id, dict(zip(values, row)))
+        return True
+
+    async def _discard(self, leg_ids: List[int], commit: bool):
+        """
+        Отменить проводки неудавшегося post
+
+        Своя транзакция (commit=True) откатывается целиком, как и раньше.
+        В транзакции вызывающего удаляются только записанные проводки.
+        """
+        if commit:
+            await self.session.rollback()
+        elif leg_ids:
+            await self.session.execute(
+                delete(BalanceTransaction)
+                .where(BalanceTransaction.id.in_(leg_ids))
+                .execution_options(synchronize_session=False)
+            )
+
+    async def post_many(
+        self,
+        postings: List[Tuple[int, Money, str, Optional[str]]],
+        reason: LedgerReason,
+        counters: Optional[list] = None
+    ) -> List[str]:
+        """
+        Провести пачку начислений пользователям (без commit)
+
+        Проводки всех событий пишутся одним INSERT, уже проведенные события
+        пропускаются. Балансы всех затронутых пользователей меняются одним
+        UPDATE users SET balance = balance + CASE id ... - только на суммы
+        реально проведенных событий.
+
+        Args:
+            postings: [(user_id, amount, idempotency_key, description), ...]
+            counters: дополнительные денежные счетчики пользователя,
+                увеличиваемые на ту же сумму (например, referral_earnings)
+
+        Returns:
+            Ключи проведенных событий
+        """
+        if not postings:
+            return []
+
+        legs = []
+        for user_id, amount, idempotency_key, description in postings:
+            amount = Money.coerce(amount)
+            legs.append({
+                "account": user_account(user_id),
+                "user_id": user_id,
+                "amount": amount,
+                "idempotency_key": idempotency_key,
+                "reason": reason.value,
+                "description": description,
+            })
+            legs.append({
+                "account": system_account(reason.value),
+                "user_id": None,
+                "amount": -amount,
+                "idempotency_key": idempotency_key,
+                "reason": reason.value,
+                "description": description,
+            })
+
+        inserted = (await self.session.execute(
+            self._insert_ignore().returning(BalanceTransaction.idempotency_key, BalanceTransaction.user_id),
+            legs
+        )).all()
+        posted = {key for key, user_id in inserted if user_id is not None}
+        if not posted:
+            return []
+
+        # Суммы по пользователям - только по событиям, проведенным сейчас
+        amounts = {}
+        for user_id, amount, idempotency_key, _ in postings:
+            if idempotency_key in posted:
+                amounts[user_id] = amounts.get(user_id, Money(0)) + Money.coerce(amount)
+
+        delta = case(
+            {user_id: literal(amount, MoneyType) for user_id, amount in amounts.items()},
+            value=User.id,
+            else_=literal(Money(0), MoneyType)
+        )
+        values = {"balance": User.balance + delta}
+        for column in counters or ():
+            values[column] = getattr(User, column) + delta
+
+        stmt = (
+            update(User)
+            .where(User.id.in_(list(amounts)))
+            .values(**values)
+            .returning(User.id, *(getattr(User, column) for column in values))
+            .execution_options(synchronize_session=False)
+        )
+        for user_id, *row in await self.session.execute(stmt):
+            self._sync_loaded(User, user_id, dict(zip(values, row)))
+
+        return [key for _, _, key, _ in postings if key in posted]
+
+    def _insert_ignore(self):
+        """INSERT проводок, пропускающий уже проведенные события"""
+        if self.session.get_bind().dialect.name == "postgresql":
+            stmt = postgresql_insert(BalanceTransaction)
+        else:
+            stmt = sqlite_insert(BalanceTransaction)
+        return stmt.on_conflict_do_nothing(index_elements=["idempotency_key", "account"])
+
+    async def is_posted(self, idempotency_key: str) -> bool:
+        """Проведено ли событие"""
+        stmt = select(BalanceTransaction.id).where(BalanceTransaction.idempotency_key == idempotency_key).limit(1)
+        return await self.session.scalar(stmt) is not None
+
+    async def get_user_transactions(self, user_id: int, limit: int = 20) -> List[BalanceTransaction]:
+        """Получить последние проводки пользователя"""
+        stmt = (
+            select(BalanceTransaction)
+            .where(BalanceTransaction.user_id == user_id)
+            .order_by(BalanceTransaction.id.desc())
+            .limit(limit)
+        )
+        result = await self.session.execute(stmt)
+        return list(result.scalars().all())
+
+    async def get_balance_mismatches(self, limit: int = 100) -> List[tuple]:
+        """
+        Пользователи, у которых баланс не совпадает с суммой проводок
+
+        Returns:
+            [(user_id, balance, ledger_balance), ...]
+        """
+        ledger = (
+            select(
+                BalanceTransaction.user_id.label("user_id"),
+                func.sum(BalanceTransaction.amount).label("total")
+            )
+            .where(BalanceTransaction.user_id.is_not(None))
+            .group_by(BalanceTransaction.user_id)
+            .subquery()
+        )
+        ledger_total = func.coalesce(ledger.c.total, 0)
+
+        stmt = (
+            select(User.id, User.balance, ledger_total)
+            .outerjoin(ledger, ledger.c.user_id == User.id)
+            .where(func.coalesce(User.balance, 0) != ledger_total)
+            .limit(limit)
+        )
+        result = await self.session.execute(stmt)
+        return list(result.all())
+
+    async def get_unbalanced_keys(self, limit: int = 100) -> List[tuple]:
+        """
+        События, проводки которых не сходятся в ноль
+
+        Returns:
+            [(idempotency_key, sum), ...]
+        """
+        stmt = (
+            select(BalanceTransaction.idempotency_key, func.sum(BalanceTransaction.amount))
+            .group_by(BalanceTransaction.idempotency_key)
+            .having(func.sum(BalanceTransaction.amount) != 0)
+            .limit(limit)
+        )
+        result = await self.session.execute(stmt)
+        return list(result.all())
@@ -1,10 +1,12 @@
-from typing import Optional, List
+from typing import Optional, List, Tuple
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func, and_, desc
+from sqlalchemy import select, update, func, and_, desc, exists, literal, cast, String
 from sqlalchemy.orm import selectinload
+from sqlalchemy.orm.attributes import set_committed_value
 from datetime import datetime, timedelta
-from database.models import Order, OrderStatus
-from .base_repository import BaseRepository
+from database.models import Order, OrderStatus, BalanceTransaction, LedgerReason
+from database.money import Money
+from .base_repository import BaseRepository, replica_read
 
 
 class OrderRepository(BaseRepository[Order]):
@@ -26,6 +28,17 @@ class OrderRepository(BaseRepository[Order]):
         result = await self.session.execute(stmt)
         return list(result.scalars().all())
     
+    async def get_with_details(self, order_id: int) -> Optional[Order]:
+        """Получить заказ с товаром и пользователем"""
+        stmt = (
+            select(Order)
+            .options(selectinload(Order.product), selectinload(Order.user))
+            .where(Order.id == order_id)
+        )
+        
+        result = await self.session.execute(stmt)
+        return result.scalar_one_or_none()
+    
     async def get_pending_orders(self) -> List[Order]:
         """Получить заказы в ожидании"""
         stmt = (
@@ -50,18 +63,115 @@ class OrderRepository(BaseRepository[Order]):
         result = await self.session.execute(stmt)
         return list(result.scalars().all())
     
-    async def update_status(self, order_id: int, status: OrderStatus, delivered_content: Optional[str] = None) -> Optional[Order]:
-        """Обновить статус заказа"""
-        order = await self.get_by_id(order_id)
-        if order:
-            order.status = status.value
-            if status == OrderStatus.DELIVERED and delivered_content:
-                order.delivered_content = delivered_content
-                order.delivered_at = datetime.utcnow()
-            await self.session.commit()
-            await self.session.refresh(order)
-        return order
+    async def transition(self, order: Order, status: OrderStatus, **values) -> bool:
+        """
+        Перевести заказ в статус status (без commit)
+
+        UPDATE выполняется с условием status и version, прочитанных вместе
+        с order, и увеличивает version. Если заказ успели изменить
+        (двойное нажатие, второй админ), строка не обновится. Побочные
+        действия перехода вызывающий выполняет в той же транзакции только
+        при True, поэтому они применяются ровно один раз.
+
+        Args:
+            values: дополнительные поля заказа (delivered_content, notes...)
+
+        Returns:
+            True, если переход выполнен; order синхронизируется с БД
+        """
+        stmt = (
+            update(Order)
+            .where(and_(
+                Order.id == order.id,
+                Order.status == order.status,
+                Order.version == order.version
+            ))
+            .values(status=status.value, version=Order.version + 1, **values)
+            .returning(Order.version)
+            .execution_options(synchronize_session=False)
+        )
+        version = (await self.session.execute(stmt)).scalar_one_or_none()
+        if version is None:
+            return False
+        
+        for key, value in {"status": status.value, "version": version, **values}.items():
+            set_committed_value(order, key, value)
+        return True
+    
+    async def expire_pending(self, created_before: datetime, limit: int, notes: str) -> List[Tuple[int, int, int]]:
+        """
+        Отменить до limit неоплаченных заказов, созданных раньше created_before (без commit)
+        
+        Кандидаты выбираются по индексу (status, created_at); условие
+        status = pending повторяется в UPDATE, поэтому заказ, оплаченный
+        параллельно, не отменится. Версия растет, как при transition.
+        
+        Returns:
+            [(order_id, product_id, quantity), ...] - отмененные заказы
+        """
+        expired = (
+            select(Order.id)
+            .where(and_(
+                Order.status == OrderStatus.PENDING.value,
+                Order.created_at < created_before
+            ))
+            .order_by(Order.created_at)
+            .limit(limit)
+        )
+        stmt = (
+            update(Order)
+            .where(and_(
+                Order.id.in_(expired.scalar_subquery()),
+                Order.status == OrderStatus.PENDING.value
+            ))
+            .values(status=OrderStatus.CANCELLED.value, version=Order.version + 1, notes=notes)
+            .returning(Order.id, Order.product_id, Order.quantity)
+            .execution_options(synchronize_session=False)
+        )
+        return [tuple(row) for row in await self.session.execute(stmt)]
+    
+    async def get_unrewarded_orders(self, limit: int) -> List[Tuple[int, int, str, Money, bool]]:
+        """
+        Заказы, ждущие обработки реферальной системой (все, кроме ожидающих оплаты)
+        
+        Выбираются по частичному индексу ix_orders_referral_pending. На PostgreSQL
+        строки блокируются до конца транзакции, а занятые другим обработчиком
+        пропускаются (FOR UPDATE SKIP LOCKED).
+        
+        Returns:
+            [(order_id, user_id, status, total_price, charged), ...], где charged -
+            проведено ли списание за заказ (проводка purchase:<order_id>)
+        """
+        # Ключ списания - как в OrderService.purchase_key
+        charged = exists().where(and_(
+            BalanceTransaction.idempotency_key == literal("purchase:") + cast(Order.id, String),
+            BalanceTransaction.reason == LedgerReason.PURCHASE.value
+        ))
+        stmt = (
+            select(Order.id, Order.user_id, Order.status, Order.total_price, charged.label("charged"))
+            .where(and_(
+                Order.referral_processed_at.is_(None),
+                Order.status != OrderStatus.PENDING.value
+            ))
+            .order_by(Order.id)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+        )
+        return [tuple(row) for row in await self.session.execute(stmt)]
+    
+    async def mark_referral_processed(self, order_ids: List[int]) -> None:
+        """Отметить заказы как обработанные реферальной системой (без commit)"""
+        if not order_ids:
+            return
+        stmt = (
+            update(Order)
+            .where(Order.id.in_(order_ids))
+            .values(referral_processed_at=datetime.utcnow())
+            .execution_options(synchronize_session=False)
+        )
+        await self.session.execute(stmt)
     
+    @replica_read
     async def get_orders_stats(self, days: int = 30) -> dict:
         """Получить статистику заказов"""
         since_date = datetime.utcnow() - timedelta(days=days)
@@ -82,7 +192,7 @@ class OrderRepository(BaseRepository[Order]):
                     Order.status.in_([OrderStatus.PAID.value, OrderStatus.DELIVERED.value])
                 )
             )
-        ) or 0
+        ) or Money(0)
         
         # Заказы по статусам
         pending_count = await self.session.scalar(
@@ -107,6 +217,7 @@ class OrderRepository(BaseRepository[Order]):
             "days": days
         }
     
+    @replica_read
     async def get_recent_orders(self, limit: int = 10) -> List[Order]:
         """Получить последние заказы"""
         stmt = (
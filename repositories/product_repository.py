@@ -1,15 +1,26 @@
-from typing import Optional, List
+from typing import Optional, List, Tuple, Dict
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func, and_, or_
+from sqlalchemy import select, update, case, func, and_, or_
 from sqlalchemy.orm import selectinload
+from database.database import STOCK_ONLY_OPTION, mark_catalog_changed
 from database.models import Product, Category
-from .base_repository import BaseRepository
+from .base_repository import BaseRepository, replica_read
+
+
+def escape_like(value: str, escape: str = "\\") -> str:
+    """Экранировать спецсимволы LIKE, чтобы % и _ в запросе искались буквально"""
+    return (
+        value.replace(escape, escape * 2)
+        .replace("%", escape + "%")
+        .replace("_", escape + "_")
+    )
 
 
 class ProductRepository(BaseRepository[Product]):
     def __init__(self, session: AsyncSession):
         super().__init__(session, Product)
     
+    @replica_read
     async def get_active_products(self, category_id: Optional[int] = None, limit: Optional[int] = None) -> List[Product]:
         """Получить активные товары"""
         stmt = select(Product).options(selectinload(Product.category)).where(Product.is_active == True)
@@ -25,6 +36,14 @@ class ProductRepository(BaseRepository[Product]):
         result = await self.session.execute(stmt)
         return list(result.scalars().all())
     
+    @replica_read
+    async def get_with_category(self, product_id: int) -> Optional[Product]:
+        """Получить товар вместе с категорией"""
+        stmt = select(Product).options(selectinload(Product.category)).where(Product.id == product_id)
+        result = await self.session.execute(stmt)
+        return result.scalar_one_or_none()
+    
+    @replica_read
     async def get_available_products(self, category_id: Optional[int] = None) -> List[Product]:
         """Получить доступные товары (в наличии)"""
         stmt = (
@@ -49,22 +68,78 @@ class ProductRepository(BaseRepository[Product]):
         result = await self.session.execute(stmt)
         return list(result.scalars().all())
     
-    async def search_products(self, query: str) -> List[Product]:
-        """Поиск товаров по названию"""
+    @replica_read
+    async def get_category_products(
+        self,
+        category_id: int,
+        in_stock: Optional[bool] = None,
+        offset: int = 0,
+        limit: Optional[int] = None
+    ) -> List[Product]:
+        """
+        Получить страницу активных товаров категории
+
+        Args:
+            in_stock: True - только в наличии, False - только закончившиеся, None - все
+        """
+        stmt = select(Product).where(and_(Product.category_id == category_id, Product.is_active == True))
+        
+        if in_stock is True:
+            stmt = stmt.where(or_(Product.is_unlimited == True, Product.stock_quantity > 0))
+        elif in_stock is False:
+            stmt = stmt.where(and_(Product.is_unlimited == False, Product.stock_quantity <= 0))
+        
+        stmt = stmt.order_by(Product.sort_order, Product.name, Product.id).offset(offset)
+        
+        if limit:
+            stmt = stmt.limit(limit)
+        
+        result = await self.session.execute(stmt)
+        return list(result.scalars().all())
+    
+    @replica_read
+    async def search_products(
+        self,
+        query: str,
+        limit: int = 10,
+        offset: int = 0,
+        only_available: bool = False
+    ) -> Tuple[List[Product], int]:
+        """
+        Поиск активных товаров по подстроке названия без учета регистра
+
+        Фильтрация, LIMIT и подсчет общего числа совпадений (оконный COUNT)
+        выполняются в БД одним запросом.
+
+        Returns:
+            (товары страницы, всего найдено)
+        """
+        conditions = [
+            Product.is_active == True,
+            Product.name.ilike(f"%{escape_like(query)}%", escape="\\")
+        ]
+        if only_available:
+            conditions.append(or_(Product.is_unlimited == True, Product.stock_quantity > 0))
+        
         stmt = (
-            select(Product)
+            select(Product, func.count().over().label("total"))
             .options(selectinload(Product.category))
-            .where(
-                and_(
-                    Product.is_active == True,
-                    Product.name.ilike(f"%{query}%")
-                )
-            )
-            .order_by(Product.name)
+            .where(and_(*conditions))
+            .order_by(Product.name, Product.id)
+            .limit(limit)
+            .offset(offset)
         )
         
-        result = await self.session.execute(stmt)
-        return list(result.scalars().all())
+        rows = (await self.session.execute(stmt)).all()
+        if rows:
+            return [row[0] for row in rows], rows[0].total
+        
+        if not offset:
+            return [], 0
+        
+        # Страница за пределами результатов - считаем совпадения отдельно
+        total = await self.session.scalar(select(func.count(Product.id)).where(and_(*conditions)))
+        return [], total
     
     async def update_stock(self, product_id: int, quantity_change: int) -> Optional[Product]:
         """Обновить остатки товара"""
@@ -77,15 +152,204 @@ class ProductRepository(BaseRepository[Product]):
             await self.session.refresh(product)
         return product
     
-    async def increment_sold(self, product_id: int, quantity: int = 1) -> Optional[Product]:
-        """Увеличить счетчик продаж"""
-        product = await self.get_by_id(product_id)
-        if product:
-            product.total_sold += quantity
+    async def claim_units(self, product_id: int, quantity: int) -> Tuple[int, Optional[str]]:
+        """
+        Атомарно списать до quantity единиц товара (без commit)
+
+        Остаток проверяется и уменьшается одним UPDATE, поэтому параллельные
+        выдачи не уходят в минус. Если остатка меньше quantity, списывается
+        сколько есть. У безлимитного товара растет только счетчик продаж.
+
+        Returns:
+            (списано единиц, содержимое товара)
+        """
+        for _ in range(3):
+            row = (await self.session.execute(
+                select(Product.stock_quantity, Product.is_unlimited, Product.digital_content)
+                .where(and_(Product.id == product_id, Product.is_active == True))
+            )).first()
+            if row is None or not row.digital_content:
+                return 0, None
+
+            claim = quantity if row.is_unlimited else min(quantity, row.stock_quantity)
+            if claim <= 0:
+                return 0, row.digital_content
+
+            stmt = (
+                update(Product)
+                .where(and_(
+                    Product.id == product_id,
+                    or_(Product.is_unlimited == True, Product.stock_quantity >= claim)
+                ))
+                .values(
+                    stock_quantity=Product.stock_quantity - (0 if row.is_unlimited else claim),
+                    total_sold=Product.total_sold + claim
+                )
+                .returning(Product.stock_quantity)
+                .execution_options(synchronize_session=False, **{STOCK_ONLY_OPTION: True})
+            )
+            remaining = (await self.session.execute(stmt)).scalar_one_or_none()
+            if remaining is not None:
+                if not row.is_unlimited and remaining == 0:
+                    mark_catalog_changed(self.session)
+                return claim, row.digital_content
+            # Остаток изменился между чтением и UPDATE - пересчитываем
+
+        return 0, None
+
+    async def claim_category_units(self, category_id: int, quantity: int) -> List[Tuple[int, str, str]]:
+        """
+        Атомарно списать до quantity единиц из товаров категории (без commit)
+
+        За один UPDATE с каждого товара списывается одна единица; условие
+        stock_quantity > 0 повторяется во внешнем WHERE, поэтому единицу,
+        уже забранную параллельной выдачей, повторно не получить.
+
+        Returns:
+            [(product_id, name, digital_content), ...]
+        """
+        claimed = []
+
+        while len(claimed) < quantity:
+            candidates = (
+                select(Product.id)
+                .where(and_(
+                    Product.category_id == category_id,
+                    Product.is_active == True,
+                    Product.is_unlimited == False,
+                    Product.stock_quantity > 0,
+                    Product.digital_content.is_not(None)
+                ))
+                .order_by(Product.id)
+                .limit(quantity - len(claimed))
+            )
+            stmt = (
+                update(Product)
+                .where(and_(Product.id.in_(candidates.scalar_subquery()), Product.stock_quantity > 0))
+                .values(stock_quantity=Product.stock_quantity - 1, total_sold=Product.total_sold + 1)
+                .returning(Product.id, Product.name, Product.digital_content, Product.stock_quantity)
+                .execution_options(synchronize_session=False, **{STOCK_ONLY_OPTION: True})
+            )
+            rows = (await self.session.execute(stmt)).all()
+            if not rows:
+                break
+            if any(row.stock_quantity == 0 for row in rows):
+                mark_catalog_changed(self.session)
+            claimed.extend((row.id, row.name, row.digital_content) for row in rows)
+
+        return claimed
+
+    async def count_category_units(self, category_id: int) -> int:
+        """Сколько единиц можно списать из категории через claim_category_units"""
+        stmt = select(func.coalesce(func.sum(Product.stock_quantity), 0)).where(and_(
+            Product.category_id == category_id,
+            Product.is_active == True,
+            Product.is_unlimited == False,
+            Product.stock_quantity > 0,
+            Product.digital_content.is_not(None)
+        ))
+        return await self.session.scalar(stmt)
+
+    async def release_units(self, product_id: int, quantity: int):
+        """Вернуть на склад единицы, списанные claim_units/claim_category_units (без commit)"""
+        stmt = (
+            update(Product)
+            .where(Product.id == product_id)
+            .values(
+                stock_quantity=case(
+                    (Product.is_unlimited == True, Product.stock_quantity),
+                    else_=Product.stock_quantity + quantity
+                ),
+                total_sold=Product.total_sold - quantity
+            )
+            .returning(Product.stock_quantity, Product.is_unlimited)
+            .execution_options(synchronize_session=False, **{STOCK_ONLY_OPTION: True})
+        )
+        row = (await self.session.execute(stmt)).first()
+        if row is not None and not row.is_unlimited and row.stock_quantity == quantity:
+            # Товар снова в наличии
+            mark_catalog_changed(self.session)
+
+    async def increment_sold(self, product_id: int, quantity: int = 1, commit: bool = True):
+        """Увеличить счетчик продаж (атомарным UPDATE)"""
+        stmt = (
+            update(Product)
+            .where(Product.id == product_id)
+            .values(total_sold=Product.total_sold + quantity)
+            .execution_options(synchronize_session=False, **{STOCK_ONLY_OPTION: True})
+        )
+        await self.session.execute(stmt)
+        if commit:
             await self.session.commit()
-            await self.session.refresh(product)
-        return product
     
+    async def return_stock_bulk(self, quantities: Dict[int, int]) -> int:
+        """
+        Вернуть на склад единицы нескольких товаров одним UPDATE (без commit)
+        
+        Args:
+            quantities: {product_id: количество}
+        
+        Returns:
+            Сколько единиц вернулось (безлимитные товары не меняются)
+        """
+        if not quantities:
+            return 0
+        
+        stmt = (
+            update(Product)
+            .where(and_(Product.id.in_(list(quantities)), Product.is_unlimited == False))
+            .values(stock_quantity=Product.stock_quantity + case(quantities, value=Product.id, else_=0))
+            .returning(Product.id, Product.stock_quantity)
+            .execution_options(synchronize_session=False, **{STOCK_ONLY_OPTION: True})
+        )
+        returned = (await self.session.execute(stmt)).all()
+        if any(stock_quantity == quantities[product_id] for product_id, stock_quantity in returned):
+            mark_catalog_changed(self.session)
+        return sum(quantities[product_id] for product_id, _ in returned)
+    
+    async def reserve_stock(self, product_id: int, quantity: int = 1) -> bool:
+        """
+        Атомарно зарезервировать quantity единиц активного товара (без commit)
+        
+        Returns:
+            False, если товар неактивен или остатка не хватает
+        """
+        stmt = (
+            update(Product)
+            .where(and_(
+                Product.id == product_id,
+                Product.is_active == True,
+                or_(Product.is_unlimited == True, Product.stock_quantity >= quantity)
+            ))
+            .values(stock_quantity=case(
+                (Product.is_unlimited == True, Product.stock_quantity),
+                else_=Product.stock_quantity - quantity
+            ))
+            .returning(Product.stock_quantity, Product.is_unlimited)
+            .execution_options(synchronize_session=False, **{STOCK_ONLY_OPTION: True})
+        )
+        row = (await self.session.execute(stmt)).first()
+        if row is None:
+            return False
+        if not row.is_unlimited and row.stock_quantity == 0:
+            # Зарезервирована последняя единица
+            mark_catalog_changed(self.session)
+        return True
+    
+    async def return_stock(self, product_id: int, quantity: int = 1):
+        """Вернуть зарезервированные единицы на склад (без commit, безлимитный товар не меняется)"""
+        stmt = (
+            update(Product)
+            .where(and_(Product.id == product_id, Product.is_unlimited == False))
+            .values(stock_quantity=Product.stock_quantity + quantity)
+            .returning(Product.stock_quantity)
+            .execution_options(synchronize_session=False, **{STOCK_ONLY_OPTION: True})
+        )
+        if (await self.session.execute(stmt)).scalar_one_or_none() == quantity:
+            # Товар снова в наличии
+            mark_catalog_changed(self.session)
+    
+    @replica_read
     async def get_low_stock_products(self, threshold: int = 5) -> List[Product]:
         """Получить товары с низкими остатками"""
         stmt = (
@@ -104,6 +368,7 @@ class ProductRepository(BaseRepository[Product]):
         result = await self.session.execute(stmt)
         return list(result.scalars().all())
     
+    @replica_read
     async def get_top_selling(self, limit: int = 10) -> List[Product]:
         """Получить топ продаваемых товаров"""
         stmt = (
@@ -0,0 +1,117 @@
+from typing import Optional, List
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, func, case, and_, or_, text, bindparam
+from database.models import Category, Product
+from database.category_counters import CATEGORY_COUNTERS, recount_sql
+from .base_repository import replica_read
+
+
+class StockSummaryRepository:
+    """
+    Сводка остатков по категориям
+
+    Читает счетчики из строки категории (их ведут триггеры на products,
+    см. database/category_counters.py). Сгруппированный пересчет по товарам
+    используется только для сверки и исправления счетчиков.
+    """
+
+    def __init__(self, session: AsyncSession):
+        self.session = session
+
+    @staticmethod
+    def _summary_query():
+        return select(
+            Category.id,
+            Category.name,
+            Category.total_products,
+            Category.available_products,
+            (Category.total_products - Category.available_products).label("out_of_stock_products"),
+            Category.unlimited_products,
+            Category.total_stock,
+        )
+
+    @staticmethod
+    def _recount_query():
+        """Фактические значения счетчиков, посчитанные по товарам"""
+        is_available = or_(Product.is_unlimited == True, Product.stock_quantity > 0)
+
+        return (
+            select(
+                Category.id,
+                Category.name,
+                Category.total_products,
+                Category.available_products,
+                Category.unlimited_products,
+                Category.total_stock,
+                func.count(Product.id).label("actual_total_products"),
+                func.coalesce(func.sum(case((is_available, 1), else_=0)), 0).label("actual_available_products"),
+                func.coalesce(func.sum(case((Product.is_unlimited == True, 1), else_=0)), 0).label("actual_unlimited_products"),
+                func.coalesce(
+                    func.sum(case((Product.is_unlimited == False, Product.stock_quantity), else_=0)), 0
+                ).label("actual_total_stock"),
+            )
+            .outerjoin(Product, and_(Product.category_id == Category.id, Product.is_active == True))
+            .group_by(
+                Category.id, Category.name, Category.total_products, Category.available_products,
+                Category.unlimited_products, Category.total_stock
+            )
+        )
+
+    @replica_read
+    async def get_category_summaries(self, only_active: bool = True) -> List[dict]:
+        """
+        Сводка по всем категориям
+
+        Returns:
+            [{'id', 'name', 'total_products', 'available_products',
+              'out_of_stock_products', 'unlimited_products', 'total_stock'}, ...]
+        """
+        stmt = self._summary_query()
+        if only_active:
+            stmt = stmt.where(Category.is_active == True).order_by(Category.sort_order, Category.name)
+        else:
+            stmt = stmt.order_by(Category.name)
+
+        result = await self.session.execute(stmt)
+        return [dict(row._mapping) for row in result]
+
+    @replica_read
+    async def get_category_summary(self, category_id: int) -> Optional[dict]:
+        """Сводка по одной категории (None, если категории нет)"""
+        stmt = self._summary_query().where(Category.id == category_id)
+        row = (await self.session.execute(stmt)).first()
+        return dict(row._mapping) if row else None
+
+    async def get_counter_drift(self) -> List[dict]:
+        """
+        Категории, у которых счетчики расходятся с товарами
+
+        Returns:
+            [{'id', 'name', 'stored': {...}, 'actual': {...}}, ...]
+        """
+        drift = []
+        for row in await self.session.execute(self._recount_query()):
+            stored = {column: getattr(row, column) for column in CATEGORY_COUNTERS}
+            actual = {column: getattr(row, f"actual_{column}") for column in CATEGORY_COUNTERS}
+            if stored != actual:
+                drift.append({"id": row.id, "name": row.name, "stored": stored, "actual": actual})
+        return drift
+
+    async def recount(self, category_ids: List[int]) -> None:
+        """
+        Пересчитать счетчики категорий по товарам (без commit)
+
+        Строки категорий сначала блокируются: параллельные изменения товаров
+        этих категорий ждут пересчета и затем применяют свои приращения к
+        уже исправленным значениям.
+        """
+        if not category_ids:
+            return
+
+        await self.session.execute(
+            select(Category.id).where(Category.id.in_(category_ids)).with_for_update()
+        )
+        await self.session.execute(
+            text(f"{recount_sql()} WHERE categories.id IN :ids").bindparams(bindparam("ids", expanding=True)),
+            {"ids": list(category_ids)}
+        )
@@ -1,9 +1,12 @@
-from typing import Optional, List
+import uuid
+from typing import Optional, List, Dict
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func
-from sqlalchemy.orm import selectinload
-from database.models import User
-from .base_repository import BaseRepository
+from sqlalchemy import select, update, func, and_, case, literal
+from sqlalchemy.orm import selectinload, aliased
+from database.models import User, Referral, LedgerReason
+from database.money import Money
+from .base_repository import BaseRepository, replica_read
+from .ledger_repository import LedgerRepository
 
 
 class UserRepository(BaseRepository[User]):
@@ -32,6 +35,7 @@ class UserRepository(BaseRepository[User]):
         result = await self.session.execute(stmt)
         return result.scalar_one_or_none()
     
+    @replica_read
     async def search_users_by_username(self, username_pattern: str) -> List[User]:
         """Поиск пользователей по частичному совпадению username"""
         stmt = select(User).where(
@@ -40,6 +44,27 @@ class UserRepository(BaseRepository[User]):
         result = await self.session.execute(stmt)
         return list(result.scalars().all())
     
+    async def get_by_ids_or_usernames(self, ids: List[int], usernames: List[str], chunk_size: int = 500) -> List[User]:
+        """
+        Найти пользователей по списку Telegram ID и username (без учета регистра)
+
+        Один запрос на пачку вместо поиска по одному пользователю.
+        """
+        usernames = [username.lower() for username in usernames]
+        users = {}
+
+        for start in range(0, max(len(ids), len(usernames)), chunk_size):
+            id_chunk = ids[start:start + chunk_size]
+            username_chunk = usernames[start:start + chunk_size]
+            stmt = select(User).where(
+                User.id.in_(id_chunk) | func.lower(User.username).in_(username_chunk)
+            )
+            result = await self.session.execute(stmt)
+            for user in result.scalars():
+                users[user.id] = user
+
+        return list(users.values())
+    
     async def get_or_create_user(self, telegram_id: int, **user_data) -> User:
         """Получить или создать пользователя"""
         user = await self.get_by_telegram_id(telegram_id)
@@ -54,14 +79,159 @@ class UserRepository(BaseRepository[User]):
         result = await self.session.execute(stmt)
         return result.scalar_one_or_none()
     
-    async def update_balance(self, user_id: int, amount: float) -> Optional[User]:
-        """Обновить баланс пользователя"""
-        user = await self.get_by_telegram_id(user_id)
-        if user:
-            user.balance += amount
-            await self.session.commit()
-            await self.session.refresh(user)
-        return user
+    async def update_balance(
+        self,
+        user_id: int,
+        amount: Money,
+        idempotency_key: Optional[str] = None,
+        reason: LedgerReason = LedgerReason.ADJUSTMENT,
+        description: Optional[str] = None
+    ) -> Optional[User]:
+        """
+        Обновить баланс пользователя через журнал балансов
+
+        Без idempotency_key изменение считается разовой ручной корректировкой.
+        """
+        key = idempotency_key or f"{reason.value}:{uuid.uuid4().hex}"
+        await LedgerRepository(self.session).post(user_id, amount, key, reason, description=description)
+        return await self.get_by_telegram_id(user_id)
+    
+    async def get_referrer_ids(self, user_ids: List[int]) -> Dict[int, Optional[int]]:
+        """
+        Пригласившие для пачки пользователей одним запросом
+        
+        Returns:
+            {user_id: referrer_id или None} - только существующие пользователи
+        """
+        if not user_ids:
+            return {}
+        stmt = select(User.id, User.referrer_id).where(User.id.in_(list(user_ids)))
+        return dict((await self.session.execute(stmt)).all())
+    
+    async def set_referrer(self, user_id: int, referrer_id: int) -> bool:
+        """
+        Привязать пользователя к пригласившему и обновить счетчики пригласившего
+        
+        Привязка - UPDATE с условием referrer_id IS NULL, поэтому повторный
+        /start не посчитает приглашенного дважды. Уже заказывавший
+        пользователь сразу учитывается как активный.
+        
+        Returns:
+            False, если пригласивший уже был установлен
+        """
+        stmt = (
+            update(User)
+            .where(and_(User.id == user_id, User.referrer_id.is_(None)))
+            .values(referrer_id=referrer_id)
+            .returning(User.total_orders)
+            .execution_options(synchronize_session=False)
+        )
+        total_orders = (await self.session.execute(stmt)).scalar_one_or_none()
+        if total_orders is None:
+            # UPDATE ничего не изменил - транзакцию вызывающего не трогаем
+            return False
+        
+        stmt = (
+            update(User)
+            .where(User.id == referrer_id)
+            .values(
+                referrals_count=User.referrals_count + 1,
+                active_referrals_count=User.active_referrals_count + (1 if total_orders else 0)
+            )
+            .returning(User.referrals_count, User.active_referrals_count)
+            .execution_options(synchronize_session=False)
+        )
+        counters = (await self.session.execute(stmt)).first()
+        await self.session.commit()
+        
+        self._sync_loaded(User, user_id, {"referrer_id": referrer_id})
+        if counters is not None:
+            self._sync_loaded(User, referrer_id, dict(zip(("referrals_count", "active_referrals_count"), counters)))
+        return True
+    
+    async def record_order(self, user_id: int, total_price: Money) -> None:
+        """
+        Учесть заказ в статистике пользователя атомарным UPDATE
+        
+        На первом заказе приглашенного его пригласивший получает +1 к активным
+        рефералам в той же транзакции.
+        """
+        stmt = (
+            update(User)
+            .where(User.id == user_id)
+            .values(total_orders=User.total_orders + 1, total_spent=User.total_spent + total_price)
+            .returning(User.total_orders, User.total_spent, User.referrer_id)
+            .execution_options(synchronize_session=False)
+        )
+        row = (await self.session.execute(stmt)).first()
+        if row is None:
+            return
+        
+        total_orders, total_spent, referrer_id = row
+        active_referrals_count = None
+        if total_orders == 1 and referrer_id:
+            stmt = (
+                update(User)
+                .where(User.id == referrer_id)
+                .values(active_referrals_count=User.active_referrals_count + 1)
+                .returning(User.active_referrals_count)
+                .execution_options(synchronize_session=False)
+            )
+            active_referrals_count = (await self.session.execute(stmt)).scalar_one_or_none()
+        await self.session.commit()
+        
+        self._sync_loaded(User, user_id, {"total_orders": total_orders, "total_spent": total_spent})
+        if active_referrals_count is not None:
+            self._sync_loaded(User, referrer_id, {"active_referrals_count": active_referrals_count})
+    
+    async def get_team_stats(self, user_id: int, depth: int) -> List[dict]:
+        """
+        Статистика команды пользователя по уровням приглашений одним рекурсивным запросом
+        
+        Уровень 1 - приглашенные пользователем, 2 - приглашенные ими и т.д.
+        до depth. Глубина ограничивает и циклы в цепочке приглашений.
+        
+        Returns:
+            [{'level', 'members', 'active', 'spent', 'earned'}, ...] по возрастанию уровня
+        """
+        team = (
+            select(User.id.label("id"), literal(1).label("level"))
+            .where(User.referrer_id == user_id)
+            .cte("team", recursive=True)
+        )
+        member = aliased(User)
+        team = team.union_all(
+            select(member.id, team.c.level + 1)
+            .join(team, member.referrer_id == team.c.id)
+            .where(team.c.level < depth)
+        )
+        
+        members = (
+            select(
+                team.c.level,
+                func.count(User.id),
+                func.sum(case((User.total_orders > 0, 1), else_=0)),
+                func.sum(User.total_spent)
+            )
+            .join(User, User.id == team.c.id)
+            .group_by(team.c.level)
+        )
+        earned = dict((await self.session.execute(
+            select(Referral.level, func.sum(Referral.reward_amount))
+            .where(Referral.user_id == user_id)
+            .group_by(Referral.level)
+        )).all())
+        
+        return [
+            {
+                "level": level,
+                "members": count,
+                "active": active or 0,
+                "spent": Money.coerce(spent or 0),
+                "earned": Money.coerce(earned.get(level) or 0),
+            }
+            for level, count, active, spent in (await self.session.execute(members.order_by(team.c.level))).all()
+        ]
     
     async def get_referrals(self, user_id: int) -> List[User]:
         """Получить рефералов пользователя"""
@@ -69,6 +239,7 @@ class UserRepository(BaseRepository[User]):
         result = await self.session.execute(stmt)
         return list(result.scalars().all())
     
+    @replica_read
     async def get_top_buyers(self, limit: int = 10) -> List[User]:
         """Получить топ покупателей"""
         stmt = (
@@ -80,13 +251,14 @@ class UserRepository(BaseRepository[User]):
         result = await self.session.execute(stmt)
         return list(result.scalars().all())
     
+    @replica_read
     async def get_stats(self) -> dict:
         """Получить статистику пользователей"""
         total_users = await self.session.scalar(select(func.count(User.id)))
         active_users = await self.session.scalar(
             select(func.count(User.id)).where(User.total_orders > 0)
         )
-        total_balance = await self.session.scalar(select(func.sum(User.balance))) or 0
+        total_balance = await self.session.scalar(select(func.sum(User.balance))) or Money(0)
         
         return {
             "total_users": total_users or 0,
@@ -94,6 +266,7 @@ class UserRepository(BaseRepository[User]):
             "total_balance": total_balance
         }
     
+    @replica_read
     async def get_recent_users(self, limit: int = 10) -> List[User]:
         """Получить недавно зарегистрированных пользователей"""
         from datetime import datetime, timedelta
@@ -110,6 +283,7 @@ class UserRepository(BaseRepository[User]):
         result = await self.session.execute(stmt)
         return list(result.scalars().all())
     
+    @replica_read
     async def get_active_users(self, limit: int = 10) -> List[User]:
         """Получить наиболее активных пользователей (по количеству заказов)"""
         stmt = (
@@ -121,6 +295,7 @@ class UserRepository(BaseRepository[User]):
         result = await self.session.execute(stmt)
         return list(result.scalars().all())
     
+    @replica_read
     async def get_users_with_balance(self, limit: int = 10) -> List[User]:
         """Получить пользователей с наибольшим балансом"""
         stmt = (
@@ -151,6 +326,7 @@ class UserRepository(BaseRepository[User]):
         result = await self.session.execute(stmt)
         return list(result.scalars().all())
     
+    @replica_read
     async def search_users_flexible(self, query: str, limit: int = 10) -> List[User]:
         """Гибкий поиск пользователей по различным параметрам"""
         users = []
@@ -216,7 +392,7 @@ class UserRepository(BaseRepository[User]):
         total_spent = await self.session.scalar(
             select(func.sum(Order.total_price))
             .where(Order.user_id == user_id, Order.status.in_(['paid', 'delivered']))
-        ) or 0
+        ) or Money(0)
         
         return {
             "total_orders": total_orders,
@@ -241,6 +417,7 @@ class UserRepository(BaseRepository[User]):
         result = await self.session.execute(stmt)
         return list(result.scalars().all())
     
+    @replica_read
     async def get_users_by_activity_level(self, level: str, limit: int = 10) -> List[User]:
         """Получить пользователей по уровню активности"""
         if level == "new":
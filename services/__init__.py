@@ -2,10 +2,16 @@ from .user_service import UserService
 from .product_service import ProductService
 from .order_service import OrderService
 from .referral_service import ReferralService
+from .ledger_service import LedgerService
+from .category_counter_service import CategoryCounterService
+from .catalog_view_service import CatalogViewService
 
 __all__ = [
     "UserService",
     "ProductService",
     "OrderService", 
-    "ReferralService"
+    "ReferralService",
+    "LedgerService",
+    "CategoryCounterService",
+    "CatalogViewService"
 ]
\ No newline at end of file
@@ -0,0 +1,88 @@
+"""
+Готовые экраны каталога для покупателей
+
+Экраны каталога одинаковы для всех пользователей, поэтому текст и
+клавиатура собираются один раз и кэшируются по (экран, id, страница,
+версия каталога). Версия растет после каждого коммита, менявшего товары
+или категории. Из остатков экраны показывают только наличие, поэтому
+покупки и возвраты меняют версию, лишь когда товар закончился или появился
+снова. Повторный просмотр - поиск в словаре без запросов к БД и сборки
+клавиатуры. TTL ограничивает устаревание при изменениях
+из других процессов.
+"""
+
+import time
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+from aiogram.types import InlineKeyboardMarkup
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from config import settings
+from database.database import catalog_version
+from keyboards import back_button, categories_kb, product_detail_kb, products_kb
+from utils import format_product_info
+from .product_service import ProductService
+
+CatalogView = Tuple[str, InlineKeyboardMarkup]
+
+CATALOG_VIEW_CACHE_SIZE = 5000
+# (экран, id..., версия каталога) -> (истекает, экран или None)
+_view_cache: Dict[tuple, Tuple[float, Optional[CatalogView]]] = {}
+
+catalog_view_metrics = {
+    "hits": 0,
+    "misses": 0,
+}
+
+
+class CatalogViewService:
+    def __init__(self, session: AsyncSession):
+        self.session = session
+        self.product_service = ProductService(session)
+
+    async def _cached(self, key: tuple, render: Callable[[], Awaitable[Optional[CatalogView]]]) -> Optional[CatalogView]:
+        """Экран из кэша или отрисованный заново"""
+        key = (*key, catalog_version())
+        cached = _view_cache.get(key)
+        if cached and cached[0] > time.monotonic():
+            catalog_view_metrics["hits"] += 1
+            return cached[1]
+
+        catalog_view_metrics["misses"] += 1
+        view = await render()
+
+        # Ключи старых версий больше не запрашиваются - проще сбросить все разом
+        if len(_view_cache) >= CATALOG_VIEW_CACHE_SIZE:
+            _view_cache.clear()
+        _view_cache[key] = (time.monotonic() + settings.CATALOG_VIEW_TTL, view)
+        return view
+
+    async def categories_view(self) -> CatalogView:
+        """Список категорий"""
+        async def render():
+            categories = await self.product_service.get_categories_menu()
+            if not categories:
+                return "❌ Категории не найдены", back_button()
+            return "📂 Выберите категорию:", categories_kb(categories)
+
+        return await self._cached(("categories",), render)
+
+    async def products_view(self, category_id: int, page: int = 0) -> CatalogView:
+        """Страница товаров категории"""
+        async def render():
+            products = await self.product_service.get_products_by_category(category_id)
+            if not products:
+                return "❌ В этой категории пока нет товаров", back_button("catalog")
+            return "🛍 Выберите товар:", products_kb(products, category_id, page)
+
+        return await self._cached(("products", category_id, page), render)
+
+    async def product_view(self, product_id: int) -> Optional[CatalogView]:
+        """Карточка товара; None - товар не найден или недоступен"""
+        async def render():
+            product = await self.product_service.get_product_details(product_id)
+            if not product:
+                return None
+            return format_product_info(product), product_detail_kb(product, user_can_buy=True)
+
+        return await self._cached(("product", product_id), render)
@@ -0,0 +1,52 @@
+from sqlalchemy.ext.asyncio import AsyncSession
+from repositories import StockSummaryRepository
+from database.database import async_session
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class CategoryCounterService:
+    def __init__(self, session: AsyncSession):
+        self.session = session
+        self.stock_summary_repo = StockSummaryRepository(session)
+
+    async def verify(self, repair: bool = False) -> dict:
+        """
+        Сверить счетчики категорий с товарами
+
+        При repair=True пересчитывает разошедшиеся категории.
+        """
+        drift = await self.stock_summary_repo.get_counter_drift()
+
+        for item in drift:
+            logger.warning(
+                f"Category counters drift for category {item['id']}: "
+                f"stored={item['stored']}, actual={item['actual']}"
+            )
+
+        repaired = False
+        if drift and repair:
+            try:
+                await self.stock_summary_repo.recount([item['id'] for item in drift])
+                await self.session.commit()
+                repaired = True
+                logger.info(f"Category counters repaired for {len(drift)} categories")
+            except Exception as e:
+                logger.error(f"Error repairing category counters: {e}")
+                await self.session.rollback()
+                raise
+        elif not drift:
+            logger.info("Category counters verification passed")
+
+        return {
+            "drift": drift,
+            "repaired": repaired,
+            "ok": not drift
+        }
+
+
+async def verify_category_counters() -> dict:
+    """Сверка и исправление счетчиков в отдельной сессии (для фоновой задачи)"""
+    async with async_session() as session:
+        return await CategoryCounterService(session).verify(repair=True)
@@ -0,0 +1,207 @@
+"""Потоковая выгрузка склада и продаж в сжатый файл (CSV/JSONL)"""
+
+import csv
+import gzip
+import io
+import logging
+import os
+import tempfile
+from datetime import datetime
+from typing import Optional
+
+import orjson
+from aiogram import Bot
+from sqlalchemy import select, and_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database.models import Product, Category, Order, User, OrderStatus
+from database.money import Money
+from repositories.base_repository import replica_read
+
+
+logger = logging.getLogger(__name__)
+
+
+# Строк за одно обращение к курсору на стороне сервера
+EXPORT_CHUNK_SIZE = 1000
+# Лимит Bot API на отправку документа через облачный сервер
+EXPORT_MAX_UPLOAD_SIZE = 50 * 1024 * 1024
+# Лимит на отправку через локальный сервер Bot API
+EXPORT_MAX_UPLOAD_SIZE_LOCAL = 2000 * 1024 * 1024
+
+EXPORT_FORMATS = ("csv", "jsonl")
+
+EXPORT_KINDS = {
+    "products": "Товары",
+    "stock": "Остатки (непроданный контент)",
+    "orders": "Выданные заказы",
+}
+
+
+def export_upload_limit(bot: Bot) -> int:
+    """Максимальный размер выгрузки, которую бот может отправить документом"""
+    return EXPORT_MAX_UPLOAD_SIZE_LOCAL if bot.session.api.is_local else EXPORT_MAX_UPLOAD_SIZE
+
+
+def _products_query():
+    """Все товары с категорией и остатками, без содержимого"""
+    return (
+        select(
+            Product.id,
+            Product.name,
+            Category.name.label("category"),
+            Product.product_type,
+            Product.duration,
+            Product.price,
+            Product.stock_quantity,
+            Product.is_unlimited,
+            Product.is_active,
+            Product.total_sold,
+            Product.created_at,
+        )
+        .join(Category, Category.id == Product.category_id)
+        .order_by(Product.id)
+    )
+
+
+def _stock_query():
+    """Непроданные единицы товара вместе с содержимым"""
+    return (
+        select(
+            Product.id,
+            Product.name,
+            Category.name.label("category"),
+            Product.product_type,
+            Product.duration,
+            Product.price,
+            Product.stock_quantity,
+            Product.digital_content,
+        )
+        .join(Category, Category.id == Product.category_id)
+        .where(and_(
+            Product.digital_content.is_not(None),
+            Product.is_active == True,
+            (Product.stock_quantity > 0) | (Product.is_unlimited == True)
+        ))
+        .order_by(Product.id)
+    )
+
+
+def _orders_query():
+    """Выданные заказы с покупателем и выданным содержимым"""
+    return (
+        select(
+            Order.id,
+            Order.user_id,
+            User.username,
+            Order.product_id,
+            Product.name.label("product"),
+            Order.quantity,
+            Order.unit_price,
+            Order.total_price,
+            Order.delivered_content,
+            Order.created_at,
+            Order.delivered_at,
+        )
+        .join(User, User.id == Order.user_id)
+        .join(Product, Product.id == Order.product_id)
+        .where(Order.status == OrderStatus.DELIVERED.value)
+        .order_by(Order.id)
+    )
+
+
+EXPORT_QUERIES = {
+    "products": _products_query,
+    "stock": _stock_query,
+    "orders": _orders_query,
+}
+
+
+def _plain_value(value):
+    """Привести значение ячейки к виду, пригодному для CSV/JSON"""
+    if isinstance(value, Money):
+        return str(value)
+    if isinstance(value, datetime):
+        return value.isoformat(sep=" ", timespec="seconds")
+    return value
+
+
+def export_file_name(kind: str, fmt: str, now: Optional[datetime] = None) -> str:
+    """Имя файла выгрузки для отправки админу"""
+    now = now or datetime.now()
+    return f"{kind}_{now:%Y%m%d_%H%M%S}.{fmt}.gz"
+
+
+class ExportService:
+    """Выгрузка таблиц через курсор на стороне сервера: в памяти только одна пачка строк"""
+
+    def __init__(self, session: AsyncSession, chunk_size: int = EXPORT_CHUNK_SIZE):
+        self.session = session
+        self.chunk_size = chunk_size
+
+    @replica_read
+    async def export_to_file(self, kind: str, fmt: str, path: str) -> int:
+        """
+        Выгрузить данные в gzip-файл
+
+        Args:
+            kind: products, stock или orders
+            fmt: csv или jsonl
+            path: путь к создаваемому файлу
+
+        Returns:
+            Количество выгруженных строк
+        """
+        if kind not in EXPORT_QUERIES:
+            raise ValueError(f"Unknown export kind: {kind}")
+        if fmt not in EXPORT_FORMATS:
+            raise ValueError(f"Unknown export format: {fmt}")
+
+        stmt = EXPORT_QUERIES[kind]().execution_options(yield_per=self.chunk_size)
+        result = await self.session.stream(stmt)
+        columns = list(result.keys())
+        rows_total = 0
+
+        with gzip.open(path, "wb", compresslevel=6) as raw:
+            text = io.TextIOWrapper(raw, encoding="utf-8", newline="") if fmt == "csv" else None
+            writer = csv.writer(text) if text else None
+
+            if writer:
+                writer.writerow(columns)
+
+            async for partition in result.partitions():
+                if writer:
+                    writer.writerows([_plain_value(value) for value in row] for row in partition)
+                else:
+                    raw.write(b"".join(
+                        orjson.dumps(dict(zip(columns, map(_plain_value, row)))) + b"\n"
+                        for row in partition
+                    ))
+                rows_total += len(partition)
+
+            if text:
+                text.flush()
+                text.detach()
+
+        logger.info(f"EXPORT: {kind} exported as {fmt}: {rows_total} rows, {os.path.getsize(path)} bytes")
+        return rows_total
+
+    async def export_to_temp_file(self, kind: str, fmt: str) -> tuple:
+        """
+        Выгрузить данные во временный файл
+
+        Файл удаляет вызывающий после отправки.
+
+        Returns:
+            (путь к файлу, количество строк)
+        """
+        fd, path = tempfile.mkstemp(prefix=f"export_{kind}_", suffix=f".{fmt}.gz")
+        os.close(fd)
+
+        try:
+            rows_total = await self.export_to_file(kind, fmt, path)
+        except Exception:
+            os.unlink(path)
+            raise
+
+        return path, rows_total
@@ -0,0 +1,45 @@
+from sqlalchemy.ext.asyncio import AsyncSession
+from repositories import LedgerRepository
+from database.database import async_session
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class LedgerService:
+    def __init__(self, session: AsyncSession):
+        self.session = session
+        self.ledger_repo = LedgerRepository(session)
+
+    async def reconcile(self) -> dict:
+        """
+        Сверить журнал балансов
+
+        Проверяет, что баланс каждого пользователя равен сумме его проводок
+        и что проводки каждого события сходятся в ноль.
+        """
+        mismatches = await self.ledger_repo.get_balance_mismatches()
+        unbalanced = await self.ledger_repo.get_unbalanced_keys()
+
+        for user_id, balance, ledger_balance in mismatches:
+            logger.warning(
+                f"Ledger mismatch for user {user_id}: balance={balance}, ledger={ledger_balance}"
+            )
+
+        for key, total in unbalanced:
+            logger.warning(f"Unbalanced ledger event {key}: sum={total}")
+
+        if not mismatches and not unbalanced:
+            logger.info("Ledger reconciliation passed")
+
+        return {
+            "mismatches": mismatches,
+            "unbalanced": unbalanced,
+            "ok": not mismatches and not unbalanced
+        }
+
+
+async def reconcile_ledger() -> dict:
+    """Сверка журнала в отдельной сессии (для фоновой задачи)"""
+    async with async_session() as session:
+        return await LedgerService(session).reconcile()
@@ -0,0 +1,170 @@
+"""Массовая выдача товаров со склада списку пользователей"""
+
+import logging
+import re
+from collections import Counter
+from typing import List, Optional, Tuple
+
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database.models import WarehouseLog
+from repositories.product_repository import ProductRepository
+from repositories.user_repository import UserRepository
+
+
+logger = logging.getLogger(__name__)
+
+
+# Ограничения одной массовой выдачи
+MASS_GIVE_MAX_RECIPIENTS = 5000
+MASS_GIVE_MAX_UNITS_PER_USER = 100
+
+_USERNAME_RE = re.compile(r"^[A-Za-z0-9_]{3,32}$")
+
+
+def parse_recipients(text: str) -> Tuple[List[int], List[str], List[str]]:
+    """
+    Разобрать список получателей: ID и username через пробел, запятую или с новой строки
+
+    Returns:
+        (ID, username без @, нераспознанные значения) - без повторов, в порядке ввода
+    """
+    ids, usernames, invalid = [], [], []
+    seen = set()
+
+    for token in re.split(r"[\s,;]+", text or ""):
+        token = token.strip().removeprefix("https://t.me/").lstrip("@")
+        if not token:
+            continue
+
+        key = token.lower()
+        if key in seen:
+            continue
+        seen.add(key)
+
+        if token.isdigit():
+            ids.append(int(token))
+        elif _USERNAME_RE.match(token):
+            usernames.append(token)
+        else:
+            invalid.append(token)
+
+    return ids, usernames, invalid
+
+
+class MassGiveService:
+    """
+    Выдача товара или любых товаров категории многим пользователям за один раз
+
+    Пользователи находятся одним запросом, единицы товара списываются
+    атомарными UPDATE, записи в лог склада вставляются одним INSERT -
+    все в одной транзакции. Уведомления отправляет вызывающий по списку
+    deliveries из отчета.
+    """
+
+    def __init__(self, session: AsyncSession):
+        self.session = session
+        self.product_repo = ProductRepository(session)
+        self.user_repo = UserRepository(session)
+
+    async def resolve_recipients(self, ids: List[int], usernames: List[str]) -> Tuple[list, List[str]]:
+        """
+        Найти пользователей одним пакетным запросом
+
+        Returns:
+            (пользователи в порядке ввода, ненайденные значения)
+        """
+        users = await self.user_repo.get_by_ids_or_usernames(ids, usernames)
+        by_id = {user.id: user for user in users}
+        by_username = {user.username.lower(): user for user in users if user.username}
+
+        found, missing, seen = [], [], set()
+        for identifier in [*ids, *usernames]:
+            user = by_id.get(identifier) if isinstance(identifier, int) else by_username.get(identifier.lower())
+            if user is None:
+                missing.append(str(identifier) if isinstance(identifier, int) else f"@{identifier}")
+            elif user.id not in seen:
+                seen.add(user.id)
+                found.append(user)
+
+        return found, missing
+
+    async def count_category_units(self, category_id: int) -> int:
+        """Сколько единиц доступно для выдачи из категории"""
+        return await self.product_repo.count_category_units(category_id)
+
+    async def give(
+        self,
+        recipients: list,
+        units_per_user: int,
+        admin_id: int,
+        admin_username: Optional[str] = None,
+        product_id: Optional[int] = None,
+        category_id: Optional[int] = None
+    ) -> dict:
+        """
+        Выдать каждому получателю units_per_user единиц товара
+
+        Источник - конкретный товар (product_id) или любые товары категории
+        (category_id). Если единиц не хватает на всех, получатели из конца
+        списка остаются без товара и попадают в 'not_delivered'.
+
+        Returns:
+            {'deliveries': [(user, [(product_id, name, content), ...]), ...],
+             'not_delivered': [user, ...], 'units': int}
+        """
+        needed = len(recipients) * units_per_user
+        report = {'deliveries': [], 'not_delivered': [], 'units': 0}
+        if not needed:
+            return report
+
+        try:
+            if product_id is not None:
+                claimed, content = await self.product_repo.claim_units(product_id, needed)
+                product = await self.product_repo.get_by_id(product_id)
+                units = [(product_id, product.name, content)] * claimed if claimed else []
+            else:
+                units = await self.product_repo.claim_category_units(category_id, needed)
+
+            # Выдаем единицы целыми наборами по units_per_user, неполный набор возвращаем на склад
+            full_sets = len(units) // units_per_user
+            for unit_product_id, quantity in Counter(
+                unit_product_id for unit_product_id, _, _ in units[full_sets * units_per_user:]
+            ).items():
+                await self.product_repo.release_units(unit_product_id, quantity)
+
+            logs = []
+            for index, user in enumerate(recipients):
+                if index >= full_sets:
+                    report['not_delivered'].append(user)
+                    continue
+
+                user_units = units[index * units_per_user:(index + 1) * units_per_user]
+                report['deliveries'].append((user, user_units))
+                logs.extend({
+                    "product_id": unit_product_id,
+                    "admin_id": admin_id,
+                    "admin_username": admin_username,
+                    "recipient_id": user.id,
+                    "recipient_username": user.username,
+                    "action": "mass_give_product",
+                    "quantity": 1,
+                    "delivered_content": content,
+                    "description": f"Массовая выдача: {name}",
+                } for unit_product_id, name, content in user_units)
+
+            if logs:
+                await self.session.execute(insert(WarehouseLog.__table__), logs)
+            await self.session.commit()
+        except Exception as e:
+            logger.error(f"Error in mass give: {e}")
+            await self.session.rollback()
+            raise
+
+        report['units'] = len(logs)
+        logger.info(
+            f"WAREHOUSE: Admin {admin_id} mass-gave {report['units']} units to "
+            f"{len(report['deliveries'])} users ({len(report['not_delivered'])} not delivered)"
+        )
+        return report
@@ -1,9 +1,28 @@
 from typing import Optional, List
+from collections import Counter
+from datetime import datetime, timedelta
 from sqlalchemy.ext.asyncio import AsyncSession
-from repositories import OrderRepository, UserRepository, ProductRepository
-from database.models import Order, OrderStatus, User, Product
-from .referral_service import ReferralService
+from repositories import OrderRepository, UserRepository, ProductRepository, LedgerRepository
+from database.models import Order, OrderStatus, User, Product, LedgerReason, ORDER_TRANSITIONS
 from .product_service import ProductService
+from database.database import async_session
+from config import settings
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Снятие просроченных резервов с запуска бота (см. expire_reservations)
+reservation_metrics = {
+    "runs": 0,
+    "expired_orders": 0,
+    "released_units": 0,
+    "last_run_at": None,
+}
+
+
+def can_transition(order: Order, status: OrderStatus) -> bool:
+    """Разрешен ли переход заказа в статус status"""
+    return status in ORDER_TRANSITIONS[OrderStatus(order.status)]
 
 
 class OrderService:
@@ -12,7 +31,7 @@ class OrderService:
         self.order_repo = OrderRepository(session)
         self.user_repo = UserRepository(session)
         self.product_repo = ProductRepository(session)
-        self.referral_service = ReferralService(session)
+        self.ledger_repo = LedgerRepository(session)
         self.product_service = ProductService(session)
     
     async def create_order(self, user_id: int, product_id: int, quantity: int = 1) -> tuple[Optional[Order], str]:
@@ -36,10 +55,10 @@ class OrderService:
         unit_price = product.price
         total_price = unit_price * quantity
         
-        # ВРЕМЕННО: отключаем проверку баланса для тестирования покупок
-        # Проверяем баланс
-        # if user.balance < total_price:
-        #     return None, f"Недостаточно средств. Необходимо: {total_price}₽, на балансе: {user.balance}₽"
+        # Проверяем баланс, чтобы не резервировать товар под заказ, который нечем оплатить.
+        # Окончательно баланс проверяет списание при оплате
+        if settings.BALANCE_PAYMENTS and user.balance < total_price:
+            return None, f"Недостаточно средств. Необходимо: {total_price}₽, на балансе: {user.balance}₽"
         
         # Резервируем товар
         if not await self.product_service.reserve_product(product_id, quantity):
@@ -56,18 +75,11 @@ class OrderService:
                 status=OrderStatus.PENDING.value
             )
             
-            # ВРЕМЕННО: отключаем списание средств для тестирования
-            # Списываем средства
-            # await self.user_repo.update_balance(user_id, -total_price)
+            # Обновляем статистику пользователя (и активных рефералов пригласившего)
+            await self.user_repo.record_order(user_id, total_price)
             
-            # Обновляем статистику пользователя
-            await self.user_repo.update(
-                user_id,
-                total_orders=user.total_orders + 1,
-                total_spent=user.total_spent + total_price
-            )
-            
-            return order, "Заказ успешно создан"
+            # Заказ с товаром - для показа подтверждения без ленивой загрузки
+            return await self.order_repo.get_with_details(order.id), "Заказ успешно создан"
             
         except Exception as e:
             # Возвращаем товар в наличие в случае ошибки
@@ -80,32 +92,92 @@ class OrderService:
         if not order:
             return False, "Заказ не найден"
         
-        if order.status != OrderStatus.PENDING.value:
+        if not can_transition(order, OrderStatus.PAID):
             return False, "Заказ уже обработан"
         
-        # Обновляем статус
-        await self.order_repo.update_status(order_id, OrderStatus.PAID)
+        try:
+            # Переход выполняет только один из параллельных запросов
+            if not await self.order_repo.transition(order, OrderStatus.PAID):
+                return False, "Заказ уже обработан"
+            
+            # Списание с баланса - в той же транзакции, что и переход в PAID
+            if settings.BALANCE_PAYMENTS and not await self.ledger_repo.post(
+                order.user_id,
+                -order.total_price,
+                idempotency_key=self.purchase_key(order.id),
+                reason=LedgerReason.PURCHASE,
+                description=f"Оплата заказа #{order.id}",
+                allow_overdraft=False,
+                commit=False
+            ):
+                total_price = order.total_price
+                await self.session.rollback()
+                return False, f"Недостаточно средств. Необходимо: {total_price}₽"
+            
+            delivered = settings.auto_delivery and await self._auto_deliver(order)
+            await self.session.commit()
+        except Exception as e:
+            logger.error(f"Error processing payment for order {order_id}: {e}")
+            await self.session.rollback()
+            return False, "Ошибка при оплате заказа"
         
-        # Обрабатываем реферальную систему
-        await self.referral_service.process_referral_reward(order_id)
+        # Реферальные награды начисляет фоновая задача (process_referral_rewards)
         
+        if delivered:
+            return True, "Заказ выдан"
         return True, "Оплата обработана"
     
+    async def _auto_deliver(self, order: Order) -> bool:
+        """
+        Выдать оплаченный заказ сразу (без commit)
+        
+        Единица товара уже зарезервирована заказом при создании, поэтому
+        выдается содержимое товара. Товар без содержимого остается
+        в очереди ручной выдачи со статусом PAID.
+        """
+        product = await self.product_repo.get_by_id(order.product_id)
+        if not product or not product.digital_content:
+            return False
+        
+        if not await self.order_repo.transition(
+            order,
+            OrderStatus.DELIVERED,
+            delivered_content=product.digital_content,
+            delivered_at=datetime.utcnow()
+        ):
+            return False
+        
+        await self.product_repo.increment_sold(order.product_id, order.quantity, commit=False)
+        logger.info(f"Order {order.id} delivered automatically")
+        return True
+    
     async def deliver_order(self, order_id: int, digital_content: str, admin_id: int) -> tuple[bool, str]:
         """Выдать заказ"""
         order = await self.order_repo.get_by_id(order_id)
         if not order:
             return False, "Заказ не найден"
         
-        if order.status not in [OrderStatus.PENDING.value, OrderStatus.PAID.value]:
+        if not can_transition(order, OrderStatus.DELIVERED):
             return False, "Заказ нельзя выдать"
         
-        # Обновляем статус и добавляем контент
-        await self.order_repo.update_status(order_id, OrderStatus.DELIVERED, digital_content)
-        
-        # Увеличиваем счетчик продаж товара
-        await self.product_repo.increment_sold(order.product_id, order.quantity)
+        try:
+            # Статус, контент и счетчик продаж - одной транзакцией
+            if not await self.order_repo.transition(
+                order,
+                OrderStatus.DELIVERED,
+                delivered_content=digital_content,
+                delivered_at=datetime.utcnow()
+            ):
+                return False, "Заказ уже обработан"
+            
+            await self.product_repo.increment_sold(order.product_id, order.quantity, commit=False)
+            await self.session.commit()
+        except Exception as e:
+            logger.error(f"Error delivering order {order_id}: {e}")
+            await self.session.rollback()
+            return False, "Ошибка при выдаче заказа"
         
+        logger.info(f"Order {order_id} delivered by admin {admin_id}")
         return True, "Заказ выдан"
     
     async def cancel_order(self, order_id: int, reason: str = "") -> tuple[bool, str]:
@@ -120,18 +192,106 @@ class OrderService:
         if order.status == OrderStatus.CANCELLED.value:
             return False, "Заказ уже отменен"
         
-        # Возвращаем товар в наличие
-        await self.product_service.return_product_stock(order.product_id, order.quantity)
+        # Возвращается только списанное при оплате: неоплаченный заказ и заказ,
+        # оплаченный без списания (BALANCE_PAYMENTS выключен), отменяются без возврата
+        was_charged = order.status == OrderStatus.PAID.value and await self.ledger_repo.is_posted(
+            self.purchase_key(order.id)
+        )
         
-        # Возвращаем деньги пользователю
-        await self.user_repo.update_balance(order.user_id, order.total_price)
+        try:
+            # Статус, возврат товара и денег - одной транзакцией
+            if not await self.order_repo.transition(
+                order,
+                OrderStatus.CANCELLED,
+                **({"notes": reason} if reason else {})
+            ):
+                return False, "Заказ уже обработан"
+            
+            # Возвращаем товар в наличие
+            await self.product_repo.return_stock(order.product_id, order.quantity)
+            
+            # Возвращаем деньги пользователю (ключ по заказу - не более одного возврата)
+            if was_charged and not await self.ledger_repo.post(
+                order.user_id,
+                order.total_price,
+                idempotency_key=self.refund_key(order.id),
+                reason=LedgerReason.ORDER_REFUND,
+                description=f"Возврат за заказ #{order.id}",
+                commit=False
+            ):
+                logger.error(f"Refund for order {order_id} was not posted, cancellation rolled back")
+                await self.session.rollback()
+                return False, "Не удалось вернуть средства, заказ не отменен"
+            
+            await self.session.commit()
+        except Exception as e:
+            logger.error(f"Error cancelling order {order_id}: {e}")
+            await self.session.rollback()
+            return False, "Ошибка при отмене заказа"
         
-        # Обновляем статус
-        await self.order_repo.update_status(order_id, OrderStatus.CANCELLED)
-        if reason:
-            await self.order_repo.update(order_id, notes=reason)
+        if was_charged:
+            return True, "Заказ отменен. Средства возвращены на баланс."
+        return True, "Заказ отменен."
+    
+    @staticmethod
+    def purchase_key(order_id: int) -> str:
+        """Ключ проводки списания за заказ"""
+        return f"purchase:{order_id}"
+    
+    @staticmethod
+    def refund_key(order_id: int) -> str:
+        """Ключ проводки возврата за заказ"""
+        return f"order_refund:{order_id}"
+    
+    async def is_refunded(self, order_id: int) -> bool:
+        """Возвращены ли деньги за заказ"""
+        return await self.ledger_repo.is_posted(self.refund_key(order_id))
+    
+    async def expire_reservations(self, ttl_minutes: int, batch_size: int = 500) -> dict:
+        """
+        Отменить неоплаченные заказы старше ttl_minutes и вернуть их товар на склад
         
-        return True, "Заказ отменен"
+        Обрабатывает пачками по batch_size, каждая пачка - отдельная
+        транзакция: отмена заказов и возврат остатков одним UPDATE на товары.
+        Денег не возвращает - заказ не был оплачен.
+        
+        Returns:
+            {'expired_orders': int, 'released_units': int}
+        """
+        created_before = datetime.utcnow() - timedelta(minutes=ttl_minutes)
+        report = {"expired_orders": 0, "released_units": 0}
+        
+        while True:
+            try:
+                expired = await self.order_repo.expire_pending(
+                    created_before, batch_size, notes="Резерв истек: заказ не оплачен"
+                )
+                quantities = Counter()
+                for _, product_id, quantity in expired:
+                    quantities[product_id] += quantity
+                released = await self.product_repo.return_stock_bulk(dict(quantities))
+                await self.session.commit()
+            except Exception as e:
+                logger.error(f"Error expiring pending orders: {e}")
+                await self.session.rollback()
+                raise
+            
+            report["expired_orders"] += len(expired)
+            report["released_units"] += released
+            if len(expired) < batch_size:
+                break
+        
+        reservation_metrics["runs"] += 1
+        reservation_metrics["expired_orders"] += report["expired_orders"]
+        reservation_metrics["released_units"] += report["released_units"]
+        reservation_metrics["last_run_at"] = datetime.utcnow()
+        
+        if report["expired_orders"]:
+            logger.info(
+                f"Expired {report['expired_orders']} pending orders, "
+                f"released {report['released_units']} units"
+            )
+        return report
     
     async def get_user_orders(self, user_id: int, limit: int = 10) -> List[Order]:
         """Получить заказы пользователя"""
@@ -142,5 +302,13 @@ class OrderService:
         return await self.order_repo.get_pending_orders()
     
     async def get_order_details(self, order_id: int) -> Optional[Order]:
-        """Получить детали заказа"""
-        return await self.order_repo.get_by_id(order_id)
\ No newline at end of file
+        """Получить детали заказа (с товаром и пользователем)"""
+        return await self.order_repo.get_with_details(order_id)
+
+
+async def expire_pending_orders() -> dict:
+    """Снятие просроченных резервов в отдельной сессии (для фоновой задачи)"""
+    async with async_session() as session:
+        return await OrderService(session).expire_reservations(
+            settings.ORDER_RESERVATION_TTL_MINUTES, settings.ORDER_EXPIRY_BATCH_SIZE
+        )
@@ -1,4 +1,4 @@
-from typing import Optional, List
+from typing import Optional, List, Tuple
 from sqlalchemy.ext.asyncio import AsyncSession
 from repositories import ProductRepository, CategoryRepository
 from database.models import Product, Category
@@ -19,8 +19,8 @@ class ProductService:
         return await self.product_repo.get_available_products(category_id)
     
     async def get_product_details(self, product_id: int) -> Optional[Product]:
-        """Получить детальную информацию о товаре"""
-        product = await self.product_repo.get_by_id(product_id)
+        """Получить детальную информацию о товаре (с категорией)"""
+        product = await self.product_repo.get_with_category(product_id)
         
         if not product or not product.is_active:
             return None
@@ -31,12 +31,17 @@ class ProductService:
         
         return product
     
-    async def search_products(self, query: str) -> List[Product]:
-        """Поиск товаров"""
+    async def search_products(self, query: str, limit: int = 10, offset: int = 0) -> Tuple[List[Product], int]:
+        """
+        Поиск товаров
+        
+        Returns:
+            (товары страницы, всего найдено)
+        """
         if len(query) < 2:
-            return []
+            return [], 0
         
-        return await self.product_repo.search_products(query)
+        return await self.product_repo.search_products(query, limit=limit, offset=offset)
     
     async def check_product_availability(self, product_id: int, quantity: int = 1) -> tuple[bool, str]:
         """Проверить доступность товара для покупки"""
@@ -54,17 +59,16 @@ class ProductService:
         return True, "Товар доступен"
     
     async def reserve_product(self, product_id: int, quantity: int = 1) -> bool:
-        """Зарезервировать товар (уменьшить остаток)"""
-        available, message = await self.check_product_availability(product_id, quantity)
+        """
+        Зарезервировать товар (уменьшить остаток)
         
-        if not available:
+        Проверка и списание остатка - один условный UPDATE, поэтому
+        параллельные покупки не резервируют одну единицу дважды.
+        """
+        if not await self.product_repo.reserve_stock(product_id, quantity):
             return False
         
-        # Уменьшаем остаток только для ограниченных товаров
-        product = await self.product_repo.get_by_id(product_id)
-        if product and not product.is_unlimited:
-            await self.product_repo.update_stock(product_id, -quantity)
-        
+        await self.session.commit()
         return True
     
     async def return_product_stock(self, product_id: int, quantity: int = 1) -> bool:
@@ -1,71 +1,144 @@
-from typing import Optional
+from typing import Optional, List, Tuple, Dict
+from sqlalchemy import insert
 from sqlalchemy.ext.asyncio import AsyncSession
-from repositories import UserRepository
-from database.models import Referral, Order, OrderStatus
+from repositories import UserRepository, OrderRepository, LedgerRepository
+from database.models import Referral, OrderStatus, LedgerReason
+from database.money import Money
 from database.database import async_session
 from config import settings
 import logging
+import time
 
 logger = logging.getLogger(__name__)
 
+# Статистика команд: (user_id, глубина) -> (истекает в, результат)
+TEAM_STATS_CACHE_SIZE = 10000
+_team_stats_cache: Dict[tuple, tuple] = {}
+
+
+def reward_key(order_id: int, level: int) -> str:
+    """Ключ проводки награды уровня level за заказ (первый уровень - прежний формат ключа)"""
+    if level == 1:
+        return f"referral_reward:{order_id}"
+    return f"referral_reward:{order_id}:{level}"
+
 
 class ReferralService:
     def __init__(self, session: AsyncSession):
         self.session = session
         self.user_repo = UserRepository(session)
+        self.order_repo = OrderRepository(session)
+        self.ledger_repo = LedgerRepository(session)
     
-    async def process_referral_reward(self, order_id: int) -> bool:
-        """Обработать реферальную награду"""
-        try:
-            # Получаем заказ
-            from repositories import OrderRepository
-            order_repo = OrderRepository(self.session)
-            order = await order_repo.get_by_id(order_id)
-            
-            if not order or order.status != OrderStatus.PAID.value:
-                return False
-            
-            # Получаем пользователя
-            user = await self.user_repo.get_by_telegram_id(order.user_id)
-            if not user or not user.referrer_id:
-                return False
-            
-            # Получаем реферера
-            referrer = await self.user_repo.get_by_telegram_id(user.referrer_id)
-            if not referrer:
-                return False
-            
-            # Рассчитываем награду
-            reward_percent = settings.REFERRAL_REWARD_PERCENT / 100
-            reward_amount = order.total_price * reward_percent
-            
-            # Начисляем награду рефереру
-            await self.user_repo.update_balance(referrer.id, reward_amount)
-            
-            # Обновляем статистику реферера
-            await self.user_repo.update(
-                referrer.id,
-                referral_earnings=referrer.referral_earnings + reward_amount
-            )
-            
-            # Создаем запись о реферальной награде
-            referral = Referral(
-                user_id=referrer.id,
-                order_id=order.id,
-                reward_amount=reward_amount,
-                reward_percent=settings.REFERRAL_REWARD_PERCENT
-            )
-            
-            self.session.add(referral)
-            await self.session.commit()
+    async def process_pending_rewards(self, batch_size: int = 500) -> dict:
+        """
+        Начислить реферальные награды за оплаченные с баланса заказы пачками
+        
+        Каждая пачка - одна транзакция: цепочка пригласивших (один запрос
+        на уровень), проводки и балансы всех получателей одним INSERT и одним
+        UPDATE, записи Referral и отметка заказов. Награда уровня за заказ
+        проводится с ключом по заказу и уровню, поэтому повторная обработка
+        ничего не начисляет дважды. Награда - процент от списанных денег, поэтому
+        отмененные заказы и заказы без списания при оплате (выданные без оплаты,
+        оплаченные при выключенном BALANCE_PAYMENTS) только отмечаются.
+        
+        Returns:
+            {'orders': int, 'rewards': int}
+        """
+        percents = settings.referral_level_percents
+        report = {"orders": 0, "rewards": 0}
+        
+        while True:
+            try:
+                orders = await self.order_repo.get_unrewarded_orders(batch_size)
+                rewards = await self._collect_rewards(
+                    [
+                        (order_id, user_id, total_price)
+                        for order_id, user_id, status, total_price, charged in orders
+                        if charged and status != OrderStatus.CANCELLED.value
+                    ],
+                    percents
+                )
+                posted = await self.ledger_repo.post_many(
+                    [
+                        (reward["user_id"], reward["reward_amount"], key, self._describe(reward))
+                        for key, reward in rewards.items()
+                    ],
+                    reason=LedgerReason.REFERRAL_REWARD,
+                    counters=["referral_earnings"]
+                )
+                if posted:
+                    await self.session.execute(insert(Referral), [rewards[key] for key in posted])
+                await self.order_repo.mark_referral_processed([order_id for order_id, *_ in orders])
+                await self.session.commit()
+            except Exception as e:
+                logger.error(f"Error processing referral rewards: {e}")
+                await self.session.rollback()
+                raise
             
-            logger.info(f"Referral reward processed: {reward_amount}₽ for user {referrer.id}")
-            return True
+            report["orders"] += len(orders)
+            report["rewards"] += len(posted)
+            if len(orders) < batch_size:
+                break
+        
+        if report["rewards"]:
+            logger.info(f"Referral rewards processed: {report['rewards']} rewards for {report['orders']} orders")
+        return report
+    
+    async def _collect_rewards(self, orders: List[Tuple[int, int, Money]], percents: List[float]) -> Dict[str, dict]:
+        """
+        Награды по уровням для пачки заказов
+        
+        Поднимается по цепочке пригласивших на len(percents) уровней, запрашивая
+        пригласивших всех заказов одного уровня разом. Цепочка обрывается на
+        несуществующем пользователе и на повторе (циклические приглашения).
+        
+        Returns:
+            {idempotency_key: поля Referral}
+        """
+        if not orders:
+            return {}
+        
+        totals = {order_id: total_price for order_id, _, total_price in orders}
+        current = {order_id: user_id for order_id, user_id, _ in orders}
+        seen = {order_id: {user_id} for order_id, user_id, _ in orders}
+        referrers = await self.user_repo.get_referrer_ids(set(current.values()))
+        rewards = {}
+        
+        for level, percent in enumerate(percents, start=1):
+            current = {
+                order_id: referrers[user_id]
+                for order_id, user_id in current.items()
+                if referrers.get(user_id) and referrers[user_id] not in seen[order_id]
+            }
+            # Пригласившие следующего уровня и заодно проверка, что получатель существует
+            missing = set(current.values()) - set(referrers)
+            referrers.update(await self.user_repo.get_referrer_ids(missing))
+            current = {order_id: user_id for order_id, user_id in current.items() if user_id in referrers}
+            if not current:
+                break
             
-        except Exception as e:
-            logger.error(f"Error processing referral reward: {e}")
-            await self.session.rollback()
-            return False
+            for order_id, user_id in current.items():
+                seen[order_id].add(user_id)
+                reward_amount = totals[order_id].percent(percent)
+                if not reward_amount:
+                    continue
+                rewards[reward_key(order_id, level)] = {
+                    "user_id": user_id,
+                    "order_id": order_id,
+                    "level": level,
+                    "reward_amount": reward_amount,
+                    "reward_percent": percent,
+                }
+        
+        return rewards
+    
+    @staticmethod
+    def _describe(reward: dict) -> str:
+        """Описание проводки награды"""
+        if reward["level"] == 1:
+            return f"Реферальная награда за заказ #{reward['order_id']}"
+        return f"Реферальная награда {reward['level']} уровня за заказ #{reward['order_id']}"
     
     async def get_referral_stats(self, user_id: int) -> dict:
         """Получить статистику по рефералам"""
@@ -73,14 +146,35 @@ class ReferralService:
         if not user:
             return {}
         
-        referrals = await self.user_repo.get_referrals(user_id)
-        
-        # Подсчитываем активных рефералов (с заказами)
-        active_referrals = [r for r in referrals if r.total_orders > 0]
-        
         return {
-            "total_referrals": len(referrals),
-            "active_referrals": len(active_referrals),
+            "total_referrals": user.referrals_count,
+            "active_referrals": user.active_referrals_count,
             "total_earnings": user.referral_earnings,
             "referral_code": user.referral_code
-        }
\ No newline at end of file
+        }
+    
+    async def get_team_stats(self, user_id: int, depth: Optional[int] = None) -> List[dict]:
+        """
+        Статистика команды по уровням (по умолчанию - на все уровни наград)
+        
+        Рекурсивный запрос по дереву приглашений дорогой для больших команд,
+        поэтому результат кэшируется на REFERRAL_TEAM_STATS_TTL секунд.
+        """
+        depth = depth or len(settings.referral_level_percents)
+        key = (user_id, depth)
+        cached = _team_stats_cache.get(key)
+        if cached and cached[0] > time.monotonic():
+            return cached[1]
+        
+        stats = await self.user_repo.get_team_stats(user_id, depth)
+        
+        if len(_team_stats_cache) >= TEAM_STATS_CACHE_SIZE:
+            _team_stats_cache.clear()
+        _team_stats_cache[key] = (time.monotonic() + settings.REFERRAL_TEAM_STATS_TTL, stats)
+        return stats
+
+
+async def process_referral_rewards() -> dict:
+    """Начисление реферальных наград в отдельной сессии (для фоновой задачи)"""
+    async with async_session() as session:
+        return await ReferralService(session).process_pending_rewards(settings.REFERRAL_BATCH_SIZE)
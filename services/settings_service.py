@@ -2,15 +2,29 @@
 Сервис для работы с системными настройками
 """
 
-from typing import Optional, Any, Union
+from typing import Optional, Any, Union, List
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
-from database.models import SystemSetting
+from sqlalchemy import select, update
+from database.models import SystemSetting, SettingsVersion
+from config import settings as app_settings
+import asyncio
+import copy
 import json
 import logging
+import time
 
 logger = logging.getLogger(__name__)
 
+# Снимок настроек процесса: ключ -> значение уже нужного типа.
+# Сверяется с settings_version не чаще SETTINGS_CACHE_POLL_INTERVAL секунд,
+# поэтому изменение из другого воркера видно не позже этого интервала
+_snapshot = {
+    "version": None,
+    "values": {},
+    "checked_at": 0.0,
+}
+_snapshot_lock = asyncio.Lock()
+
 
 class SettingsService:
     """Сервис для управления системными настройками"""
@@ -19,22 +33,54 @@ class SettingsService:
         self.session = session
     
     async def get_setting(self, key: str, default: Any = None) -> Any:
-        """Получить значение настройки по ключу"""
-        try:
-            result = await self.session.execute(
-                select(SystemSetting).where(SystemSetting.key == key)
-            )
-            setting = result.scalar_one_or_none()
-            
-            if not setting:
-                return default
-            
-            # Преобразуем значение в нужный тип
-            return self._convert_value(setting.value, setting.value_type)
-            
-        except Exception as e:
-            logger.error(f"Error getting setting {key}: {e}")
+        """Получить значение настройки по ключу (из снимка процесса)"""
+        await self._ensure_fresh()
+        
+        if key not in _snapshot["values"]:
             return default
+        
+        value = _snapshot["values"][key]
+        # Снимок общий для всех запросов - json-значения отдаем копией
+        return copy.deepcopy(value) if isinstance(value, (list, dict)) else value
+    
+    async def _ensure_fresh(self, force: bool = False):
+        """Перечитать снимок, если версия настроек в БД изменилась"""
+        if not force and _snapshot["version"] is not None and (
+            time.monotonic() - _snapshot["checked_at"] < app_settings.SETTINGS_CACHE_POLL_INTERVAL
+        ):
+            return
+        
+        async with _snapshot_lock:
+            # Пока ждали блокировку, снимок мог обновить другой запрос
+            if not force and _snapshot["version"] is not None and (
+                time.monotonic() - _snapshot["checked_at"] < app_settings.SETTINGS_CACHE_POLL_INTERVAL
+            ):
+                return
+            
+            try:
+                version = await self.session.scalar(select(SettingsVersion.version).where(SettingsVersion.id == 1)) or 0
+                if force or version != _snapshot["version"]:
+                    result = await self.session.execute(select(SystemSetting.key, SystemSetting.value, SystemSetting.value_type))
+                    _snapshot["values"] = {
+                        key: self._convert_value(value, value_type)
+                        for key, value, value_type in result
+                    }
+                    _snapshot["version"] = version
+                _snapshot["checked_at"] = time.monotonic()
+            except Exception as e:
+                # Остаемся на прежнем снимке до следующей проверки
+                logger.error(f"Error refreshing settings snapshot: {e}")
+    
+    async def _bump_version(self):
+        """Увеличить версию настроек в текущей транзакции (без commit)"""
+        bumped = await self.session.scalar(
+            update(SettingsVersion)
+            .where(SettingsVersion.id == 1)
+            .values(version=SettingsVersion.version + 1)
+            .returning(SettingsVersion.version)
+        )
+        if bumped is None:
+            self.session.add(SettingsVersion(id=1, version=1))
     
     async def set_setting(
         self, 
@@ -74,13 +120,16 @@ class SettingsService:
                 )
                 self.session.add(setting)
             
+            await self._bump_version()
             await self.session.commit()
-            return True
             
         except Exception as e:
             logger.error(f"Error setting {key}: {e}")
             await self.session.rollback()
             return False
+        
+        await self._ensure_fresh(force=True)
+        return True
     
     async def get_settings_by_category(self, category: str) -> list[dict]:
         """Получить все настройки по категории"""
@@ -113,17 +162,42 @@ class SettingsService:
             )
             setting = result.scalar_one_or_none()
             
-            if setting:
-                await self.session.delete(setting)
-                await self.session.commit()
-                return True
+            if not setting:
+                return False
             
-            return False
+            await self.session.delete(setting)
+            await self._bump_version()
+            await self.session.commit()
             
         except Exception as e:
             logger.error(f"Error deleting setting {key}: {e}")
             await self.session.rollback()
             return False
+        
+        await self._ensure_fresh(force=True)
+        return True
+    
+    async def get_setting_by_id(self, setting_id: int) -> Optional[SystemSetting]:
+        """Получить настройку по ID (для редактирования в админке)"""
+        return await self.session.get(SystemSetting, setting_id)
+    
+    async def get_editable_settings(self, category: Optional[str] = None) -> List[SystemSetting]:
+        """Получить редактируемые настройки (всех или одной категории)"""
+        stmt = select(SystemSetting).where(SystemSetting.is_editable == True).order_by(SystemSetting.key)
+        if category:
+            stmt = stmt.where(SystemSetting.category == category)
+        result = await self.session.execute(stmt)
+        return list(result.scalars().all())
+    
+    async def get_categories(self) -> List[str]:
+        """Получить категории редактируемых настроек"""
+        result = await self.session.execute(
+            select(SystemSetting.category)
+            .where(SystemSetting.is_editable == True)
+            .distinct()
+            .order_by(SystemSetting.category)
+        )
+        return list(result.scalars().all())
     
     def _get_value_type(self, value: Any) -> str:
         """Определить тип значения"""
@@ -208,13 +282,30 @@ class SettingsService:
             }
         ]
         
-        for default_setting in defaults:
-            # Проверяем, не существует ли уже такая настройка
-            existing = await self.get_setting(default_setting["key"])
-            if existing is None:
-                await self.set_setting(
-                    default_setting["key"],
-                    default_setting["value"],
-                    default_setting["description"],
-                    default_setting["category"]
-                )
\ No newline at end of file
+        # Наличие проверяем по снимку, недостающие создаем одной транзакцией
+        await self._ensure_fresh()
+        missing = [
+            default_setting for default_setting in defaults
+            if default_setting["key"] not in _snapshot["values"]
+        ]
+        if not missing:
+            return
+        
+        try:
+            for default_setting in missing:
+                self.session.add(SystemSetting(
+                    key=default_setting["key"],
+                    value=self._value_to_string(default_setting["value"]),
+                    value_type=self._get_value_type(default_setting["value"]),
+                    description=default_setting["description"],
+                    category=default_setting["category"],
+                    is_editable=True
+                ))
+            await self._bump_version()
+            await self.session.commit()
+        except Exception as e:
+            # Настройку мог создать параллельный запрос - перечитаем снимок
+            logger.error(f"Error initializing default settings: {e}")
+            await self.session.rollback()
+        
+        await self._ensure_fresh(force=True)
\ No newline at end of file
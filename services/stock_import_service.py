@@ -0,0 +1,296 @@
+"""Потоковый импорт товаров склада из файла (TXT/CSV)"""
+
+import codecs
+import csv
+import logging
+from typing import AsyncIterator, Awaitable, Callable, List, Optional
+
+import aiofiles
+from aiogram import Bot
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database.money import Money
+from database.models import ProductType
+from .warehouse_service import WarehouseService
+
+
+logger = logging.getLogger(__name__)
+
+
+# Строк в одной пачке: проверка дублей и вставка идут пачками
+IMPORT_BATCH_SIZE = 1000
+# Сколько текстов ошибок хранить в отчете (счетчики считаются по всем строкам)
+IMPORT_MAX_ERRORS = 20
+# Размер чанка при скачивании файла
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+# Размер чанка при чтении с диска локального сервера Bot API: каждое чтение - переход в поток
+LOCAL_READ_CHUNK_SIZE = 1024 * 1024
+# Лимит Bot API на скачивание файла ботом через облачный сервер
+CLOUD_DOWNLOAD_MAX_SIZE = 20 * 1024 * 1024
+
+CSV_EXTENSIONS = (".csv",)
+SPREADSHEET_EXTENSIONS = (".xlsx", ".xls", ".ods")
+CSV_HEADER_WORDS = {
+    "login", "email", "password", "key", "code", "promo", "content",
+    "логин", "почта", "пароль", "ключ", "код", "промокод", "контент",
+}
+
+
+def is_csv_file(file_name: Optional[str], mime_type: Optional[str] = None) -> bool:
+    """Файл в формате CSV (по расширению или MIME)"""
+    name = (file_name or "").lower()
+    return name.endswith(CSV_EXTENSIONS) or mime_type in ("text/csv", "application/csv")
+
+
+def is_spreadsheet_file(file_name: Optional[str]) -> bool:
+    """Файл таблицы, который нужно сохранить как CSV перед импортом"""
+    return (file_name or "").lower().endswith(SPREADSHEET_EXTENSIONS)
+
+
+def max_download_size(bot: Bot) -> Optional[int]:
+    """Максимальный размер файла, который бот может скачать (None - без ограничения)"""
+    return None if bot.session.api.is_local else CLOUD_DOWNLOAD_MAX_SIZE
+
+
+async def stream_telegram_file(bot: Bot, file_id: str, chunk_size: int = DOWNLOAD_CHUNK_SIZE) -> AsyncIterator[bytes]:
+    """
+    Скачивать файл из Telegram по частям, не загружая его целиком в память
+
+    Локальный сервер Bot API сам скачивает файл на свой диск и отдает путь
+    к нему - файл читается напрямую с общего диска, без второй передачи по HTTP.
+    """
+    file = await bot.get_file(file_id)
+    api = bot.session.api
+
+    if api.is_local:
+        path = api.wrap_local_file.to_local(file.file_path)
+        async with aiofiles.open(path, "rb") as f:
+            while chunk := await f.read(max(chunk_size, LOCAL_READ_CHUNK_SIZE)):
+                yield chunk
+        return
+
+    url = api.file_url(bot.token, file.file_path)
+
+    async for chunk in bot.session.stream_content(url, chunk_size=chunk_size, raise_for_status=True):
+        yield chunk
+
+
+async def iter_text_lines(chunks: AsyncIterator[bytes], encoding: str = "utf-8-sig") -> AsyncIterator[str]:
+    """
+    Разбить поток байтов на строки
+
+    Декодер инкрементальный: многобайтовые символы на границе чанков
+    не ломаются, в памяти держится только хвост незавершенной строки.
+    """
+    decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+    tail = ""
+
+    async for chunk in chunks:
+        text = tail + decoder.decode(chunk)
+        lines = text.splitlines(keepends=True)
+
+        # Последняя строка может быть неполной - ждем следующий чанк
+        tail = lines.pop() if lines and not lines[-1].endswith(("\n", "\r")) else ""
+
+        for line in lines:
+            yield line.rstrip("\r\n")
+
+    tail += decoder.decode(b"", final=True)
+    if tail:
+        yield tail
+
+
+def csv_line_to_content(line: str, product_type: str, delimiter: str) -> str:
+    """Собрать содержимое товара из строки CSV"""
+    try:
+        cells = next(csv.reader([line], delimiter=delimiter))
+    except (csv.Error, StopIteration):
+        return line.strip()
+
+    cells = [cell.strip() for cell in cells if cell.strip()]
+    if not cells:
+        return ""
+
+    if product_type == ProductType.ACCOUNT.value and len(cells) >= 2:
+        return f"{cells[0]}:{cells[1]}"
+    return cells[0]
+
+
+def detect_csv_delimiter(line: str) -> str:
+    """Определить разделитель CSV по первой строке"""
+    counts = {delimiter: line.count(delimiter) for delimiter in (",", ";", "\t")}
+    delimiter = max(counts, key=counts.get)
+    return delimiter if counts[delimiter] else ","
+
+
+def is_csv_header(line: str, delimiter: str) -> bool:
+    """Похожа ли первая строка CSV на заголовок"""
+    cells = [cell.strip().lower() for cell in line.split(delimiter) if cell.strip()]
+    return bool(cells) and all(cell in CSV_HEADER_WORDS for cell in cells)
+
+
+def new_import_report() -> dict:
+    """Пустой отчет в формате WarehouseService.mass_add_products"""
+    return {
+        'total_lines': 0,
+        'successful': 0,
+        'errors': [],
+        'errors_total': 0,
+        'duplicates': 0,
+        'empty_lines': 0,
+        'invalid_format': 0
+    }
+
+
+class StockImportService:
+    """Импорт товаров из потока строк пачками ограниченного размера"""
+
+    def __init__(self, session: AsyncSession, batch_size: int = IMPORT_BATCH_SIZE):
+        self.session = session
+        self.batch_size = batch_size
+        self.warehouse_service = WarehouseService(session)
+
+    async def import_lines(
+        self,
+        lines: AsyncIterator[str],
+        base_name: str,
+        category_id: int,
+        product_type: str,
+        duration: str,
+        price: float,
+        admin_id: int,
+        admin_username: Optional[str] = None,
+        csv_format: bool = False,
+        on_progress: Optional[Callable[[dict], Awaitable]] = None
+    ) -> dict:
+        """
+        Импортировать товары из потока строк
+
+        Каждая пачка нормализуется по правилам mass_add_products, проверяется
+        на дубли внутри пачки и в БД (включая уже вставленные пачки),
+        вставляется одним INSERT и фиксируется.
+
+        Returns:
+            Отчет в формате mass_add_products и 'batches'
+        """
+        report = new_import_report()
+        report['batches'] = 0
+
+        unit_price = Money.from_rubles(price)
+        delimiter = None
+        batch: List[tuple] = []
+
+        async for line in lines:
+            report['total_lines'] += 1
+            line_num = report['total_lines']
+
+            if csv_format:
+                if delimiter is None:
+                    delimiter = detect_csv_delimiter(line)
+                    if is_csv_header(line, delimiter):
+                        continue
+                line = csv_line_to_content(line, product_type, delimiter)
+
+            batch.append((line_num, line))
+
+            if len(batch) >= self.batch_size:
+                await self._import_batch(batch, base_name, category_id, product_type, duration,
+                                         unit_price, admin_id, admin_username, report)
+                batch = []
+                if on_progress:
+                    await on_progress(report)
+
+        if batch:
+            await self._import_batch(batch, base_name, category_id, product_type, duration,
+                                     unit_price, admin_id, admin_username, report)
+            if on_progress:
+                await on_progress(report)
+
+        logger.info(f"WAREHOUSE: File import by admin {admin_id}: {report['successful']} added, "
+                    f"{report['total_lines']} lines, {report['duplicates']} duplicates, "
+                    f"{report['invalid_format']} invalid")
+        return report
+
+    async def _import_batch(
+        self,
+        batch: List[tuple],
+        base_name: str,
+        category_id: int,
+        product_type: str,
+        duration: str,
+        unit_price: Money,
+        admin_id: int,
+        admin_username: Optional[str],
+        report: dict
+    ):
+        """Нормализовать, отфильтровать дубли и вставить одну пачку"""
+        seen = set()
+        candidates = []
+
+        for line_num, content in batch:
+            content = content.strip()
+
+            if not content:
+                report['empty_lines'] += 1
+                continue
+
+            content = self.warehouse_service.normalize_content_line(content, product_type)
+            if not content:
+                report['invalid_format'] += 1
+                self._add_error(report, f"Строка {line_num}: неверный формат (ожидается логин:пароль или логин|пароль)")
+                continue
+
+            if content.lower() in seen:
+                report['duplicates'] += 1
+                self._add_error(report, f"Строка {line_num}: дубликат контента")
+                continue
+
+            seen.add(content.lower())
+            candidates.append((line_num, content))
+
+        existing = await self.warehouse_service.find_existing_contents(
+            [content for _, content in candidates], product_type
+        )
+
+        rows = []
+        for line_num, content in candidates:
+            if content in existing:
+                report['duplicates'] += 1
+                self._add_error(report, f"Строка {line_num}: товар с таким содержимым уже существует (ID: {existing[content]})")
+                continue
+
+            rows.append({
+                "name": f"{base_name} #{line_num}",
+                "description": "Автоматически добавлен через импорт из файла",
+                "price": unit_price,
+                "category_id": category_id,
+                "is_active": True,
+                "is_unlimited": False,
+                "stock_quantity": 1,
+                "total_sold": 0,
+                "product_type": product_type,
+                "duration": duration,
+                "digital_content": content,
+            })
+
+        try:
+            ids = await self.warehouse_service.bulk_create_products(
+                rows, admin_id, admin_username,
+                action="import_product",
+                description="Импорт из файла"
+            )
+        except Exception as e:
+            logger.error(f"Error importing batch: {e}")
+            await self.session.rollback()
+            self._add_error(report, f"Строки {batch[0][0]}-{batch[-1][0]}: ошибка сохранения")
+            return
+
+        report['successful'] += len(ids)
+        report['batches'] += 1
+
+    @staticmethod
+    def _add_error(report: dict, error: str):
+        report['errors_total'] += 1
+        if len(report['errors']) < IMPORT_MAX_ERRORS:
+            report['errors'].append(error)
+
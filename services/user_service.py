@@ -1,8 +1,9 @@
 import uuid
 from typing import Optional
 from sqlalchemy.ext.asyncio import AsyncSession
-from repositories import UserRepository
-from database.models import User
+from repositories import UserRepository, LedgerRepository
+from database.models import User, LedgerReason
+from database.money import Money
 from config import settings
 
 
@@ -62,24 +63,27 @@ class UserService:
         if not referrer or referrer.id == user_id:
             return False
         
-        await self.user_repo.update(user_id, referrer_id=referrer.id)
-        return True
+        return await self.user_repo.set_referrer(user_id, referrer.id)
     
     async def add_balance(self, user_id: int, amount: float) -> Optional[User]:
         """Пополнить баланс пользователя"""
         if amount <= 0:
             return None
         
-        return await self.user_repo.update_balance(user_id, amount)
+        return await self.user_repo.update_balance(user_id, Money.from_rubles(amount))
     
-    async def spend_balance(self, user_id: int, amount: float) -> bool:
-        """Списать с баланса пользователя"""
-        user = await self.user_repo.get_by_telegram_id(user_id)
-        if not user or user.balance < amount:
+    async def spend_balance(self, user_id: int, amount: float, idempotency_key: Optional[str] = None) -> bool:
+        """Списать с баланса пользователя (только при достаточном балансе)"""
+        if amount <= 0:
             return False
         
-        await self.user_repo.update_balance(user_id, -amount)
-        return True
+        return await LedgerRepository(self.session).post(
+            user_id,
+            -Money.from_rubles(amount),
+            idempotency_key=idempotency_key or f"purchase:{uuid.uuid4().hex}",
+            reason=LedgerReason.PURCHASE,
+            allow_overdraft=False
+        )
     
     async def get_user_info(self, user_id: int) -> Optional[dict]:
         """Получить информацию о пользователе"""
@@ -87,11 +91,9 @@ class UserService:
         if not user:
             return None
         
-        referrals = await self.user_repo.get_referrals(user_id)
-        
         return {
             "user": user,
-            "referrals_count": len(referrals)
+            "referrals_count": user.referrals_count
         }
     
     def _generate_referral_code(self) -> str:
@@ -111,7 +113,7 @@ class UserService:
         # Получаем статистику заказов
         orders = await self.user_repo.get_user_orders(user_id)
         total_orders = len(orders)
-        total_spent = sum(order.total_price for order in orders)
+        total_spent = sum((order.total_price for order in orders), Money(0))
         
         # Получаем последние заказы
         recent_orders = orders[:3] if orders else []
@@ -215,7 +217,7 @@ class UserService:
         delivered_orders = len(orders_by_status.get('delivered', []))
         cancelled_orders = len(orders_by_status.get('cancelled', []))
         
-        total_spent = sum(order.total_price for order in orders if order.status in ['paid', 'delivered'])
+        total_spent = sum((order.total_price for order in orders if order.status in ['paid', 'delivered']), Money(0))
         
         return {
             "user_found": True,
@@ -238,7 +240,7 @@ class UserService:
         
         orders = await self.user_repo.get_user_orders(user_id)
         total_orders = len(orders)
-        total_spent = sum(order.total_price for order in orders)
+        total_spent = sum((order.total_price for order in orders), Money(0))
         
         # Определяем уровень активности
         if total_orders == 0:
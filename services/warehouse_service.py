@@ -3,13 +3,15 @@
 import logging
 from typing import Optional, List, Tuple
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, and_, or_
+from sqlalchemy import select, insert, and_, or_
 from sqlalchemy.orm import selectinload
 
 from database.models import Product, Category, User, WarehouseLog, ProductType
+from database.money import Money
 from repositories.product_repository import ProductRepository
 from repositories.category_repository import CategoryRepository
 from repositories.user_repository import UserRepository
+from repositories.stock_summary_repository import StockSummaryRepository
 
 
 logger = logging.getLogger(__name__)
@@ -23,6 +25,7 @@ class WarehouseService:
         self.product_repo = ProductRepository(session)
         self.category_repo = CategoryRepository(session)
         self.user_repo = UserRepository(session)
+        self.stock_summary_repo = StockSummaryRepository(session)
     
     async def add_product(
         self,
@@ -44,7 +47,7 @@ class WarehouseService:
                 product_type=product_type,
                 duration=duration,
                 digital_content=content,
-                price=price,
+                price=Money.from_rubles(price),
                 stock_quantity=1,
                 is_active=True
             )
@@ -146,6 +149,15 @@ class WarehouseService:
         """Получить товары доступные для выдачи"""
         return await self.product_repo.get_available_products()
     
+    async def search_available_products(self, query: str, limit: int = 10) -> Tuple[List[Product], int]:
+        """
+        Поиск товаров с остатком по названию (фильтрация и LIMIT на стороне БД)
+        
+        Returns:
+            (первые limit товаров, всего найдено)
+        """
+        return await self.product_repo.search_products(query, limit=limit, only_available=True)
+    
     async def get_products_by_category(self, category_id: int) -> List[Product]:
         """Получить доступные товары по категории (только с остатками > 0 или безлимитные)"""
         return await self.product_repo.get_available_products(category_id)
@@ -491,7 +503,7 @@ class WarehouseService:
             
             # Проверяем дубли в самом наборе данных
             unique_contents = set()
-            processed_contents = []
+            candidates = []
             
             for i, content in enumerate(content_lines, 1):
                 content = content.strip()
@@ -502,18 +514,11 @@ class WarehouseService:
                     continue
                 
                 # Проверяем формат содержимого
-                if product_type == ProductType.ACCOUNT.value:
-                    # Используем улучшенную валидацию для аккаунтов
-                    parsed_lines = self.parse_content_lines(content, product_type)
-                    if not parsed_lines or parsed_lines[0] != content:
-                        # Пробуем нормализовать формат
-                        normalized_content = self._normalize_account_content(content)
-                        if not normalized_content:
-                            report['invalid_format'] += 1
-                            report['errors'].append(f"Строка {i}: неверный формат (ожидается логин:пароль или логин|пароль)")
-                            continue
-                        else:
-                            content = normalized_content  # Используем нормализованную версию
+                content = self.normalize_content_line(content, product_type)
+                if not content:
+                    report['invalid_format'] += 1
+                    report['errors'].append(f"Строка {i}: неверный формат (ожидается логин:пароль или логин|пароль)")
+                    continue
                 
                 # Проверяем дубли в текущем наборе
                 if content.lower() in unique_contents:
@@ -522,17 +527,22 @@ class WarehouseService:
                     continue
                 
                 unique_contents.add(content.lower())
-                
-                # Проверяем дубли в базе данных
-                existing_product = await self._check_content_duplicate(content, product_type)
-                if existing_product:
+                candidates.append((i, content))
+            
+            # Проверяем дубли в базе данных одним запросом
+            existing = await self.find_existing_contents([content for _, content in candidates], product_type)
+            processed_contents = []
+            
+            for i, content in candidates:
+                if content in existing:
                     report['duplicates'] += 1
-                    report['errors'].append(f"Строка {i}: товар с таким содержимым уже существует (ID: {existing_product.id})")
+                    report['errors'].append(f"Строка {i}: товар с таким содержимым уже существует (ID: {existing[content]})")
                     continue
                 
                 processed_contents.append((i, content))
             
             # Создаем товары только для валидных строк
+            unit_price = Money.from_rubles(price)
             for line_num, content in processed_contents:
                 # Генерируем название с номером
                 product_name = f"{base_name} #{line_num}"
@@ -541,7 +551,7 @@ class WarehouseService:
                 product = Product(
                     name=product_name,
                     description=f"Автоматически добавлен через массовое добавление",
-                    price=price,
+                    price=unit_price,
                     category_id=category_id,
                     is_active=True,
                     is_unlimited=False,
@@ -690,6 +700,94 @@ class WarehouseService:
         except Exception as e:
             return False, {"error": f"Ошибка парсинга: {str(e)}"}
     
+    def normalize_content_line(self, content: str, product_type: str) -> Optional[str]:
+        """
+        Привести одну непустую строку контента к формату хранения
+        
+        Returns:
+            Нормализованное содержимое или None, если формат неверный
+        """
+        if product_type != ProductType.ACCOUNT.value:
+            return content
+        
+        # Используем улучшенную валидацию для аккаунтов
+        parsed_lines = self.parse_content_lines(content, product_type)
+        if parsed_lines and parsed_lines[0] == content:
+            return content
+        
+        # Пробуем нормализовать формат
+        return self._normalize_account_content(content)
+    
+    async def find_existing_contents(self, contents: List[str], product_type: str) -> dict:
+        """
+        Найти активные товары с таким же содержимым (пакетная проверка дублей)
+        
+        Returns:
+            {содержимое: id товара}
+        """
+        if not contents:
+            return {}
+        
+        existing = {}
+        # Ограничиваем число параметров в одном IN
+        for start in range(0, len(contents), 1000):
+            stmt = select(Product.digital_content, Product.id).where(
+                and_(
+                    Product.digital_content.in_(contents[start:start + 1000]),
+                    Product.product_type == product_type,
+                    Product.is_active == True
+                )
+            )
+            result = await self.session.execute(stmt)
+            existing.update(result.all())
+        
+        return existing
+    
+    async def bulk_create_products(
+        self,
+        rows: List[dict],
+        admin_id: int,
+        admin_username: Optional[str] = None,
+        action: str = "mass_add_product",
+        description: str = "Массовое добавление"
+    ) -> List[int]:
+        """
+        Вставить товары пачкой вместе с записями в лог склада и зафиксировать
+
+        Args:
+            rows: словари с полями Product, digital_content уникален в пачке
+        
+        Returns:
+            ID созданных товаров
+        """
+        if not rows:
+            return []
+        
+        # Core INSERT по таблицам - без накладных расходов ORM на каждую строку.
+        # Содержимое в пачке уникально - сопоставляем ID по нему, а не по порядку строк:
+        # sort_by_parameter_order в SQLite вставляет по одной строке
+        result = await self.session.execute(
+            insert(Product.__table__).returning(Product.digital_content, Product.id),
+            rows
+        )
+        ids_by_content = dict(result.all())
+        ids = [ids_by_content[row["digital_content"]] for row in rows]
+        
+        await self.session.execute(insert(WarehouseLog.__table__), [
+            {
+                "product_id": product_id,
+                "admin_id": admin_id,
+                "admin_username": admin_username,
+                "action": action,
+                "quantity": 1,
+                "description": f"{description}: {row['name']}",
+            }
+            for product_id, row in zip(ids, rows)
+        ])
+        
+        await self.session.commit()
+        return ids
+    
     def _normalize_account_content(self, content: str) -> Optional[str]:
         """Нормализовать содержимое аккаунта к формату логин:пароль"""
         try:
@@ -767,7 +865,7 @@ class WarehouseService:
             if description is not None:
                 product.description = description  
             if price is not None:
-                product.price = price
+                product.price = Money.from_rubles(price)
             if product_type is not None:
                 product.product_type = product_type
             if duration is not None:
@@ -805,59 +903,16 @@ class WarehouseService:
     
     async def get_category_stats(self) -> List[dict]:
         """Получить статистику ДОСТУПНЫХ товаров по категориям (только с остатками > 0 или безлимитные)"""
-        from sqlalchemy import func
         try:
-            # Получаем все категории с подсчетом ДОСТУПНЫХ товаров (с остатками > 0 или безлимитные)
-            stmt = select(
-                Category.id,
-                Category.name,
-                select(func.count(Product.id)).where(
-                    and_(
-                        Product.category_id == Category.id,
-                        Product.is_active == True,
-                        or_(
-                            Product.is_unlimited == True,
-                            Product.stock_quantity > 0
-                        )
-                    )
-                ).label('total_products'),
-                select(func.sum(Product.stock_quantity)).where(
-                    and_(
-                        Product.category_id == Category.id,
-                        Product.is_active == True,
-                        Product.is_unlimited == False
-                    )
-                ).label('total_stock')
-            ).order_by(Category.name)
-            
-            result = await self.session.execute(stmt)
-            category_stats = []
-            
-            for row in result:
-                # Получаем количество безлимитных товаров
-                unlimited_stmt = select(func.count(Product.id)).where(
-                    and_(
-                        Product.category_id == row.id,
-                        Product.is_active == True,
-                        Product.is_unlimited == True
-                    )
-                )
-                unlimited_result = await self.session.execute(unlimited_stmt)
-                unlimited_count = unlimited_result.scalar() or 0
-                
-                # Анализируем дубликаты по названиям в категории
-                duplicates_info = await self._analyze_category_duplicates(row.id)
-                
-                category_stats.append({
-                    'id': row.id,
-                    'name': row.name,
-                    'total_products': row.total_products or 0,
-                    'total_stock': row.total_stock or 0,
-                    'unlimited_products': unlimited_count,
-                    'duplicates_info': duplicates_info
-                })
+            summaries = await self.stock_summary_repo.get_category_summaries(only_active=False)
             
-            return category_stats
+            return [{
+                'id': summary['id'],
+                'name': summary['name'],
+                'total_products': summary['available_products'],
+                'total_stock': summary['total_stock'],
+                'unlimited_products': summary['unlimited_products']
+            } for summary in summaries]
             
         except Exception as e:
             logger.error(f"Error getting category stats: {e}")
@@ -865,126 +920,106 @@ class WarehouseService:
     
     async def get_single_category_stats(self, category_id: int) -> Optional[dict]:
         """Получить статистику для одной конкретной категории в реальном времени"""
-        from sqlalchemy import func
         try:
-            # Получаем категорию
-            category = await self.get_category_by_id(category_id)
-            if not category:
+            summary = await self.stock_summary_repo.get_category_summary(category_id)
+            if not summary:
                 return None
             
-            # Получаем количество доступных товаров
-            available_products_stmt = select(func.count(Product.id)).where(
-                and_(
-                    Product.category_id == category_id,
-                    Product.is_active == True,
-                    or_(
-                        Product.is_unlimited == True,
-                        Product.stock_quantity > 0
-                    )
-                )
-            )
-            available_result = await self.session.execute(available_products_stmt)
-            available_count = available_result.scalar() or 0
-            
-            # Получаем общий остаток (только для товаров с ограниченным количеством)
-            total_stock_stmt = select(func.sum(Product.stock_quantity)).where(
-                and_(
-                    Product.category_id == category_id,
-                    Product.is_active == True,
-                    Product.is_unlimited == False
-                )
-            )
-            stock_result = await self.session.execute(total_stock_stmt)
-            total_stock = stock_result.scalar() or 0
-            
-            # Получаем количество безлимитных товаров
-            unlimited_stmt = select(func.count(Product.id)).where(
-                and_(
-                    Product.category_id == category_id,
-                    Product.is_active == True,
-                    Product.is_unlimited == True
-                )
-            )
-            unlimited_result = await self.session.execute(unlimited_stmt)
-            unlimited_count = unlimited_result.scalar() or 0
-            
             return {
-                'id': category.id,
-                'name': category.name,
-                'total_products': available_count,
-                'total_stock': total_stock,
-                'unlimited_products': unlimited_count
+                'id': summary['id'],
+                'name': summary['name'],
+                'total_products': summary['available_products'],
+                'total_stock': summary['total_stock'],
+                'unlimited_products': summary['unlimited_products']
             }
             
         except Exception as e:
             logger.error(f"Error getting single category stats for category {category_id}: {e}")
             return None
+    
+    async def get_stock_summary(self) -> List[dict]:
+        """Сводка остатков по активным категориям (счетчики из строк категорий)"""
+        return await self.stock_summary_repo.get_category_summaries()
+    
+    async def get_category_stock_summary(self, category_id: int) -> Optional[dict]:
+        """Сводка остатков одной категории"""
+        return await self.stock_summary_repo.get_category_summary(category_id)
+    
+    async def get_category_products_page(
+        self,
+        category_id: int,
+        page: int = 0,
+        per_page: int = 10,
+        in_stock: Optional[bool] = True
+    ) -> List[Product]:
+        """Получить одну страницу товаров категории вместо загрузки всей категории"""
+        return await self.product_repo.get_category_products(
+            category_id, in_stock=in_stock, offset=page * per_page, limit=per_page
+        )
 
-    async def _analyze_category_duplicates(self, category_id: int) -> dict:
-        """Анализировать дубликаты товаров в категории по названиям"""
-        try:
-            from sqlalchemy import func, text
-            
-            # Получаем все товары в категории
-            stmt = select(Product).where(
-                and_(
-                    Product.category_id == category_id,
-                    Product.is_active == True
-                )
-            ).order_by(Product.name, Product.id)
-            
-            result = await self.session.execute(stmt)
-            products = list(result.scalars().all())
-            
-            # Группируем по нормализованным названиям
-            grouped_products = {}
-            for product in products:
-                # Нормализуем название (убираем номера, лишние пробелы)
-                normalized_name = self._normalize_product_name(product.name)
-                
-                if normalized_name not in grouped_products:
-                    grouped_products[normalized_name] = {
-                        'original_name': product.name,
-                        'products': [],
-                        'total_stock': 0,
-                        'has_unlimited': False
-                    }
-                
-                group = grouped_products[normalized_name]
-                group['products'].append({
-                    'id': product.id,
-                    'name': product.name,
-                    'stock': product.stock_quantity,
-                    'is_unlimited': product.is_unlimited,
-                    'price': product.price
-                })
-                
-                if product.is_unlimited:
-                    group['has_unlimited'] = True
-                else:
-                    group['total_stock'] += product.stock_quantity
-            
-            # Находим "переполненные" (дублирующиеся) товары
-            overflow_products = {}
-            for normalized_name, group in grouped_products.items():
-                if len(group['products']) > 1:  # Есть дубликаты
-                    overflow_products[normalized_name] = {
-                        'original_name': group['original_name'],
-                        'count': len(group['products']),
-                        'total_stock': group['total_stock'],
-                        'has_unlimited': group['has_unlimited'],
-                        'products': group['products']
-                    }
+    async def _analyze_duplicates(self) -> dict:
+        """
+        Анализировать дубликаты товаров по названиям во всех категориях
+        
+        Один запрос только нужных колонок активных товаров вместо загрузки
+        объектов по каждой категории; группировка - по нормализованному названию.
+        
+        Returns:
+            {category_id: {'total_unique_names', 'overflow_count', 'overflow_products'}}
+        """
+        stmt = select(
+            Product.id, Product.category_id, Product.name, Product.stock_quantity,
+            Product.is_unlimited, Product.price
+        ).where(Product.is_active == True).order_by(Product.category_id, Product.name, Product.id)
+        
+        # Группируем по категории и нормализованному названию
+        grouped_by_category = {}
+        for product in await self.session.execute(stmt):
+            grouped_products = grouped_by_category.setdefault(product.category_id, {})
+            normalized_name = self._normalize_product_name(product.name)
+            
+            if normalized_name not in grouped_products:
+                grouped_products[normalized_name] = {
+                    'original_name': product.name,
+                    'products': [],
+                    'total_stock': 0,
+                    'has_unlimited': False
+                }
             
-            return {
+            group = grouped_products[normalized_name]
+            group['products'].append({
+                'id': product.id,
+                'name': product.name,
+                'stock': product.stock_quantity,
+                'is_unlimited': product.is_unlimited,
+                'price': product.price
+            })
+            
+            if product.is_unlimited:
+                group['has_unlimited'] = True
+            else:
+                group['total_stock'] += product.stock_quantity
+        
+        # Находим "переполненные" (дублирующиеся) товары
+        duplicates = {}
+        for category_id, grouped_products in grouped_by_category.items():
+            overflow_products = {
+                normalized_name: {
+                    'original_name': group['original_name'],
+                    'count': len(group['products']),
+                    'total_stock': group['total_stock'],
+                    'has_unlimited': group['has_unlimited'],
+                    'products': group['products']
+                }
+                for normalized_name, group in grouped_products.items()
+                if len(group['products']) > 1  # Есть дубликаты
+            }
+            duplicates[category_id] = {
                 'total_unique_names': len(grouped_products),
                 'overflow_count': len(overflow_products),
                 'overflow_products': overflow_products
             }
-            
-        except Exception as e:
-            logger.error(f"Error analyzing duplicates for category {category_id}: {e}")
-            return {'total_unique_names': 0, 'overflow_count': 0, 'overflow_products': {}}
+        return duplicates
 
     def _normalize_product_name(self, name: str) -> str:
         """Нормализовать название товара для поиска дубликатов"""
@@ -1002,6 +1037,7 @@ class WarehouseService:
         """Получить умную статистику склада с анализом переполненных товаров"""
         try:
             category_stats = await self.get_category_stats()
+            duplicates_by_category = await self._analyze_duplicates()
             
             # Общая статистика
             total_categories = len(category_stats)
@@ -1014,7 +1050,9 @@ class WarehouseService:
             total_overflow_products = 0
             
             for category in category_stats:
-                duplicates = category['duplicates_info']
+                duplicates = duplicates_by_category.get(category['id'])
+                if duplicates is None:
+                    continue
                 if duplicates['overflow_count'] > 0:
                     overflow_categories.append({
                         'category_name': category['name'],
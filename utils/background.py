@@ -0,0 +1,48 @@
+"""Фоновые задачи бота: периодические и разовые"""
+
+import asyncio
+import logging
+from typing import Awaitable, Callable, Coroutine, Set
+
+logger = logging.getLogger(__name__)
+
+# Разовые задачи в работе: event loop хранит на задачи только слабые ссылки
+_running: Set[asyncio.Task] = set()
+
+
+async def run_periodic(job: Callable[[], Awaitable], interval: float, name: str, initial_delay: float = 0):
+    """
+    Выполнять job каждые interval секунд до отмены задачи
+
+    Ошибки одного запуска логируются и не останавливают цикл.
+    """
+    if initial_delay:
+        await asyncio.sleep(initial_delay)
+
+    while True:
+        try:
+            await job()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Background job {name} failed: {e}")
+
+        await asyncio.sleep(interval)
+
+
+def start_periodic(job: Callable[[], Awaitable], interval: float, name: str, initial_delay: float = 0) -> asyncio.Task:
+    """Запустить периодическую задачу в текущем event loop"""
+    logger.info(f"Starting background job {name} every {interval}s")
+    return asyncio.create_task(run_periodic(job, interval, name, initial_delay), name=name)
+
+
+def start_background(coro: Coroutine, name: str) -> asyncio.Task:
+    """
+    Запустить разовую задачу, не дожидаясь ее (например, долгую рассылку из обработчика)
+
+    Результат и ошибки задачи обрабатывает вызывающий через add_done_callback.
+    """
+    task = asyncio.create_task(coro, name=name)
+    _running.add(task)
+    task.add_done_callback(_running.discard)
+    return task
@@ -0,0 +1,113 @@
+"""
+HTTP-сессия Bot API
+
+По умолчанию aiogram создает AiohttpSession с настройками TCPConnector
+по умолчанию и stdlib json. Настроенная сессия держит больший пул
+keep-alive соединений к api.telegram.org, кэширует DNS, ограничивает
+время установки соединения отдельно от общего таймаута запроса и
+сериализует JSON через orjson.
+
+Выбирается настройкой BOT_SESSION: "tuned" или "default".
+
+BOT_API_SERVER_URL переключает бота на локальный сервер Bot API
+(telegram-bot-api --local): он скачивает файлы до 2 ГБ и отдает в getFile
+абсолютный путь на своем диске вместо ссылки для скачивания.
+"""
+
+import json
+from pathlib import Path
+from typing import Any, Optional
+
+from aiogram import Bot
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.session.base import BaseSession
+from aiogram.client.telegram import (
+    PRODUCTION,
+    BareFilesPathWrapper,
+    FilesPathWrapper,
+    SimpleFilesPathWrapper,
+    TelegramAPIServer,
+)
+from aiogram.methods import TelegramMethod
+from aiohttp import ClientTimeout
+
+from config import settings
+
+
+def _orjson_dumps(value: Any) -> str:
+    import orjson
+    return orjson.dumps(value).decode()
+
+
+def json_functions(library: str) -> tuple:
+    """(loads, dumps) для библиотеки json или orjson"""
+    if library == "orjson":
+        import orjson
+        return orjson.loads, _orjson_dumps
+    if library == "json":
+        return json.loads, json.dumps
+    raise ValueError(f"Unknown JSON library: {library}")
+
+
+class TunedAiohttpSession(AiohttpSession):
+    """AiohttpSession с настраиваемым пулом соединений и таймаутом подключения"""
+
+    def __init__(
+        self,
+        connection_limit: int = 100,
+        dns_cache_ttl: int = 300,
+        keepalive_timeout: float = 60,
+        connect_timeout: float = 5,
+        **kwargs: Any
+    ):
+        super().__init__(**kwargs)
+        self._connector_init.update(
+            limit=connection_limit,
+            limit_per_host=connection_limit,
+            use_dns_cache=True,
+            ttl_dns_cache=dns_cache_ttl,
+            keepalive_timeout=keepalive_timeout,
+        )
+        self.connect_timeout = connect_timeout
+
+    async def make_request(self, bot: Bot, method: TelegramMethod, timeout: Optional[float] = None) -> Any:
+        # Общий таймаут - как задан для запроса (у getUpdates он длиннее long polling),
+        # подключение к недоступному серверу обрывается раньше
+        total = self.timeout if timeout is None else timeout
+        return await super().make_request(
+            bot, method, ClientTimeout(total=total, sock_connect=min(self.connect_timeout, total))
+        )
+
+
+def create_bot_api() -> TelegramAPIServer:
+    """Сервер Bot API по настройкам: облачный или локальный"""
+    if not settings.BOT_API_SERVER_URL:
+        return PRODUCTION
+
+    wrap_local_file: FilesPathWrapper = BareFilesPathWrapper()
+    if settings.BOT_API_SERVER_FILES_DIR and settings.BOT_API_LOCAL_FILES_DIR:
+        wrap_local_file = SimpleFilesPathWrapper(
+            Path(settings.BOT_API_SERVER_FILES_DIR), Path(settings.BOT_API_LOCAL_FILES_DIR)
+        )
+    return TelegramAPIServer.from_base(settings.BOT_API_SERVER_URL, is_local=True, wrap_local_file=wrap_local_file)
+
+
+def create_bot_session(api: Optional[TelegramAPIServer] = None) -> Optional[BaseSession]:
+    """Сессия Bot API по настройкам (None - сессия aiogram по умолчанию)"""
+    api = api or create_bot_api()
+    if settings.BOT_SESSION == "default":
+        return None if api is PRODUCTION else AiohttpSession(api=api)
+    if settings.BOT_SESSION != "tuned":
+        raise ValueError(f"Unknown bot session: {settings.BOT_SESSION}")
+
+    json_loads, json_dumps = json_functions(settings.BOT_JSON)
+    return TunedAiohttpSession(
+        connection_limit=settings.BOT_API_CONNECTION_LIMIT,
+        dns_cache_ttl=settings.BOT_API_DNS_CACHE_TTL,
+        keepalive_timeout=settings.BOT_API_KEEPALIVE_TIMEOUT,
+        connect_timeout=settings.BOT_API_CONNECT_TIMEOUT,
+        api=api,
+        json_loads=json_loads,
+        json_dumps=json_dumps,
+        timeout=settings.BOT_API_TIMEOUT,
+    )
@@ -0,0 +1,223 @@
+"""
+Маршрутизация callback-запросов по префиксному дереву
+
+Обработчики регистрируются с фильтром CallbackPattern вместо
+F.data == ... / F.data.startswith(...):
+
+    @router.callback_query(CallbackPattern.exact("warehouse_menu"))
+    @router.callback_query(CallbackPattern.prefix("warehouse_show_category_", category_id=int, page=0))
+
+Параметры разбираются из хвоста callback_data (части через "_") и передаются
+в обработчик как аргументы нужного типа. Значение по умолчанию делает
+параметр необязательным, тип берется из него.
+
+install_callback_table(dp) переносит такие обработчики из всех роутеров
+в одну таблицу диспетчера: обработчик ищется проходом по дереву за длину
+callback_data, а не перебором фильтров всех роутеров. Более длинный
+префикс проверяется раньше короткого ("warehouse_delete_category_" раньше
+"warehouse_delete_"), поэтому порядок регистрации больше не важен.
+"""
+
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+from aiogram import Dispatcher, Router
+from aiogram.dispatcher.event.bases import UNHANDLED, SkipHandler
+from aiogram.dispatcher.event.handler import HandlerObject
+from aiogram.filters import Filter
+from aiogram.types import CallbackQuery
+
+_REQUIRED = object()
+
+
+class CallbackPattern(Filter):
+    """Точное значение callback_data или префикс с типизированными параметрами"""
+
+    def __init__(self, text: str, is_prefix: bool = False, params: Optional[Dict[str, Any]] = None):
+        self.text = text
+        self.is_prefix = is_prefix
+        # имя -> (тип, значение по умолчанию или _REQUIRED)
+        self.params: List[Tuple[str, type, Any]] = []
+        for name, spec in (params or {}).items():
+            if isinstance(spec, type):
+                self.params.append((name, spec, _REQUIRED))
+            else:
+                self.params.append((name, type(spec), spec))
+        self._required = sum(1 for _, _, default in self.params if default is _REQUIRED)
+
+    @classmethod
+    def exact(cls, text: str) -> "CallbackPattern":
+        """callback_data равна text"""
+        return cls(text)
+
+    @classmethod
+    def prefix(cls, prefix: str, **params: Any) -> "CallbackPattern":
+        """
+        callback_data начинается с prefix
+
+        Args:
+            params: имя=тип (обязательный параметр) или имя=значение
+                по умолчанию. Последний параметр забирает остаток хвоста
+        """
+        return cls(prefix, is_prefix=True, params=params)
+
+    def parse(self, data: Optional[str]) -> Union[bool, Dict[str, Any]]:
+        """Разобрать callback_data: False - не подходит, иначе параметры"""
+        if data is None:
+            return False
+        if not self.is_prefix:
+            return data == self.text
+        if not data.startswith(self.text):
+            return False
+        if not self.params:
+            return True
+
+        tail = data[len(self.text):]
+        parts = tail.split("_", len(self.params) - 1) if tail else []
+        if len(parts) < self._required:
+            return False
+
+        values = {}
+        for index, (name, kind, default) in enumerate(self.params):
+            if index >= len(parts):
+                values[name] = default
+                continue
+            try:
+                values[name] = kind(parts[index])
+            except ValueError:
+                return False
+        return values
+
+    async def __call__(self, callback: CallbackQuery) -> Union[bool, Dict[str, Any]]:
+        return self.parse(callback.data)
+
+    def __str__(self) -> str:
+        if not self.is_prefix:
+            return f"CallbackPattern.exact({self.text!r})"
+        params = ", ".join(name for name, _, _ in self.params)
+        return f"CallbackPattern.prefix({self.text!r}{', ' if params else ''}{params})"
+
+
+class _Node:
+    __slots__ = ("children", "exact", "prefix")
+
+    def __init__(self):
+        self.children: Dict[str, "_Node"] = {}
+        self.exact: list = []
+        self.prefix: list = []
+
+
+class CallbackTrie:
+    """Префиксное дерево по строкам callback_data"""
+
+    def __init__(self):
+        self._root = _Node()
+        self.size = 0
+
+    def add(self, pattern: CallbackPattern, item: Any):
+        node = self._root
+        for char in pattern.text:
+            node = node.children.setdefault(char, _Node())
+        (node.prefix if pattern.is_prefix else node.exact).append(item)
+        self.size += 1
+
+    def lookup(self, data: str) -> List[Any]:
+        """Кандидаты для data: точное совпадение, затем префиксы от длинного к короткому"""
+        node = self._root
+        prefixes = [node.prefix] if node.prefix else []
+        for char in data:
+            node = node.children.get(char)
+            if node is None:
+                break
+            if node.prefix:
+                prefixes.append(node.prefix)
+        else:
+            if node.exact:
+                prefixes.append(node.exact)
+
+        candidates = []
+        for items in reversed(prefixes):
+            candidates.extend(items)
+        return candidates
+
+
+class _Route:
+    """Обработчик из таблицы и middleware роутеров между ним и диспетчером"""
+
+    __slots__ = ("handler", "call")
+
+    def __init__(self, handler: HandlerObject, call):
+        self.handler = handler
+        self.call = call
+
+
+class CallbackTable:
+    """Таблица callback-обработчиков диспетчера"""
+
+    def __init__(self):
+        self.trie = CallbackTrie()
+
+    def collect(self, dp: Dispatcher):
+        """Перенести обработчики с CallbackPattern из всех роутеров диспетчера в таблицу"""
+        for router in dp.chain_tail:
+            observer = router.observers["callback_query"]
+            middlewares = self._router_middlewares(router, dp)
+            remaining = []
+            for handler in observer.handlers:
+                pattern = self._pattern_of(handler)
+                if pattern is None:
+                    remaining.append(handler)
+                    continue
+                call = observer.outer_middleware.wrap_middlewares(middlewares, handler.call)
+                self.trie.add(pattern, _Route(handler, call))
+            observer.handlers = remaining
+
+    @staticmethod
+    def _pattern_of(handler: HandlerObject) -> Optional[CallbackPattern]:
+        """CallbackPattern среди фильтров обработчика"""
+        for filter_object in handler.filters or ():
+            if isinstance(filter_object.callback, CallbackPattern):
+                return filter_object.callback
+        return None
+
+    @staticmethod
+    def _router_middlewares(router: Router, dp: Dispatcher) -> list:
+        """
+        Inner middleware роутеров от дочернего роутера диспетчера до router
+
+        Middleware самого диспетчера уже обернули вызов таблицы.
+        """
+        middlewares = []
+        for item in reversed(tuple(router.chain_head)):
+            if item is not dp:
+                middlewares.extend(item.observers["callback_query"].middleware)
+        return middlewares
+
+    def lookup(self, data: Optional[str]) -> List[_Route]:
+        return self.trie.lookup(data) if data is not None else []
+
+    async def dispatch(self, callback: CallbackQuery, **kwargs: Any) -> Any:
+        """Найти обработчик callback_data и вызвать его; иначе - обычный обход роутеров"""
+        for route in self.lookup(callback.data):
+            kwargs["handler"] = route.handler
+            result, data = await route.handler.check(callback, **kwargs)
+            if not result:
+                continue
+            try:
+                return await route.call(callback, {**kwargs, **data})
+            except SkipHandler:
+                continue
+        return UNHANDLED
+
+
+def install_callback_table(dp: Dispatcher) -> CallbackTable:
+    """
+    Собрать таблицу callback-обработчиков и подключить ее к диспетчеру
+
+    Вызывать после include_router всех роутеров. Обработчики без
+    CallbackPattern остаются в роутерах и проверяются как обычно, если
+    в таблице ничего не подошло.
+    """
+    table = CallbackTable()
+    table.collect(dp)
+    dp.callback_query.register(table.dispatch)
+    return table
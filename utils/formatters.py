@@ -1,5 +1,11 @@
 from datetime import datetime
 from database.models import User, Product, Order, OrderStatus
+from database.money import Money
+
+
+def format_money(amount) -> str:
+    """Форматировать сумму в рублях: Money или число"""
+    return f"{Money.coerce(amount)}₽"
 
 
 def format_user_info(user: User, referrals_count: int = 0) -> str:
@@ -13,9 +19,9 @@ def format_user_info(user: User, referrals_count: int = 0) -> str:
         text += f"🔗 @{user.username}\n"
     
     text += f"\n🆔 UID: <code>{user.id}</code>\n"
-    text += f"💰 Баланс: <b>{user.balance:.2f}₽</b>\n"
+    text += f"💰 Баланс: <b>{format_money(user.balance)}</b>\n"
     text += f"📦 Заказов: <b>{user.total_orders}</b>\n"
-    text += f"💸 Потрачено: <b>{user.total_spent:.2f}₽</b>\n"
+    text += f"💸 Потрачено: <b>{format_money(user.total_spent)}</b>\n"
     
     # Промокод пользователя
     if user.promo_code:
@@ -32,7 +38,7 @@ def format_product_info(product: Product, show_stock: bool = False) -> str:
     if product.description:
         text += f"\n📝 {product.description}\n"
     
-    text += f"\n💰 Цена: <b>{product.price:.2f}₽</b>\n"
+    text += f"\n💰 Цена: <b>{format_money(product.price)}</b>\n"
     text += f"📂 Категория: <b>{product.category.name}</b>\n"
     
     if show_stock:
@@ -74,7 +80,7 @@ def format_order_info(order: Order, show_content: bool = False) -> str:
     text = f"{icon} <b>Заказ #{order.id}</b>\n"
     text += f"📦 Товар: <b>{order.product.name}</b>\n"
     text += f"📊 Количество: <b>{order.quantity}</b>\n"
-    text += f"💰 Сумма: <b>{order.total_price:.2f}₽</b>\n"
+    text += f"💰 Сумма: <b>{format_money(order.total_price)}</b>\n"
     text += f"📅 Статус: <b>{status_name}</b>\n"
     text += f"🕐 Создан: <b>{order.created_at.strftime('%d.%m.%Y %H:%M')}</b>\n"
     
@@ -103,7 +109,7 @@ def format_stats(stats: dict) -> str:
         text += f"📦 Всего заказов: <b>{stats['total_orders']}</b>\n"
     
     if "total_revenue" in stats:
-        text += f"💰 Общая выручка: <b>{stats['total_revenue']:.2f}₽</b>\n"
+        text += f"💰 Общая выручка: <b>{format_money(stats['total_revenue'])}</b>\n"
     
     return text
 
@@ -125,9 +131,9 @@ def format_user_brief_info(user_info: dict) -> str:
         text += f"🔗 @{user.username}\n"
     
     text += f"🆔 UID: <code>{user.id}</code>\n"
-    text += f"💰 Баланс: <b>{user.balance:.2f}₽</b>\n"
+    text += f"💰 Баланс: <b>{format_money(user.balance)}</b>\n"
     text += f"📦 Заказов: <b>{total_orders}</b>\n"
-    text += f"💸 Потрачено: <b>{total_spent:.2f}₽</b>\n"
+    text += f"💸 Потрачено: <b>{format_money(total_spent)}</b>\n"
     
     # Уровень активности
     if user_info["is_vip_buyer"]:
@@ -152,7 +158,7 @@ def format_user_brief_info(user_info: dict) -> str:
                 "cancelled": "❌"
             }.get(order.status, "❓")
             
-            text += f"{status_icon} {order.product.name} - {order.total_price:.2f}₽ ({order.created_at.strftime('%d.%m')})\n"
+            text += f"{status_icon} {order.product.name} - {format_money(order.total_price)} ({order.created_at.strftime('%d.%m')})\n"
     
     return text
 
@@ -170,9 +176,9 @@ def format_user_search_result(user: dict) -> str:
         text += f"🔗 @{user.username}\n"
     
     text += f"🆔 UID: <code>{user.id}</code>\n"
-    text += f"💰 Баланс: <b>{user.balance:.2f}₽</b>\n"
+    text += f"💰 Баланс: <b>{format_money(user.balance)}</b>\n"
     text += f"📦 Заказов: <b>{user.total_orders}</b>\n"
-    text += f"💸 Потрачено: <b>{user.total_spent:.2f}₽</b>\n"
+    text += f"💸 Потрачено: <b>{format_money(user.total_spent)}</b>\n"
     
     # Промокод пользователя
     if user.promo_code:
@@ -202,7 +208,7 @@ def format_user_orders_summary(summary: dict) -> str:
     text += f"💳 Оплачены: <b>{summary['paid_orders']}</b>\n"
     text += f"✅ Выданы: <b>{summary['delivered_orders']}</b>\n"
     text += f"❌ Отменены: <b>{summary['cancelled_orders']}</b>\n"
-    text += f"💸 Потрачено: <b>{summary['total_spent']:.2f}₽</b>\n"
+    text += f"💸 Потрачено: <b>{format_money(summary['total_spent'])}</b>\n"
     
     # Последние заказы
     if summary["recent_orders"]:
@@ -215,7 +221,7 @@ def format_user_orders_summary(summary: dict) -> str:
                 "cancelled": "❌"
             }.get(order.status, "❓")
             
-            text += f"{status_icon} {order.product.name} - {order.total_price:.2f}₽ ({order.created_at.strftime('%d.%m %H:%M')})\n"
+            text += f"{status_icon} {order.product.name} - {format_money(order.total_price)} ({order.created_at.strftime('%d.%m %H:%M')})\n"
     
     return text
 
@@ -308,9 +314,9 @@ def format_user_for_delivery(user_info: dict) -> str:
         text += f"🔗 @{user.username}\n"
     
     text += f"🆔 UID: <code>{user.id}</code>\n"
-    text += f"💰 Баланс: <b>{user.balance:.2f}₽</b>\n"
+    text += f"💰 Баланс: <b>{format_money(user.balance)}</b>\n"
     text += f"📦 Заказов: <b>{total_orders}</b>\n"
-    text += f"💸 Потрачено: <b>{total_spent:.2f}₽</b>\n"
+    text += f"💸 Потрачено: <b>{format_money(total_spent)}</b>\n"
     
     # Уровень активности
     if user_info["is_vip_buyer"]:
@@ -341,14 +347,14 @@ def format_delivery_message(order: dict, product: dict, user: dict, admin_info:
     text += "📋 <b>Информация о заказе:</b>\n"
     text += f"🆔 Заказ: <code>#{order['id']}</code>\n"
     text += f"📅 Дата: <b>{order['created_at']}</b>\n"
-    text += f"💰 Сумма: <b>{order['total_price']:.2f}₽</b>\n"
+    text += f"💰 Сумма: <b>{format_money(order['total_price'])}</b>\n"
     text += f"📦 Количество: <b>{order['quantity']}</b>\n\n"
     
     # Информация о товаре
     text += "🛍 <b>Товар:</b>\n"
     text += f"📦 Название: <b>{product['name']}</b>\n"
     text += f"📂 Категория: <b>{product['category_name']}</b>\n"
-    text += f"💰 Цена: <b>{product['price']:.2f}₽</b>\n"
+    text += f"💰 Цена: <b>{format_money(product['price'])}</b>\n"
     
     if product.get('duration'):
         text += f"⏱ Длительность: <b>{product['duration']}</b>\n"
@@ -374,7 +380,7 @@ def format_delivery_message(order: dict, product: dict, user: dict, admin_info:
     if user.get('username'):
         text += f"🔗 Username: @{user['username']}\n"
     text += f"🆔 ID: <code>{user['id']}</code>\n"
-    text += f"💰 Баланс: <b>{user.get('balance', 0):.2f}₽</b>\n"
+    text += f"💰 Баланс: <b>{format_money(user.get('balance', 0))}</b>\n"
     text += f"📦 Заказов: <b>{user.get('total_orders', 0)}</b>\n\n"
     
     # Информация о выдаче
@@ -401,7 +407,7 @@ def format_delivery_content_message(order: dict, product: dict, content: str, in
     text += "📋 <b>Детали заказа:</b>\n"
     text += f"🆔 Заказ: <code>#{order['id']}</code>\n"
     text += f"📦 Товар: <b>{product['name']}</b>\n"
-    text += f"💰 Сумма: <b>{order['total_price']:.2f}₽</b>\n"
+    text += f"💰 Сумма: <b>{format_money(order['total_price'])}</b>\n"
     text += f"📅 Дата: <b>{order['created_at']}</b>\n\n"
     
     # Содержимое товара
@@ -444,7 +450,7 @@ def format_delivery_admin_notification(order: dict, product: dict, user: dict, a
     text += "📋 <b>Детали выдачи:</b>\n"
     text += f"🆔 Заказ: <code>#{order['id']}</code>\n"
     text += f"📦 Товар: <b>{product['name']}</b>\n"
-    text += f"💰 Сумма: <b>{order['total_price']:.2f}₽</b>\n"
+    text += f"💰 Сумма: <b>{format_money(order['total_price'])}</b>\n"
     text += f"📅 Дата выдачи: <b>{order.get('delivered_at', 'Сейчас')}</b>\n\n"
     
     # Информация о пользователе
@@ -458,7 +464,7 @@ def format_delivery_admin_notification(order: dict, product: dict, user: dict, a
         text += f"🔗 @{user['username']}\n"
     text += f"🆔 ID: <code>{user['id']}</code>\n"
     text += f"📦 Заказов: <b>{user.get('total_orders', 0)}</b>\n"
-    text += f"💸 Потрачено: <b>{user.get('total_spent', 0):.2f}₽</b>\n\n"
+    text += f"💸 Потрачено: <b>{format_money(user.get('total_spent', 0))}</b>\n\n"
     
     # Информация о выдаче
     admin_name = admin_info.get('first_name', 'Администратор')
@@ -474,7 +480,7 @@ def format_delivery_admin_notification(order: dict, product: dict, user: dict, a
     # Статистика
     text += "📊 <b>Статистика:</b>\n"
     text += f"📦 Всего выдано товаров: <b>{order.get('total_delivered', 0)}</b>\n"
-    text += f"💰 Общая выручка: <b>{order.get('total_revenue', 0):.2f}₽</b>\n"
+    text += f"💰 Общая выручка: <b>{format_money(order.get('total_revenue', 0))}</b>\n"
     
     return text
 
@@ -530,7 +536,7 @@ def format_delivery_confirmation_message(order: dict, product: dict, user: dict)
     text += "📋 <b>Детали заказа:</b>\n"
     text += f"🆔 Заказ: <code>#{order['id']}</code>\n"
     text += f"📦 Товар: <b>{product['name']}</b>\n"
-    text += f"💰 Сумма: <b>{order['total_price']:.2f}₽</b>\n"
+    text += f"💰 Сумма: <b>{format_money(order['total_price'])}</b>\n"
     text += f"📅 Дата заказа: <b>{order['created_at']}</b>\n\n"
     
     # Информация о пользователе
@@ -543,7 +549,7 @@ def format_delivery_confirmation_message(order: dict, product: dict, user: dict)
     if user.get('username'):
         text += f"🔗 @{user['username']}\n"
     text += f"🆔 ID: <code>{user['id']}</code>\n"
-    text += f"💰 Баланс: <b>{user.get('balance', 0):.2f}₽</b>\n"
+    text += f"💰 Баланс: <b>{format_money(user.get('balance', 0))}</b>\n"
     text += f"📦 Заказов: <b>{user.get('total_orders', 0)}</b>\n\n"
     
     text += "⚠️ <b>ВНИМАНИЕ:</b>\n"
@@ -563,17 +569,17 @@ def format_delivery_success_stats(stats: dict) -> str:
     
     text += "📈 <b>Сегодня:</b>\n"
     text += f"✅ Выдано: <b>{stats.get('today_delivered', 0)}</b>\n"
-    text += f"💰 Выручка: <b>{stats.get('today_revenue', 0):.2f}₽</b>\n"
+    text += f"💰 Выручка: <b>{format_money(stats.get('today_revenue', 0))}</b>\n"
     text += f"👥 Покупателей: <b>{stats.get('today_customers', 0)}</b>\n\n"
     
     text += "📈 <b>За неделю:</b>\n"
     text += f"✅ Выдано: <b>{stats.get('week_delivered', 0)}</b>\n"
-    text += f"💰 Выручка: <b>{stats.get('week_revenue', 0):.2f}₽</b>\n"
+    text += f"💰 Выручка: <b>{format_money(stats.get('week_revenue', 0))}</b>\n"
     text += f"👥 Покупателей: <b>{stats.get('week_customers', 0)}</b>\n\n"
     
     text += "📈 <b>За месяц:</b>\n"
     text += f"✅ Выдано: <b>{stats.get('month_delivered', 0)}</b>\n"
-    text += f"💰 Выручка: <b>{stats.get('month_revenue', 0):.2f}₽</b>\n"
+    text += f"💰 Выручка: <b>{format_money(stats.get('month_revenue', 0))}</b>\n"
     text += f"👥 Покупателей: <b>{stats.get('month_customers', 0)}</b>\n\n"
     
     # Топ товаров
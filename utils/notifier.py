@@ -0,0 +1,131 @@
+"""Очередь уведомлений пользователям с ограничением скорости отправки"""
+
+import asyncio
+import logging
+import time
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramForbiddenError, TelegramRetryAfter, TelegramBadRequest
+
+
+logger = logging.getLogger(__name__)
+
+
+class RateLimitedSender:
+    """
+    Отправка сообщений из очереди не быстрее rate сообщений в секунду
+
+    Telegram ограничивает рассылку ~30 сообщениями в секунду на бота, при
+    превышении отвечает RetryAfter. Несколько воркеров делят один общий
+    интервал между отправками, поэтому сетевые задержки не снижают скорость.
+    На RetryAfter воркер ждет указанное время и повторяет сообщение.
+
+    Использование:
+        async with RateLimitedSender(bot, rate=25) as sender:
+            sender.enqueue(chat_id, text)
+        # на выходе дожидается отправки всей очереди
+    """
+
+    def __init__(self, bot: Bot, rate: float = 25, workers: int = 4, max_retries: int = 3):
+        self.bot = bot
+        self.interval = 1 / rate if rate > 0 else 0
+        self.workers = workers
+        self.max_retries = max_retries
+
+        self.sent = 0
+        self.failed = 0
+        self.blocked = 0
+
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._tasks = []
+        self._next_slot = 0.0
+        self._slot_lock = asyncio.Lock()
+
+    async def __aenter__(self) -> "RateLimitedSender":
+        self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            await self.join()
+        await self.stop()
+
+    def start(self):
+        """Запустить воркеры"""
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        """Остановить воркеры (неотправленные сообщения отбрасываются)"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def enqueue(self, chat_id: int, text: str, **kwargs):
+        """Поставить сообщение в очередь"""
+        self._queue.put_nowait((chat_id, text, kwargs))
+
+    async def join(self):
+        """Дождаться отправки всех сообщений из очереди"""
+        await self._queue.join()
+
+    @property
+    def pending(self) -> int:
+        return self._queue.qsize()
+
+    async def _wait_slot(self):
+        """Занять следующий свободный интервал отправки"""
+        async with self._slot_lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self.interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+    async def _pause(self, seconds: float):
+        """Сдвинуть все следующие отправки после RetryAfter"""
+        async with self._slot_lock:
+            self._next_slot = max(self._next_slot, time.monotonic() + seconds)
+
+    async def _worker(self):
+        while True:
+            chat_id, text, kwargs = await self._queue.get()
+            try:
+                await self._send(chat_id, text, kwargs)
+            finally:
+                self._queue.task_done()
+
+    async def _send(self, chat_id: int, text: str, kwargs: dict):
+        for attempt in range(self.max_retries + 1):
+            await self._wait_slot()
+            try:
+                await self.bot.send_message(chat_id=chat_id, text=text, **kwargs)
+                self.sent += 1
+                return
+            except TelegramRetryAfter as e:
+                logger.warning(f"Flood control on notification to {chat_id}, retry after {e.retry_after}s")
+                await self._pause(e.retry_after)
+            except TelegramForbiddenError:
+                # Пользователь заблокировал бота - повтор не поможет
+                self.blocked += 1
+                return
+            except TelegramBadRequest as e:
+                logger.error(f"Failed to send notification to {chat_id}: {e}")
+                self.failed += 1
+                return
+            except Exception as e:
+                if attempt == self.max_retries:
+                    logger.error(f"Failed to send notification to {chat_id}: {e}")
+                    break
+                await asyncio.sleep(2 ** attempt)
+
+        self.failed += 1
+
+    def stats(self) -> dict:
+        return {
+            "sent": self.sent,
+            "failed": self.failed,
+            "blocked": self.blocked,
+            "pending": self.pending,
+        }
@@ -0,0 +1,39 @@
+"""Прогресс долгих операций в одном редактируемом сообщении"""
+
+import time
+from typing import Optional
+
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.types import Message, InlineKeyboardMarkup
+
+
+class ProgressMessage:
+    """
+    Сообщение со статусом, которое редактируется не чаще interval секунд
+
+    Частые edit_text упираются в лимиты Telegram, поэтому промежуточные
+    обновления пропускаются, а финальное отправляется с force=True.
+    """
+
+    def __init__(self, message: Message, interval: float = 2.0):
+        self.message = message
+        self.interval = interval
+        self._last_update = 0.0
+        self._last_text: Optional[str] = None
+
+    async def update(self, text: str, reply_markup: Optional[InlineKeyboardMarkup] = None, force: bool = False):
+        """Обновить текст статуса"""
+        now = time.monotonic()
+        if not force and now - self._last_update < self.interval:
+            return
+        if text == self._last_text and reply_markup is None:
+            return
+
+        self._last_update = now
+        self._last_text = text
+
+        try:
+            await self.message.edit_text(text, reply_markup=reply_markup)
+        except TelegramBadRequest as e:
+            if "message is not modified" not in str(e):
+                raise
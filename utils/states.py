@@ -92,6 +92,15 @@ class WarehouseQuickGiveStates(StatesGroup):
     waiting_for_confirmation = State()
 
 
+class WarehouseMassGiveStates(StatesGroup):
+    """Состояния для массовой выдачи товара"""
+    waiting_for_category = State()
+    waiting_for_source = State()
+    waiting_for_quantity = State()
+    waiting_for_recipients = State()
+    waiting_for_confirmation = State()
+
+
 class AdminSettingsStates(StatesGroup):
     """Состояния для редактирования настроек системы"""
     waiting_for_value = State()
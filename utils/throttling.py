@@ -0,0 +1,200 @@
+"""
+Ограничение частоты апдейтов от пользователя
+
+Каждый callback относится к группе обработчиков по префиксу callback_data
+(покупка, пагинация, остальное), у группы свои лимиты:
+  - token bucket на пользователя: rate апдейтов в секунду, запас burst;
+  - debounce: повтор той же callback_data раньше чем через debounce
+    секунд после принятого нажатия отбрасывается.
+Лишний callback сразу получает ответ "подождите" (клиент Telegram
+кэширует его на cache_time) и не доходит ни до очереди чата, ни до
+обработчиков и БД. Лишние сообщения отбрасываются молча.
+
+Администраторы не ограничиваются.
+"""
+
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, Iterable, Optional, Tuple
+
+from aiogram import Dispatcher
+from aiogram.types import TelegramObject, Update
+
+from utils.callbacks import CallbackPattern, CallbackTrie
+
+logger = logging.getLogger(__name__)
+
+THROTTLED_TEXT = "⏳ Слишком часто, подождите немного"
+
+# Группы обработчиков: префиксы callback_data и лимиты (апдейтов/с, запас, debounce в с)
+DEFAULT_GROUPS = {
+    "buy": {
+        "prefixes": ("buy_", "confirm_order_", "cancel_order_"),
+        "limits": (0.5, 3, 1.0),
+    },
+    "pagination": {
+        "prefixes": (
+            "catalog", "category_", "products_", "product_", "cart_",
+            "warehouse_show_category_", "warehouse_all_products_page_",
+            "products_stock_page_", "out_of_stock_page_", "warehouse_category_stock_page_",
+        ),
+        "limits": (3.0, 8, 0.3),
+    },
+    # Все остальные callback и сообщения
+    "default": {
+        "prefixes": (),
+        "limits": (5.0, 15, 0.3),
+    },
+}
+
+# Сколько записей хранить до очистки устаревших
+_MAX_ENTRIES = 10000
+
+throttle_metrics = {
+    "passed": 0,
+    "throttled": 0,
+    "debounced": 0,
+}
+
+
+class ThrottleGroup:
+    """Лимиты группы обработчиков"""
+
+    __slots__ = ("name", "rate", "burst", "debounce")
+
+    def __init__(self, name: str, rate: float, burst: int, debounce: float):
+        self.name = name
+        self.rate = rate
+        self.burst = burst
+        self.debounce = debounce
+
+
+class Throttler:
+    """Token bucket на (пользователь, группа) и debounce на (пользователь, callback_data)"""
+
+    def __init__(self, groups: Iterable[Tuple[ThrottleGroup, Iterable[str]]], exempt_ids: Iterable[int] = ()):
+        self._trie = CallbackTrie()
+        self.groups: Dict[str, ThrottleGroup] = {}
+        self.default: Optional[ThrottleGroup] = None
+        for group, prefixes in groups:
+            self.groups[group.name] = group
+            if group.name == "default":
+                self.default = group
+            for prefix in prefixes:
+                self._trie.add(CallbackPattern.prefix(prefix), group)
+        if self.default is None:
+            raise ValueError("throttling requires a default group")
+
+        self.exempt_ids = set(exempt_ids)
+        # (user_id, группа) -> (токены, время обновления)
+        self._buckets: Dict[Tuple[int, str], Tuple[float, float]] = {}
+        # (user_id, callback_data) -> время принятого нажатия
+        self._pressed: Dict[Tuple[int, str], float] = {}
+
+    def group_for(self, data: Optional[str]) -> ThrottleGroup:
+        """Группа callback_data (самый длинный подходящий префикс)"""
+        if data:
+            groups = self._trie.lookup(data)
+            if groups:
+                return groups[0]
+        return self.default
+
+    def _take_token(self, user_id: int, group: ThrottleGroup, now: float) -> bool:
+        key = (user_id, group.name)
+        tokens, updated_at = self._buckets.get(key, (group.burst, now))
+        tokens = min(group.burst, tokens + (now - updated_at) * group.rate)
+        if tokens < 1:
+            self._buckets[key] = (tokens, now)
+            return False
+        self._buckets[key] = (tokens - 1, now)
+        return True
+
+    def check(self, user_id: int, data: Optional[str], now: Optional[float] = None) -> Optional[str]:
+        """
+        Пропустить апдейт или нет
+
+        Args:
+            data: callback_data, None для сообщений
+
+        Returns:
+            None - пропустить, иначе причина: "debounced" или "throttled"
+        """
+        if user_id in self.exempt_ids:
+            return None
+        now = time.monotonic() if now is None else now
+        group = self.group_for(data)
+
+        if data is not None and group.debounce:
+            pressed_at = self._pressed.get((user_id, data))
+            if pressed_at is not None and now - pressed_at < group.debounce:
+                return "debounced"
+
+        if not self._take_token(user_id, group, now):
+            return "throttled"
+
+        if data is not None and group.debounce:
+            self._pressed[(user_id, data)] = now
+        self._cleanup(now)
+        return None
+
+    def _cleanup(self, now: float):
+        """Убрать истекшие debounce и заполнившиеся корзины, когда записей слишком много"""
+        if len(self._pressed) > _MAX_ENTRIES:
+            longest = max(group.debounce for group in self.groups.values())
+            for key in [key for key, value in self._pressed.items() if now - value >= longest]:
+                del self._pressed[key]
+
+        if len(self._buckets) > _MAX_ENTRIES:
+            refill = max(group.burst / group.rate for group in self.groups.values())
+            for key in [key for key, (_, updated) in self._buckets.items() if now - updated >= refill]:
+                del self._buckets[key]
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: Update,
+        data: Dict[str, Any]
+    ) -> Any:
+        user = data.get("event_from_user")
+        callback = event.callback_query
+        if user is None or (callback is None and event.message is None):
+            return await handler(event, data)
+
+        reason = self.check(user.id, callback.data if callback is not None else None)
+        if reason is None:
+            throttle_metrics["passed"] += 1
+            return await handler(event, data)
+
+        throttle_metrics[reason] += 1
+        if callback is not None:
+            group = self.group_for(callback.data)
+            try:
+                await callback.answer(THROTTLED_TEXT, cache_time=max(1, round(group.debounce)))
+            except Exception as e:
+                logger.debug(f"Failed to answer throttled callback: {e}")
+        return None
+
+
+def build_groups(overrides: Dict[str, Tuple[float, int, float]]) -> list:
+    """Группы по умолчанию с переопределенными лимитами"""
+    groups = []
+    for name, spec in DEFAULT_GROUPS.items():
+        rate, burst, debounce = overrides.get(name, spec["limits"])
+        groups.append((ThrottleGroup(name, rate, int(burst), debounce), spec["prefixes"]))
+    return groups
+
+
+def install_throttling(
+    dp: Dispatcher,
+    overrides: Optional[Dict[str, Tuple[float, int, float]]] = None,
+    exempt_ids: Iterable[int] = ()
+) -> Throttler:
+    """
+    Подключить ограничение частоты к диспетчеру
+
+    Регистрировать до планировщика апдейтов, чтобы лишние апдейты
+    отбрасывались, не вставая в очередь чата.
+    """
+    throttler = Throttler(build_groups(overrides or {}), exempt_ids)
+    dp.update.outer_middleware(throttler)
+    return throttler
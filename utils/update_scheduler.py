@@ -0,0 +1,131 @@
+"""
+Очередность обработки апдейтов
+
+Polling aiogram обрабатывает каждый апдейт отдельной задачей, без порядка
+внутри чата: двойное нажатие "Купить" запускает два create_order сразу,
+а быстрый ввод в мастере админки гоняет записи FSM наперегонки.
+
+UpdateScheduler - outer middleware апдейтов: апдейты одного чата ждут
+в очереди этого чата и обрабатываются строго по одному в порядке
+поступления, апдейты разных чатов - параллельно, но не больше
+concurrency одновременно.
+"""
+
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Hashable, Optional
+
+from aiogram import Dispatcher
+from aiogram.types import TelegramObject
+
+logger = logging.getLogger(__name__)
+
+
+class UpdateScheduler:
+    """Последовательно внутри чата, параллельно между чатами"""
+
+    def __init__(self, concurrency: int):
+        if concurrency < 1:
+            raise ValueError("concurrency must be positive")
+        self.concurrency = concurrency
+        self._semaphore = asyncio.Semaphore(concurrency)
+        # ключ чата -> очередь ожидающих; голова очереди - обрабатываемый апдейт
+        self._queues: Dict[Hashable, Deque[asyncio.Future]] = {}
+        self.metrics = {
+            "submitted": 0,
+            "completed": 0,
+            "running": 0,
+            "queued": 0,
+            "max_queue_depth": 0,
+            "wait_total": 0.0,
+            "wait_max": 0.0,
+        }
+
+    @staticmethod
+    def key_for(data: Dict[str, Any]) -> Optional[Hashable]:
+        """Ключ очереди: чат апдейта, иначе пользователь"""
+        chat = data.get("event_chat")
+        if chat is not None:
+            return chat.id
+        user = data.get("event_from_user")
+        return user.id if user is not None else None
+
+    def queue_depth(self, key: Hashable) -> int:
+        """Сколько апдейтов чата в очереди, включая обрабатываемый"""
+        queue = self._queues.get(key)
+        return len(queue) if queue else 0
+
+    async def run(self, key: Optional[Hashable], func: Callable[[], Awaitable[Any]]) -> Any:
+        """Выполнить func в очереди чата key (None - без очереди, только общий лимит)"""
+        self.metrics["submitted"] += 1
+        submitted_at = time.monotonic()
+
+        if key is None:
+            return await self._execute(func, submitted_at)
+
+        queue = self._queues.setdefault(key, deque())
+        turn = asyncio.get_running_loop().create_future()
+        queue.append(turn)
+        if len(queue) == 1:
+            turn.set_result(None)
+        else:
+            self.metrics["queued"] += 1
+        self.metrics["max_queue_depth"] = max(self.metrics["max_queue_depth"], len(queue))
+
+        try:
+            await turn
+            return await self._execute(func, submitted_at)
+        finally:
+            self._release(key, queue, turn)
+
+    async def _execute(self, func: Callable[[], Awaitable[Any]], submitted_at: float) -> Any:
+        async with self._semaphore:
+            wait = time.monotonic() - submitted_at
+            self.metrics["wait_total"] += wait
+            self.metrics["wait_max"] = max(self.metrics["wait_max"], wait)
+            self.metrics["running"] += 1
+            try:
+                return await func()
+            finally:
+                self.metrics["running"] -= 1
+                self.metrics["completed"] += 1
+
+    def _release(self, key: Hashable, queue: Deque[asyncio.Future], turn: asyncio.Future):
+        """Освободить очередь чата и передать ход следующему апдейту"""
+        if queue[0] is not turn:
+            # Отменен, не дождавшись очереди
+            queue.remove(turn)
+            self.metrics["queued"] -= 1
+            return
+
+        queue.popleft()
+        if queue:
+            self.metrics["queued"] -= 1
+            # Отмененный следующий сам уйдет из головы и передаст ход дальше
+            if not queue[0].done():
+                queue[0].set_result(None)
+        elif self._queues.get(key) is queue:
+            del self._queues[key]
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        return await self.run(self.key_for(data), lambda: handler(event, data))
+
+
+def install_update_scheduler(dp: Dispatcher, concurrency: int) -> UpdateScheduler:
+    """
+    Подключить планировщик к диспетчеру
+
+    Регистрируется outer middleware апдейтов после встроенного
+    UserContextMiddleware, поэтому чат и пользователь уже известны.
+    """
+    scheduler = UpdateScheduler(concurrency)
+    dp.update.outer_middleware(scheduler)
+    logger.info(f"Update scheduler installed: per-chat order, concurrency {concurrency}")
+    return scheduler
@@ -0,0 +1,159 @@
+"""
+Пропуск редактирований сообщений без изменений
+
+Обработчики часто вызывают edit_text/edit_reply_markup с тем же
+содержимым, что уже показано (повторное открытие категории или страницы,
+обновление статистики без изменений). Каждый такой вызов - запрос к Bot API
+и часто ошибка "message is not modified".
+
+ViewCache - middleware запросов сессии бота. Для каждого сообщения
+(chat_id, message_id) хранится отпечаток последнего отправленного текста
+и клавиатуры. Редактирование с тем же отпечатком не отправляется и
+возвращает True, как Bot API для inline-сообщений.
+
+Кэш живет в процессе: сообщение, отредактированное другим процессом бота,
+этот процесс не увидит. Кэш ограничен по размеру, самые старые записи
+вытесняются.
+"""
+
+from collections import OrderedDict
+from typing import Any, Hashable, Optional, Tuple
+
+from aiogram import Bot
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.methods import (
+    DeleteMessage,
+    EditMessageCaption,
+    EditMessageReplyMarkup,
+    EditMessageText,
+    SendMessage,
+    TelegramMethod,
+)
+from aiogram.types import Message
+
+# Отпечаток не известен (например, текст сообщения после правки одной клавиатуры)
+_UNKNOWN = None
+# Сообщение без клавиатуры
+_NO_MARKUP = 0
+
+view_metrics = {
+    "edits": 0,
+    "skipped": 0,
+    "not_modified": 0,
+}
+
+
+def _plain(value: Any) -> Any:
+    """Значение поля для отпечатка (Default и модели - через repr/json)"""
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    if isinstance(value, list):
+        return tuple(_plain(item) for item in value)
+    if hasattr(value, "model_dump_json"):
+        return value.model_dump_json(exclude_none=True)
+    return repr(value)
+
+
+def _text_fingerprint(method: TelegramMethod) -> int:
+    """Отпечаток текста (или подписи) вместе с разметкой и превью ссылок"""
+    if isinstance(method, EditMessageCaption):
+        return hash(("caption", method.caption, _plain(method.parse_mode), _plain(method.caption_entities)))
+    return hash((
+        "text",
+        method.text,
+        _plain(method.parse_mode),
+        _plain(method.entities),
+        _plain(method.link_preview_options),
+        _plain(method.disable_web_page_preview),
+    ))
+
+
+def _markup_fingerprint(method: TelegramMethod) -> int:
+    """Отпечаток клавиатуры; без reply_markup Telegram убирает клавиатуру"""
+    if method.reply_markup is None:
+        return _NO_MARKUP
+    return hash(_plain(method.reply_markup))
+
+
+class ViewCache(BaseRequestMiddleware):
+    """Отпечатки показанных сообщений по (chat_id, message_id)"""
+
+    def __init__(self, max_size: int = 50000):
+        self.max_size = max_size
+        self._views: "OrderedDict[Hashable, Tuple[Optional[int], int]]" = OrderedDict()
+
+    @staticmethod
+    def _key(method: TelegramMethod) -> Optional[Hashable]:
+        inline_message_id = getattr(method, "inline_message_id", None)
+        if inline_message_id:
+            return ("inline", inline_message_id)
+        chat_id = getattr(method, "chat_id", None)
+        message_id = getattr(method, "message_id", None)
+        if chat_id is None or message_id is None:
+            return None
+        return (chat_id, message_id)
+
+    def _remember(self, key: Hashable, view: Tuple[Optional[int], int]):
+        self._views[key] = view
+        self._views.move_to_end(key)
+        if len(self._views) > self.max_size:
+            self._views.popitem(last=False)
+
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType,
+        bot: Bot,
+        method: TelegramMethod
+    ) -> Any:
+        if isinstance(method, (EditMessageText, EditMessageCaption, EditMessageReplyMarkup)):
+            return await self._edit(make_request, bot, method)
+
+        result = await make_request(bot, method)
+
+        if isinstance(method, SendMessage) and isinstance(result, Message):
+            self._remember((result.chat.id, result.message_id), (_text_fingerprint(method), _markup_fingerprint(method)))
+        elif isinstance(method, DeleteMessage):
+            self._views.pop((method.chat_id, method.message_id), None)
+        return result
+
+    async def _edit(self, make_request: NextRequestMiddlewareType, bot: Bot, method: TelegramMethod) -> Any:
+        key = self._key(method)
+        if key is None:
+            return await make_request(bot, method)
+
+        shown = self._views.get(key)
+        markup = _markup_fingerprint(method)
+        if isinstance(method, EditMessageReplyMarkup):
+            # Правка одной клавиатуры: текст остается прежним
+            view = (shown[0] if shown is not None else _UNKNOWN, markup)
+            unchanged = shown is not None and shown[1] == markup
+        else:
+            view = (_text_fingerprint(method), markup)
+            unchanged = shown == view
+
+        view_metrics["edits"] += 1
+        if unchanged:
+            view_metrics["skipped"] += 1
+            self._views.move_to_end(key)
+            return True
+
+        try:
+            result = await make_request(bot, method)
+        except TelegramBadRequest as e:
+            if "message is not modified" in str(e):
+                view_metrics["not_modified"] += 1
+                self._remember(key, view)
+            else:
+                self._views.pop(key, None)
+            raise
+
+        self._remember(key, view)
+        return result
+
+
+def install_view_cache(bot: Bot, max_size: int = 50000) -> ViewCache:
+    """Подключить кэш отпечатков к сессии бота"""
+    view_cache = ViewCache(max_size)
+    bot.session.middleware(view_cache)
+    return view_cache
@@ -203,6 +203,152 @@ class WarehouseMessages:
         "❓ Добавить все товары на склад?"
     )
     
+    MASS_ADD_FILE_HINT = (
+        "📄 <b>Много строк?</b> Отправьте файл <code>.txt</code> или <code>.csv</code> "
+        "(из Excel: «Сохранить как CSV») - он будет загружен потоково, без ограничения 4096 символов."
+    )
+    
+    IMPORT_FILE_START = (
+        "📄 <b>Импорт товаров из файла</b>\n\n"
+        "Поддерживаются <code>.txt</code> (строка = товар) и <code>.csv</code> "
+        "(для аккаунтов - первые две колонки логин и пароль).\n\n"
+        "Шаг 1/6: Выберите категорию для товаров:"
+    )
+    
+    IMPORT_FILE_CONFIRMATION = (
+        "📄 <b>Подтверждение импорта из файла</b>\n\n"
+        "🏷 <b>Название:</b> {name}\n"
+        "📂 <b>Категория:</b> {category}\n"
+        "📦 <b>Тип:</b> {product_type}\n"
+        "⏱ <b>Длительность:</b> {duration}\n"
+        "💰 <b>Цена:</b> {price}₽\n"
+        "📎 <b>Файл:</b> {file_name} ({file_size})\n\n"
+        "❓ Импортировать товары из файла?"
+    )
+    
+    IMPORT_FILE_TOO_LARGE = (
+        "❌ <b>Файл слишком большой</b>\n\n"
+        "📦 Размер: {size}, лимит Telegram на скачивание ботом: {limit}\n\n"
+        "Разделите файл на части меньше лимита или подключите локальный "
+        "сервер Bot API (BOT_API_SERVER_URL). Отправьте файл поменьше:"
+    )
+    
+    IMPORT_FILE_PROGRESS = (
+        "⏳ <b>Импорт из файла...</b>\n\n"
+        "📋 Обработано строк: <b>{total_lines}</b>\n"
+        "✅ Добавлено: <b>{successful}</b>\n"
+        "🔄 Дубликатов: {duplicates}\n"
+        "❌ Неверный формат: {invalid_format}"
+    )
+    
+    # Массовая выдача
+    MASS_GIVE_START = (
+        "📦 <b>Массовая выдача</b>\n\n"
+        "Шаг 1/4: Выберите категорию:"
+    )
+    
+    MASS_GIVE_SOURCE = (
+        "📦 <b>Массовая выдача</b>\n\n"
+        "📂 <b>Категория:</b> {category}\n\n"
+        "Шаг 2/4: Выберите товар или выдавайте любые товары категории\n"
+        "(каждому получателю - свои единицы):"
+    )
+    
+    MASS_GIVE_QUANTITY = (
+        "📦 <b>Массовая выдача</b>\n\n"
+        "🏷 <b>Источник:</b> {source}\n"
+        "📊 <b>Доступно:</b> {available} шт.\n\n"
+        "Шаг 3/4: Сколько единиц выдать каждому получателю? (1-{max_units})"
+    )
+    
+    MASS_GIVE_RECIPIENTS = (
+        "📦 <b>Массовая выдача</b>\n\n"
+        "Шаг 4/4: Отправьте список получателей - Telegram ID или username,\n"
+        "через пробел, запятую или с новой строки (до {max_recipients}).\n\n"
+        "<b>Пример:</b>\n"
+        "<code>123456789\n"
+        "@username\n"
+        "another_user</code>"
+    )
+    
+    MASS_GIVE_CONFIRMATION = (
+        "📦 <b>Подтверждение массовой выдачи</b>\n\n"
+        "🏷 <b>Источник:</b> {source}\n"
+        "🔢 <b>Каждому:</b> {units} шт.\n"
+        "👥 <b>Получателей найдено:</b> {found}\n"
+        "📊 <b>Нужно единиц:</b> {needed}, доступно: {available}\n"
+        "{warnings}\n"
+        "❓ Выдать товар?"
+    )
+    
+    MASS_GIVE_PROGRESS = (
+        "⏳ <b>Массовая выдача: отправка уведомлений...</b>\n\n"
+        "✅ Выдано: {delivered} получателям ({units} шт.)\n"
+        "📨 Отправлено: {sent} / {delivered}\n"
+        "🚫 Заблокировали бота: {blocked}\n"
+        "❌ Ошибок отправки: {failed}"
+    )
+    
+    MASS_GIVE_SUMMARY = (
+        "✅ <b>Массовая выдача завершена</b>\n\n"
+        "🏷 <b>Источник:</b> {source}\n"
+        "👥 Выдано: <b>{delivered}</b> получателям ({units} шт.)\n"
+        "📭 Не хватило товара: {not_delivered}\n"
+        "📨 Уведомлений отправлено: {sent}\n"
+        "🚫 Заблокировали бота: {blocked}\n"
+        "❌ Ошибок отправки: {failed}"
+    )
+    
+    MASS_GIVE_USER_NOTIFICATION = (
+        "🎁 <b>Вам выдан товар!</b>\n\n"
+        "📦 <b>Товар:</b> {product_name}\n\n"
+        "📋 <b>Данные для использования:</b>\n"
+        "{contents}\n\n"
+        "💡 <i>Сохраните эти данные в надежном месте</i>"
+    )
+    
+    # Экспорт
+    EXPORT_MENU = (
+        "📤 <b>Экспорт склада и продаж</b>\n\n"
+        "• <b>Товары</b> - все товары с ценами и остатками\n"
+        "• <b>Остатки</b> - непроданный контент\n"
+        "• <b>Заказы</b> - выданные заказы с выданным контентом\n\n"
+        "Файл будет сжат (gzip). Выберите данные и формат:\n\n"
+        "💡 Также доступна команда <code>/export products csv</code>"
+    )
+    
+    EXPORT_STARTED = (
+        "⏳ <b>Формирую выгрузку...</b>\n\n"
+        "📋 Данные: {kind}\n"
+        "📄 Формат: {fmt}"
+    )
+    
+    EXPORT_DONE = (
+        "✅ <b>Выгрузка готова</b>\n\n"
+        "📋 {kind}: {rows} строк\n"
+        "📦 Размер: {size}"
+    )
+    
+    EXPORT_TOO_LARGE = (
+        "❌ <b>Файл слишком большой</b>\n\n"
+        "📦 Размер: {size}, лимит Telegram: {limit}\n\n"
+        "Выгрузите данные частями или используйте выгрузку из БД напрямую."
+    )
+    
+    # Счетчики категорий
+    COUNTERS_OK = "✅ Счетчики категорий совпадают с товарами"
+    
+    COUNTERS_DRIFT = (
+        "⚠️ <b>Счетчики расходятся с товарами</b>\n\n"
+        "{categories}\n\n"
+        "Исправить: <code>/counters repair</code>"
+    )
+    
+    COUNTERS_REPAIRED = (
+        "🔧 <b>Счетчики исправлены</b>\n\n"
+        "{categories}"
+    )
+    
     MASS_ADD_SUCCESS = (
         "✅ <b>Товары успешно добавлены!</b>\n\n"
         "📦 Добавлено товаров: {count}\n"